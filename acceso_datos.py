@@ -0,0 +1,77 @@
+"""
+## Acceso a datos sin bloqueo
+
+Los manejadores de `python-telegram-bot` y el JobQueue corren en el bucle de eventos de asyncio,
+mientras que `pandas.read_sql_query` y `engine.begin()` son síncronos. Este módulo ejecuta las
+consultas y escrituras en un pool de hilos acotado para que una consulta lenta no congele al resto
+de los usuarios.
+
+El tamaño del pool se configura con la variable de entorno `DB_HILOS` (por defecto 8).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import functools
+import os
+
+import pandas as pd
+
+
+# Pool de hilos compartido para todas las operaciones de base de datos
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv('DB_HILOS', 8)), thread_name_prefix='db')
+
+
+async def ejecutar_en_hilo(funcion, *args, **kwargs):
+    """
+    ## Funcion ejecutar en hilo:
+    Ejecuta una función bloqueante en el pool de hilos de base de datos y espera su resultado.
+
+    Args:
+        funcion (callable): Función síncrona a ejecutar.
+        *args, **kwargs: Argumentos para la función.
+
+    Returns:
+        Any: Valor devuelto por la función.
+    """
+    loop = asyncio.get_running_loop()
+    # Copia el contexto para que la traza activa (ver trazas.py) siga a la consulta en el hilo
+    contexto = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(contexto.run, funcion, *args, **kwargs))
+
+
+def _escribir(engine, query, params):
+    with engine.begin() as con:
+        return con.execute(query, params).rowcount
+
+
+async def consulta_async(engine, query, params=None):
+    """
+    ## Funcion consulta async:
+    Ejecuta una consulta de lectura fuera del bucle de eventos.
+
+    Args:
+        engine (Engine): Motor de SQLAlchemy.
+        query (str | TextClause): Consulta SQL a ejecutar.
+        params (dict, opcional): Parámetros de la consulta.
+
+    Returns:
+        pd.DataFrame: Resultado de la consulta en forma de DataFrame.
+    """
+    return await ejecutar_en_hilo(pd.read_sql_query, query, engine, params=params)
+
+
+async def ejecutar_async(engine, query, params=None):
+    """
+    ## Funcion ejecutar async:
+    Ejecuta una sentencia de escritura dentro de una transacción, fuera del bucle de eventos.
+
+    Args:
+        engine (Engine): Motor de SQLAlchemy.
+        query (TextClause): Sentencia SQL a ejecutar.
+        params (dict | list[dict], opcional): Parámetros de la sentencia; una lista ejecuta un executemany.
+
+    Returns:
+        int: Cantidad de filas afectadas.
+    """
+    return await ejecutar_en_hilo(_escribir, engine, query, params)
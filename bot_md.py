@@ -1,17 +1,33 @@
 from telegram import Update, ReplyKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackContext, ConversationHandler, JobQueue
-from sqlalchemy import create_engine, text
+from telegram.ext import Application, CallbackQueryHandler, CommandHandler, MessageHandler, filters, CallbackContext, ConversationHandler, JobQueue
+from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 from dotenv import load_dotenv
-import urllib.parse
 import logging
+import os
 import pandas as pd
 from datetime import datetime, timedelta
 from threading import Thread
 import threading
 import time
 import asyncio
-import io
+
+from acceso_datos import ejecutar_en_hilo, ejecutar_async
+from cache_reportes import CacheReportes
+from claves import ResolutorClaves, normalizar_medidor, transform_client_to
+from cola_solicitudes import ColaSolicitudes
+from conexion import calentar, engine_pnrp, estadisticas_pool
+from consultas import CONSULTAS, TAMANO_PAGINA, consulta_pagina, parametros
+from directorio_usuarios import DirectorioUsuarios
+from envios import EnvioFallido, ProgramadorEnvios
+from escritor_estados import EscritorEstados
+from metricas import CICLO, RECLAMADAS, REGISTRO_METRICAS, detener_servidor, iniciar_servidor, instrumentar_manejadores, medir_solicitud
+from paginacion import COMANDOS_PAGINADOS, PaginasReporte
+from planificacion_excel import ArchivoPlanificacionError, CargaPlanificacion
+from plantillas import PLANTILLAS, TABLA_POR_COMANDO, mensaje_tabla, primera_fila
+from procesador import DespachadorSolicitudes, ProcesadorSolicitudes
+from trazas import TRAZAS, comando_trazas, traza_de
+from webhook import ejecutar_aplicacion
 
 
 
@@ -29,35 +45,80 @@ logging.basicConfig(
 # Cargar las variables de entorno desde el archivo .env
 load_dotenv()
 
-# Conexión a la base de datos usando SQLAlchemy
-usuario = os.getenv('DB_USER')
-contrasena = os.getenv('DB_PASSWORD')
-host = os.getenv('DB_HOST')
-base_datos = os.getenv('DB_NAME')
+# Conexión a la base de datos usando SQLAlchemy, con el pool configurable e instrumentado de conexion.py
+engine = engine_pnrp()
+
+# Directorio en memoria de los usuarios autorizados, se recarga al vencer el TTL o al registrar un usuario
+directorio_usuarios = DirectorioUsuarios(engine, 'bot_usuarios_autorizados', ttl=int(os.getenv('USUARIOS_TTL', 300)))
+
+# Cola compartida de solicitudes: cada instancia reclama sus filas con un arriendo que vence. Solo se
+# atienden las solicitudes de los últimos `SOLICITUDES_ANTIGUEDAD_DIAS` días, para no responder filas
+# históricas que quedaron sin enviar
+cola_solicitudes = ColaSolicitudes(
+    engine, 'proceso_bot', 'ITEM',
+    filtro=f"AND FECHA >= DATE_SUB(NOW(), INTERVAL {int(os.getenv('SOLICITUDES_ANTIGUEDAD_DIAS', 7))} DAY)"
+)
+
+# Claves de los medidores de cada ciclo, resueltas con una consulta por lote
+resolutor_claves = ResolutorClaves(engine)
 
-logging.info("CODIFICANDO CONTRASEÑA")
-encoded_password = urllib.parse.quote_plus(contrasena)
+# Confirmaciones de envío agrupadas en un commit por ciclo
+escritor_estados = EscritorEstados(engine, 'proceso_bot', 'ITEM', trazas=TRAZAS)
 
-ssl_args = {
-    'ssl_cert': os.getenv('SSL_CERT_PATH'),
-    'ssl_key': os.getenv('SSL_KEY_PATH')
-}
-engine = create_engine(f"mysql+pymysql://{usuario}:{encoded_password}@{host}/{base_datos}", connect_args=ssl_args)
+# Resultados recientes de los reportes por marca, comando y clave
+cache_reportes = CacheReportes()
 
+# Envíos a Telegram con límite global, separación por chat y reintentos
+programador_envios = ProgramadorEnvios()
 
-def solicitud_query(QUERY):
+# Nombre del bot en las métricas (ver metricas.py) y estadísticas de sus componentes
+NOMBRE_BOT = 'bot_md'
+REGISTRO_METRICAS.estadisticas('bot_cola', lambda: {'pendientes': cola_solicitudes.contar_pendientes()}, bot=NOMBRE_BOT)
+REGISTRO_METRICAS.estadisticas('bot_cache_reportes', cache_reportes.estadisticas, bot=NOMBRE_BOT)
+REGISTRO_METRICAS.estadisticas('bot_envios', programador_envios.estadisticas, bot=NOMBRE_BOT)
+REGISTRO_METRICAS.estadisticas('bot_escritor', escritor_estados.estadisticas, bot=NOMBRE_BOT)
+
+
+def solicitud_query(QUERY, params=None):
     """
     Ejecuta una consulta SQL y devuelve el resultado como un DataFrame de pandas.
 
     Args:
         QUERY (str): Consulta SQL a ejecutar.
+        params (dict, opcional): Parámetros de la consulta.
 
     Returns:
         pd.DataFrame: Resultado de la consulta en forma de DataFrame.
     """
-    df = pd.read_sql_query(QUERY, engine)
+    df = pd.read_sql_query(QUERY, engine, params=params)
     return df
 
+async def solicitud_query_async(QUERY, params=None):
+    """
+    Ejecuta `solicitud_query` en el pool de hilos de base de datos sin bloquear el bucle de eventos.
+
+    Args:
+        QUERY (str | TextClause): Consulta SQL a ejecutar.
+        params (dict, opcional): Parámetros de la consulta.
+
+    Returns:
+        pd.DataFrame: Resultado de la consulta en forma de DataFrame.
+    """
+    return await ejecutar_en_hilo(solicitud_query, QUERY, params)
+
+async def ejecutar_escritura(QUERY, params=None):
+    """
+    Ejecuta una sentencia de escritura en su propia transacción sin bloquear el bucle de eventos.
+
+    Args:
+        QUERY (TextClause): Sentencia SQL a ejecutar.
+        params (dict | list[dict], opcional): Parámetros de la sentencia.
+
+    Returns:
+        int: Cantidad de filas afectadas.
+    """
+    return await ejecutar_async(engine, QUERY, params)
+
 async def start(update: Update, context: CallbackContext):
     """
     Inicia el proceso de registro. Verifica si el usuario ya está registrado.
@@ -70,10 +131,8 @@ async def start(update: Update, context: CallbackContext):
         int: Estado del flujo de conversación.
     """
     user_id = update.message.from_user.id
-    usuarios = solicitud_query("SELECT * FROM bot_usuarios_autorizados;")
-    iD_TELEGRAM = usuarios['ID_TELEGRAM'].tolist()
 
-    if int(user_id) not in iD_TELEGRAM:
+    if await directorio_usuarios.obtener_async(user_id) is None:
         await update.message.reply_text('¡Bienvenido! Por favor, ingresa tu nombre completo para validar tus datos:')
         return REGISTRO
     else:
@@ -97,19 +156,18 @@ async def registro(update: Update, context: CallbackContext):
     user_first_name = update.message.from_user.first_name
 
     try:
-        with engine.begin() as con:
-            query_update = text("""
-                UPDATE bot_usuarios_autorizados 
-                SET ID_TELEGRAM=:user_id,
-                ROL='SUPERVISOR'
-                WHERE NOMBRE_COMPLETO=:user_name 
-                OR NOMBRE_TELEGRAM=:user_first_name 
-                OR USUARIO_TELEGRAM=:user_name_id
-            """)
-            con.execute(query_update, {'user_id': user_id, 'user_name': user_name, 'user_first_name': user_first_name, 'user_name_id': user_name_id})
-            await update.message.reply_text(f'Te has registrado con éxito como {user_name}. Usa el comando /menu para acceder a las opciones.')
+        query_update = text("""
+            UPDATE bot_usuarios_autorizados 
+            SET ID_TELEGRAM=:user_id,
+            ROL='SUPERVISOR'
+            WHERE NOMBRE_COMPLETO=:user_name 
+            OR NOMBRE_TELEGRAM=:user_first_name 
+            OR USUARIO_TELEGRAM=:user_name_id
+        """)
+        await ejecutar_escritura(query_update, {'user_id': user_id, 'user_name': user_name, 'user_first_name': user_first_name, 'user_name_id': user_name_id})
+        directorio_usuarios.invalidar()
+        await update.message.reply_text(f'Te has registrado con éxito como {user_name}. Usa el comando /menu para acceder a las opciones.')
     except SQLAlchemyError as e:
-        print(e)
         logging.error(f"Error al registrar usuario: {e}")
         await update.message.reply_text('Ocurrió un error durante el registro. Por favor, inténtalo de nuevo.')
 
@@ -127,12 +185,9 @@ async def verificar_rol(update: Update, context: CallbackContext):
         int: Estado del flujo de conversación.
     """
     user_id = update.message.from_user.id
-    usuarios = solicitud_query("SELECT * FROM bot_usuarios_autorizados;")
-    iD_TELEGRAM = usuarios['ID_TELEGRAM'].tolist()
-    Rol_user = solicitud_query(f"SELECT ROL FROM bot_usuarios_autorizados where ID_TELEGRAM = {user_id};")
-    roluser = Rol_user.iloc[0, 0]
+    usuario = await directorio_usuarios.obtener_async(user_id)
 
-    if int(user_id) in iD_TELEGRAM and roluser == 'PLANIFICADOR' or roluser == 'ADMINISTRADOR':
+    if usuario is not None and usuario['ROL'] in ('PLANIFICADOR', 'ADMINISTRADOR'):
         await update.message.reply_text(
             '¡Bienvenido! Por favor, ingresa los medidores que planificarán enviando un archivo Excel, '
             'una lista de medidores separada por comas, o un listado de medidores en diferentes líneas.'
@@ -155,62 +210,55 @@ async def planificacion(update: Update, context: CallbackContext):
     """
     user_id = update.message.from_user.id
     user_first_name = update.message.from_user.first_name
-    print("Realizando la planificación")
+    logging.debug("Realizando la planificación")
 
-    # Obtener datos de usuarios autorizados
-    usuarios = solicitud_query("SELECT * FROM bot_usuarios_autorizados;")
-    iD_TELEGRAM = usuarios['ID_TELEGRAM'].tolist()
+    # Obtener datos del usuario desde el directorio en memoria
+    usuario_encontrado = await directorio_usuarios.obtener_async(user_id)
 
-    if int(user_id) in iD_TELEGRAM:
-        usuario_encontrado = usuarios.loc[usuarios['ID_TELEGRAM'] == int(user_id)].iloc[0]
+    if usuario_encontrado is not None:
         nombre_completo = usuario_encontrado['NOMBRE_COMPLETO'] if pd.notna(usuario_encontrado['NOMBRE_COMPLETO']) else user_first_name
-        print(f"Nombre completo: {nombre_completo}")
+        logging.debug(f"Planificación de {nombre_completo}")
 
         # Manejo de archivos enviados
         if update.message.document:
             file = update.message.document
-            print("El usuario envió un documento")
+            logging.debug("El usuario envió un documento")
 
             # Verificación del tipo de archivo
             if file.file_name.endswith('.xlsx') or file.file_name.endswith('.xls'):
                 try:
                     file_path = await context.bot.get_file(file.file_id)
-                    file_data = await file_path.download_as_bytearray()
-                    print("Datos del archivo descargado")
-
-                    # Convertir bytearray a BytesIO para que pandas pueda leerlo
-                    file_stream = io.BytesIO(file_data)
+                    logging.debug("Cargando el archivo por lotes")
 
-                    # Leer datos de Excel usando BytesIO
-                    excel_data = pd.read_excel(file_stream)
-                    print("Datos del Excel leídos")
-                    print(excel_data)
+                    # El archivo se lee en el pool de procesos, que descarta las filas donde la columna 'Clave'
+                    # es nula, vacía o "", o sin una fecha válida
+                    def construir_registro(valores):
+                        clave, medidor, fecha = valores
+                        return {'user_id': user_id, 'user_nombre': nombre_completo, 'medidor': medidor, 'fecha': fecha}
 
-                    # Limpiar el DataFrame: eliminar filas donde la columna 'Clave' es nula, vacía o ""
-                    excel_data = excel_data.dropna(subset=['Clave'])  # Eliminar filas con NaN en 'Clave'
-                    excel_data = excel_data[excel_data['Clave'].astype(str).str.strip() != '']  # Eliminar filas con cadenas vacías
-                    print(excel_data)
+                    query_insert = text("""
+                        INSERT INTO pnrp.bot_planificacion_md(ID_TELEGRAM, NOMBRE, MEDIDOR, FECHA_PLANIFICACION, REVISION)
+                        VALUES(:user_id, :user_nombre, :medidor, :fecha, 0)
+                    """)
 
-                    records = [(user_id, nombre_completo, row['Medidor'], row['Fecha'].strftime('%Y-%m-%d'))
-                               for index, row in excel_data.iterrows()]
+                    async def insertar(registros):
+                        # Insertar el lote usando executemany
+                        await ejecutar_escritura(query_insert, registros)
 
+                    carga = CargaPlanificacion(['Clave', 'Medidor', 'Fecha'], 'Clave', 'Fecha', construir_registro, insertar)
                     try:
-                        with engine.begin() as con:
-                            # Usar la sintaxis de SQLAlchemy para múltiples inserciones
-                            query_insert = text("""
-                                INSERT INTO pnrp.bot_planificacion_md(ID_TELEGRAM, NOMBRE, MEDIDOR, FECHA_PLANIFICACION, REVISION)
-                                VALUES(:user_id, :user_nombre, :medidor, :fecha, 0)
-                            """)
-                            # Insertar múltiples registros usando executemany
-                            con.execute(query_insert, [dict(zip(['user_id', 'user_nombre', 'medidor', 'fecha'], record)) for record in records])
+                        insertadas, descartadas = await carga.cargar(file, file_path, update)
+                    except ArchivoPlanificacionError as e:
+                        logging.warning(f"Archivo de planificación rechazado: {e}")
+                        await update.message.reply_text(f'{e}. Por favor, revisa el archivo y vuelve a intentarlo.')
                     except SQLAlchemyError as e:
                         logging.error(f"Error al insertar los medidores: {e}")
                         await update.message.reply_text('Error al registrar los medidores. Por favor, inténtalo de nuevo.')
-
-                    await update.message.reply_text('Todos los medidores han sido registrados con éxito. Usa el comando /menu para acceder a las opciones.')
+                    else:
+                        logging.info(f"Planificación cargada por {nombre_completo}: {insertadas} filas, {descartadas} descartadas")
+                        await update.message.reply_text(f'Todos los medidores han sido registrados con éxito ({insertadas} registrados, {descartadas} filas descartadas). Usa el comando /menu para acceder a las opciones.')
 
                 except Exception as e:
-                    print(e)
                     logging.error(f"Error al procesar los datos del archivo Excel: {e}")
                     await update.message.reply_text('Error al procesar el archivo. Por favor, asegúrate de que el formato sea correcto.')
 
@@ -294,22 +342,6 @@ async def seleccionar_marca(update: Update, context: CallbackContext):
     await update.message.reply_text(f'Seleccionaste: {update.message.text}. Ahora ingresa el número del medidor:')
     return INGRESAR_MEDIDOR
 
-def transform_client_to(client):
-    """
-    Transforma el identificador del cliente en un formato específico.
-
-    Args:
-        client (str): El identificador original del cliente.
-
-    Returns:
-        str: El identificador transformado en el formato "AAAA-XXX-YYYYYY".
-    """
-    year = client[:4]
-    group = client[4:7]
-    number = client[7:]
-    transformed_client = f"{year}-{group.zfill(3)}-{number.zfill(6)}"
-    return transformed_client
-
 # Función para manejar la entrada del número de medidor
 async def ingresar_medidor(update: Update, context: CallbackContext):
     """
@@ -328,31 +360,32 @@ async def ingresar_medidor(update: Update, context: CallbackContext):
     user_command = context.user_data['user_command']
     user_marca = context.user_data['marca']
     fecha_instantanea = datetime.now()
-    usuarios = solicitud_query("SELECT * FROM bot_usuarios_autorizados;")
-    iD_TELEGRAM = usuarios['ID_TELEGRAM'].tolist()
+    usuario_encontrado = await directorio_usuarios.obtener_async(user_id)
 
     if user_medidor != "None" and (13 <= len(user_medidor) <= 15):
         if not (len(user_medidor) > 8 and user_medidor[4] == '-' and user_medidor[8] == '-'):
             user_medidor = transform_client_to(user_medidor)
            
-    if int(user_id) in iD_TELEGRAM:
+    if usuario_encontrado is not None:
         try:
-            usuario_encontrado = usuarios.loc[usuarios['ID_TELEGRAM'] == int(user_id)].iloc[0]
             nombre_completo = usuario_encontrado['NOMBRE_COMPLETO'] if pd.notna(usuario_encontrado['NOMBRE_COMPLETO']) else user_first_name
  
-            with engine.begin() as con:
-                logging.info(f"Insertando consulta a la base de datos, nombre: {nombre_completo}, medidor:{user_medidor}, comando:{user_command}, fecha:{fecha_instantanea}")
-                print(f"el nombre completo es: {nombre_completo} y el medidor que ingreso es: {user_medidor}, comando: {user_command}")
-                query_insert = text("INSERT INTO proceso_bot (ID_TG, COMANDO, MEDIDOR, FECHA, PROCESO, ENVIADO, NOMBRE) VALUES (:user_id, :user_command, :user_medidor, :fecha_instantanea, 0, 0, :nombre_completo)")
-                con.execute(query_insert, {
+            logging.info(f"Insertando consulta a la base de datos, nombre: {nombre_completo}, medidor:{user_medidor}, comando:{user_command}, fecha:{fecha_instantanea}")
+            query_insert = text("INSERT INTO proceso_bot (ID_TG, COMANDO, MEDIDOR, FECHA, PROCESO, ENVIADO, NOMBRE, TRAZA_ID) VALUES (:user_id, :user_command, :user_medidor, :fecha_instantanea, 0, 0, :nombre_completo, :traza_id)")
+            # La traza de la solicitud empieza con la inserción y sigue con el id guardado en la fila
+            traza_id = TRAZAS.nuevo_id()
+            with TRAZAS.activar(traza_id, bot=NOMBRE_BOT, marca='Elster', comando=user_command, medidor=user_medidor), TRAZAS.tramo('insercion'):
+                await ejecutar_escritura(query_insert, {
                     'user_id': user_id,
                     'user_command': user_command,
                     'user_medidor': user_medidor,
                     'fecha_instantanea': fecha_instantanea,
-                    'nombre_completo': nombre_completo
+                    'nombre_completo': nombre_completo,
+                    'traza_id': traza_id
                 })
-                logging.info(f"Insercion exitosa, nombre: {nombre_completo}, medidor:{user_medidor} ,comando:{user_command}, fecha:{fecha_instantanea}")
-                await update.message.reply_text(f"La solicitud de validación está en proceso para el medidor: {user_medidor}")
+            logging.info(f"Insercion exitosa, nombre: {nombre_completo}, medidor:{user_medidor} ,comando:{user_command}, fecha:{fecha_instantanea}, traza:{traza_id}")
+            despachador_solicitudes.notificar()
+            await update.message.reply_text(f"La solicitud de validación está en proceso para el medidor: {user_medidor}")
 
         except SQLAlchemyError as e:
             logging.error(f"Error al insertar solicitud en la base de datos: {e}")
@@ -361,6 +394,232 @@ async def ingresar_medidor(update: Update, context: CallbackContext):
     return ConversationHandler.END
 
 
+async def consultar_reporte(user_command, medidor, clave):
+    """
+    Ejecuta las consultas del reporte solicitado para un medidor.
+
+    Args:
+        user_command (str): Comando solicitado (1 a 5).
+        medidor (str): Número del medidor.
+        clave (str): Clave del medidor, o "EMPTY" si no se encontró.
+
+    Returns:
+        dict: Resultados de las consultas (DataFrames) indexados por nombre.
+    """
+    datos = {}
+    if clave != "EMPTY":
+        if user_command == "1":
+            datos['informacion_medidor'] = await solicitud_query_async(CONSULTAS['elster_informacion'], parametros(medidor=medidor))
+        if user_command == "2":
+            datos['comunicacion_elster'] = await solicitud_query_async(CONSULTAS['elster_comunicacion'], parametros(medidor=medidor))
+        if user_command == "3":
+            datos['alarmas_medidor'] = await solicitud_query_async(CONSULTAS['elster_alarmas'], parametros(medidor=medidor))
+        if user_command == "4":
+            datos['ordenes'] = await solicitud_query_async(CONSULTAS['elster_ordenes'], parametros(clave=clave))
+    if user_command == '5':
+        datos['comentario_telegestion'] = await solicitud_query_async(CONSULTAS['bitacora'], parametros(clave=clave))
+    return datos
+
+def construir_mensaje(user_command, datos, medidor, clave, user_first_name):
+    """
+    Construye el mensaje del reporte a partir de los resultados de `consultar_reporte`,
+    con las plantillas de `plantillas.py`.
+
+    Args:
+        user_command (str): Comando solicitado (1 a 5).
+        datos (dict): Resultados de las consultas del reporte.
+        medidor (str): Número del medidor.
+        clave (str): Clave del medidor, o "EMPTY" si no se encontró.
+        user_first_name (str): Nombre del usuario para el saludo.
+
+    Returns:
+        str | None: Mensaje a enviar, o None si no hay nada que enviar.
+    """
+    plantillas = PLANTILLAS.get(('Elster', user_command))
+    if plantillas is None:
+        return None
+    contexto = {'nombre': user_first_name, 'medidor': medidor}
+
+    if user_command == "2":
+        if clave == "EMPTY":
+            return plantillas['sin_clave'].renderizar(**contexto)
+
+        comunicacion_elster = datos['comunicacion_elster']
+        if comunicacion_elster.empty:
+            return plantillas['vacio'].renderizar(**contexto)
+
+        medidor_comunicacion = primera_fila(comunicacion_elster)
+        gatekeeper = medidor_comunicacion['gatekeeper']
+        rele = medidor_comunicacion['service_status']
+        last_registered = medidor_comunicacion['last_registered']
+        last_register_read = medidor_comunicacion['last_register_read']
+        fecha_actual = datetime.now()
+
+        # Determinar si el medidor comunica usando la fecha correspondiente
+        if not pd.isnull(last_register_read):
+            comunica = "Si comunica" if (fecha_actual - last_register_read) < timedelta(days=3) else "No comunica"
+            ultima_comunicacion = f"Última fecha de comunicacion del medidor a través del gatekeeper: {last_register_read}"
+        else:
+            comunica = "Si comunica" if (fecha_actual - last_registered) < timedelta(days=3) else "No comunica"
+            ultima_comunicacion = f"Última fecha de comunicacion directa del medidor: {last_registered}"
+
+        # Convertir el estado del rele
+        estado_rele = {
+            "connect": "Conectado",
+            "disconnect": "Desconectado",
+            "unknown": "Desconocido"
+        }.get(rele.lower(), "Desconocido")
+
+        # Mensaje para el estado del gatekeeper
+        if pd.isnull(gatekeeper):
+            gatekeeper_info = (
+                "El medidor comunica, pero no tiene gatekeeper asociado."
+                if comunica == "Sí comunica"
+                else "El medidor no comunica y no tiene gatekeeper asociado."
+            )
+        else:
+            gatekeeper_info = (
+                f"El medidor comunica a través del gatekeeper asociado."
+                if not pd.isnull(last_register_read)
+                else "El medidor tiene un gatekeeper asociado, pero no ha comunicado a traves de el."
+            )
+
+        return plantillas['reporte'].renderizar(
+            clave=clave, ultima_comunicacion=ultima_comunicacion, gatekeeper_info=gatekeeper_info,
+            estado_rele=estado_rele, comunica=comunica, **contexto
+        )
+
+    tabla = datos.get(TABLA_POR_COMANDO[user_command])
+    if tabla is not None and user_command in COMANDOS_PAGINADOS:
+        # Solo las filas de la página; la fila adicional indica si hay otra
+        tabla = tabla.head(TAMANO_PAGINA)
+    if clave == "EMPTY" and user_command != '5':
+        logging.warning(f"No se encontró información para el medidor: {medidor} o clave: {clave}")
+    return mensaje_tabla(plantillas, tabla, clave, **contexto)
+
+async def consultar_pagina(solicitud, cursor):
+    """
+    Consulta una página del reporte de órdenes de servicio o de bitácora.
+
+    Args:
+        solicitud (tuple): `(marca, comando, clave, medidor, nombre)` del reporte.
+        cursor (dict | None): Cursor de la última fila de la página anterior (ver
+            `paginacion.cursor_fila`), o None para la primera página.
+
+    Returns:
+        pd.DataFrame: Filas de la página y, si hay otra página, una fila adicional.
+    """
+    _, user_command, clave, _, _ = solicitud
+    consulta = 'elster_ordenes' if user_command == "4" else 'bitacora'
+    sentencia, params = consulta_pagina(consulta, clave, cursor)
+    return await solicitud_query_async(sentencia, params)
+
+def renderizar_pagina(solicitud, tabla):
+    """
+    Construye el mensaje de una página del reporte de órdenes de servicio o de bitácora.
+
+    Args:
+        solicitud (tuple): `(marca, comando, clave, medidor, nombre)` del reporte.
+        tabla (pd.DataFrame): Filas de la página.
+
+    Returns:
+        str: Mensaje de la página.
+    """
+    _, user_command, clave, medidor, user_first_name = solicitud
+    return construir_mensaje(user_command, {TABLA_POR_COMANDO[user_command]: tabla}, medidor, clave, user_first_name)
+
+
+# Navegación de los reportes que tienen más de una página
+paginas_reporte = PaginasReporte(consultar_pagina, renderizar_pagina)
+
+
+async def obtener_reporte(user_command, medidor, claves):
+    """
+    Busca la clave del medidor y obtiene los resultados de su reporte, desde `cache_reportes` si son recientes.
+
+    Args:
+        user_command (str): Comando solicitado (1 a 5).
+        medidor (str): Número del medidor.
+        claves (dict): Claves del lote resueltas por `resolutor_claves`.
+
+    Returns:
+        tuple: Clave del medidor (o "EMPTY") y resultados de las consultas del reporte.
+    """
+    medidor_catalogo = normalizar_medidor('Elster', medidor)
+    clave = claves.get(('Elster', medidor_catalogo))
+    if clave is None:
+        clave = (await ejecutar_en_hilo(resolutor_claves.resolver, 'Elster', [medidor_catalogo]))[medidor_catalogo]
+
+    datos = await cache_reportes.obtener(
+        ('Elster', user_command, clave, medidor),
+        lambda: consultar_reporte(user_command, medidor, clave)
+    )
+    return clave, datos
+
+async def procesar_solicitud(application, solicitud, lote):
+    """
+    Atiende una solicitud reclamada por `cola_solicitudes`: obtiene el reporte del medidor según el
+    comando solicitado (desde `cache_reportes` si es reciente) y lo envía al usuario.
+
+    Args:
+        application (object): La aplicación que contiene el bot para enviar mensajes.
+        solicitud (pd.Series): Fila de `proceso_bot` con la solicitud.
+        lote (LoteSolicitudes): Claves del lote y consultas compartidas entre solicitudes idénticas.
+
+    Returns:
+        None
+    """
+    solicitud_id = solicitud['ITEM']
+    user_id = solicitud['ID_TG']
+    user_command = solicitud['COMANDO']
+    medidor = solicitud['MEDIDOR']
+    user_first_name = solicitud['NOMBRE']
+
+    logging.debug(f"Procesando solicitud {solicitud_id}: ID_TG {user_id}, comando {user_command}, medidor {medidor}, nombre {user_first_name}")
+
+    traza_id = traza_de(solicitud, f"{NOMBRE_BOT}-{solicitud_id}")
+    with medir_solicitud(NOMBRE_BOT, 'Elster', user_command, solicitud.get('FECHA'), traza_id, medidor) as medicion:
+        # Las solicitudes idénticas del lote comparten la búsqueda de la clave y las consultas del reporte
+        with medicion.etapa('reporte'):
+            clave, datos = await lote.vuelos.ejecutar(
+                (user_command, medidor),
+                lambda: obtener_reporte(user_command, medidor, lote.claves)
+            )
+        with medicion.etapa('render'):
+            mensaje = construir_mensaje(user_command, datos, medidor, clave, user_first_name)
+            teclado = None
+            if mensaje and user_command in COMANDOS_PAGINADOS:
+                mensaje, teclado = paginas_reporte.abrir(
+                    ('Elster', user_command, clave, medidor, user_first_name), mensaje, datos.get(TABLA_POR_COMANDO[user_command])
+                )
+
+        if mensaje:
+            try:
+                # Termina cuando Telegram confirmó la entrega
+                with medicion.etapa('envio'):
+                    await programador_envios.enviar(application.bot, user_id, mensaje, reply_markup=teclado)
+                logging.info(f"Mensaje enviado a ID_TG: {user_id} (traza {traza_id})")
+
+                escritor_estados.marcar_enviado(solicitud_id, traza_id)
+                medicion.resultado = 'enviado'
+
+            except EnvioFallido as e:
+                logging.error(f"Error al enviar mensaje a ID_TG: {user_id} (traza {traza_id}): {e.error}")
+                medicion.resultado = 'fallido_definitivo' if e.definitivo else 'fallido'
+                if e.definitivo:
+                    # El chat no acepta el mensaje (bot bloqueado, mensaje inválido): no se vuelve a reclamar.
+                    # Si el error es temporal la fila queda reclamada y se reintenta al vencer el arriendo.
+                    escritor_estados.marcar_liberado(solicitud_id, traza_id)
+        else:
+            # Sin mensaje que enviar: la solicitud queda atendida y no se vuelve a reclamar
+            escritor_estados.marcar_liberado(solicitud_id, traza_id)
+            medicion.resultado = 'sin_mensaje'
+
+
+# Procesador con concurrencia acotada para las solicitudes pendientes
+procesador_solicitudes = ProcesadorSolicitudes(procesar_solicitud, 'ITEM')
+
+
 async def procesar_solicitudes(application):
     """
     Procesa las solicitudes pendientes de un bot y envía respuestas personalizadas a los usuarios.
@@ -369,6 +628,12 @@ async def procesar_solicitudes(application):
     ni enviadas. Para cada solicitud, se determina el comando del usuario y se recupera la información relevante
     del medidor asociado. Según el comando, se construye un mensaje que se envía al usuario a través de un bot.
 
+    Las solicitudes se reclaman con `cola_solicitudes`, de modo que varias instancias del bot pueden
+    compartir la misma tabla sin tomar dos veces la misma fila.
+
+    Las solicitudes se atienden en paralelo con `procesador_solicitudes`, hasta `SOLICITUDES_CONCURRENCIA`
+    a la vez y conservando el orden de las solicitudes de cada usuario.
+
     Los comandos posibles son:
         1. Información del medidor
         2. Estado de comunicación del medidor
@@ -379,6 +644,10 @@ async def procesar_solicitudes(application):
     Parámetros:
         application (object): La aplicación que contiene el bot para enviar mensajes.
 
+    Retorna:
+        int: Solicitudes reclamadas en el ciclo; `despachador_solicitudes` ejecuta otro ciclo mientras
+        el reclamo vuelve lleno.
+
     Manejo de errores:
         - Registra errores en el procesamiento de solicitudes y el envío de mensajes.
 
@@ -386,206 +655,74 @@ async def procesar_solicitudes(application):
         - Conexión a la base de datos utilizando `engine`.
         - Funciones auxiliares para realizar consultas a la base de datos.
     """
+    inicio = time.perf_counter()
+    reclamadas = 0
     try:
-        with engine.connect() as conn:
-            solicitudes_df = solicitud_query("SELECT * FROM proceso_bot WHERE PROCESO = 0 AND ENVIADO = 0  AND year(FECHA) = 2025;")
-            logging.info(f"Solicitudes encontradas: {solicitudes_df}")
-            print(solicitudes_df)
-            for _, solicitud in solicitudes_df.iterrows():
-                solicitud_id = solicitud['ITEM']
-                user_id = solicitud['ID_TG']
-                user_command = solicitud['COMANDO']
-                medidor = solicitud['MEDIDOR']
-                user_first_name = solicitud['NOMBRE']
-
-                print(f"{solicitud_id},  {user_id}, {user_command}, {medidor}, {user_first_name}")
-                
-                with engine.begin() as conn:
-                    query_update_proceso = text("UPDATE proceso_bot SET PROCESO='1' WHERE ITEM = :id")
-                    conn.execute(query_update_proceso, {'id': solicitud_id})
-                
-                mensaje = None
-                clave = solicitud_query(f"select CLAVE_CATALOGO from pnrp.airflow_elster_universo where MEDIDOR_CATALOGO = '{medidor}' limit 1;")
-                if not clave.empty:
-                    clave = clave.iloc[0,0]
-                else:
-                    clave = "EMPTY"
-            
-
-                # print(clave)
-                if user_command == "1":
-                    if clave != "EMPTY":   
-                        informacion_medidor = solicitud_query(f"SELECT * FROM pnrp.airflow_elster_universo WHERE MEDIDOR_CATALOGO = '{medidor}';")
-                        
-                        if not informacion_medidor.empty:
-                            medidor_info = informacion_medidor.iloc[0]
-                            mensaje = (
-                                f"Hola Ingeniero {user_first_name}\n\n"
-                                f"El siguiente reporte es para el medidor: {medidor}.\n\n"
-                                f"Clave: {medidor_info['CLAVE_INCMS']}\n"
-                                f"Nombre Abonado: {medidor_info['NOMBRE_ABONADO_INCMS']}\n"
-                                f"Medidor: {medidor_info['MEDIDOR_INCMS']}\n"
-                                f"Multiplicador: {medidor_info['MULTIPLICADOR']}\n"
-                                f"Último Consumo: {medidor_info['ULTIMO_CONSUMO']}\n"
-                                f"Lectura Actual: {medidor_info['LECTURA_ACTUAL']}\n"
-                                f"Código de Lectura: {medidor_info['CODIGO_LECTURA']}\n"
-                                f"Tarifa: {medidor_info['TARIFA']}\n"
-                                f"Tipo de Medida: {medidor_info['TIPO_MEDIDA']}\n"
-                                f"Zona: {medidor_info['ZONA']}\n"
-                                f"Región PNRP: {medidor_info['REGION_PNRP']}\n"
-                                f"Circuito: {medidor_info['CIRCUITO']}\n"
-                                f"Subestación: {medidor_info['SUBESTACION']}\n"
-                                f"Coord. Geograficas(X,Y): {medidor_info['COORD_U_X']}, {medidor_info['COORD_U_Y']}\n"
-                                f"Coord. UTM(X,Y):{medidor_info['COORD_X']}, {medidor_info['COORD_Y']}\n"
-                                f"Ubicacion de medidor: https://www.google.com/maps?q={medidor_info['COORD_U_Y']},{medidor_info['COORD_U_X']}"
-                            )
-                        
-                        if informacion_medidor.empty:
-                            mensaje = f"Hola ingeniero {user_first_name}, no hay informacion del medidor: {medidor}"
-                    else:
-                        mensaje = f"No se encontro informacion del medidor: {medidor}"
-                        logging.warning(f"No se encontró información para el medidor: {medidor}")
-                
-                if user_command == "2":
-                    if clave != "EMPTY":
-                        comunicacion_elster = solicitud_query(f"SELECT * FROM pnrp.ws_elster_rele where device_name = '{medidor}';")
-                        
-                        # Verifica si el DataFrame no está vacío
-                        if not comunicacion_elster.empty:
-                            medidor_comunicacion = comunicacion_elster.iloc[0]
-                            gatekeeper = medidor_comunicacion['gatekeeper']
-                            rele = medidor_comunicacion['service_status']
-                            last_registered = medidor_comunicacion['last_registered']
-                            last_register_read = medidor_comunicacion['last_register_read']
-                            fecha_actual = datetime.now()
-
-                            # Determinar si el medidor comunica usando la fecha correspondiente
-                            if not pd.isnull(last_register_read):
-                                comunica = "Si comunica" if (fecha_actual - last_register_read) < timedelta(days=3) else "No comunica"
-                                ultima_comunicacion = f"Última fecha de comunicacion del medidor a través del gatekeeper: {last_register_read}"
-                            else:
-                                comunica = "Si comunica" if (fecha_actual - last_registered) < timedelta(days=3) else "No comunica"
-                                ultima_comunicacion = f"Última fecha de comunicacion directa del medidor: {last_registered}"
-
-                            # Convertir el estado del rele
-                            estado_rele = {
-                                "connect": "Conectado",
-                                "disconnect": "Desconectado",
-                                "unknown": "Desconocido"
-                            }.get(rele.lower(), "Desconocido")
-
-                            # Mensaje para el estado del gatekeeper
-                            if pd.isnull(gatekeeper):
-                                gatekeeper_info = (
-                                    "El medidor comunica, pero no tiene gatekeeper asociado."
-                                    if comunica == "Sí comunica"
-                                    else "El medidor no comunica y no tiene gatekeeper asociado."
-                                )
-                            else:
-                                gatekeeper_info = (
-                                    f"El medidor comunica a través del gatekeeper asociado."
-                                    if not pd.isnull(last_register_read)
-                                    else "El medidor tiene un gatekeeper asociado, pero no ha comunicado a traves de el."
-                                )
-
-                            # Construir el mensaje final
-                            mensaje = (
-                                f"Hola Ingeniero {user_first_name}\n\n"
-                                f"El siguiente reporte es para el medidor: {medidor} con clave: {clave}.\n\n"
-                                f"{ultima_comunicacion}\n"
-                                f"{gatekeeper_info}\n"
-                                f"Estado del rele: {estado_rele}\n\n"
-                                f"Comunicación: {comunica}"
-                            )
-                        
-                        # Mensaje cuando el DataFrame está vacío
-                        else:
-                            mensaje = f"Hola ingeniero {user_first_name}, no hay informacion del medidor: {medidor}"
+        with CICLO.medir(bot=NOMBRE_BOT, etapa='reclamo') as reclamo:
+            solicitudes_df = await cola_solicitudes.reclamar_async()
+        reclamadas = len(solicitudes_df)
+        RECLAMADAS.observar(reclamadas, bot=NOMBRE_BOT)
+        logging.info(f"Solicitudes encontradas: {reclamadas}")
+        logging.debug(f"Solicitudes reclamadas:\n{solicitudes_df}")
+        solicitudes = [solicitud for _, solicitud in solicitudes_df.iterrows()]
+        # El reclamo y las claves son del ciclo: se registran en la traza de cada solicitud
+        trazas_ids = [traza_de(solicitud, f"{NOMBRE_BOT}-{solicitud['ITEM']}") for solicitud in solicitudes]
+        TRAZAS.registrar_lote(trazas_ids, 'reclamo', reclamo.inicio, reclamo.duracion, reclamadas=len(solicitudes))
+        with CICLO.medir(bot=NOMBRE_BOT, etapa='claves') as etapa_claves:
+            claves = await resolutor_claves.resolver_lote(solicitudes, marca='Elster')
+        TRAZAS.registrar_lote(trazas_ids, 'claves', etapa_claves.inicio, etapa_claves.duracion)
+        await procesador_solicitudes.procesar_lote(application, solicitudes, claves)
+        with CICLO.medir(bot=NOMBRE_BOT, etapa='confirmacion'):
+            # Registra la confirmación y termina las trazas de los estados escritos
+            await escritor_estados.vaciar()
+        if not solicitudes_df.empty:
+            logging.info(f"Caché de reportes: {cache_reportes.estadisticas()}")
+            logging.info(f"Pool de conexiones: {estadisticas_pool(engine)}")
+            logging.info(f"Envíos: {programador_envios.estadisticas()}")
+
+    except Exception as e:
+        logging.error(f"Error en procesamiento de solicitudes: {e}")
+    CICLO.observar(time.perf_counter() - inicio, bot=NOMBRE_BOT, etapa='ciclo')
+    return reclamadas
 
-                    else:
-                        mensaje = f"No se encontro informacion del medidor: {medidor}"
-
-                
-
-                if user_command == "3":
-
-                    if clave != "EMPTY":
-                            
-                        alarmas_medidor = solicitud_query(f"SELECT NOMBRE_EVENTO, MAX(FECHA) AS FECHA,  count(NOMBRE_EVENTO) AS CANTIDAD  FROM pnrp.airflow_elster_alarmas WHERE medidor = '{medidor}' GROUP BY NOMBRE_EVENTO ORDER BY FECHA DESC LIMIT 30;")
-                        # print(alarmas_medidor)
-                        if not alarmas_medidor.empty:
-                            mensaje= (f"Hola ingeniero {user_first_name}\n\n"
-                                f"El siguiente reporte es para el medidor: {medidor}.\n\n"
-                                f"Alarmas del medidor:\n\n"
-                            )
-                            for index, row in alarmas_medidor.iterrows():
-                                mensaje += (f"- {row['NOMBRE_EVENTO']} \n(Ultima Fecha Detectada: {row['FECHA']}, Cantidad: {row['CANTIDAD']})\n\n")
-
-                            mensaje += "\nPor favor revise las alarmas mencionadas."
-                        
-                        if alarmas_medidor.empty:
-                            mensaje = f"Hola ingeniero {user_first_name}, no hay informacion del medidor: {medidor}"
-                    else:
-                        logging.warning(f"No se encontro información para el medidor: {medidor} o clave: {clave}")
-                        mensaje = f"No se encontro información de alarmas para el medidor {medidor}."
-    
-                if user_command == "4":
-                    if clave != "EMPTY":
-                        # Consultar las órdenes para el medidor específico
-                        ordenes = solicitud_query(f"SELECT * FROM pnrp.airflow_elster_os WHERE clave = '{clave}' ORDER BY FECHA_EJECUCION DESC;")
-                        
-                        # Verificar si el DataFrame no está vacío
-                        if not ordenes.empty:
-                            # Crear el mensaje concatenando la información de cada orden
-                            mensaje = (f"Hola ingeniero {user_first_name},\n\n"
-                                    f"El siguiente reporte es para el medidor: {medidor}.\n\n"
-                                    f"Alarmas del medidor:\n\n" + 
-                                    "\n\n".join(
-                                        f"Número de OS: {orden['OS']}\n"
-                                        f"Estado de la OS: {orden['ESTADO']}\n"
-                                        f"Categoría de la anomalía: {orden['CATEGORIA']}\n"
-                                        f"Descripción de OS: {orden['DESCRIPCION']}\n"
-                                        f"Fecha Generada: {orden['FECHA_GENERADA']}\n"
-                                        f"Fecha de Ejecución: {orden['FECHA_EJECUCION']}\n"
-                                        for _, orden in ordenes.iterrows()
-                                    ))
-                        
-                        if ordenes.empty:
-                            mensaje = f"Hola ingeniero {user_first_name}, no hay informacion del medidor: {medidor}"
-                    else:
-                        logging.warning(f"No se encontro información para el medidor: {medidor} o clave: {clave}")
-                        mensaje = f"No se encontro ordenes de servicio para el medidor {medidor} con clave {clave}."
-
-                if user_command == '5':
-                    comentario_telegestion = solicitud_query(f"SELECT * FROM bitacora_ac where clave = '{clave}' and ESTADO <> 'ANULADO' and REQUIERE_OS = TRUE order by fecha_asignacion desc;")
-                    if not comentario_telegestion.empty:
-                        mensaje = (f"\nHola ingeniero {user_first_name}, \n\n"
-                                   f"El siguiente reporte es para el medidor: {medidor}\n\n"
-                                   f"El departamento de telegestion ha hecho una o mas revisiones al medidor.\n"
-                                   "\n\n".join(
-                                            f"Fecha de analisis: {comentario['FECHA_ANALISIS']}\n"
-                                            f"Alarma encontrada: {comentario['ALARMA']}\n"
-                                            f"Comentario del analista: {comentario['COMENTARIO_ANALISTA']}\n"
-                                            for _, comentario in comentario_telegestion.iterrows() 
-                                   ) 
-                        )
-                    if comentario_telegestion.empty:
-                        mensaje = f"Hola ingeniero {user_first_name}, no se ha realizado analisis para el medidor: {medidor} con clave: {clave}"
-
-                if mensaje:
-                    try:
-                        await application.bot.send_message(chat_id=user_id, text=mensaje)
-                        logging.info(f"Mensaje enviado a ID_TG: {user_id}")
-                        
-                        with engine.begin() as conn:
-                            query_update_enviado = text("UPDATE proceso_bot SET ENVIADO='1' WHERE ITEM = :id")
-                            conn.execute(query_update_enviado, {'id': solicitud_id})
 
-                    except Exception as e:
-                        logging.error(f"Error al enviar mensaje a ID_TG: {user_id}: {e}")
+# Despachador que atiende las solicitudes apenas se insertan, sin esperar al sondeo del JobQueue
+despachador_solicitudes = DespachadorSolicitudes(procesar_solicitudes, lote=cola_solicitudes.lote)
 
+async def iniciar_aplicacion(application):
+    """
+    Prepara la aplicación al arrancar: abre las conexiones del pool, inicia el endpoint de métricas
+    y el despachador.
+
+    Args:
+        application (Application): La aplicación que contiene el bot para enviar mensajes.
+    """
+    try:
+        await ejecutar_en_hilo(calentar, engine)
     except Exception as e:
-        logging.error(f"Error en procesamiento de solicitudes: {e}")
+        # Sin conexiones calentadas el bot funciona igual; la primera consulta abrirá la conexión
+        logging.error(f"No se pudo calentar el pool de conexiones: {e}")
+    await iniciar_servidor()
+    await iniciar_despachador(application)
+
+async def iniciar_despachador(application):
+    """
+    Inicia el despachador de solicitudes cuando la aplicación arranca.
+
+    Args:
+        application (Application): La aplicación que contiene el bot para enviar mensajes.
+    """
+    despachador_solicitudes.iniciar(application)
+
+async def detener_despachador(application):
+    """
+    Detiene el despachador de solicitudes y el endpoint de métricas cuando la aplicación se detiene.
+
+    Args:
+        application (Application): La aplicación que contiene el bot para enviar mensajes.
+    """
+    await despachador_solicitudes.detener()
+    await detener_servidor()
     
 
 """def iniciar_proceso_asincrono(application):
@@ -609,10 +746,8 @@ async def manejar_mensaje(update: Update, context: CallbackContext):
         None
     """
     user_id = update.message.from_user.id
-    usuarios = solicitud_query("SELECT * FROM bot_usuarios_autorizados;")
-    iD_TELEGRAM = usuarios['ID_TELEGRAM'].tolist()
 
-    if int(user_id) in iD_TELEGRAM:
+    if await directorio_usuarios.obtener_async(user_id) is not None:
         # Usuario registrado, iniciar flujo de selección de opciones
         return await iniciar_menu(update, context)
     else:
@@ -655,17 +790,28 @@ async def error(update: Update, context: CallbackContext):
     logging.error(f"Actualización {update} causó el error {context.error}")
 
 
-def main():
+def construir_aplicacion(token=None, sondeo=True):
     """
-    Función principal para iniciar el bot. Configura los manejadores de comandos y
+    Construye la aplicación del bot. Configura los manejadores de comandos y
     mensajes, gestiona el flujo de conversación y establece un JobQueue para tareas
-    programadas.
+    programadas. La usan `main` y el proceso conjunto de `bots.py`.
+
+    Args:
+        token (str, opcional): Token del bot; por defecto `YOUR_TOKEN`.
+        sondeo (bool): Programar el sondeo periódico de solicitudes. `bots.py` lo desactiva
+            porque sondea las colas de todos los bots con una sola consulta.
 
     Returns:
-        None
+        Application: La aplicación configurada, o None si el JobQueue no está disponible.
     """
     # Tu token de bot aquí
-    application = Application.builder().token(os.getenv('YOUR_TOKEN')).build()
+    application = (
+        Application.builder()
+        .token(token or os.getenv('YOUR_TOKEN'))
+        .post_init(iniciar_aplicacion)
+        .post_stop(detener_despachador)
+        .build()
+    )
 
     # Primer ConversationHandler para el registro
     registro_handler = ConversationHandler(
@@ -708,19 +854,42 @@ def main():
     # Añadir los manejadores al bot
     application.add_handler(registro_handler)
     application.add_handler(menu_handler)
+    # Botones "Anterior" / "Siguiente" de los reportes paginados
+    application.add_handler(CallbackQueryHandler(paginas_reporte.manejar, pattern=r'^pag:'))
+    # Trazas más lentas de la última hora, para los administradores
+    application.add_handler(CommandHandler('trazas', comando_trazas(directorio_usuarios, NOMBRE_BOT)))
     # Manejador de errores
     application.add_error_handler(error)
+    # Duración y errores de cada manejador en las métricas
+    instrumentar_manejadores(application, NOMBRE_BOT)
 
     # Asegúrate de que la job_queue esté disponible
     if application.job_queue is None:
         logging.error("JobQueue no está disponible. Asegúrate de que python-telegram-bot esté instalado con el extra `job-queue`.")
-        return
+        return None
 
-    # Configuración del JobQueue
+    # Configuración del JobQueue: el sondeo solo es respaldo para las solicitudes insertadas por otros procesos,
+    # las del propio bot se atienden al instante con el despachador
     job_queue = application.job_queue
-    job_queue.run_repeating(procesar_solicitudes, interval=10, first=0)
+    if sondeo:
+        job_queue.run_repeating(procesar_solicitudes, interval=int(os.getenv('SOLICITUDES_INTERVALO', 60)), first=0)
+
+    return application
+
+
+def main():
+    """
+    Función principal para iniciar el bot.
+
+    Returns:
+        None
+    """
+    application = construir_aplicacion()
+    if application is None:
+        return
 
-    application.run_polling()
+    # Polling por defecto, o webhook con BOT_MODO=webhook
+    ejecutar_aplicacion(application)
 
 
 if __name__ == '__main__':
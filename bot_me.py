@@ -20,19 +20,37 @@ El bot utiliza un `ConversationHandler` con diferentes estados:
 """
 
 from telegram import Update, ReplyKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackContext, ConversationHandler, JobQueue
-from sqlalchemy import create_engine, text
+from telegram.ext import Application, CallbackQueryHandler, CommandHandler, MessageHandler, filters, CallbackContext, ConversationHandler, JobQueue
+from sqlalchemy import bindparam, text
 from sqlalchemy.exc import SQLAlchemyError
 from dotenv import load_dotenv
-import urllib.parse
 import logging
+import os
+import re
 import pandas as pd
 from datetime import datetime, timedelta
 from threading import Thread
 import threading
 import time
 import asyncio
-import io
+
+from acceso_datos import ejecutar_en_hilo, ejecutar_async
+from cache_reportes import CacheReportes
+from claves import ResolutorClaves, normalizar_medidor
+from comunicacion import MotorComunicacion, RollupComunicacion
+from cola_solicitudes import ColaSolicitudes
+from conexion import calentar, engine_pnrp, estadisticas_pool
+from consultas import CONSULTAS, TAMANO_PAGINA, consulta_pagina, parametros
+from directorio_usuarios import DirectorioUsuarios
+from envios import EnvioFallido, ProgramadorEnvios
+from escritor_estados import EscritorEstados
+from metricas import CICLO, RECLAMADAS, REGISTRO_METRICAS, detener_servidor, iniciar_servidor, instrumentar_manejadores, medir_solicitud
+from paginacion import COMANDOS_PAGINADOS, PaginasReporte
+from planificacion_excel import ArchivoPlanificacionError, CargaPlanificacion
+from plantillas import PLANTILLAS, TABLA_POR_COMANDO, mensaje_tabla
+from procesador import DespachadorSolicitudes, ProcesadorSolicitudes
+from trazas import TRAZAS, comando_trazas, traza_de
+from webhook import ejecutar_aplicacion
 
 
 
@@ -50,36 +68,84 @@ logging.basicConfig(
 # Cargar las variables de entorno desde el archivo .env
 load_dotenv()
 
-# Conexión a la base de datos usando SQLAlchemy
-usuario = os.getenv('DB_USER')
-contrasena = os.getenv('DB_PASSWORD')
-host = os.getenv('DB_HOST')
-base_datos = os.getenv('DB_NAME')
+# Conexión a la base de datos usando SQLAlchemy, con el pool configurable e instrumentado de conexion.py
+engine = engine_pnrp()
+
+# Directorio en memoria de los usuarios autorizados, se recarga al vencer el TTL o al registrar un usuario
+directorio_usuarios = DirectorioUsuarios(engine, 'bot_usuarios_autorizados_me', ttl=int(os.getenv('USUARIOS_TTL', 300)))
+
+# Cola compartida de solicitudes: cada instancia reclama sus filas con un arriendo que vence
+cola_solicitudes = ColaSolicitudes(engine, 'bot_solicitudes_me', 'id')
+
+# Claves de los medidores de cada ciclo, resueltas con una consulta por marca
+resolutor_claves = ResolutorClaves(engine)
+
+# Resumen diario de comunicación por clave, actualizado tras cada carga de Airflow
+rollup_comunicacion = RollupComunicacion(engine)
+
+# Porcentajes de comunicación del reporte 2 con una consulta por clave
+motor_comunicacion = MotorComunicacion(engine, rollup_comunicacion)
 
-logging.info("CODIFICANDO CONTRASEÑA")
-encoded_password = urllib.parse.quote_plus(contrasena)
+# Confirmaciones de envío agrupadas en un commit por ciclo
+escritor_estados = EscritorEstados(engine, 'bot_solicitudes_me', 'id', trazas=TRAZAS)
 
-ssl_args = {
-    'ssl_cert': os.getenv('SSL_CERT_PATH'),
-    'ssl_key': os.getenv('SSL_KEY_PATH')
-}
-engine = create_engine(f"mysql+pymysql://{usuario}:{encoded_password}@{host}/{base_datos}", connect_args=ssl_args)
+# Resultados recientes de los reportes por marca, comando y clave
+cache_reportes = CacheReportes()
 
-def solicitud_query(QUERY):
+# Envíos a Telegram con límite global, separación por chat y reintentos
+programador_envios = ProgramadorEnvios()
+
+# Nombre del bot en las métricas (ver metricas.py) y estadísticas de sus componentes
+NOMBRE_BOT = 'bot_me'
+REGISTRO_METRICAS.estadisticas('bot_cola', lambda: {'pendientes': cola_solicitudes.contar_pendientes()}, bot=NOMBRE_BOT)
+REGISTRO_METRICAS.estadisticas('bot_cache_reportes', cache_reportes.estadisticas, bot=NOMBRE_BOT)
+REGISTRO_METRICAS.estadisticas('bot_envios', programador_envios.estadisticas, bot=NOMBRE_BOT)
+REGISTRO_METRICAS.estadisticas('bot_escritor', escritor_estados.estadisticas, bot=NOMBRE_BOT)
+
+def solicitud_query(QUERY, params=None):
     """
     ## Funcion Solicitud Query:
     Ejecuta una consulta SQL y devuelve el resultado como un DataFrame de pandas.
 
     Args:
         QUERY (str): Consulta SQL a ejecutar.
+        params (dict, opcional): Parámetros de la consulta.
 
     Returns:
         pd.DataFrame: Resultado de la consulta en forma de DataFrame.
     """
     # Ejecutar una consulta y devolver el resultado como DataFrame
-    df = pd.read_sql_query(QUERY, engine)
+    df = pd.read_sql_query(QUERY, engine, params=params)
     return df
 
+async def solicitud_query_async(QUERY, params=None):
+    """
+    ## Funcion Solicitud Query Async:
+    Ejecuta `solicitud_query` en el pool de hilos de base de datos sin bloquear el bucle de eventos.
+
+    Args:
+        QUERY (str | TextClause): Consulta SQL a ejecutar.
+        params (dict, opcional): Parámetros de la consulta.
+
+    Returns:
+        pd.DataFrame: Resultado de la consulta en forma de DataFrame.
+    """
+    return await ejecutar_en_hilo(solicitud_query, QUERY, params)
+
+async def ejecutar_escritura(QUERY, params=None):
+    """
+    ## Funcion Ejecutar Escritura:
+    Ejecuta una sentencia de escritura en su propia transacción sin bloquear el bucle de eventos.
+
+    Args:
+        QUERY (TextClause): Sentencia SQL a ejecutar.
+        params (dict | list[dict], opcional): Parámetros de la sentencia.
+
+    Returns:
+        int: Cantidad de filas afectadas.
+    """
+    return await ejecutar_async(engine, QUERY, params)
+
 
 # Función para iniciar el registro
 async def start(update: Update, context: CallbackContext):
@@ -95,10 +161,8 @@ async def start(update: Update, context: CallbackContext):
         int: Estado del flujo de conversación.
     """
     user_id = update.message.from_user.id
-    usuarios = solicitud_query("SELECT * FROM bot_usuarios_autorizados_me;")
-    iD_TELEGRAM = usuarios['ID_TELEGRAM'].tolist()
 
-    if int(user_id) not in iD_TELEGRAM:
+    if await directorio_usuarios.obtener_async(user_id) is None:
         await update.message.reply_text('¡Bienvenido! Por favor, ingresa tu nombre completo para validar tus datos:')
         return REGISTRO
     else:
@@ -124,19 +188,18 @@ async def registro(update: Update, context: CallbackContext):
     user_first_name = update.message.from_user.first_name
 
     try:
-        with engine.begin() as con:
-            query_update = text("""
-                UPDATE bot_usuarios_autorizados_me 
-                SET ID_TELEGRAM=:user_id,
-                ROL='SUPERVISOR'
-                WHERE NOMBRE_COMPLETO=:user_name 
-                OR NOMBRE_TELEGRAM=:user_first_name 
-                OR USUARIO_TELEGRAM=:user_name_id
-            """)
-            con.execute(query_update, {'user_id': user_id, 'user_name': user_name, 'user_first_name': user_first_name, 'user_name_id': user_name_id})
-            await update.message.reply_text(f'Te has registrado con éxito como {user_name}. Usa el comando /menu para acceder a las opciones.')
+        query_update = text("""
+            UPDATE bot_usuarios_autorizados_me 
+            SET ID_TELEGRAM=:user_id,
+            ROL='SUPERVISOR'
+            WHERE NOMBRE_COMPLETO=:user_name 
+            OR NOMBRE_TELEGRAM=:user_first_name 
+            OR USUARIO_TELEGRAM=:user_name_id
+        """)
+        await ejecutar_escritura(query_update, {'user_id': user_id, 'user_name': user_name, 'user_first_name': user_first_name, 'user_name_id': user_name_id})
+        directorio_usuarios.invalidar()
+        await update.message.reply_text(f'Te has registrado con éxito como {user_name}. Usa el comando /menu para acceder a las opciones.')
     except SQLAlchemyError as e:
-        print(e)
         logging.error(f"Error al registrar usuario: {e}")
         await update.message.reply_text('Ocurrió un error durante el registro. Por favor, inténtalo de nuevo.')
 
@@ -157,12 +220,9 @@ async def verificar_rol(update: Update, context: CallbackContext):
         int: Estado del flujo de conversación.
     """
     user_id = update.message.from_user.id
-    usuarios = solicitud_query("SELECT * FROM bot_usuarios_autorizados_me;")
-    iD_TELEGRAM = usuarios['ID_TELEGRAM'].tolist()
-    Rol_user = solicitud_query(f"SELECT ROL FROM bot_usuarios_autorizados_me where ID_TELEGRAM = {user_id};")
-    roluser = Rol_user.iloc[0, 0]
+    usuario = await directorio_usuarios.obtener_async(user_id)
 
-    if int(user_id) in iD_TELEGRAM and roluser == 'PLANIFICADOR' or roluser== 'ADMINISTRADOR':
+    if usuario is not None and usuario['ROL'] in ('PLANIFICADOR', 'ADMINISTRADOR'):
         await update.message.reply_text(
             '¡Bienvenido! Por favor, ingresa los medidores que planificarán enviando un archivo Excel, '
             'una lista de medidores separada por comas, o un listado de medidores en diferentes líneas.'
@@ -172,6 +232,103 @@ async def verificar_rol(update: Update, context: CallbackContext):
         await update.message.reply_text('No estás autorizado para realizar una planificación.')
         return ConversationHandler.END
 
+# Medidores aceptados en la planificación por texto: letras, números y guiones
+PATRON_MEDIDOR = re.compile(r'[0-9A-Za-z-]{3,30}')
+
+def separar_medidores(texto):
+    """
+    ## Funcion separar medidores:
+    Separa la lista de medidores enviada como texto (por comas, punto y coma o saltos de línea),
+    la normaliza y elimina los repetidos.
+
+    Args:
+        texto (str): Mensaje del usuario.
+
+    Returns:
+        tuple: Medidores aceptados (sin repetir, en el orden enviado) y medidores rechazados por formato.
+    """
+    aceptados = {}
+    rechazados = []
+    for medidor in re.split(r'[,;\n]', texto):
+        medidor = medidor.strip().upper()
+        if not medidor:
+            continue
+        if PATRON_MEDIDOR.fullmatch(medidor):
+            aceptados.setdefault(medidor, None)
+        else:
+            rechazados.append(medidor)
+    return list(aceptados), rechazados
+
+def registrar_planificacion_texto(user_id, nombre, medidores):
+    """
+    ## Funcion registrar planificacion texto:
+    Inserta los medidores en `bot_planificacion_me` en una sola transacción, omitiendo los que ya
+    están planificados para hoy.
+
+    Args:
+        user_id (int): ID de Telegram del planificador.
+        nombre (str): Nombre del planificador.
+        medidores (list[str]): Medidores normalizados y sin repetir.
+
+    Returns:
+        tuple: Medidores insertados y medidores que ya estaban planificados hoy.
+    """
+    if not medidores:
+        return [], []
+
+    ahora = datetime.now()
+    inicio_dia = ahora.replace(hour=0, minute=0, second=0, microsecond=0)
+    query_existentes = text("""
+        SELECT DISTINCT MEDIDOR FROM bot_planificacion_me
+        WHERE MEDIDOR IN :medidores AND FECHA_PLANIFICACION >= :inicio AND FECHA_PLANIFICACION < :fin
+    """).bindparams(bindparam('medidores', expanding=True))
+    query_insert = text("""
+        INSERT INTO bot_planificacion_me(ID_TELEGRAM, NOMBRE, MEDIDOR, FECHA_PLANIFICACION, REVISION)
+        VALUES(:user_id, :user_nombre, :medidor, :fecha, 0)
+    """)
+
+    with engine.begin() as con:
+        existentes = {str(fila[0]).upper() for fila in con.execute(query_existentes, {
+            'medidores': medidores,
+            'inicio': inicio_dia,
+            'fin': inicio_dia + timedelta(days=1)
+        })}
+        insertados = [medidor for medidor in medidores if medidor not in existentes]
+        duplicados = [medidor for medidor in medidores if medidor in existentes]
+        if insertados:
+            # PyMySQL convierte el executemany de un INSERT ... VALUES en una sola sentencia de varias filas
+            con.execute(query_insert, [
+                {'user_id': user_id, 'user_nombre': nombre, 'medidor': medidor, 'fecha': ahora}
+                for medidor in insertados
+            ])
+    return insertados, duplicados
+
+def resumen_planificacion_texto(insertados, duplicados, rechazados):
+    """
+    ## Funcion resumen planificacion texto:
+    Arma la respuesta de la planificación por texto.
+
+    Args:
+        insertados (list[str]): Medidores registrados.
+        duplicados (list[str]): Medidores ya planificados hoy.
+        rechazados (list[str]): Medidores con formato inválido.
+
+    Returns:
+        str: Mensaje para el usuario.
+    """
+    def listar(medidores, maximo=50):
+        # Se limita la lista para no superar el tamaño máximo de un mensaje de Telegram
+        lista = ', '.join(medidores[:maximo])
+        return lista + (f" y {len(medidores) - maximo} más" if len(medidores) > maximo else "")
+
+    mensaje = f"Medidores registrados: {len(insertados)}."
+    if duplicados:
+        mensaje += f"\nYa estaban planificados hoy ({len(duplicados)}): {listar(duplicados)}"
+    if rechazados:
+        mensaje += f"\nRechazados por formato inválido ({len(rechazados)}): {listar(rechazados)}"
+    mensaje += "\nUsa el comando /menu para acceder a las opciones."
+    return mensaje
+
 # Funcion para ingresar la planificacion
 async def planificacion(update: Update, context: CallbackContext):
     """
@@ -187,103 +344,81 @@ async def planificacion(update: Update, context: CallbackContext):
     """
     user_id = update.message.from_user.id
     user_first_name = update.message.from_user.first_name
-    print("Realizando la planificación")
+    logging.debug("Realizando la planificación")
 
-    # Obtener datos de usuarios autorizados
-    usuarios = solicitud_query("SELECT * FROM bot_usuarios_autorizados_me;")
-    iD_TELEGRAM = usuarios['ID_TELEGRAM'].tolist()
+    # Obtener datos del usuario desde el directorio en memoria
+    usuario_encontrado = await directorio_usuarios.obtener_async(user_id)
 
-    if int(user_id) in iD_TELEGRAM:
-        usuario_encontrado = usuarios.loc[usuarios['ID_TELEGRAM'] == int(user_id)].iloc[0]
+    if usuario_encontrado is not None:
         nombre_completo = usuario_encontrado['NOMBRE_COMPLETO'] if pd.notna(usuario_encontrado['NOMBRE_COMPLETO']) else user_first_name
-        print(f"Nombre completo: {nombre_completo}")
+        logging.debug(f"Planificación de {nombre_completo}")
 
         # Manejo de archivos enviados
         if update.message.document:
             file = update.message.document
-            print("El usuario envió un documento")
+            logging.debug("El usuario envió un documento")
 
             # Verificación del tipo de archivo
             if file.file_name.endswith('.xlsx') or file.file_name.endswith('.xls'):
                 try:
                     file_path = await context.bot.get_file(file.file_id)
-                    file_data = await file_path.download_as_bytearray()
-                    print("Datos del archivo descargado")
+                    logging.debug("Cargando el archivo por lotes")
 
-                    # Convertir bytearray a BytesIO para que pandas pueda leerlo
-                    file_stream = io.BytesIO(file_data)
+                    # El archivo se lee en el pool de procesos, que descarta las filas donde la columna 'Clave'
+                    # es nula, vacía o "", o sin una fecha válida
+                    def construir_registro(valores):
+                        clave, fecha = valores
+                        return {'user_id': user_id, 'user_nombre': nombre_completo, 'clave': clave, 'fecha': fecha}
 
-                    # Leer datos de Excel usando BytesIO
-                    excel_data = pd.read_excel(file_stream)
-                    print("Datos del Excel leídos")
-                    print(excel_data)
+                    query_insert = text("""
+                        INSERT INTO pnrp.bot_planificacion_me(ID_TELEGRAM, NOMBRE, CLAVE, FECHA_PLANIFICACION, REVISION, CANTIDAD_CONSULTAS)
+                        VALUES(:user_id, :user_nombre, :clave, :fecha, 0, 0)
+                    """)
 
-                    # Limpiar el DataFrame: eliminar filas donde la columna 'Clave' es nula, vacía o ""
-                    excel_data = excel_data.dropna(subset=['Clave'])  # Eliminar filas con NaN en 'Clave'
-                    excel_data = excel_data[excel_data['Clave'].astype(str).str.strip() != '']  # Eliminar filas con cadenas vacías
-                    print(excel_data)
-                
+                    async def insertar(registros):
+                        # Insertar el lote usando executemany
+                        await ejecutar_escritura(query_insert, registros)
 
-                    records = [(user_id, nombre_completo, row['Clave'], row['Fecha de Programación'].strftime('%Y-%m-%d'))
-                           for index, row in excel_data.iterrows()]
-                
+                    carga = CargaPlanificacion(['Clave', 'Fecha de Programación'], 'Clave', 'Fecha de Programación', construir_registro, insertar)
                     try:
-                        with engine.begin() as con:
-                            # Usar la sintaxis de SQLAlchemy para múltiples inserciones
-                            query_insert = text("""
-                                INSERT INTO pnrp.bot_planificacion_me(ID_TELEGRAM, NOMBRE, CLAVE, FECHA_PLANIFICACION, REVISION, CANTIDAD_CONSULTAS)
-                                VALUES(:user_id, :user_nombre, :clave, :fecha, 0, 0)
-                            """)
-                            # Insertar múltiples registros usando executemany
-                            con.execute(query_insert, [dict(zip(['user_id', 'user_nombre', 'clave', 'fecha'], record)) for record in records])
+                        insertadas, descartadas = await carga.cargar(file, file_path, update)
+                    except ArchivoPlanificacionError as e:
+                        logging.warning(f"Archivo de planificación rechazado: {e}")
+                        await update.message.reply_text(f'{e}. Por favor, revisa el archivo y vuelve a intentarlo.')
                     except SQLAlchemyError as e:
                         logging.error(f"Error al insertar los medidores: {e}")
                         await update.message.reply_text('Error al registrar los medidores. Por favor, inténtalo de nuevo.')
-
-
-                    await update.message.reply_text('Todos los medidores han sido registrados con éxito. Usa el comando /menu para acceder a las opciones.')
+                    else:
+                        logging.info(f"Planificación cargada por {nombre_completo}: {insertadas} filas, {descartadas} descartadas")
+                        await update.message.reply_text(f'Todos los medidores han sido registrados con éxito ({insertadas} registrados, {descartadas} filas descartadas). Usa el comando /menu para acceder a las opciones.')
 
                 except Exception as e:
-                    print(e)
                     logging.error(f"Error al procesar los datos del archivo Excel: {e}")
                     await update.message.reply_text('Error al procesar los datos del archivo Excel. Por favor, verifica el formato y vuelve a intentarlo.')
             
             else:
                 await update.message.reply_text('Por favor, envía un archivo Excel (.xlsx o .xls).')
 
-    # Manejo de entrada de texto
-    else:
-        print("El usuario envió un texto")
-        user_text = update.message.text.strip()
-
-        if ',' in user_text:
-            medidores = [medidor.strip() for medidor in user_text.split(',')]
+        # Manejo de entrada de texto
         else:
-            medidores = [line.strip() for line in user_text.split('\n') if line.strip()]
+            logging.debug("El usuario envió un texto")
+            aceptados, rechazados = separar_medidores(update.message.text or '')
 
-        if not medidores:
-            await update.message.reply_text('No se encontraron medidores en el texto proporcionado. Por favor, envía una lista válida.')
-            return ConversationHandler.END
+            if not aceptados and not rechazados:
+                await update.message.reply_text('No se encontraron medidores en el texto proporcionado. Por favor, envía una lista válida.')
+                return ConversationHandler.END
 
-        try:
-            for medidor in medidores:
-                fecha_planificacion = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                try:
-                    with engine.begin() as con:
-                        query_insert = text("""
-                            INSERT INTO bot_planificacion_me(ID_TELEGRAM, NOMBRE, MEDIDOR, FECHA_PLANIFICACION, REVISION)
-                            VALUES(:user_id, :user_nombre, :medidor, :fecha, 0)
-                        """)
-                        con.execute(query_insert, user_id=user_id, user_nombre=user_first_name, medidor=medidor, fecha=fecha_planificacion)
-                except SQLAlchemyError as e:
-                    logging.error(f"Error al insertar el medidor {medidor}: {e}")
-                    await update.message.reply_text(f'Error al registrar el medidor {medidor}. Por favor, inténtalo de nuevo.')
-            
-            await update.message.reply_text('Todos los medidores han sido registrados con éxito. Usa el comando /menu para acceder a las opciones.')
-        
-        except Exception as e:
-            logging.error(f"Error al procesar los datos del texto: {e}")
-            await update.message.reply_text('Error al procesar los datos del texto. Por favor, verifica el formato y vuelve a intentarlo.')
+            try:
+                insertados, duplicados = await ejecutar_en_hilo(registrar_planificacion_texto, user_id, nombre_completo, aceptados)
+                logging.info(f"Planificación por texto de {nombre_completo}: {len(insertados)} registrados, {len(duplicados)} duplicados, {len(rechazados)} rechazados")
+                await update.message.reply_text(resumen_planificacion_texto(insertados, duplicados, rechazados))
+
+            except SQLAlchemyError as e:
+                logging.error(f"Error al insertar los medidores: {e}")
+                await update.message.reply_text('Error al registrar los medidores. Por favor, inténtalo de nuevo.')
+
+    else:
+        await update.message.reply_text('No estás autorizado para realizar una planificación.')
 
     return ConversationHandler.END
 
@@ -388,8 +523,7 @@ async def ingresar_medidor(update: Update, context: CallbackContext):
     user_command = context.user_data['user_command']
     user_marca = context.user_data['marca']
     fecha_instantanea = datetime.now()
-    usuarios = solicitud_query("SELECT * FROM bot_usuarios_autorizados_me;")
-    iD_TELEGRAM = usuarios['ID_TELEGRAM'].tolist()
+    usuario_encontrado = await directorio_usuarios.obtener_async(user_id)
     if user_marca == "Union":
         def convertir_medidor(user_medidor):
             # Si el user_medidor empieza con '7', quita el '7' y agrega ceros al principio hasta completar 12 dígitos
@@ -405,20 +539,17 @@ async def ingresar_medidor(update: Update, context: CallbackContext):
         if len(user_medidor) > 2 and len(user_medidor) < 6 or user_medidor.startswith('7'):
             user_medidor = convertir_medidor(user_medidor)
             
-    if int(user_id) in iD_TELEGRAM:
+    if usuario_encontrado is not None:
         try:
-            usuario_encontrado = usuarios.loc[usuarios['ID_TELEGRAM'] == int(user_id)].iloc[0]
             nombre_completo = usuario_encontrado['NOMBRE_COMPLETO'] if pd.notna(usuario_encontrado['NOMBRE_COMPLETO']) else user_first_name
             rol_user = usuario_encontrado['ROL']
-            print(rol_user)
-            print(f" rol supervisor {rol_user == 'SUPERVISOR'}")
-            print(f"rol diferente a supervisor {rol_user == 'ADMINISTRADOR' or rol_user == 'ANALISTA' or rol_user == 'PLANIFICADOR'}")
+            logging.debug(f"Solicitud de {nombre_completo} con rol {rol_user}")
 
 
             if rol_user == "SUPERVISOR":
 
                 if user_marca == "Hexing":
-                    clave = solicitud_query(f"select CLAVE_CATALOGO from pnrp.airflow_hexing_universo where MEDIDOR_CATALOGO = {user_medidor} limit 1;")
+                    clave = await solicitud_query_async(CONSULTAS['hexing_clave'], parametros(medidor=user_medidor))
                     if not clave.empty:
                         clave = clave.iloc[0,0]
                     else:
@@ -438,21 +569,21 @@ async def ingresar_medidor(update: Update, context: CallbackContext):
                     if len(user_medidor) > 2 and len(user_medidor) < 6 or user_medidor.startswith('7'):
                         user_medidor = convertir_medidor(user_medidor)
 
-                    clave = solicitud_query(f"SELECT CLAVE_CATALOGO from pnrp.airflow_union_universo where MEDIDOR_CATALOGO = '{user_medidor}' limit 1;")
+                    clave = await solicitud_query_async(CONSULTAS['union_clave'], parametros(medidor=user_medidor))
                     if not clave.empty:
                         clave = clave.iloc[0,0]
                     else:
                         clave = "EMPTY"
                 
                 if clave != 'EMPTY':
-                    planificaciones = solicitud_query(f"SELECT * FROM pnrp.bot_planificacion_me WHERE CLAVE={clave} order by FECHA_PLANIFICACION DESC;")
+                    planificaciones = await solicitud_query_async(CONSULTAS['planificacion_me_por_clave'], parametros(clave=clave))
                     if not planificaciones.empty:
                         planificacion = planificaciones.iloc[0]
                         fecha_planificacion = planificacion['FECHA_PLANIFICACION']
                         clave_planificada = planificacion['CLAVE']
                         id_clave_planificada = planificacion['id']
                         cantidad = planificacion['CANTIDAD_CONSULTAS']
-                        print(planificacion)
+                        logging.debug(f"Planificación de la clave {clave}: {planificacion.to_dict()}")
                         if cantidad == None or cantidad == 0:
                             cantidad = 1
                         else:
@@ -460,36 +591,37 @@ async def ingresar_medidor(update: Update, context: CallbackContext):
 
                         diferencia = fecha_instantanea - fecha_planificacion
 
-                        print(diferencia)
-                        print()
+                        logging.debug(f"Días desde la planificación de la clave {clave}: {diferencia}")
 
                         if diferencia <= timedelta(days=3) and clave_planificada == clave:
 
-                            with engine.begin() as con:
-                                logging.info(f"Insertando consulta a la base de datos, nombre: {nombre_completo}, medidor:{user_medidor}, comando:{user_command}, fecha:{fecha_instantanea}")
-                                print(f"el nombre completo es: {nombre_completo} y el medidor que ingreso es: {user_medidor}, comando: {user_command}")
-                                query_insert = text("INSERT INTO bot_solicitudes_me (ID_TG, COMANDO, MEDIDOR, MARCA, FECHA, PROCESO, ENVIADO, NOMBRE) VALUES (:user_id, :user_command, :user_medidor, :user_marca , :fecha_instantanea, 0, 0, :nombre_completo)")
-                                con.execute(query_insert, {
+                            logging.info(f"Insertando consulta a la base de datos, nombre: {nombre_completo}, medidor:{user_medidor}, comando:{user_command}, fecha:{fecha_instantanea}")
+                            query_insert = text("INSERT INTO bot_solicitudes_me (ID_TG, COMANDO, MEDIDOR, MARCA, FECHA, PROCESO, ENVIADO, NOMBRE, TRAZA_ID) VALUES (:user_id, :user_command, :user_medidor, :user_marca , :fecha_instantanea, 0, 0, :nombre_completo, :traza_id)")
+                            # La traza de la solicitud empieza con la inserción y sigue con el id guardado en la fila
+                            traza_id = TRAZAS.nuevo_id()
+                            with TRAZAS.activar(traza_id, bot=NOMBRE_BOT, marca=user_marca, comando=user_command, medidor=user_medidor), TRAZAS.tramo('insercion'):
+                                await ejecutar_escritura(query_insert, {
                                     'user_id': user_id,
                                     'user_command': user_command,
                                     'user_medidor': user_medidor,
                                     'user_marca' : user_marca,
                                     'fecha_instantanea': fecha_instantanea,
-                                    'nombre_completo': nombre_completo
-                                })
-                                logging.info(f"Insercion exitosa, nombre: {nombre_completo}, medidor:{user_medidor}, marca:{user_marca} ,comando:{user_command}, fecha:{fecha_instantanea}")
-                                await update.message.reply_text(f"La solicitud de validación está en proceso para el medidor: {user_medidor}")
-
-                            with engine.begin() as con:
-                                if cantidad > 0:
-                                    query_update = text("UPDATE bot_planificacion_me set REVISION = '1', CANTIDAD_CONSULTAS = :cantidad where id = :id;")
-                                else:
-                                    query_update = text("UPDATE bot_planificacion_me set CANTIDAD_CONSULTAS = :cantidad where id = :id;")
-
-                                con.execute(query_update, {
-                                    'cantidad' : cantidad,
-                                    'id' : id_clave_planificada
+                                    'nombre_completo': nombre_completo,
+                                    'traza_id': traza_id
                                 })
+                            logging.info(f"Insercion exitosa, nombre: {nombre_completo}, medidor:{user_medidor}, marca:{user_marca} ,comando:{user_command}, fecha:{fecha_instantanea}, traza:{traza_id}")
+                            despachador_solicitudes.notificar()
+                            await update.message.reply_text(f"La solicitud de validación está en proceso para el medidor: {user_medidor}")
+
+                            if cantidad > 0:
+                                query_update = text("UPDATE bot_planificacion_me set REVISION = '1', CANTIDAD_CONSULTAS = :cantidad where id = :id;")
+                            else:
+                                query_update = text("UPDATE bot_planificacion_me set CANTIDAD_CONSULTAS = :cantidad where id = :id;")
+
+                            await ejecutar_escritura(query_update, {
+                                'cantidad' : cantidad,
+                                'id' : id_clave_planificada
+                            })
                     
                     if planificaciones.empty:
                         await update.message.reply_text(f"Medidor: {user_medidor} no ha sido planificado.")
@@ -498,20 +630,23 @@ async def ingresar_medidor(update: Update, context: CallbackContext):
                     await update.message.reply_text(f"No se tiene informacion de medidor: {user_medidor}.")
 
             if rol_user == "ADMINISTRADOR" or rol_user == "ANALISTA" or rol_user == "PLANIFICADOR":
-                with engine.begin() as con:
-                    logging.info(f"Insertando consulta a la base de datos, nombre: {nombre_completo}, medidor:{user_medidor}, comando:{user_command}, fecha:{fecha_instantanea}")
-                    print(f"el nombre completo es: {nombre_completo} y el medidor que ingreso es: {user_medidor}, comando: {user_command}")
-                    query_insert = text("INSERT INTO bot_solicitudes_me (ID_TG, COMANDO, MEDIDOR, MARCA, FECHA, PROCESO, ENVIADO, NOMBRE) VALUES (:user_id, :user_command, :user_medidor, :user_marca , :fecha_instantanea, 0, 0, :nombre_completo)")
-                    con.execute(query_insert, {
+                logging.info(f"Insertando consulta a la base de datos, nombre: {nombre_completo}, medidor:{user_medidor}, comando:{user_command}, fecha:{fecha_instantanea}")
+                query_insert = text("INSERT INTO bot_solicitudes_me (ID_TG, COMANDO, MEDIDOR, MARCA, FECHA, PROCESO, ENVIADO, NOMBRE, TRAZA_ID) VALUES (:user_id, :user_command, :user_medidor, :user_marca , :fecha_instantanea, 0, 0, :nombre_completo, :traza_id)")
+                # La traza de la solicitud empieza con la inserción y sigue con el id guardado en la fila
+                traza_id = TRAZAS.nuevo_id()
+                with TRAZAS.activar(traza_id, bot=NOMBRE_BOT, marca=user_marca, comando=user_command, medidor=user_medidor), TRAZAS.tramo('insercion'):
+                    await ejecutar_escritura(query_insert, {
                         'user_id': user_id,
                         'user_command': user_command,
                         'user_medidor': user_medidor,
                         'user_marca' : user_marca,
                         'fecha_instantanea': fecha_instantanea,
-                        'nombre_completo': nombre_completo
+                        'nombre_completo': nombre_completo,
+                        'traza_id': traza_id
                     })
-                    logging.info(f"Insercion exitosa, nombre: {nombre_completo}, medidor:{user_medidor}, marca:{user_marca} ,comando:{user_command}, fecha:{fecha_instantanea}")
-                    await update.message.reply_text(f"La solicitud de validación está en proceso para el medidor: {user_medidor}")
+                logging.info(f"Insercion exitosa, nombre: {nombre_completo}, medidor:{user_medidor}, marca:{user_marca} ,comando:{user_command}, fecha:{fecha_instantanea}, traza:{traza_id}")
+                despachador_solicitudes.notificar()
+                await update.message.reply_text(f"La solicitud de validación está en proceso para el medidor: {user_medidor}")
 
 
         except SQLAlchemyError as e:
@@ -521,6 +656,225 @@ async def ingresar_medidor(update: Update, context: CallbackContext):
     return PROCESAR_SOLICITUDES
 
 # Funcion para las respuestas a los usuarios
+async def consultar_reporte(user_marca, user_command, medidor, clave):
+    """
+    ## Funcion Consultar reporte:
+    Ejecuta las consultas del reporte solicitado para un medidor según su marca.
+
+    Args:
+        user_marca (str): Marca del medidor (Union o Hexing).
+        user_command (str): Comando solicitado (1 a 5).
+        medidor (str): Número del medidor.
+        clave (str): Clave del medidor, o "EMPTY" si no se encontró.
+
+    Returns:
+        dict: Resultados de las consultas (DataFrames) indexados por nombre.
+    """
+    datos = {}
+    if clave != "EMPTY":
+        if user_marca == 'Hexing':
+            if user_command == "1":
+                datos['informacion_medidor'] = await solicitud_query_async(CONSULTAS['hexing_informacion'], parametros(medidor=medidor))
+            if user_command == "2":
+                datos['comunicacion'] = await solicitud_query_async(CONSULTAS['hexing_comunicacion'], parametros(clave=clave, medidor=medidor))
+                datos['promedio_comunicacion'] = await motor_comunicacion.porcentajes('Hexing', clave)
+            if user_command == "3":
+                datos['alarmas_medidor'] = await solicitud_query_async(CONSULTAS['hexing_alarmas'], parametros(clave=clave))
+            if user_command == "4":
+                datos['ordenes'] = await solicitud_query_async(CONSULTAS['hexing_ordenes'], parametros(clave=clave))
+        if user_marca == 'Union':
+            if user_command == "1":
+                datos['informacion_medidor'] = await solicitud_query_async(CONSULTAS['union_informacion'], parametros(clave=clave))
+            if user_command == "2":
+                datos['comunicacion_union'] = await solicitud_query_async(CONSULTAS['union_comunicacion'], parametros(clave=clave))
+                datos['comunicacion'] = await motor_comunicacion.porcentajes('Union', clave)
+            if user_command == "3":
+                datos['alarmas_medidor'] = await solicitud_query_async(CONSULTAS['union_alarmas'], parametros(clave=clave))
+            if user_command == "4":
+                datos['ordenes'] = await solicitud_query_async(CONSULTAS['union_ordenes'], parametros(clave=clave))
+    if user_command == '5':
+        datos['comentario_telegestion'] = await solicitud_query_async(CONSULTAS['bitacora'], parametros(clave=clave))
+    return datos
+
+def construir_mensaje(user_marca, user_command, datos, medidor, clave, user_first_name):
+    """
+    ## Funcion Construir mensaje:
+    Construye el mensaje del reporte a partir de los resultados de `consultar_reporte`,
+    con las plantillas de `plantillas.py`.
+
+    Args:
+        user_marca (str): Marca del medidor (Union o Hexing).
+        user_command (str): Comando solicitado (1 a 5).
+        datos (dict): Resultados de las consultas del reporte.
+        medidor (str): Número del medidor.
+        clave (str): Clave del medidor, o "EMPTY" si no se encontró.
+        user_first_name (str): Nombre del usuario para el saludo.
+
+    Returns:
+        str | None: Mensaje a enviar, o None si no hay nada que enviar.
+    """
+    plantillas = PLANTILLAS.get((user_marca, user_command))
+    if plantillas is None:
+        return None
+    contexto = {'nombre': user_first_name, 'medidor': medidor, 'clave': clave}
+
+    if user_command == "2":
+        if clave == "EMPTY":
+            return plantillas['sin_clave'].renderizar(**contexto)
+
+        # Última comunicación y porcentajes de comunicación
+        if user_marca == 'Hexing':
+            ultima, porcentajes = datos['comunicacion'], datos['promedio_comunicacion']
+        else:
+            ultima, porcentajes = datos['comunicacion_union'], datos['comunicacion']
+
+        if ultima.empty and porcentajes.empty:
+            return plantillas['vacio'].renderizar(**contexto)
+        if ultima.empty:
+            return plantillas['sin_ultima'].renderizar(porcentajes, **contexto)
+        if porcentajes.empty:
+            return plantillas['sin_porcentajes'].renderizar(ultima, **contexto)
+        return plantillas['reporte'].renderizar(ultima, porcentajes, **contexto)
+
+    tabla = datos.get(TABLA_POR_COMANDO[user_command])
+    if tabla is not None and user_command in COMANDOS_PAGINADOS:
+        # Solo las filas de la página; la fila adicional indica si hay otra
+        tabla = tabla.head(TAMANO_PAGINA)
+    if clave == "EMPTY" and user_command != '5':
+        logging.warning(f"No se encontró información para el medidor: {medidor} o clave: {clave}")
+    return mensaje_tabla(plantillas, tabla, **contexto)
+
+async def consultar_pagina(solicitud, cursor):
+    """
+    ## Funcion Consultar pagina:
+    Consulta una página del reporte de órdenes de servicio o de bitácora.
+
+    Args:
+        solicitud (tuple): `(marca, comando, clave, medidor, nombre)` del reporte.
+        cursor (dict | None): Cursor de la última fila de la página anterior (ver
+            `paginacion.cursor_fila`), o None para la primera página.
+
+    Returns:
+        pd.DataFrame: Filas de la página y, si hay otra página, una fila adicional.
+    """
+    user_marca, user_command, clave, _, _ = solicitud
+    consulta = f'{user_marca.lower()}_ordenes' if user_command == "4" else 'bitacora'
+    sentencia, params = consulta_pagina(consulta, clave, cursor)
+    return await solicitud_query_async(sentencia, params)
+
+def renderizar_pagina(solicitud, tabla):
+    """
+    ## Funcion Renderizar pagina:
+    Construye el mensaje de una página del reporte de órdenes de servicio o de bitácora.
+
+    Args:
+        solicitud (tuple): `(marca, comando, clave, medidor, nombre)` del reporte.
+        tabla (pd.DataFrame): Filas de la página.
+
+    Returns:
+        str: Mensaje de la página.
+    """
+    user_marca, user_command, clave, medidor, user_first_name = solicitud
+    return construir_mensaje(user_marca, user_command, {TABLA_POR_COMANDO[user_command]: tabla}, medidor, clave, user_first_name)
+
+
+# Navegación de los reportes que tienen más de una página
+paginas_reporte = PaginasReporte(consultar_pagina, renderizar_pagina)
+
+
+async def obtener_reporte(user_marca, user_command, medidor, claves):
+    """
+    ## Funcion Obtener reporte:
+    Busca la clave del medidor según la marca y obtiene los resultados de su reporte, desde
+    `cache_reportes` si son recientes.
+
+    Args:
+        user_marca (str): Marca del medidor (Hexing o Union).
+        user_command (str): Comando solicitado (1 a 5).
+        medidor (str): Número del medidor tal como lo escribió el usuario.
+        claves (dict): Claves del lote resueltas por `resolutor_claves`.
+
+    Returns:
+        tuple: Medidor normalizado, clave del medidor (o "EMPTY") y resultados de las consultas del reporte.
+    """
+    medidor = normalizar_medidor(user_marca, medidor)
+    clave = claves.get((user_marca, medidor))
+    if clave is None:
+        clave = (await ejecutar_en_hilo(resolutor_claves.resolver, user_marca, [medidor]))[medidor]
+
+    datos = await cache_reportes.obtener(
+        (user_marca, user_command, clave, medidor),
+        lambda: consultar_reporte(user_marca, user_command, medidor, clave)
+    )
+    return medidor, clave, datos
+
+
+async def procesar_solicitud(context, solicitud, lote):
+    """
+    ## Funcion Procesar solicitud:
+    Atiende una solicitud reclamada por `cola_solicitudes`: obtiene el reporte del medidor según la
+    marca y el comando solicitados (desde `cache_reportes` si es reciente) y lo envía al usuario.
+
+    Args:
+        context (CallbackContext): Contexto con el bot para enviar mensajes.
+        solicitud (pd.Series): Fila de `bot_solicitudes_me` con la solicitud.
+        lote (LoteSolicitudes): Claves del lote y consultas compartidas entre solicitudes idénticas.
+
+    Returns:
+        None
+    """
+    solicitud_id = solicitud['id']
+    user_id = solicitud['ID_TG']
+    user_command = solicitud['COMANDO']
+    medidor = solicitud['MEDIDOR']
+    user_marca = solicitud['MARCA']
+    user_first_name = solicitud['NOMBRE']
+
+    logging.debug(f"Procesando solicitud {solicitud_id}: ID_TG {user_id}, comando {user_command}, medidor {medidor}, nombre {user_first_name}")
+
+    traza_id = traza_de(solicitud, f"{NOMBRE_BOT}-{solicitud_id}")
+    with medir_solicitud(NOMBRE_BOT, user_marca, user_command, solicitud.get('FECHA'), traza_id, medidor) as medicion:
+        # Las solicitudes idénticas del lote comparten la búsqueda de la clave y las consultas del reporte
+        with medicion.etapa('reporte'):
+            medidor, clave, datos = await lote.vuelos.ejecutar(
+                (user_command, medidor, user_marca),
+                lambda: obtener_reporte(user_marca, user_command, medidor, lote.claves)
+            )
+        with medicion.etapa('render'):
+            mensaje = construir_mensaje(user_marca, user_command, datos, medidor, clave, user_first_name)
+            teclado = None
+            if mensaje and user_command in COMANDOS_PAGINADOS:
+                mensaje, teclado = paginas_reporte.abrir(
+                    (user_marca, user_command, clave, medidor, user_first_name), mensaje, datos.get(TABLA_POR_COMANDO[user_command])
+                )
+
+        if mensaje:
+            try:
+                # Termina cuando Telegram confirmó la entrega
+                with medicion.etapa('envio'):
+                    await programador_envios.enviar(context.bot, user_id, mensaje, reply_markup=teclado)
+                logging.info(f"Mensaje enviado a ID_TG: {user_id} (traza {traza_id})")
+
+                escritor_estados.marcar_enviado(solicitud_id, traza_id)
+                medicion.resultado = 'enviado'
+
+            except EnvioFallido as e:
+                logging.error(f"Error al enviar mensaje a ID_TG: {user_id} (traza {traza_id}): {e.error}")
+                medicion.resultado = 'fallido_definitivo' if e.definitivo else 'fallido'
+                if e.definitivo:
+                    # El chat no acepta el mensaje (bot bloqueado, mensaje inválido): no se vuelve a reclamar.
+                    # Si el error es temporal la fila queda reclamada y se reintenta al vencer el arriendo.
+                    escritor_estados.marcar_liberado(solicitud_id, traza_id)
+        else:
+            # Sin mensaje que enviar: la solicitud queda atendida y no se vuelve a reclamar
+            escritor_estados.marcar_liberado(solicitud_id, traza_id)
+            medicion.resultado = 'sin_mensaje'
+
+
+# Procesador con concurrencia acotada para las solicitudes pendientes
+procesador_solicitudes = ProcesadorSolicitudes(procesar_solicitud, 'id')
+
+
 async def procesar_solicitudes(context: CallbackContext):
     """
     ## Funcion Procesar solicitudes:
@@ -530,6 +884,12 @@ async def procesar_solicitudes(context: CallbackContext):
     ni enviadas. Para cada solicitud, se determina el comando del usuario y se recupera la información relevante
     del medidor asociado. Según el comando, se construye un mensaje que se envía al usuario a través de un bot.
 
+    Las solicitudes se reclaman con `cola_solicitudes`, de modo que varias instancias del bot pueden
+    compartir la misma tabla sin tomar dos veces la misma fila.
+
+    Las solicitudes se atienden en paralelo con `procesador_solicitudes`, hasta `SOLICITUDES_CONCURRENCIA`
+    a la vez y conservando el orden de las solicitudes de cada usuario.
+
     Los comandos posibles son:
         1. Información del medidor
         2. Estado de comunicación del medidor
@@ -540,6 +900,10 @@ async def procesar_solicitudes(context: CallbackContext):
     Parámetros:
         application (object): La aplicación que contiene el bot para enviar mensajes.
 
+    Retorna:
+        int: Solicitudes reclamadas en el ciclo; `despachador_solicitudes` ejecuta otro ciclo mientras
+        el reclamo vuelve lleno.
+
     Manejo de errores:
         - Registra errores en el procesamiento de solicitudes y el envío de mensajes.
 
@@ -547,416 +911,78 @@ async def procesar_solicitudes(context: CallbackContext):
         - Conexión a la base de datos utilizando `engine`.
         - Funciones auxiliares para realizar consultas a la base de datos.
     """
-    print("procesando solicitud")
+    inicio = time.perf_counter()
+    reclamadas = 0
     try:
         logging.info(f"procesando solicitud")
-        with engine.connect() as conn:
-            solicitudes_df = solicitud_query("SELECT * FROM bot_solicitudes_me WHERE PROCESO = 0 AND ENVIADO = 0;")
-            # logging.info(f"Solicitudes encontradas: {solicitudes_df}")
-
-            for _, solicitud in solicitudes_df.iterrows():
-                solicitud_id = solicitud['id']
-                user_id = solicitud['ID_TG']
-                user_command = solicitud['COMANDO']
-                medidor = solicitud['MEDIDOR']
-                user_marca = solicitud['MARCA']
-                user_first_name = solicitud['NOMBRE']
-
-                print(f"{solicitud_id},  {user_id}, {user_command}, {medidor}, {user_first_name}")
-                
-                with engine.begin() as conn:
-                    query_update_proceso = text("UPDATE bot_solicitudes_me SET PROCESO='1' WHERE id = :id")
-                    conn.execute(query_update_proceso, {'id': solicitud_id})
-                
-                mensaje = None
-                if user_marca == "Hexing":
-                    clave = solicitud_query(f"select CLAVE_CATALOGO from pnrp.airflow_hexing_universo where MEDIDOR_CATALOGO = {medidor} limit 1;")
-                    if not clave.empty:
-                        clave = clave.iloc[0,0]
-                    else:
-                        clave = "EMPTY"
-                if user_marca == "Union":
-                    def convertir_medidor(medidor):
-                        # Si el medidor empieza con '7', quita el '7' y agrega ceros al principio hasta completar 12 dígitos
-                        if medidor.startswith('7'):
-                            medidor = medidor[1:]  # Elimina el '7'
-                        
-                        # Si el medidor es numérico y tiene menos de 12 dígitos, añade ceros al principio
-                        if medidor.isdigit() and len(medidor) < 12:
-                            medidor = medidor.zfill(12)  # Rellena con ceros a la izquierda hasta completar 12 dígitos
-
-                        return medidor
-                    
-                    if len(medidor) > 2 and len(medidor) < 6 or medidor.startswith('7'):
-                        medidor = convertir_medidor(medidor)
-
-                    clave = solicitud_query(f"SELECT CLAVE_CATALOGO from pnrp.airflow_union_universo where MEDIDOR_CATALOGO = '{medidor}' limit 1;")
-                    if not clave.empty:
-                        clave = clave.iloc[0,0]
-                    else:
-                        clave = "EMPTY"
-
-                    print(clave)
-
-                # print(clave)
-                if user_command == "1":
-                    if user_marca == 'Hexing':
-                        if clave != "EMPTY":   
-                            informacion_medidor = solicitud_query(f"SELECT * FROM pnrp.airflow_hexing_universo WHERE MEDIDOR_CATALOGO = {medidor};")
-                            
-                            if not informacion_medidor.empty:
-                                medidor_info = informacion_medidor.iloc[0]
-                                mensaje = (
-                                    f"Hola Ingeniero {user_first_name}\n\n"
-                                    f"El siguiente reporte es para el medidor: {medidor}.\n\n"
-                                    f"Clave: {medidor_info['CLAVE_INCMS']}\n"
-                                    f"Nombre Abonado: {medidor_info['NOMBRE_ABONADO_INCMS']}\n"
-                                    f"Medidor: {medidor_info['MEDIDOR_INCMS']}\n"
-                                    f"Multiplicador: {medidor_info['MULTIPLICADOR_INCMS']}\n"
-                                    f"Último Consumo: {medidor_info['ULTIMO_CONSUMO']}\n"
-                                    f"Lectura Actual: {medidor_info['LECTURA_ACTUAL']}\n"
-                                    f"Código de Lectura: {medidor_info['CODIGO_LECTURA']}\n"
-                                    f"Tarifa: {medidor_info['TARIFA']}\n"
-                                    f"Tipo de Medida: {medidor_info['TIPO_MEDIDA']}\n"
-                                    f"Zona: {medidor_info['ZONA']}\n"
-                                    f"Región PNRP: {medidor_info['REGION_PNRP']}\n"
-                                    f"Circuito: {medidor_info['CIRCUITO']}\n"
-                                    f"Subestación: {medidor_info['SUBESTACION']}\n"
-                                    f"Coord. (X,Y):  {medidor_info['COORD_U_Y']}, {medidor_info['COORD_U_X']}\n"
-                                    f"Coord. UTM (X,Y): {medidor_info['COORD_Y']}, {medidor_info['COORD_X']}\n"
-                                    f"Ubicacion de medidor: https://www.google.com/maps?q={medidor_info['COORD_U_Y']},{medidor_info['COORD_U_X']}"
-                                )
-                            
-                            if informacion_medidor.empty:
-                                mensaje = f"Hola ingeniero {user_first_name}, no tenemos informacion del medidor: {medidor}"
-                        else:
-                            mensaje = f"No se encontro informacion del medidor: {medidor}"
-                            logging.warning(f"No se encontró información para el medidor: {medidor}")
-                    if user_marca == 'Union':
-                        if clave != 'EMPTY':
-                            informacion_medidor = solicitud_query(f"SELECT * FROM pnrp.airflow_union_universo WHERE CLAVE_CATALOGO = '{clave}';")
-
-                            if not informacion_medidor.empty:
-                                medidor_info = informacion_medidor.iloc[0]
-                                mensaje = (
-                                    f"Hola Ingeniero {user_first_name}\n\n"
-                                    f"El siguiente reporte es para el medidor: {medidor}.\n\n"
-                                    f"Clave: {medidor_info['CLAVE_INCMS']}\n"
-                                    f"Nombre Abonado: {medidor_info['NOMBRE_ABONADO_INCMS']}\n"
-                                    f"Medidor: {medidor_info['MEDIDOR_INCMS']}\n"
-                                    f"Multiplicador: {medidor_info['MULTIPLICADOR_INCMS']}\n"
-                                    f"Último Consumo: {medidor_info['ULTIMO_CONSUMO']}\n"
-                                    f"Lectura Actual: {medidor_info['LECTURA_ACTUAL']}\n"
-                                    f"Código de Lectura: {medidor_info['CODIGO_LECTURA']}\n"
-                                    f"Tarifa: {medidor_info['TARIFA']}\n"
-                                    f"Tipo de Medida: {medidor_info['TIPO_MEDIDA']}\n"
-                                    f"Zona: {medidor_info['ZONA']}\n"
-                                    f"Región PNRP: {medidor_info['REGION_PNRP']}\n"
-                                    f"Circuito: {medidor_info['CIRCUITO']}\n"
-                                    f"Subestación: {medidor_info['SUBESTACION']}\n"
-                                    f"Coord. (X,Y):  {medidor_info['COORD_U_Y']}, {medidor_info['COORD_U_X']}\n"
-                                    f"Coord. UTM (X,Y): {medidor_info['COORD_Y']}, {medidor_info['COORD_X']}\n"
-                                    f"Ubicacion de medidor: https://www.google.com/maps?q={medidor_info['COORD_U_Y']},{medidor_info['COORD_U_X']}"
-                                )
-                            if informacion_medidor.empty:
-                                mensaje = f"Hola ingeniero {user_first_name}, no tenemos informacion del medidor: {medidor}"
-                        else:
-                            mensaje = f"No se encontro informacion del medidor: {medidor}"
-                            logging.warning(f"No se encontró información para el medidor: {medidor}")
-                
-                if user_command == "2":
-
-                    if user_marca == 'Hexing':
-                        if clave != "EMPTY":
-                            comunicacion = solicitud_query(f"SELECT * FROM pnrp.airflow_hexing_ulti_comu where clave = '{clave}' or medidor='{medidor}';")
-                            promedio_comunicacion = solicitud_query(f"""SELECT 
-                                                                        -- Porcentaje de comunicación últimos 7 días
-                                                                        ((Rango7Dias.TotalIntervalos - COALESCE(SinLectura7Dias.IntervalosSinLectura, 0)) / Rango7Dias.TotalIntervalos) * 100 AS PorcentajeComunicacion7Dias,
-                                                                        
-                                                                        -- Porcentaje de comunicación últimos 30 días
-                                                                        ((Rango30Dias.TotalIntervalos - COALESCE(SinLectura30Dias.IntervalosSinLectura, 0)) / Rango30Dias.TotalIntervalos) * 100 AS PorcentajeComunicacion30Dias
-                                                                    FROM
-                                                                        -- Porcentaje de comunicación últimos 7 días
-                                                                        (SELECT COUNT(DISTINCT UC.FECHA) AS IntervalosSinLectura
-                                                                        FROM pnrp.airflow_hexing_sinlectura UC
-                                                                        WHERE UC.CLAVE = '{clave}'
-                                                                        AND UC.NOMBRE_EVENTO = 'Sin Lectura'
-                                                                        AND UC.FECHA BETWEEN DATE_SUB(CURDATE(), INTERVAL 7 DAY) AND CURDATE()) AS SinLectura7Dias
-                                                                        RIGHT JOIN
-                                                                        (SELECT (TIMESTAMPDIFF(MINUTE, DATE_SUB(CURDATE(), INTERVAL 7 DAY), CURDATE()) / 15) AS TotalIntervalos) AS Rango7Dias ON 1=1
-                                                                        
-                                                                        -- Porcentaje de comunicación últimos 30 días
-                                                                        LEFT JOIN
-                                                                        (SELECT COUNT(DISTINCT UC.FECHA) AS IntervalosSinLectura
-                                                                        FROM pnrp.airflow_hexing_sinlectura UC
-                                                                        WHERE UC.CLAVE = '{clave}'
-                                                                        AND UC.NOMBRE_EVENTO = 'Sin Lectura'
-                                                                        AND UC.FECHA BETWEEN DATE_SUB(CURDATE(), INTERVAL 30 DAY) AND CURDATE()) AS SinLectura30Dias ON 1=1
-                                                                        LEFT JOIN
-                                                                        (SELECT (TIMESTAMPDIFF(MINUTE, DATE_SUB(CURDATE(), INTERVAL 30 DAY), CURDATE()) / 15) AS TotalIntervalos) AS Rango30Dias ON 1=1;
-                                                                    """)
-                            if not comunicacion.empty and not promedio_comunicacion.empty:
-                                medidor_comunicacion = comunicacion.iloc[0]
-                                medidor_promedio = promedio_comunicacion.iloc[0]
-                                mensaje = (
-                                    f"Hola Ingeniero {user_first_name}\n\n"
-                                    f"El siguiente reporte es para el medidor: {medidor} con clave: {clave}.\n\n"
-                                    f"Ultima Fecha de comunicacion: {medidor_comunicacion['FECHA']}\n"
-                                    f"Ultima Lectura: {medidor_comunicacion['LECTURA']}\n\n"
-                                    f"Promedio de comunicaciones:\n"
-                                    f"Promedio en los ultimos 7 dias: {medidor_promedio['PorcentajeComunicacion7Dias']}.\n"
-                                    f"Promedio en los ultimos 30 dias: {medidor_promedio['PorcentajeComunicacion30Dias']}.\n"
-                                )
-                            
-                            if not promedio_comunicacion.empty and comunicacion.empty:
-                                medidor_promedio = promedio_comunicacion.iloc[0]
-                                mensaje = (
-                                    f"Hola Ingeniero {user_first_name}\n\n"
-                                    f"El siguiente reporte es para el medidor: {medidor} con clave: {clave}.\n\n"
-                                    f"No se obtuvo la ultima comunicacion\n\n"
-                                    f"Promedio de comunicaciones:\n"
-                                    f"Promedio en los ultimos 7 dias: {medidor_promedio['PorcentajeComunicacion7Dias']}.\n"
-                                    f"Promedio en los ultimos 30 dias: {medidor_promedio['PorcentajeComunicacion30Dias']}.\n"
-                                )
-                            
-                            if promedio_comunicacion.empty and not comunicacion.empty:
-                                medidor_comunicacion = comunicacion.iloc[0]
-                                mensaje = (
-                                    f"Hola Ingeniero {user_first_name}\n\n"
-                                    f"El siguiente reporte es para el medidor: {medidor} con clave: {clave}.\n\n"
-                                    f"Ultima Fecha de comunicacion: {medidor_comunicacion['FECHA']}\n"
-                                    f"Ultima Lectura: {medidor_comunicacion['LECTURA']}\n\n"
-                                    f"Promedio de comunicaciones:\n"
-                                    f"No se Obtuvo el promedio de la comunicacion"
-                                )
-                            if promedio_comunicacion.empty and comunicacion.empty:
-                                mensaje = f"Hola ingeniero {user_first_name}, no se obtuvo la comunicacion del medidor: {medidor}"
+        with CICLO.medir(bot=NOMBRE_BOT, etapa='reclamo') as reclamo:
+            solicitudes_df = await cola_solicitudes.reclamar_async()
+        reclamadas = len(solicitudes_df)
+        RECLAMADAS.observar(reclamadas, bot=NOMBRE_BOT)
+        # logging.info(f"Solicitudes encontradas: {solicitudes_df}")
+
+        solicitudes = [solicitud for _, solicitud in solicitudes_df.iterrows()]
+        # El reclamo y las claves son del ciclo: se registran en la traza de cada solicitud
+        trazas_ids = [traza_de(solicitud, f"{NOMBRE_BOT}-{solicitud['id']}") for solicitud in solicitudes]
+        TRAZAS.registrar_lote(trazas_ids, 'reclamo', reclamo.inicio, reclamo.duracion, reclamadas=len(solicitudes))
+        with CICLO.medir(bot=NOMBRE_BOT, etapa='claves') as etapa_claves:
+            claves = await resolutor_claves.resolver_lote(solicitudes)
+        TRAZAS.registrar_lote(trazas_ids, 'claves', etapa_claves.inicio, etapa_claves.duracion)
+        await procesador_solicitudes.procesar_lote(context, solicitudes, claves)
+        with CICLO.medir(bot=NOMBRE_BOT, etapa='confirmacion'):
+            # Registra la confirmación y termina las trazas de los estados escritos
+            await escritor_estados.vaciar()
+        if not solicitudes_df.empty:
+            logging.info(f"Caché de reportes: {cache_reportes.estadisticas()}")
+            logging.info(f"Pool de conexiones: {estadisticas_pool(engine)}")
+            logging.info(f"Envíos: {programador_envios.estadisticas()}")
 
-                        else:
-                            mensaje = f"No se encontro informacion del medidor: {medidor}"
-
-                    
-                    if user_marca == 'Union':
-                        if clave != "EMPTY":
-                            comunicacion_union = solicitud_query(F"""SELECT * FROM pnrp.airflow_union_ulti_comu WHERE CLAVE = '{clave}';""")
-                            comunicacion = solicitud_query(f"""SELECT 
-                                                                    (Rango7Dias.TotalDias - COALESCE(SinLectura7Dias.DiasSinLectura, 0)) / Rango7Dias.TotalDias * 100 AS PorcentajeComunicacion7Dias,
-                                                                    (Rango1Mes.TotalDias - COALESCE(SinLectura1Mes.DiasSinLectura, 0)) / Rango1Mes.TotalDias * 100 AS PorcentajeComunicacion1Mes,
-                                                                    (Rango3Meses.TotalDias - COALESCE(SinLectura3Meses.DiasSinLectura, 0)) / Rango3Meses.TotalDias * 100 AS PorcentajeComunicacion3Meses,
-                                                                    (Rango1Ano.TotalDias - COALESCE(SinLectura1Ano.DiasSinLectura, 0)) / Rango1Ano.TotalDias * 100 AS PorcentajeComunicacion1Ano
-                                                                FROM
-                                                                    -- Porcentaje de comunicación últimos 7 días
-                                                                    (SELECT COUNT(DISTINCT UC.FECHA) AS DiasSinLectura
-                                                                    FROM pnrp.Alarmas_Union_Consumo UC
-                                                                    WHERE UC.CLAVE = '{clave}'
-                                                                    AND UC.NOMBRE_EVENTO = 'Día sin lectura'
-                                                                    AND UC.FECHA BETWEEN DATE_SUB(CURDATE(), INTERVAL 7 DAY) AND CURDATE()) AS SinLectura7Dias
-                                                                    RIGHT JOIN
-                                                                    (SELECT 7 AS TotalDias) AS Rango7Dias ON 1=1
-                                                                    
-                                                                    -- Porcentaje de comunicación último mes
-                                                                    LEFT JOIN
-                                                                    (SELECT COUNT(DISTINCT UC.FECHA) AS DiasSinLectura
-                                                                    FROM pnrp.Alarmas_Union_Consumo UC
-                                                                    WHERE UC.CLAVE = '{clave}'
-                                                                    AND UC.NOMBRE_EVENTO = 'Día sin lectura'
-                                                                    AND UC.FECHA BETWEEN DATE_SUB(CURDATE(), INTERVAL 1 MONTH) AND CURDATE()) AS SinLectura1Mes
-                                                                    ON 1=1
-                                                                    LEFT JOIN
-                                                                    (SELECT DATEDIFF(CURDATE(), DATE_SUB(CURDATE(), INTERVAL 1 MONTH)) + 1 AS TotalDias) AS Rango1Mes ON 1=1
-                                                                    
-                                                                    -- Porcentaje de comunicación últimos 3 meses
-                                                                    LEFT JOIN
-                                                                    (SELECT COUNT(DISTINCT UC.FECHA) AS DiasSinLectura
-                                                                    FROM pnrp.Alarmas_Union_Consumo UC
-                                                                    WHERE UC.CLAVE = '{clave}'
-                                                                    AND UC.NOMBRE_EVENTO = 'Día sin lectura'
-                                                                    AND UC.FECHA BETWEEN DATE_SUB(CURDATE(), INTERVAL 3 MONTH) AND CURDATE()) AS SinLectura3Meses
-                                                                    ON 1=1
-                                                                    LEFT JOIN
-                                                                    (SELECT DATEDIFF(CURDATE(), DATE_SUB(CURDATE(), INTERVAL 3 MONTH)) + 1 AS TotalDias) AS Rango3Meses ON 1=1
-                                                                    
-                                                                    -- Porcentaje de comunicación último año
-                                                                    LEFT JOIN
-                                                                    (SELECT COUNT(DISTINCT UC.FECHA) AS DiasSinLectura
-                                                                    FROM pnrp.Alarmas_Union_Consumo UC
-                                                                    WHERE UC.CLAVE = '{clave}'
-                                                                    AND UC.NOMBRE_EVENTO = 'Día sin lectura'
-                                                                    AND UC.FECHA BETWEEN DATE_SUB(CURDATE(), INTERVAL 1 YEAR) AND CURDATE()) AS SinLectura1Ano
-                                                                    ON 1=1
-                                                                    LEFT JOIN
-                                                                    (SELECT DATEDIFF(CURDATE(), DATE_SUB(CURDATE(), INTERVAL 1 YEAR)) + 1 AS TotalDias) AS Rango1Ano ON 1=1;
-                                                                """)
-                            if not comunicacion.empty and not comunicacion_union.empty:
-                                row_union = comunicacion_union.iloc[0]
-                                row = comunicacion.iloc[0]
-                                mensaje = (f"Hola ingeniero {user_first_name}\n\n"
-                                        f"El reporte de comunicación para el medidor: {medidor} es el siguiente:\n\n"
-                                        f"- Ultima fecha de comunicacion: {row_union['FECHA']}\n"
-                                        F"- Ultima lectura: {row_union['LECTURA']}\n"
-                                        f"- Últimos 7 días: {row['PorcentajeComunicacion7Dias']:.2f}%\n"
-                                        f"- Último mes: {row['PorcentajeComunicacion1Mes']:.2f}%\n"
-                                        f"- Últimos 3 meses: {row['PorcentajeComunicacion3Meses']:.2f}%\n"
-                                        f"- Último año: {row['PorcentajeComunicacion1Ano']:.2f}%\n\n"
-                                        f"Por favor revise los porcentajes de comunicación mencionados.")
-                            
-                            if not comunicacion.empty and comunicacion_union.empty:
-                                row = comunicacion.iloc[0]
-                                mensaje = (f"Hola ingeniero {user_first_name}\n\n"
-                                        f"El reporte de comunicación para el medidor: {medidor} es el siguiente:\n\n"
-                                        f"Porcentaje de Comunicacion\n"
-                                        f"- Últimos 7 días: {row['PorcentajeComunicacion7Dias']:.2f}%\n"
-                                        f"- Último mes: {row['PorcentajeComunicacion1Mes']:.2f}%\n"
-                                        f"- Últimos 3 meses: {row['PorcentajeComunicacion3Meses']:.2f}%\n"
-                                        f"- Último año: {row['PorcentajeComunicacion1Ano']:.2f}%\n\n"
-                                        f"Por favor revise los porcentajes de comunicación mencionados.")
-                            
-                            if comunicacion.empty and not comunicacion_union.empty:
-                                row_union = comunicacion_union.iloc[0]
-                                mensaje = (f"Hola ingeniero {user_first_name}\n\n"
-                                        f"El reporte de comunicación para el medidor: {medidor} es el siguiente:\n\n"
-                                        f"- Ultima fecha de comunicacion: {row_union['FECHA']}\n"
-                                        f"- Ultima lectura: {row_union['LECTURA']}\n"
-                                        f"- No se obtuvo el promedio de comunicacion\n"
-                                        f"Por favor revise los porcentajes de comunicación mencionados.")
-                            if comunicacion.empty and comunicacion_union.empty:
-                                mensaje = f"Hola ingeniero {user_first_name}, no se obtuvo la comunicacion del medidor: {medidor}"
+    except Exception as e:
+        logging.error(f"Error en procesamiento de solicitudes: {e}")
+    CICLO.observar(time.perf_counter() - inicio, bot=NOMBRE_BOT, etapa='ciclo')
+    return reclamadas
 
-                        else:
-                            mensaje = (f"No se encontró información de comunicación para el medidor {medidor} con clave {clave}.")
 
+# Despachador que atiende las solicitudes apenas se insertan, sin esperar al sondeo del JobQueue
+despachador_solicitudes = DespachadorSolicitudes(procesar_solicitudes, lote=cola_solicitudes.lote)
 
+async def iniciar_aplicacion(application):
+    """
+    ## Funcion iniciar aplicacion:
+    Prepara la aplicación al arrancar: abre las conexiones del pool, inicia el endpoint de métricas
+    y el despachador.
 
-                if user_command == "3":
+    Args:
+        application (Application): La aplicación que contiene el bot para enviar mensajes.
+    """
+    try:
+        await ejecutar_en_hilo(calentar, engine)
+    except Exception as e:
+        # Sin conexiones calentadas el bot funciona igual; la primera consulta abrirá la conexión
+        logging.error(f"No se pudo calentar el pool de conexiones: {e}")
+    await iniciar_servidor()
+    await iniciar_despachador(application)
 
-                    if user_marca == 'Hexing':
-                        if clave != "EMPTY":
-                                
-                            alarmas_medidor = solicitud_query(f"SELECT ALARM_DESC, MAX(FECHA) AS FECHA,  count(ALARM_DESC) AS CANTIDAD  FROM pnrp.airflow_hexing_alarmas WHERE clave = '{clave}' GROUP BY ALARM_DESC ORDER BY FECHA DESC LIMIT 30;")
-                            # print(alarmas_medidor)
-                            if not alarmas_medidor.empty:
-                                mensaje= (f"Hola ingeniero {user_first_name}\n\n"
-                                    f"El siguiente reporte es para el medidor: {medidor}.\n\n"
-                                    f"Alarmas del medidor:\n\n"
-                                )
-                                for index, row in alarmas_medidor.iterrows():
-                                    mensaje += (f"- {row['ALARM_DESC']} \n(Ultima Fecha Detectada: {row['FECHA']}, Cantidad: {row['CANTIDAD']})\n\n")
+async def iniciar_despachador(application):
+    """
+    ## Funcion iniciar despachador:
+    Inicia el despachador de solicitudes cuando la aplicación arranca.
 
-                                mensaje += "\nPor favor revise las alarmas mencionadas."
-                            
-                            if alarmas_medidor.empty:
-                                mensaje = f"Hola ingeniero {user_first_name}, No se encontraron alarmas para el medidor: {medidor}"
-                        else:
-                            logging.warning(f"No se encontró información para el medidor: {medidor} o clave: {clave}")
-                            mensaje = f"No se encontró información de alarmas para el medidor {medidor}."
-
-                    if user_marca == 'Union':
-                        if clave != "EMPTY":
-                            alarmas_medidor = solicitud_query(f"SELECT NOMBRE_EVENTO, MAX(FECHA) AS FECHA, count(NOMBRE_EVENTO) AS CANTIDAD FROM pnrp.Alarmas_Union_Consumo where clave= '{clave}' GROUP BY NOMBRE_EVENTO ORDER BY FECHA DESC LIMIT 30;")
-                            if not alarmas_medidor.empty:
-                                mensaje = (f"hola ingeniero {user_first_name}\n\n"
-                                    f"El siguiente reporte es para el medidor: {medidor}\n\n"
-                                    f"Alarmas del medidor:\n\n"
-                                )
-                                for index, row in alarmas_medidor.iterrows():
-                                    mensaje += (f"- {row['NOMBRE_EVENTO']} \n(Ultima Fecha Detectada: {row['FECHA']}, Cantidad: {row['CANTIDAD']})\n\n")
-                                
-                                mensaje += "\nPor favor revise las alarmas mencionadas."
-                            if alarmas_medidor.empty:
-                                mensaje = f"Hola ingeniero {user_first_name}, No se encontraron alarmas para el medidor: {medidor}"
-                    else: 
-                        logging.warning(f"No se encontro una informacion para el medidor: {medidor} o clave: {clave}")
-                        mensjae = f"No se encontro informacion de la alarmas para el medidor {medidor}."
-                        
-                if user_command == "4":
-                    if user_marca == "Hexing":
-                        if clave != "EMPTY":
-                            # Consultar las órdenes para el medidor específico
-                            ordenes = solicitud_query(f"SELECT * FROM pnrp.airflow_hexing_os WHERE clave = '{clave}' ORDER BY FECHA_EJECUCION DESC;")
-                            
-                            # Verificar si el DataFrame no está vacío
-                            if not ordenes.empty:
-                                # Crear el mensaje concatenando la información de cada orden
-                                mensaje = (f"Hola ingeniero {user_first_name},\n\n"
-                                        f"El siguiente reporte es para el medidor: {medidor}.\n\n"
-                                        f"Alarmas del medidor:\n\n" + 
-                                        "\n\n".join(
-                                            f"Número de OS: {orden['OS']}\n"
-                                            f"Estado de la OS: {orden['ESTADO']}\n"
-                                            f"Tipo de Gestion: {orden['DESCRIPCION_OS']}"
-                                            f"Categoría de la anomalía: {orden['CATEGORIA']}\n"
-                                            f"Descripción de OS: {orden['DESCRIPCION']}\n"
-                                            f"Fecha Generada: {orden['FECHA_GENERADA']}\n"
-                                            f"Fecha de Ejecución: {orden['FECHA_EJECUCION']}\n"
-                                            for _, orden in ordenes.iterrows()
-                                        ))
-                            if ordenes.empty:
-                                mensaje = f"Hola ingeniero {user_first_name}, no se encontraron Ordenes de Servicio para el medidor: {medidor} con clave: {clave}"
-                        else:
-                            logging.warning(f"No se encontró información para el medidor: {medidor} o clave: {clave}")
-                            mensaje = f"No se encontró ordenes de servicio para el medidor {medidor} con clave {clave}."
-
-                    if user_marca == "Union":
-                        if clave != "EMPTY":
-                            # Consultar las órdenes para el medidor específico
-                            ordenes = solicitud_query(f"SELECT * FROM pnrp.airflow_union_os WHERE clave = '{clave}' ORDER BY FECHA_EJECUCION DESC;")
-                            
-                            # Verificar si el DataFrame no está vacío
-                            if not ordenes.empty:
-                                # Crear el mensaje concatenando la información de cada orden
-                                mensaje = (f"Hola ingeniero {user_first_name},\n\n"
-                                        f"El siguiente reporte es para el medidor: {medidor}.\n\n"
-                                        f"Alarmas del medidor:\n\n" + 
-                                        "\n\n".join(
-                                            f"Número de OS: {orden['OS']}\n"
-                                            f"Estado de la OS: {orden['ESTADO']}\n"
-                                            f"Categoría de la anomalía: {orden['CATEGORIA']}\n"
-                                            f"Descripción de OS: {orden['DESCRIPCION']}\n"
-                                            f"Fecha Generada: {orden['FECHA_GENERADA']}\n"
-                                            f"Fecha de Ejecución: {orden['FECHA_EJECUCION']}\n"
-                                            for _, orden in ordenes.iterrows()
-                                        ))
-
-                            if ordenes.empty:
-                                mensaje = f"Hola ingeniero {user_first_name}, no se encontraron Ordenes de Servicio para el medidor: {medidor} con clave: {clave}"
-                        else:
-                            logging.warning(f"No se encontró información para el medidor: {medidor} o clave: {clave}")
-                            mensaje = f"No se encontró ordenes de servicio para el medidor {medidor} con clave {clave}."
-                
-                if user_command == '5':
-                    comentario_telegestion = solicitud_query(f"SELECT * FROM bitacora_ac where clave = '{clave}' and ESTADO <> 'ANULADO' and REQUIERE_OS = TRUE order by fecha_asignacion desc;")
-                    if not comentario_telegestion.empty:
-                        mensaje = (f"Hola ingeniero {user_first_name}, \n\n"
-                                   f"el siguiente reporte es para el medidor: {medidor}\n\n"
-                                   f"El departamento de telegestion ha hecho una o mas revisiones al medidor.\n"
-                                   "\n\n".join(
-                                        f"Fecha de analisis: {comentario['FECHA_ANALISIS']}\n"
-                                        f"Alarma encontrada: {comentario['ALARMA']}\n"
-                                        f"Fecha de la alarma encontrada: {comentario['FECHA_ALARMA']}\n"
-                                        f"Comentario del analista: {comentario['COMENTARIO_ANALISTA']}\n"
-                                        f"Criticidad de la alarma: {comentario['CRITICIDAD_ALARMA']}\n"
-                                        f"Estado de la revision: {comentario['ESTADO']}\n"
-                                        for _, comentario in comentario_telegestion.iterrows() 
-                                   ) 
-                        )
-                    if comentario_telegestion.empty:
-                        mensaje = f"Hola ingeniero {user_first_name}, no se ha realizado analisis para el medidor: {medidor} con clave: {clave}"
-
-                if mensaje:
-                    try:
-                        await context.bot.send_message(chat_id=user_id, text=mensaje)
-                        logging.info(f"Mensaje enviado a ID_TG: {user_id}")
-                        
-                        with engine.begin() as conn:
-                            print("actualizando campo enviado")
-                            query_update_enviado = text("UPDATE bot_solicitudes_me SET ENVIADO='1' WHERE id = :id")
-                            conn.execute(query_update_enviado, {'id': solicitud_id})
+    Args:
+        application (Application): La aplicación que contiene el bot para enviar mensajes.
+    """
+    despachador_solicitudes.iniciar(application)
 
-                    except Exception as e:
-                        logging.error(f"Error al enviar mensaje a ID_TG: {user_id}: {e}")
+async def detener_despachador(application):
+    """
+    ## Funcion detener despachador:
+    Detiene el despachador de solicitudes y el endpoint de métricas cuando la aplicación se detiene.
 
-    except Exception as e:
-        logging.error(f"Error en procesamiento de solicitudes: {e}")
+    Args:
+        application (Application): La aplicación que contiene el bot para enviar mensajes.
+    """
+    await despachador_solicitudes.detener()
+    await detener_servidor()
     
 
 # Función para manejar mensajes que no son comandos
@@ -976,10 +1002,8 @@ async def manejar_mensaje(update: Update, context: CallbackContext):
         None
     """
     user_id = update.message.from_user.id
-    usuarios = solicitud_query("SELECT * FROM bot_usuarios_autorizados_me;")
-    iD_TELEGRAM = usuarios['ID_TELEGRAM'].tolist()
 
-    if int(user_id) in iD_TELEGRAM:
+    if await directorio_usuarios.obtener_async(user_id) is not None:
         # Usuario registrado, iniciar flujo de selección de opciones
         return await iniciar_menu(update, context)
     else:
@@ -1022,18 +1046,29 @@ async def error(update: Update, context: CallbackContext):
     """
     logging.error(f"Actualización {update} causó el error {context.error}")
 
-def main():
+def construir_aplicacion(token=None, sondeo=True):
     """
-    ## Funcion main:
-    Función principal para iniciar el bot. Configura los manejadores de comandos y
+    ## Funcion construir_aplicacion:
+    Construye la aplicación del bot. Configura los manejadores de comandos y
     mensajes, gestiona el flujo de conversación y establece un JobQueue para tareas
-    programadas.
+    programadas. La usan `main` y el proceso conjunto de `bots.py`.
+
+    Args:
+        token (str, opcional): Token del bot; por defecto `YOUR_TOKEN`.
+        sondeo (bool): Programar el sondeo periódico de solicitudes. `bots.py` lo desactiva
+            porque sondea las colas de todos los bots con una sola consulta.
 
     Returns:
-        None
+        Application: La aplicación configurada, o None si el JobQueue no está disponible.
     """
     # Tu token de bot aquí
-    application = Application.builder().token(os.getenv('YOUR_TOKEN')).build()
+    application = (
+        Application.builder()
+        .token(token or os.getenv('YOUR_TOKEN'))
+        .post_init(iniciar_aplicacion)
+        .post_stop(detener_despachador)
+        .build()
+    )
     
     
     # Primer ConversationHandler para el registro
@@ -1078,18 +1113,27 @@ def main():
     application.add_handler(planificacion_handler)
     application.add_handler(registro_handler)
     application.add_handler(menu_handler)
+    # Botones "Anterior" / "Siguiente" de los reportes paginados
+    application.add_handler(CallbackQueryHandler(paginas_reporte.manejar, pattern=r'^pag:'))
+    # Trazas más lentas de la última hora, para los administradores
+    application.add_handler(CommandHandler('trazas', comando_trazas(directorio_usuarios, NOMBRE_BOT)))
     # Manejador de errores
     application.add_error_handler(error)
+    # Duración y errores de cada manejador en las métricas
+    instrumentar_manejadores(application, NOMBRE_BOT)
 
 
     # Asegúrate de que la job_queue esté disponible
     if application.job_queue is None:
         logging.error("JobQueue no está disponible. Asegúrate de que python-telegram-bot esté instalado con el extra `job-queue`.")
-        return
+        return None
 
-    # Configuración del JobQueue
+    # Configuración del JobQueue: el sondeo solo es respaldo para las solicitudes insertadas por otros procesos,
+    # las del propio bot se atienden al instante con el despachador
     job_queue = application.job_queue
-    job_queue.run_repeating(procesar_solicitudes, interval=10, first=0)
+    if sondeo:
+        job_queue.run_repeating(procesar_solicitudes, interval=int(os.getenv('SOLICITUDES_INTERVALO', 60)), first=0)
+    job_queue.run_repeating(rollup_comunicacion.actualizar_todas, interval=int(os.getenv('ROLLUP_INTERVALO', 900)), first=10)
 
 
     """# Ejecutar el bot en un hilo separado para no bloquear el hilo principal
@@ -1098,7 +1142,23 @@ def main():
 
 
 
-    application.run_polling()
+    return application
+
+
+def main():
+    """
+    ## Funcion main:
+    Función principal para iniciar el bot.
+
+    Returns:
+        None
+    """
+    application = construir_aplicacion()
+    if application is None:
+        return
+
+    # Polling por defecto, o webhook con BOT_MODO=webhook
+    ejecutar_aplicacion(application)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,229 @@
+"""
+## Bot de Telegram simulado
+
+Reemplazo de `telegram.Bot` para medir los bots sin conectarse a Telegram. Registra cada mensaje
+enviado y simula:
+
+- Latencia de cada llamada a la API.
+- Errores de red aleatorios (`NetworkError`) con la probabilidad indicada.
+- Los límites de Telegram: más de `limite_global` mensajes en un segundo, o dos mensajes al mismo
+  chat con menos de `intervalo_chat` segundos entre sí, responden `RetryAfter`.
+
+Los mensajes devueltos se pueden editar con `edit_text` (como el aviso de avance de la planificación),
+y los archivos registrados con `agregar_archivo` se descargan con `get_file`, así que también sirve
+para los manejadores de `/menu` y `/planificacion` (ver `benchmark.py`).
+
+`APISimulada` reemplaza en cambio la conexión HTTP de python-telegram-bot, para ejecutar una
+`Application` completa (polling con `getUpdates` o webhook con `setWebhook`) sin Telegram.
+"""
+
+from collections import deque
+from types import SimpleNamespace
+import asyncio
+import itertools
+import json
+import logging
+import random
+import time
+
+from telegram.error import NetworkError, RetryAfter
+from telegram.request import BaseRequest
+
+
+class BotSimulado:
+    """
+    ## Clase BotSimulado:
+    Bot falso que registra los mensajes en lugar de enviarlos.
+
+    Args:
+        latencia (float): Segundos que tarda cada llamada.
+        tasa_errores (float): Probabilidad (0 a 1) de que una llamada falle con `NetworkError`.
+        limite_global (int, opcional): Mensajes por segundo permitidos en total; None sin límite.
+        intervalo_chat (float, opcional): Segundos mínimos entre mensajes a un mismo chat; None sin límite.
+        retry_after (int | timedelta): Espera que se informa en `RetryAfter`.
+        semilla (int, opcional): Semilla de los errores aleatorios.
+    """
+
+    def __init__(self, latencia=0.0, tasa_errores=0.0, limite_global=None, intervalo_chat=None,
+                 retry_after=1, semilla=None):
+        self.latencia = latencia
+        self.tasa_errores = tasa_errores
+        self.limite_global = limite_global
+        self.intervalo_chat = intervalo_chat
+        self.retry_after = retry_after
+        self._azar = random.Random(semilla)
+        self._ids = itertools.count(1)
+        self._ultimo_segundo = deque()
+        self._ultimo_por_chat = {}
+        self._archivos = {}
+
+        # Mensajes entregados: (momento, chat_id, texto, argumentos adicionales)
+        self.enviados = []
+        # Mensajes rechazados con `RetryAfter`: (momento, chat_id)
+        self.rechazados = []
+        self.limites = 0
+        self.errores = 0
+
+    def _rechazar(self, ahora, chat_id):
+        self.limites += 1
+        self.rechazados.append((ahora, chat_id))
+        raise RetryAfter(self.retry_after)
+
+    def _revisar_limites(self, chat_id):
+        ahora = time.monotonic()
+        if self.limite_global is not None:
+            while self._ultimo_segundo and ahora - self._ultimo_segundo[0] >= 1:
+                self._ultimo_segundo.popleft()
+            if len(self._ultimo_segundo) >= self.limite_global:
+                self._rechazar(ahora, chat_id)
+        if self.intervalo_chat is not None:
+            ultimo = self._ultimo_por_chat.get(chat_id)
+            if ultimo is not None and ahora - ultimo < self.intervalo_chat:
+                self._rechazar(ahora, chat_id)
+        self._ultimo_segundo.append(ahora)
+        self._ultimo_por_chat[chat_id] = ahora
+
+    async def send_message(self, chat_id, text, **kwargs):
+        """
+        Simula `Bot.send_message`.
+
+        Returns:
+            SimpleNamespace: Mensaje con `message_id`, `chat_id`, `text` y la corrutina `edit_text`.
+        """
+        if self.latencia:
+            await asyncio.sleep(self.latencia)
+        if self.tasa_errores and self._azar.random() < self.tasa_errores:
+            self.errores += 1
+            raise NetworkError("Error de red simulado")
+        self._revisar_limites(chat_id)
+        self.enviados.append((time.monotonic(), chat_id, text, kwargs))
+        return self._mensaje(next(self._ids), chat_id, text)
+
+    def _mensaje(self, message_id, chat_id, text):
+        async def edit_text(text, **kwargs):
+            return await self.edit_message_text(text, chat_id=chat_id, message_id=message_id, **kwargs)
+
+        return SimpleNamespace(message_id=message_id, chat_id=chat_id, text=text, edit_text=edit_text)
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        """
+        Simula `Bot.edit_message_text` sin aplicar límites.
+        """
+        if self.latencia:
+            await asyncio.sleep(self.latencia)
+        return self._mensaje(message_id, chat_id, text)
+
+    def agregar_archivo(self, contenido):
+        """
+        Registra un archivo para que los manejadores lo obtengan con `get_file`.
+
+        Args:
+            contenido (bytes): Contenido del archivo.
+
+        Returns:
+            str: `file_id` del archivo.
+        """
+        file_id = f"archivo-{len(self._archivos) + 1}"
+        self._archivos[file_id] = contenido
+        return file_id
+
+    async def get_file(self, file_id, **kwargs):
+        """
+        Simula `Bot.get_file` para un archivo registrado con `agregar_archivo`.
+
+        Returns:
+            SimpleNamespace: Archivo con `file_id`, `file_size` y la corrutina `download_to_drive(ruta)`.
+        """
+        if self.latencia:
+            await asyncio.sleep(self.latencia)
+        contenido = self._archivos[file_id]
+
+        async def download_to_drive(ruta):
+            with open(ruta, 'wb') as archivo:
+                archivo.write(contenido)
+            return ruta
+
+        return SimpleNamespace(file_id=file_id, file_size=len(contenido), download_to_drive=download_to_drive)
+
+
+class APISimulada(BaseRequest):
+    """
+    ## Clase APISimulada:
+    Conexión falsa de python-telegram-bot que responde la API de bots en memoria: `getMe`,
+    `getUpdates` (con espera larga), `sendMessage`, `setWebhook` y `deleteWebhook`.
+
+    Se usa con `Application.builder().request(api).get_updates_request(api)`.
+
+    Args:
+        latencia (float): Segundos que tarda cada llamada, salvo la espera de `getUpdates`.
+    """
+
+    def __init__(self, latencia=0.0):
+        self.latencia = latencia
+        self._ids = itertools.count(1)
+        self._pendientes = deque()
+        self._nuevas = asyncio.Event()
+
+        # Métodos llamados, en orden, y mensajes enviados: (momento, chat_id, texto)
+        self.llamadas = []
+        self.enviados = []
+        self.webhook = None
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def agregar_actualizacion(self, actualizacion):
+        """
+        Deja una actualización (dict de la API) para el próximo `getUpdates`.
+        """
+        self._pendientes.append(actualizacion)
+        self._nuevas.set()
+
+    async def _get_updates(self, parametros):
+        offset = parametros.get('offset', 0)
+        while self._pendientes and self._pendientes[0]['update_id'] < offset:
+            self._pendientes.popleft()
+        if not self._pendientes and parametros.get('timeout'):
+            self._nuevas.clear()
+            try:
+                await asyncio.wait_for(self._nuevas.wait(), parametros['timeout'])
+            except asyncio.TimeoutError:
+                pass
+        return list(itertools.islice(self._pendientes, parametros.get('limit', 100)))
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        metodo = url.rsplit('/', 1)[-1]
+        parametros = request_data.parameters if request_data is not None else {}
+        self.llamadas.append(metodo)
+        if self.latencia:
+            await asyncio.sleep(self.latencia)
+
+        if metodo == 'getMe':
+            respuesta = {'id': 1, 'is_bot': True, 'first_name': 'Bot simulado', 'username': 'bot_simulado'}
+        elif metodo == 'getUpdates':
+            respuesta = await self._get_updates(parametros)
+        elif metodo == 'sendMessage':
+            chat_id = int(parametros['chat_id'])
+            self.enviados.append((time.monotonic(), chat_id, parametros['text']))
+            respuesta = {
+                'message_id': next(self._ids), 'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'}, 'text': parametros['text'],
+            }
+        elif metodo == 'setWebhook':
+            self.webhook = parametros['url']
+            respuesta = True
+        elif metodo == 'deleteWebhook':
+            self.webhook = None
+            respuesta = True
+        else:
+            logging.warning(f"Método no simulado: {metodo}")
+            return 404, json.dumps({'ok': False, 'error_code': 404, 'description': 'Not Found'}).encode()
+        return 200, json.dumps({'ok': True, 'result': respuesta}).encode()
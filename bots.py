@@ -0,0 +1,180 @@
+"""
+## Proceso conjunto de los bots
+
+Ejecuta varios bots (por defecto `bot_md.py` y `bot_me.py`) en un solo proceso y un solo bucle de
+eventos, en lugar de un proceso por bot:
+
+- Un solo motor y pool de conexiones (`engine_pnrp` en `conexion.py`) y un solo pool de hilos de base
+  de datos (`acceso_datos.py`), compartidos por todos los bots.
+- Un solo sondeo de las colas de solicitudes: cada `SOLICITUDES_INTERVALO` segundos (por defecto 60)
+  una consulta de solo lectura revisa con `EXISTS` si hay filas pendientes en la cola de cada bot y
+  despierta solo a los despachadores que tienen trabajo. Reemplaza el `UPDATE` de reclamo que cada
+  bot ejecutaba en cada sondeo aunque no hubiera solicitudes.
+- Un solo servidor HTTP en modo webhook, con una ruta por bot (ver `webhook.py`).
+
+Cada bot es un módulo que expone `construir_aplicacion(token, sondeo)`, `engine`, `cola_solicitudes`
+y `despachador_solicitudes`. Las tablas, consultas, claves y plantillas de cada marca ya viven en
+módulos compartidos (`consultas.py`, `claves.py`, `plantillas.py`), así que un bot nuevo solo define
+sus manejadores.
+
+Variables de entorno:
+- `BOTS` (por defecto `bot_md,bot_me`): módulos de los bots a ejecutar.
+- `TOKEN_<MODULO>` (por ejemplo `TOKEN_BOT_MD`, `TOKEN_BOT_ME`): token de cada bot. Con un solo bot
+  se puede usar `YOUR_TOKEN`.
+- `BOTS_LOG` (por defecto `bots.log`): archivo de registro común.
+
+Uso:
+    python bots.py
+"""
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+import asyncio
+import importlib
+import logging
+import os
+
+from acceso_datos import ejecutar_en_hilo
+from metricas import REGISTRO_METRICAS
+from webhook import ejecutar_aplicaciones
+
+
+class SondeoColas:
+    """
+    ## Clase SondeoColas:
+    Revisa con una consulta por motor si las colas de varios bots tienen solicitudes pendientes y
+    notifica al despachador de cada bot que las tenga.
+
+    Args:
+        bots (dict): Módulo de cada bot por nombre, con `engine`, `cola_solicitudes` y
+            `despachador_solicitudes`.
+        intervalo (int, opcional): Segundos entre revisiones; por defecto `SOLICITUDES_INTERVALO` o 60.
+    """
+
+    def __init__(self, bots, intervalo=None):
+        self.bots = bots
+        self.intervalo = intervalo or int(os.getenv('SOLICITUDES_INTERVALO', 60))
+
+        # Bots agrupados por motor: normalmente todos comparten el mismo
+        grupos = {}
+        for nombre, bot in bots.items():
+            grupos.setdefault(id(bot.engine), (bot.engine, []))[1].append(nombre)
+        self._consultas = []
+        for engine, nombres in grupos.values():
+            columnas = ', '.join(
+                f"EXISTS(SELECT 1 FROM {bots[nombre].cola_solicitudes.tabla} "
+                f"WHERE {bots[nombre].cola_solicitudes.condicion_pendientes}) AS pendientes_{indice}"
+                for indice, nombre in enumerate(nombres)
+            )
+            self._consultas.append((engine, text(f"SELECT {columnas}"), nombres))
+
+        # Contadores
+        self.revisiones = 0
+        self.notificaciones = 0
+
+    def pendientes(self):
+        """
+        Consulta qué bots tienen solicitudes pendientes.
+
+        Returns:
+            dict: True o False por nombre de bot.
+        """
+        resultado = {}
+        for engine, query, nombres in self._consultas:
+            with engine.connect() as con:
+                fila = con.execute(query).one()
+            resultado.update(zip(nombres, (bool(valor) for valor in fila)))
+        return resultado
+
+    async def revisar(self):
+        """
+        Ejecuta una revisión y despierta a los despachadores de los bots con solicitudes pendientes.
+
+        Returns:
+            list: Nombres de los bots notificados.
+        """
+        pendientes = await ejecutar_en_hilo(self.pendientes)
+        self.revisiones += 1
+        notificados = [nombre for nombre, hay in pendientes.items() if hay]
+        for nombre in notificados:
+            self.bots[nombre].despachador_solicitudes.notificar()
+        self.notificaciones += len(notificados)
+        return notificados
+
+    async def ejecutar(self):
+        """
+        Revisa las colas cada `intervalo` segundos hasta ser cancelado.
+        """
+        while True:
+            try:
+                await self.revisar()
+            except Exception as e:
+                logging.error(f"Error al sondear las colas de solicitudes: {e}")
+            await asyncio.sleep(self.intervalo)
+
+
+def cargar_bots(nombres):
+    """
+    Importa los módulos de los bots.
+
+    Args:
+        nombres (list): Nombres de los módulos (`bot_md`, `bot_me`).
+
+    Returns:
+        dict: Módulo de cada bot por nombre.
+    """
+    return {nombre: importlib.import_module(nombre) for nombre in nombres}
+
+
+def construir_aplicaciones(bots):
+    """
+    Construye la aplicación de cada bot sin su sondeo propio, que reemplaza `SondeoColas`.
+
+    Args:
+        bots (dict): Módulo de cada bot por nombre.
+
+    Returns:
+        dict: Aplicación de cada bot por nombre, o None si falta un token o el JobQueue.
+    """
+    aplicaciones = {}
+    for nombre, bot in bots.items():
+        variable = f"TOKEN_{nombre.upper()}"
+        token = os.getenv(variable)
+        if token is None and len(bots) > 1:
+            logging.error(f"Falta la variable {variable} con el token de {nombre}")
+            return None
+        application = bot.construir_aplicacion(token=token, sondeo=False)
+        if application is None:
+            return None
+        aplicaciones[nombre] = application
+    return aplicaciones
+
+
+def main():
+    """
+    Ejecuta los bots de `BOTS` en un solo proceso, en el modo de `BOT_MODO` (polling por defecto).
+
+    Returns:
+        None
+    """
+    load_dotenv()
+    # Antes de importar los bots: su propio `basicConfig` no tiene efecto si el registro ya está configurado
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        filename=os.getenv('BOTS_LOG', 'bots.log'),
+        filemode='a'
+    )
+
+    bots = cargar_bots([nombre.strip() for nombre in os.getenv('BOTS', 'bot_md,bot_me').split(',') if nombre.strip()])
+    aplicaciones = construir_aplicaciones(bots)
+    if aplicaciones is None:
+        return
+
+    sondeo = SondeoColas(bots)
+    REGISTRO_METRICAS.estadisticas('bot_sondeo', lambda: {'revisiones': sondeo.revisiones, 'notificaciones': sondeo.notificaciones})
+    asyncio.run(ejecutar_aplicaciones(aplicaciones, tareas=[sondeo.ejecutar]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+## Caché de resultados de reportes
+
+Guarda en memoria los resultados de las consultas de cada reporte para que varias consultas sobre el
+mismo medidor en pocos minutos no vuelvan a ejecutar las mismas consultas. Las tablas de origen las
+refresca Airflow por horario, así que un resultado reciente sigue siendo válido.
+
+- Cada tipo de reporte (comando) tiene su propio tiempo de vida (TTL).
+- El tamaño es acotado; al llenarse se descarta la entrada menos usada recientemente (LRU).
+- Una entrada vencida hace menos de `ventana_obsoleta` segundos se entrega de inmediato y se refresca
+  en segundo plano (stale-while-revalidate).
+"""
+
+from collections import OrderedDict
+import asyncio
+import logging
+import os
+import time
+
+
+# Tiempo de vida en segundos por comando
+TTL_POR_COMANDO = {
+    '1': 3600,  # Información del medidor (universo)
+    '2': 600,   # Comunicación del medidor
+    '3': 900,   # Alarmas del medidor
+    '4': 1800,  # Órdenes de servicio
+    '5': 300,   # Comentarios de telegestión
+}
+
+
+class CacheReportes:
+    """
+    ## Clase CacheReportes:
+    Caché LRU con TTL por comando y refresco en segundo plano de las entradas vencidas.
+
+    Las claves son tuplas que comienzan con `(marca, comando, clave, ...)`.
+
+    Args:
+        ttl_por_comando (dict, opcional): TTL en segundos por comando; por defecto `TTL_POR_COMANDO`.
+        tamano (int, opcional): Máximo de entradas; por defecto `CACHE_REPORTES_TAMANO` o 1000.
+        ventana_obsoleta (int, opcional): Segundos después del TTL en que una entrada aún se entrega
+            mientras se refresca; por defecto `CACHE_REPORTES_OBSOLETO` o 600.
+    """
+
+    def __init__(self, ttl_por_comando=None, tamano=None, ventana_obsoleta=None):
+        self.ttl_por_comando = ttl_por_comando or TTL_POR_COMANDO
+        self.tamano = tamano or int(os.getenv('CACHE_REPORTES_TAMANO', 1000))
+        self.ventana_obsoleta = ventana_obsoleta if ventana_obsoleta is not None else int(os.getenv('CACHE_REPORTES_OBSOLETO', 600))
+        self._entradas = OrderedDict()
+        self._refrescando = set()
+        # El ciclo de eventos solo guarda referencias débiles a las tareas
+        self._tareas = set()
+
+        # Contadores de uso
+        self.aciertos = 0
+        self.aciertos_obsoletos = 0
+        self.fallos = 0
+
+    def _guardar(self, clave_cache, valor):
+        self._entradas[clave_cache] = (time.monotonic(), valor)
+        self._entradas.move_to_end(clave_cache)
+        while len(self._entradas) > self.tamano:
+            self._entradas.popitem(last=False)
+
+    async def _refrescar(self, clave_cache, cargar):
+        try:
+            self._guardar(clave_cache, await cargar())
+        except Exception as e:
+            logging.error(f"Error al refrescar el reporte {clave_cache} en caché: {e}")
+        finally:
+            self._refrescando.discard(clave_cache)
+
+    async def obtener(self, clave_cache, cargar):
+        """
+        Devuelve el resultado en caché o lo carga con `cargar`.
+
+        Args:
+            clave_cache (tuple): `(marca, comando, clave, ...)` que identifica el reporte.
+            cargar (callable): Corrutina sin argumentos que ejecuta las consultas del reporte.
+
+        Returns:
+            Any: Resultado del reporte.
+        """
+        entrada = self._entradas.get(clave_cache)
+        if entrada is not None:
+            guardado_en, valor = entrada
+            edad = time.monotonic() - guardado_en
+            ttl = self.ttl_por_comando.get(clave_cache[1], 0)
+
+            if edad < ttl:
+                self.aciertos += 1
+                self._entradas.move_to_end(clave_cache)
+                return valor
+
+            if edad < ttl + self.ventana_obsoleta:
+                self.aciertos_obsoletos += 1
+                self._entradas.move_to_end(clave_cache)
+                if clave_cache not in self._refrescando:
+                    self._refrescando.add(clave_cache)
+                    tarea = asyncio.get_running_loop().create_task(self._refrescar(clave_cache, cargar))
+                    self._tareas.add(tarea)
+                    tarea.add_done_callback(self._tareas.discard)
+                return valor
+
+        self.fallos += 1
+        valor = await cargar()
+        self._guardar(clave_cache, valor)
+        return valor
+
+    def estadisticas(self):
+        """
+        Devuelve los contadores de la caché.
+
+        Returns:
+            dict: Aciertos, aciertos obsoletos, fallos y entradas actuales.
+        """
+        return {
+            'aciertos': self.aciertos,
+            'aciertos_obsoletos': self.aciertos_obsoletos,
+            'fallos': self.fallos,
+            'entradas': len(self._entradas),
+        }
@@ -0,0 +1,170 @@
+"""
+## Resolución de claves por lote
+
+Antes de atender un ciclo de solicitudes se normalizan todos los medidores del lote según su marca
+(`transform_client_to` para Elster, `convertir_medidor` para Union) y se buscan todas las claves con
+una sola consulta `IN (...)` por marca, en lugar de una consulta `LIMIT 1` por solicitud.
+
+Los medidores que no aparecen en el universo quedan con la clave `"EMPTY"`, igual que antes.
+"""
+
+from sqlalchemy import bindparam, text
+import logging
+
+from acceso_datos import ejecutar_en_hilo
+
+
+# Tabla de universo por marca
+TABLAS_UNIVERSO = {
+    'Elster': 'pnrp.airflow_elster_universo',
+    'Hexing': 'pnrp.airflow_hexing_universo',
+    'Union': 'pnrp.airflow_union_universo',
+}
+
+
+def transform_client_to(client):
+    """
+    Transforma el identificador del cliente en un formato específico.
+
+    Args:
+        client (str): El identificador original del cliente.
+
+    Returns:
+        str: El identificador transformado en el formato "AAAA-XXX-YYYYYY".
+    """
+    year = client[:4]
+    group = client[4:7]
+    number = client[7:]
+    transformed_client = f"{year}-{group.zfill(3)}-{number.zfill(6)}"
+    return transformed_client
+
+
+def convertir_medidor(medidor):
+    """
+    Convierte un medidor Union al formato del catálogo.
+
+    Args:
+        medidor (str): Medidor tal como lo escribió el usuario.
+
+    Returns:
+        str: Medidor sin el '7' inicial y, si es numérico, completado con ceros hasta 12 dígitos.
+    """
+    # Si el medidor empieza con '7', quita el '7' y agrega ceros al principio hasta completar 12 dígitos
+    if medidor.startswith('7'):
+        medidor = medidor[1:]  # Elimina el '7'
+
+    # Si el medidor es numérico y tiene menos de 12 dígitos, añade ceros al principio
+    if medidor.isdigit() and len(medidor) < 12:
+        medidor = medidor.zfill(12)  # Rellena con ceros a la izquierda hasta completar 12 dígitos
+
+    return medidor
+
+
+def normalizar_medidor(marca, medidor):
+    """
+    Aplica la normalización de la marca al medidor.
+
+    Args:
+        marca (str): Elster, Hexing o Union.
+        medidor (str): Medidor de la solicitud.
+
+    Returns:
+        str: Medidor normalizado.
+    """
+    medidor = str(medidor)
+    if marca == "Elster":
+        if medidor != "None" and (13 <= len(medidor) <= 15):
+            if not (len(medidor) > 8 and medidor[4] == '-' and medidor[8] == '-'):
+                medidor = transform_client_to(medidor)
+    elif marca == "Union":
+        if len(medidor) > 2 and len(medidor) < 6 or medidor.startswith('7'):
+            medidor = convertir_medidor(medidor)
+    return medidor
+
+
+def _llave(medidor):
+    # MEDIDOR_CATALOGO se compara como texto, sin distinguir mayúsculas ni espacios finales (como MySQL)
+    return str(medidor).rstrip().upper()
+
+
+class ResolutorClaves:
+    """
+    ## Clase ResolutorClaves:
+    Busca las claves de catálogo de varios medidores con una consulta por marca.
+
+    Args:
+        engine (Engine): Motor de SQLAlchemy.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._queries = {
+            marca: text(f"SELECT MEDIDOR_CATALOGO, CLAVE_CATALOGO FROM {tabla} WHERE MEDIDOR_CATALOGO IN :medidores").bindparams(bindparam('medidores', expanding=True))
+            for marca, tabla in TABLAS_UNIVERSO.items()
+        }
+
+        # Contadores de consultas
+        self.medidores = 0
+        self.consultas = 0
+
+    def resolver(self, marca, medidores):
+        """
+        Busca las claves de los medidores (ya normalizados) de una marca.
+
+        Args:
+            marca (str): Elster, Hexing o Union.
+            medidores (iterable): Medidores normalizados.
+
+        Returns:
+            dict: Medidor -> clave, con "EMPTY" para los que no están en el universo.
+        """
+        medidores = list(dict.fromkeys(medidores))
+        claves = {medidor: "EMPTY" for medidor in medidores}
+        if not medidores:
+            return claves
+        llaves = {}
+        for medidor in medidores:
+            llaves.setdefault(_llave(medidor), []).append(medidor)
+
+        with self.engine.connect() as con:
+            filas = con.execute(self._queries[marca], {'medidores': medidores}).all()
+        self.medidores += len(medidores)
+        self.consultas += 1
+
+        for medidor_catalogo, clave in filas:
+            # Como con LIMIT 1, se toma la primera fila de cada medidor
+            for medidor in llaves.pop(_llave(medidor_catalogo), []):
+                claves[medidor] = clave
+        return claves
+
+    async def resolver_lote(self, solicitudes, marca=None, columna_marca='MARCA'):
+        """
+        Normaliza los medidores del lote y resuelve sus claves con una consulta por marca.
+
+        Args:
+            solicitudes (iterable): Filas de solicitudes con la columna `MEDIDOR`.
+            marca (str, opcional): Marca de todas las solicitudes; si no se indica se lee de `columna_marca`.
+            columna_marca (str): Columna con la marca de cada solicitud.
+
+        Returns:
+            dict: `(marca, medidor normalizado)` -> clave.
+        """
+        por_marca = {}
+        for solicitud in solicitudes:
+            marca_solicitud = marca or solicitud[columna_marca]
+            if marca_solicitud in TABLAS_UNIVERSO:
+                por_marca.setdefault(marca_solicitud, set()).add(normalizar_medidor(marca_solicitud, solicitud['MEDIDOR']))
+
+        claves = {}
+        for marca_solicitud, medidores in por_marca.items():
+            try:
+                resueltas = await ejecutar_en_hilo(self.resolver, marca_solicitud, medidores)
+            except Exception as e:
+                # Sin el mapa, cada solicitud busca su clave por separado
+                logging.error(f"Error al resolver claves {marca_solicitud} por lote: {e}")
+                continue
+            claves.update({(marca_solicitud, medidor): clave for medidor, clave in resueltas.items()})
+
+        if claves:
+            logging.info(f"{len(claves)} claves resueltas con {len(por_marca)} consultas")
+        return claves
@@ -0,0 +1,111 @@
+"""
+## Cola de solicitudes con reclamo atómico
+
+Permite que varias instancias de un bot compartan la misma tabla de solicitudes (`proceso_bot` o
+`bot_solicitudes_me`). Cada instancia reclama un lote de filas con una sola sentencia `UPDATE`, que
+marca `PROCESO = 1` y escribe el identificador del trabajador y el vencimiento del arriendo (lease).
+Como la sentencia es atómica en MySQL, dos instancias nunca reclaman la misma fila.
+
+Si una instancia se cae después de reclamar, el arriendo vence y otra instancia vuelve a tomar la
+fila, hasta `intentos_maximos` veces. Una fila atendida sin mensaje que enviar se libera dejando
+`LEASE_HASTA` en NULL (ver `escritor_estados.py`) para que no se vuelva a reclamar.
+
+Requiere las columnas `WORKER_ID`, `LEASE_HASTA` e `INTENTOS` descritas en `esquema.sql`.
+"""
+
+from sqlalchemy import text
+import logging
+import os
+import socket
+import uuid
+
+import pandas as pd
+
+from acceso_datos import ejecutar_en_hilo
+
+
+class ColaSolicitudes:
+    """
+    ## Clase ColaSolicitudes:
+    Reclama solicitudes pendientes de una tabla usando arriendos con vencimiento.
+
+    Args:
+        engine (Engine): Motor de SQLAlchemy.
+        tabla (str): Tabla de solicitudes.
+        columna_id (str): Columna que identifica la fila (`ITEM` o `id`).
+        filtro (str, opcional): Condición SQL adicional para las filas pendientes, comenzando con `AND`.
+        lote (int, opcional): Filas a reclamar por ciclo; por defecto `SOLICITUDES_LOTE` o 50.
+        lease_segundos (int, opcional): Duración del arriendo; por defecto `SOLICITUDES_LEASE` o 120.
+        intentos_maximos (int, opcional): Reclamos permitidos por fila; por defecto `SOLICITUDES_INTENTOS` o 3.
+        worker_id (str, opcional): Identificador del trabajador; por defecto `host-pid`.
+    """
+
+    def __init__(self, engine, tabla, columna_id, filtro='', lote=None, lease_segundos=None,
+                 intentos_maximos=None, worker_id=None):
+        self.engine = engine
+        self.tabla = tabla
+        self.columna_id = columna_id
+        self.filtro = filtro
+        self.lote = lote or int(os.getenv('SOLICITUDES_LOTE', 50))
+        self.lease_segundos = lease_segundos or int(os.getenv('SOLICITUDES_LEASE', 120))
+        self.intentos_maximos = intentos_maximos or int(os.getenv('SOLICITUDES_INTENTOS', 3))
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+
+        # Condición de las filas que se pueden reclamar; la usa también el sondeo compartido de bots.py
+        self.condicion_pendientes = (
+            f"ENVIADO = 0 AND INTENTOS < {int(self.intentos_maximos)} "
+            f"AND (PROCESO = 0 OR LEASE_HASTA < NOW()) {filtro}"
+        )
+
+        self._query_reclamar = text(f"""
+            UPDATE {tabla}
+            SET PROCESO = '1',
+                WORKER_ID = :token,
+                LEASE_HASTA = DATE_ADD(NOW(), INTERVAL :lease SECOND),
+                INTENTOS = INTENTOS + 1
+            WHERE {self.condicion_pendientes}
+            ORDER BY {columna_id}
+            LIMIT :lote
+        """)
+        self._query_reclamadas = text(f"SELECT * FROM {tabla} WHERE WORKER_ID = :token AND ENVIADO = 0 ORDER BY {columna_id};")
+        self._query_pendientes = text(f"SELECT COUNT(*) FROM {tabla} WHERE {self.condicion_pendientes}")
+
+    def reclamar(self):
+        """
+        Reclama hasta `lote` solicitudes pendientes o con arriendo vencido.
+
+        Returns:
+            pd.DataFrame: Filas reclamadas por este trabajador en este ciclo.
+        """
+        # Un token por reclamo distingue este lote de los anteriores del mismo trabajador
+        token = f"{self.worker_id}:{uuid.uuid4().hex[:8]}"
+        with self.engine.begin() as con:
+            reclamadas = con.execute(self._query_reclamar, {
+                'token': token,
+                'lease': self.lease_segundos,
+                'lote': self.lote
+            }).rowcount
+            if not reclamadas:
+                return pd.DataFrame()
+            resultado = con.execute(self._query_reclamadas, {'token': token})
+            solicitudes = pd.DataFrame(resultado.all(), columns=list(resultado.keys()))
+
+        logging.info(f"{self.worker_id} reclamó {reclamadas} solicitudes de {self.tabla}")
+        return solicitudes
+
+    def contar_pendientes(self):
+        """
+        Cuenta las solicitudes que se pueden reclamar (el backlog de la cola).
+
+        Returns:
+            int: Filas pendientes o con arriendo vencido.
+        """
+        with self.engine.connect() as con:
+            return con.execute(self._query_pendientes).scalar()
+
+    async def reclamar_async(self):
+        """
+        Igual que `reclamar`, ejecutado en el pool de hilos de base de datos.
+        """
+        return await ejecutar_en_hilo(self.reclamar)
+
@@ -0,0 +1,386 @@
+"""
+## Porcentajes de comunicación por ventanas
+
+Calcula los porcentajes de comunicación del reporte 2 (Union y Hexing) con una sola consulta por
+clave. La consulta trae las fechas distintas "sin lectura" de la ventana más larga, ordenadas; cada
+ventana (7 días, 1 mes, 3 meses, 1 año...) se cuenta después con una búsqueda binaria sobre esas
+fechas, en lugar de un `COUNT(DISTINCT FECHA)` con su propio recorrido de la tabla por ventana.
+
+Los resultados son los mismos que daba la consulta anterior en MySQL:
+- Las ventanas van de `DATE_SUB(CURDATE(), INTERVAL n ...)` a `CURDATE()`, ambos inclusive, con la
+  fecha de hoy tomada del servidor y el ajuste de fin de mes de `DATE_SUB`.
+- El porcentaje `(total - sin_lectura) / total * 100` se redondea con la misma escala decimal que
+  MySQL usa en la división (`div_precision_increment` = 4).
+
+`RollupComunicacion` mantiene además un resumen diario por clave (`bot_comunicacion_diaria`); cuando
+está al día, los porcentajes se leen de ahí con una búsqueda por índice en lugar de la tabla de origen.
+"""
+
+from bisect import bisect_left, bisect_right
+from calendar import monthrange
+from datetime import date, datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from sqlalchemy import text
+import logging
+import time
+
+import pandas as pd
+
+from acceso_datos import ejecutar_en_hilo
+
+
+def restar_meses(fecha, meses):
+    """
+    Resta meses a una fecha igual que `DATE_SUB(fecha, INTERVAL n MONTH)`: si el día no existe en el
+    mes de destino se usa el último día de ese mes.
+
+    Args:
+        fecha (date): Fecha de partida.
+        meses (int): Cantidad de meses a restar.
+
+    Returns:
+        date: Fecha resultante.
+    """
+    indice = fecha.year * 12 + fecha.month - 1 - meses
+    anio, mes = divmod(indice, 12)
+    mes += 1
+    return date(anio, mes, min(fecha.day, monthrange(anio, mes)[1]))
+
+
+def _dias(n):
+    return lambda hoy: hoy - timedelta(days=n)
+
+
+def _meses(n):
+    return lambda hoy: restar_meses(hoy, n)
+
+
+def _total_dias_fijo(n):
+    # `SELECT 7 AS TotalDias`
+    return lambda inicio, hoy: Decimal(n)
+
+
+def _total_dias(inicio, hoy):
+    # `DATEDIFF(CURDATE(), inicio) + 1`
+    return Decimal((hoy - inicio).days + 1)
+
+
+def _total_intervalos(inicio, hoy):
+    # `TIMESTAMPDIFF(MINUTE, inicio, CURDATE()) / 15`, con escala 4
+    minutos = (hoy - inicio).days * 24 * 60
+    return (Decimal(minutos) / 15).quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)
+
+
+# Configuración por marca: tabla, evento, ventanas (columna, inicio, total) y escala del resultado
+MARCAS = {
+    'Union': {
+        'tabla': 'pnrp.Alarmas_Union_Consumo',
+        'evento': 'Día sin lectura',
+        'ventanas': [
+            ('PorcentajeComunicacion7Dias', _dias(7), _total_dias_fijo(7)),
+            ('PorcentajeComunicacion1Mes', _meses(1), _total_dias),
+            ('PorcentajeComunicacion3Meses', _meses(3), _total_dias),
+            ('PorcentajeComunicacion1Ano', _meses(12), _total_dias),
+        ],
+        'desde': 'DATE_SUB(CURDATE(), INTERVAL 1 YEAR)',
+        'escala': 4,
+    },
+    'Hexing': {
+        'tabla': 'pnrp.airflow_hexing_sinlectura',
+        'evento': 'Sin Lectura',
+        'ventanas': [
+            ('PorcentajeComunicacion7Dias', _dias(7), _total_intervalos),
+            ('PorcentajeComunicacion30Dias', _dias(30), _total_intervalos),
+        ],
+        'desde': 'DATE_SUB(CURDATE(), INTERVAL 30 DAY)',
+        # (total con escala 4 - sin lectura) / total suma otros 4 decimales
+        'escala': 8,
+    },
+}
+
+
+def _como_datetime(valor):
+    if isinstance(valor, datetime):
+        return valor
+    return datetime(valor.year, valor.month, valor.day)
+
+
+def porcentaje(total, sin_lectura, escala):
+    """
+    Calcula `(total - sin_lectura) / total * 100` con el redondeo de MySQL.
+
+    Args:
+        total (Decimal): Días o intervalos de la ventana.
+        sin_lectura (int): Días o intervalos distintos sin lectura.
+        escala (int): Decimales del cociente.
+
+    Returns:
+        Decimal: Porcentaje de comunicación.
+    """
+    cociente = ((total - sin_lectura) / total).quantize(Decimal(1).scaleb(-escala), rounding=ROUND_HALF_UP)
+    return cociente * 100
+
+
+def _calcular(hoy, marca, contar):
+    configuracion = MARCAS[marca]
+    resultado = {}
+    for columna, calcular_inicio, calcular_total in configuracion['ventanas']:
+        inicio = calcular_inicio(hoy)
+        resultado[columna] = porcentaje(calcular_total(inicio, hoy), contar(inicio), configuracion['escala'])
+    return resultado
+
+
+def calcular_porcentajes(fechas, hoy, marca):
+    """
+    Calcula los porcentajes de todas las ventanas de una marca a partir de las fechas sin lectura.
+
+    Args:
+        fechas (list): Fechas distintas sin lectura (date o datetime), ordenadas de menor a mayor.
+        hoy (date): Fecha actual del servidor (`CURDATE()`).
+        marca (str): Union o Hexing.
+
+    Returns:
+        dict: Porcentaje (Decimal) por columna, con los mismos nombres que la consulta anterior.
+    """
+    fechas = [_como_datetime(fecha) for fecha in fechas]
+    # `FECHA BETWEEN inicio AND CURDATE()` compara contra la medianoche de cada extremo
+    fin = bisect_right(fechas, _como_datetime(hoy))
+    return _calcular(hoy, marca, lambda inicio: fin - bisect_left(fechas, _como_datetime(inicio), 0, fin))
+
+
+def calcular_porcentajes_diarios(dias, hoy, marca):
+    """
+    Calcula los porcentajes de todas las ventanas de una marca a partir del resumen diario.
+
+    Args:
+        dias (list): Tuplas `(fecha, sin_lectura, sin_lectura_medianoche)` de `bot_comunicacion_diaria`,
+            ordenadas por fecha.
+        hoy (date): Fecha actual del servidor (`CURDATE()`).
+        marca (str): Union o Hexing.
+
+    Returns:
+        dict: Porcentaje (Decimal) por columna, con los mismos nombres que la consulta anterior.
+    """
+    fechas = [fecha for fecha, _, _ in dias]
+    acumulado = [0]
+    for _, sin_lectura, _ in dias:
+        acumulado.append(acumulado[-1] + sin_lectura)
+
+    # De hoy solo cuenta la medianoche, igual que `BETWEEN inicio AND CURDATE()`
+    fin = bisect_left(fechas, hoy)
+    medianoche_hoy = dias[fin][2] if fin < len(dias) and fechas[fin] == hoy else 0
+    return _calcular(hoy, marca, lambda inicio: acumulado[fin] - acumulado[bisect_left(fechas, inicio, 0, fin)] + medianoche_hoy)
+
+
+class RollupComunicacion:
+    """
+    ## Clase RollupComunicacion:
+    Mantiene `bot_comunicacion_diaria`: por marca, clave y día, la cantidad de fechas distintas sin
+    lectura y cuántas de ellas son exactamente la medianoche. Guarda un año móvil.
+
+    La actualización es incremental: solo se recalculan los días desde el último día del resumen, y
+    solo cuando la fecha más reciente de la tabla de origen avanzó desde la última construcción
+    (es decir, cuando terminó una carga de Airflow). `GET_LOCK` evita que dos instancias construyan a la vez.
+
+    Requiere las tablas `bot_comunicacion_diaria` y `bot_comunicacion_control` de `esquema.sql`.
+
+    Args:
+        engine (Engine): Motor de SQLAlchemy.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._vigente = {marca: False for marca in MARCAS}
+        self._query_origen = {
+            marca: text(f"SELECT MAX(FECHA) FROM {configuracion['tabla']} WHERE NOMBRE_EVENTO = :evento;")
+            for marca, configuracion in MARCAS.items()
+        }
+        self._query_insertar = {
+            marca: text(f"""
+                INSERT INTO bot_comunicacion_diaria (MARCA, CLAVE, FECHA, SIN_LECTURA, SIN_LECTURA_MEDIANOCHE)
+                SELECT :marca, CLAVE, DATE(FECHA), COUNT(DISTINCT FECHA),
+                       COUNT(DISTINCT CASE WHEN FECHA = DATE(FECHA) THEN FECHA END)
+                FROM {configuracion['tabla']}
+                WHERE NOMBRE_EVENTO = :evento
+                  AND FECHA >= :desde
+                GROUP BY CLAVE, DATE(FECHA);
+            """)
+            for marca, configuracion in MARCAS.items()
+        }
+        self._query_control = text("SELECT FECHA_ORIGEN FROM bot_comunicacion_control WHERE MARCA = :marca;")
+        self._query_ultimo_dia = text("SELECT MAX(FECHA) FROM bot_comunicacion_diaria WHERE MARCA = :marca;")
+        self._query_borrar = text("DELETE FROM bot_comunicacion_diaria WHERE MARCA = :marca AND (FECHA >= :desde OR FECHA < DATE_SUB(CURDATE(), INTERVAL 1 YEAR));")
+        self._query_guardar_control = text("""
+            INSERT INTO bot_comunicacion_control (MARCA, FECHA_ORIGEN, CONSTRUIDO)
+            VALUES (:marca, :fecha_origen, NOW())
+            ON DUPLICATE KEY UPDATE FECHA_ORIGEN = VALUES(FECHA_ORIGEN), CONSTRUIDO = VALUES(CONSTRUIDO);
+        """)
+
+    def vigente(self, marca):
+        """
+        Indica si el resumen de la marca está al día con su tabla de origen.
+
+        Args:
+            marca (str): Union o Hexing.
+
+        Returns:
+            bool: True si se puede leer el resumen en lugar de la tabla de origen.
+        """
+        return self._vigente.get(marca, False)
+
+    def _construir(self, con, marca, fecha_origen):
+        ultimo_dia = con.execute(self._query_ultimo_dia, {'marca': marca}).scalar()
+        if ultimo_dia is None:
+            # Primera construcción: el año completo
+            desde = con.execute(text("SELECT DATE_SUB(CURDATE(), INTERVAL 1 YEAR);")).scalar()
+        else:
+            # El último día pudo quedar incompleto, se recalcula junto con los nuevos
+            desde = ultimo_dia
+
+        inicio = time.perf_counter()
+        borradas = con.execute(self._query_borrar, {'marca': marca, 'desde': desde}).rowcount
+        insertadas = con.execute(self._query_insertar[marca], {'marca': marca, 'evento': MARCAS[marca]['evento'], 'desde': desde}).rowcount
+        con.execute(self._query_guardar_control, {'marca': marca, 'fecha_origen': fecha_origen})
+        duracion = time.perf_counter() - inicio
+
+        logging.info(f"Resumen de comunicación {marca} desde {desde}: {insertadas} filas insertadas, {borradas} borradas en {duracion:.2f} s")
+        return insertadas
+
+    def actualizar(self, marca):
+        """
+        Actualiza el resumen de una marca si su tabla de origen tiene datos nuevos.
+
+        Args:
+            marca (str): Union o Hexing.
+
+        Returns:
+            int | None: Filas insertadas, o None si no hubo que construir.
+        """
+        with self.engine.begin() as con:
+            fecha_origen = con.execute(self._query_origen[marca], {'evento': MARCAS[marca]['evento']}).scalar()
+            fecha_control = con.execute(self._query_control, {'marca': marca}).scalar()
+            if fecha_origen is None or (fecha_control is not None and fecha_control >= fecha_origen):
+                self._vigente[marca] = fecha_control is not None
+                return None
+
+            # Otra instancia está construyendo; se reintenta en el siguiente ciclo
+            if not con.execute(text("SELECT GET_LOCK('bot_comunicacion_diaria', 0);")).scalar():
+                self._vigente[marca] = False
+                return None
+            try:
+                insertadas = self._construir(con, marca, fecha_origen)
+            finally:
+                con.execute(text("SELECT RELEASE_LOCK('bot_comunicacion_diaria');"))
+
+        self._vigente[marca] = True
+        return insertadas
+
+    async def actualizar_todas(self, context=None):
+        """
+        Actualiza el resumen de todas las marcas. Pensada para ejecutarse desde el JobQueue.
+
+        Args:
+            context (CallbackContext, opcional): Contexto del JobQueue.
+        """
+        for marca in MARCAS:
+            try:
+                await ejecutar_en_hilo(self.actualizar, marca)
+            except Exception as e:
+                self._vigente[marca] = False
+                logging.error(f"Error al actualizar el resumen de comunicación {marca}: {e}")
+
+
+class MotorComunicacion:
+    """
+    ## Clase MotorComunicacion:
+    Obtiene los porcentajes de comunicación de una clave con una sola consulta: sobre el resumen
+    diario si está al día, o sobre la tabla de origen si no.
+
+    Args:
+        engine (Engine): Motor de SQLAlchemy.
+        rollup (RollupComunicacion, opcional): Resumen diario a usar cuando esté vigente.
+    """
+
+    def __init__(self, engine, rollup=None):
+        self.engine = engine
+        self.rollup = rollup
+        self._queries = {
+            marca: text(f"""
+                SELECT CURDATE() AS HOY, SL.FECHA
+                FROM (SELECT 1) AS X
+                LEFT JOIN (
+                    SELECT DISTINCT FECHA
+                    FROM {configuracion['tabla']}
+                    WHERE CLAVE = :clave
+                      AND NOMBRE_EVENTO = :evento
+                      AND FECHA BETWEEN {configuracion['desde']} AND CURDATE()
+                ) AS SL ON 1=1
+                ORDER BY SL.FECHA;
+            """)
+            for marca, configuracion in MARCAS.items()
+        }
+        self._query_diaria = text("""
+            SELECT CURDATE() AS HOY, D.FECHA, D.SIN_LECTURA, D.SIN_LECTURA_MEDIANOCHE
+            FROM (SELECT 1) AS X
+            LEFT JOIN (
+                SELECT FECHA, SIN_LECTURA, SIN_LECTURA_MEDIANOCHE
+                FROM bot_comunicacion_diaria
+                WHERE MARCA = :marca
+                  AND CLAVE = :clave
+                  AND FECHA BETWEEN DATE_SUB(CURDATE(), INTERVAL 1 YEAR) AND CURDATE()
+            ) AS D ON 1=1
+            ORDER BY D.FECHA;
+        """)
+
+    def consultar(self, marca, clave):
+        """
+        Trae la fecha del servidor y las fechas sin lectura de la ventana más larga.
+
+        Args:
+            marca (str): Union o Hexing.
+            clave (str): Clave del medidor.
+
+        Returns:
+            tuple: Fecha actual del servidor y lista ordenada de fechas sin lectura.
+        """
+        with self.engine.connect() as con:
+            filas = con.execute(self._queries[marca], {'clave': str(clave), 'evento': MARCAS[marca]['evento']}).all()
+        hoy = filas[0][0]
+        return hoy, [fecha for _, fecha in filas if fecha is not None]
+
+    def consultar_diaria(self, marca, clave):
+        """
+        Trae la fecha del servidor y los días de la clave en `bot_comunicacion_diaria`.
+
+        Args:
+            marca (str): Union o Hexing.
+            clave (str): Clave del medidor.
+
+        Returns:
+            tuple: Fecha actual del servidor y lista ordenada de `(fecha, sin_lectura, sin_lectura_medianoche)`.
+        """
+        with self.engine.connect() as con:
+            filas = con.execute(self._query_diaria, {'marca': marca, 'clave': str(clave)}).all()
+        hoy = filas[0][0]
+        return hoy, [tuple(fila[1:]) for fila in filas if fila[1] is not None]
+
+    async def porcentajes(self, marca, clave):
+        """
+        Calcula los porcentajes de comunicación de una clave.
+
+        Args:
+            marca (str): Union o Hexing.
+            clave (str): Clave del medidor.
+
+        Returns:
+            pd.DataFrame: Una fila con un porcentaje por ventana, como la consulta anterior.
+        """
+        if self.rollup is not None and self.rollup.vigente(marca):
+            hoy, dias = await ejecutar_en_hilo(self.consultar_diaria, marca, clave)
+            resultado = calcular_porcentajes_diarios(dias, hoy, marca)
+        else:
+            hoy, fechas = await ejecutar_en_hilo(self.consultar, marca, clave)
+            resultado = calcular_porcentajes(fechas, hoy, marca)
+        # `read_sql_query` convertía los DECIMAL de MySQL a float
+        return pd.DataFrame([{columna: float(valor) for columna, valor in resultado.items()}])
@@ -0,0 +1,216 @@
+"""
+## Pool de conexiones a MySQL
+
+Crea el motor de SQLAlchemy con un pool configurable por variables de entorno y lo instrumenta:
+
+- `DB_POOL_TAMANO` (por defecto `DB_HILOS` o 8): conexiones que se mantienen abiertas. Conviene que
+  sea igual a la cantidad de hilos de `acceso_datos.py`, que son los que usan las conexiones.
+- `DB_POOL_OVERFLOW` (por defecto 2): conexiones adicionales permitidas en picos.
+- `DB_POOL_TIMEOUT` (por defecto 30): segundos máximos de espera por una conexión libre.
+- `DB_POOL_RECYCLE` (por defecto 1800): segundos tras los que una conexión se reabre, antes de que
+  MySQL la cierre por inactividad.
+- `DB_POOL_PRE_PING` (por defecto 1): verifica la conexión antes de usarla y la reabre si se cayó,
+  en lugar de devolver el error al usuario.
+- `DB_CONNECT_TIMEOUT` (por defecto 10): segundos máximos para abrir una conexión (TLS incluido).
+
+`calentar` abre las conexiones al arrancar para que el primer usuario no pague el handshake TLS, y
+`estadisticas_pool` expone conexiones en uso, overflow, esperas y reconexiones.
+
+`engine_pnrp` arma el motor de la base de datos de los bots (`DB_USER`, `DB_PASSWORD`, `DB_HOST`,
+`DB_NAME` y los certificados `SSL_CERT_PATH` / `SSL_KEY_PATH`) una sola vez por proceso: si los dos
+bots corren en el mismo proceso (ver `bots.py`) comparten el motor y su pool. Con `DB_URL` se usa esa
+URL completa, sin certificados (por ejemplo la base local de `benchmark.py`).
+"""
+
+import logging
+import os
+import threading
+import time
+import urllib.parse
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import QueuePool
+
+from metricas import REGISTRO_METRICAS, instrumentar_engine
+
+
+class EstadisticasPool:
+    """
+    ## Clase EstadisticasPool:
+    Contadores del pool de conexiones. Se actualizan desde los hilos de base de datos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.esperas = 0
+        self.espera_total = 0.0
+        self.espera_maxima = 0.0
+        self.conexiones_creadas = 0
+        self.reconexiones = 0
+
+    def registrar_espera(self, segundos):
+        with self._lock:
+            self.esperas += 1
+            self.espera_total += segundos
+            self.espera_maxima = max(self.espera_maxima, segundos)
+
+    def registrar_conexion(self):
+        with self._lock:
+            self.conexiones_creadas += 1
+
+    def registrar_reconexion(self):
+        with self._lock:
+            self.reconexiones += 1
+
+
+class PoolInstrumentado(QueuePool):
+    """
+    ## Clase PoolInstrumentado:
+    `QueuePool` que mide cuánto espera cada hilo para obtener una conexión (incluida la apertura de
+    conexiones nuevas).
+    """
+
+    estadisticas = None
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if self.estadisticas is not None:
+                self.estadisticas.registrar_espera(time.perf_counter() - inicio)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.estadisticas = self.estadisticas
+        return pool
+
+
+def crear_engine(url, connect_args=None):
+    """
+    Crea el motor de SQLAlchemy con el pool configurado e instrumentado.
+
+    Args:
+        url (str): URL de conexión.
+        connect_args (dict, opcional): Argumentos del driver (por ejemplo, los certificados SSL).
+
+    Returns:
+        Engine: Motor de SQLAlchemy.
+    """
+    connect_args = dict(connect_args or {})
+    if url.startswith('mysql'):
+        connect_args.setdefault('connect_timeout', int(os.getenv('DB_CONNECT_TIMEOUT', 10)))
+
+    engine = create_engine(
+        url,
+        connect_args=connect_args,
+        poolclass=PoolInstrumentado,
+        pool_size=int(os.getenv('DB_POOL_TAMANO', os.getenv('DB_HILOS', 8))),
+        max_overflow=int(os.getenv('DB_POOL_OVERFLOW', 2)),
+        pool_timeout=int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        pool_recycle=int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        pool_pre_ping=os.getenv('DB_POOL_PRE_PING', '1') == '1',
+    )
+
+    estadisticas = EstadisticasPool()
+    engine.pool.estadisticas = estadisticas
+
+    @event.listens_for(engine, 'connect')
+    def al_conectar(conexion, registro):
+        estadisticas.registrar_conexion()
+
+    @event.listens_for(engine, 'invalidate')
+    def al_invalidar(conexion, registro, excepcion):
+        # Una conexión caída (detectada por pre-ping o por un error) se reabre en el siguiente uso
+        estadisticas.registrar_reconexion()
+        logging.warning(f"Conexión a la base de datos invalidada, se reabrirá: {excepcion}")
+
+    # Duración y errores de cada sentencia (ver metricas.py)
+    instrumentar_engine(engine)
+    return engine
+
+
+_engines = {}
+_lock_engines = threading.Lock()
+
+
+def engine_pnrp():
+    """
+    Devuelve el motor de la base de datos de los bots, creándolo la primera vez.
+
+    Returns:
+        Engine: Motor de SQLAlchemy compartido por todos los módulos del proceso.
+    """
+    url = os.getenv('DB_URL')
+    connect_args = {}
+    if not url:
+        usuario = os.getenv('DB_USER')
+        contrasena = urllib.parse.quote_plus(os.getenv('DB_PASSWORD'))
+        url = f"mysql+pymysql://{usuario}:{contrasena}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
+        connect_args = {
+            'ssl_cert': os.getenv('SSL_CERT_PATH'),
+            'ssl_key': os.getenv('SSL_KEY_PATH')
+        }
+    with _lock_engines:
+        engine = _engines.get(url)
+        if engine is None:
+            engine = _engines[url] = crear_engine(url, connect_args=connect_args)
+            REGISTRO_METRICAS.estadisticas('bot_pool', lambda: estadisticas_pool(engine))
+    return engine
+
+
+def calentar(engine, conexiones=None):
+    """
+    Abre conexiones del pool al arrancar, para que las primeras consultas no paguen el handshake TLS.
+
+    Args:
+        engine (Engine): Motor de SQLAlchemy.
+        conexiones (int, opcional): Conexiones a abrir; por defecto `DB_POOL_CALENTAR` o el tamaño del pool.
+
+    Returns:
+        int: Conexiones abiertas.
+    """
+    conexiones = conexiones or int(os.getenv('DB_POOL_CALENTAR', engine.pool.size()))
+    inicio = time.perf_counter()
+    abiertas = []
+    try:
+        # Se mantienen todas tomadas a la vez para que el pool abra conexiones distintas
+        for _ in range(conexiones):
+            conexion = engine.connect()
+            abiertas.append(conexion)
+            conexion.execute(text("SELECT 1"))
+    finally:
+        for conexion in abiertas:
+            conexion.close()
+
+    logging.info(f"Pool de conexiones calentado: {len(abiertas)} conexiones en {time.perf_counter() - inicio:.2f} s")
+    return len(abiertas)
+
+
+def estadisticas_pool(engine):
+    """
+    Devuelve el estado y los contadores del pool de conexiones.
+
+    Args:
+        engine (Engine): Motor de SQLAlchemy.
+
+    Returns:
+        dict: Tamaño, conexiones en uso y libres, overflow, esperas y reconexiones.
+    """
+    pool = engine.pool
+    estadisticas = pool.estadisticas
+    resultado = {
+        'tamano': pool.size(),
+        'en_uso': pool.checkedout(),
+        'libres': pool.checkedin(),
+        'overflow': pool.overflow(),
+    }
+    if estadisticas is not None:
+        resultado.update({
+            'esperas': estadisticas.esperas,
+            'espera_promedio': estadisticas.espera_total / estadisticas.esperas if estadisticas.esperas else 0.0,
+            'espera_maxima': estadisticas.espera_maxima,
+            'conexiones_creadas': estadisticas.conexiones_creadas,
+            'reconexiones': estadisticas.reconexiones,
+        })
+    return resultado
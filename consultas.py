@@ -0,0 +1,152 @@
+"""
+## Catálogo de consultas de los reportes
+
+Todas las consultas de lectura de los bots, con nombre y parámetros enlazados (`:medidor`, `:clave`).
+Se construyen una sola vez al importar el módulo y se reutilizan: SQLAlchemy guarda la compilación de
+cada sentencia en su caché, y ningún texto SQL se arma con datos del usuario.
+
+Los medidores y las claves se envían siempre como texto, igual que el tipo de `MEDIDOR_CATALOGO` y
+`CLAVE` en las tablas, para que MySQL compare sin convertir la columna y pueda usar sus índices.
+
+Las órdenes de servicio y la bitácora se leen por páginas de `REPORTE_PAGINA` filas (por defecto 10)
+con paginación por clave (keyset): la página siguiente continúa después de la fecha y el desempate de
+la última fila mostrada, sin `OFFSET`, así que cada página cuesta lo mismo sin importar cuántas haya
+antes. Se lee una fila de más para saber si hay otra página.
+
+- Se ordena por la columna de fecha tal cual y por un desempate único (`OS`, `ID_BITACORA`), de modo
+  que el índice `(clave, fecha, desempate)` de `esquema.sql` sirve al orden y al cursor, y ninguna
+  fila se repite ni se pierde en el borde de una página.
+- Las fechas nulas van al final, como en el `ORDER BY ... DESC` original (MySQL ordena los NULL como
+  el menor valor). El cursor dice si la última fila tenía la fecha nula (`consulta_pagina`): mientras
+  no, la página siguiente es `nombre_siguiente`, que incluye las filas sin fecha; después,
+  `nombre_siguiente_nulas` recorre solo las filas sin fecha por el desempate.
+
+Las consultas que dependen de la tabla (cola, estados, claves por lote y comunicación) viven en sus
+propios módulos y también usan parámetros enlazados.
+"""
+
+import os
+
+from sqlalchemy import text
+
+
+# Filas por página de los reportes paginados
+TAMANO_PAGINA = int(os.getenv('REPORTE_PAGINA', 10))
+
+
+CONSULTAS = {
+    # Elster
+    'elster_clave': text("SELECT CLAVE_CATALOGO FROM pnrp.airflow_elster_universo WHERE MEDIDOR_CATALOGO = :medidor LIMIT 1;"),
+    'elster_informacion': text("SELECT * FROM pnrp.airflow_elster_universo WHERE MEDIDOR_CATALOGO = :medidor;"),
+    'elster_comunicacion': text("SELECT * FROM pnrp.ws_elster_rele WHERE device_name = :medidor;"),
+    'elster_alarmas': text("""
+        SELECT NOMBRE_EVENTO, MAX(FECHA) AS FECHA, COUNT(NOMBRE_EVENTO) AS CANTIDAD
+        FROM pnrp.airflow_elster_alarmas
+        WHERE medidor = :medidor
+        GROUP BY NOMBRE_EVENTO ORDER BY FECHA DESC LIMIT 30;
+    """),
+
+    # Hexing
+    'hexing_clave': text("SELECT CLAVE_CATALOGO FROM pnrp.airflow_hexing_universo WHERE MEDIDOR_CATALOGO = :medidor LIMIT 1;"),
+    'hexing_informacion': text("SELECT * FROM pnrp.airflow_hexing_universo WHERE MEDIDOR_CATALOGO = :medidor;"),
+    'hexing_comunicacion': text("SELECT * FROM pnrp.airflow_hexing_ulti_comu WHERE clave = :clave OR medidor = :medidor;"),
+    'hexing_alarmas': text("""
+        SELECT ALARM_DESC, MAX(FECHA) AS FECHA, COUNT(ALARM_DESC) AS CANTIDAD
+        FROM pnrp.airflow_hexing_alarmas
+        WHERE clave = :clave
+        GROUP BY ALARM_DESC ORDER BY FECHA DESC LIMIT 30;
+    """),
+
+    # Union
+    'union_clave': text("SELECT CLAVE_CATALOGO FROM pnrp.airflow_union_universo WHERE MEDIDOR_CATALOGO = :medidor LIMIT 1;"),
+    'union_informacion': text("SELECT * FROM pnrp.airflow_union_universo WHERE CLAVE_CATALOGO = :clave;"),
+    'union_comunicacion': text("SELECT * FROM pnrp.airflow_union_ulti_comu WHERE CLAVE = :clave;"),
+    'union_alarmas': text("""
+        SELECT NOMBRE_EVENTO, MAX(FECHA) AS FECHA, COUNT(NOMBRE_EVENTO) AS CANTIDAD
+        FROM pnrp.Alarmas_Union_Consumo
+        WHERE clave = :clave
+        GROUP BY NOMBRE_EVENTO ORDER BY FECHA DESC LIMIT 30;
+    """),
+
+    # Comunes
+    'planificacion_me_por_clave': text("SELECT * FROM pnrp.bot_planificacion_me WHERE CLAVE = :clave ORDER BY FECHA_PLANIFICACION DESC;"),
+}
+
+
+def _paginada(tabla, filtro, fecha, desempate):
+    # Primera página, página siguiente y página siguiente entre las fechas nulas, ordenadas por
+    # fecha y desempate descendentes
+    seleccion = f"SELECT *, {fecha} AS ORDEN_FECHA, {desempate} AS ORDEN_DESEMPATE FROM {tabla} WHERE ({filtro})"
+    final = f"ORDER BY {fecha} DESC, {desempate} DESC LIMIT {TAMANO_PAGINA + 1};"
+    siguiente = f"AND ({fecha} < :fecha OR ({fecha} = :fecha AND {desempate} < :desempate) OR {fecha} IS NULL)"
+    siguiente_nulas = f"AND {fecha} IS NULL AND {desempate} < :desempate"
+    return text(f"{seleccion} {final}"), text(f"{seleccion} {siguiente} {final}"), text(f"{seleccion} {siguiente_nulas} {final}")
+
+
+# Reportes paginados: nombre -> tabla, filtro, columna de fecha y columna de desempate, que debe ser
+# única (el número de orden `OS`; `ID_BITACORA` de `esquema.sql`). Cada uno tiene las consultas
+# `nombre` (primera página), `nombre_siguiente` (`:fecha`, `:desempate`) y `nombre_siguiente_nulas`
+# (`:desempate`); `consulta_pagina` elige la que corresponde al cursor.
+PAGINADAS = {
+    'elster_ordenes': ('pnrp.airflow_elster_os', "clave = :clave", 'FECHA_EJECUCION', 'OS'),
+    'hexing_ordenes': ('pnrp.airflow_hexing_os', "clave = :clave", 'FECHA_EJECUCION', 'OS'),
+    'union_ordenes': ('pnrp.airflow_union_os', "clave = :clave", 'FECHA_EJECUCION', 'OS'),
+    'bitacora': ('bitacora_ac', "clave = :clave AND ESTADO <> 'ANULADO' AND REQUIERE_OS = TRUE", 'fecha_asignacion', 'ID_BITACORA'),
+}
+
+for _nombre, (_tabla, _filtro, _fecha, _desempate) in PAGINADAS.items():
+    CONSULTAS[_nombre], CONSULTAS[f'{_nombre}_siguiente'], CONSULTAS[f'{_nombre}_siguiente_nulas'] = \
+        _paginada(_tabla, _filtro, _fecha, _desempate)
+
+
+def parametros(**valores):
+    """
+    Convierte los parámetros de una consulta del catálogo a texto, el tipo de las columnas.
+
+    Args:
+        **valores: Parámetros de la consulta (`medidor`, `clave`...).
+
+    Returns:
+        dict: Parámetros listos para la consulta.
+    """
+    return {nombre: None if valor is None else str(valor) for nombre, valor in valores.items()}
+
+
+def consulta_pagina(nombre, clave, cursor=None):
+    """
+    Elige la consulta de una página de un reporte paginado y arma sus parámetros.
+
+    Args:
+        nombre (str): Reporte de `PAGINADAS`.
+        clave (str): Clave del medidor.
+        cursor (dict, opcional): Cursor de la última fila de la página anterior (ver
+            `paginacion.cursor_fila`), o None para la primera página.
+
+    Returns:
+        tuple: Sentencia del catálogo y sus parámetros.
+    """
+    if cursor is None:
+        return CONSULTAS[nombre], parametros(clave=clave)
+    # La fecha y el desempate se enlazan con su tipo, para comparar con las columnas del índice
+    if cursor['fecha_nula']:
+        return CONSULTAS[f'{nombre}_siguiente_nulas'], {**parametros(clave=clave), 'desempate': cursor['desempate']}
+    return CONSULTAS[f'{nombre}_siguiente'], {**parametros(clave=clave), 'fecha': cursor['fecha'], 'desempate': cursor['desempate']}
+
+
+# Nombre de cada consulta del catálogo, por identidad de la sentencia (para las métricas)
+_NOMBRES = {id(consulta): nombre for nombre, consulta in CONSULTAS.items()}
+
+
+def nombre_consulta(sentencia):
+    """
+    Devuelve el nombre de una consulta del catálogo.
+
+    Args:
+        sentencia (TextClause | None): Sentencia ejecutada.
+
+    Returns:
+        str | None: Nombre en `CONSULTAS`, o None si la sentencia no es del catálogo.
+    """
+    if sentencia is None or CONSULTAS.get(_NOMBRES.get(id(sentencia))) is not sentencia:
+        return None
+    return _NOMBRES[id(sentencia)]
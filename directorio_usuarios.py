@@ -0,0 +1,111 @@
+"""
+## Directorio de usuarios autorizados
+
+Mantiene en memoria los usuarios autorizados de un bot en un diccionario indexado por `ID_TELEGRAM`,
+con su nombre completo y su rol. El directorio se carga una sola vez desde la base de datos y se
+refresca cuando vence su tiempo de vida (TTL) o cuando se invalida explícitamente, por ejemplo
+después de un registro.
+
+Así los manejadores verifican la autorización con una búsqueda en el diccionario en lugar de
+consultar la tabla completa en cada mensaje.
+"""
+
+from sqlalchemy import text
+import logging
+import threading
+import time
+
+from acceso_datos import ejecutar_en_hilo
+
+
+class DirectorioUsuarios:
+    """
+    ## Clase DirectorioUsuarios:
+    Directorio en memoria de los usuarios autorizados de una tabla.
+
+    Args:
+        engine (Engine): Motor de SQLAlchemy usado para cargar los usuarios.
+        tabla (str): Nombre de la tabla de usuarios autorizados.
+        ttl (int): Segundos que el directorio se considera vigente antes de recargarse.
+    """
+
+    def __init__(self, engine, tabla, ttl=300):
+        self.engine = engine
+        self.tabla = tabla
+        self.ttl = ttl
+        self._usuarios = {}
+        self._cargado_en = None
+        self._lock = threading.Lock()
+
+    def cargar(self):
+        """
+        Carga todos los usuarios con `ID_TELEGRAM` asignado y reemplaza el directorio actual.
+
+        Returns:
+            int: Cantidad de usuarios cargados.
+        """
+        query = text(f"SELECT ID_TELEGRAM, NOMBRE_COMPLETO, ROL FROM {self.tabla} WHERE ID_TELEGRAM IS NOT NULL;")
+        with self.engine.connect() as con:
+            filas = con.execute(query).all()
+
+        usuarios = {}
+        for id_telegram, nombre_completo, rol in filas:
+            try:
+                usuarios[int(id_telegram)] = {'NOMBRE_COMPLETO': nombre_completo, 'ROL': rol}
+            except (TypeError, ValueError):
+                logging.warning(f"ID_TELEGRAM inválido en {self.tabla}: {id_telegram}")
+
+        with self._lock:
+            self._usuarios = usuarios
+            self._cargado_en = time.monotonic()
+
+        logging.info(f"Directorio de usuarios {self.tabla} cargado: {len(usuarios)} usuarios")
+        return len(usuarios)
+
+    def invalidar(self):
+        """
+        Marca el directorio como vencido para que se recargue en la siguiente consulta.
+        """
+        with self._lock:
+            self._cargado_en = None
+
+    def vigente(self):
+        """
+        Indica si el directorio está cargado y no ha vencido su TTL.
+
+        Returns:
+            bool: True si no es necesario recargar.
+        """
+        cargado_en = self._cargado_en
+        return cargado_en is not None and (time.monotonic() - cargado_en) < self.ttl
+
+    def obtener(self, user_id):
+        """
+        Busca un usuario por su ID de Telegram, recargando el directorio si está vencido.
+
+        Args:
+            user_id (int): ID de Telegram del usuario.
+
+        Returns:
+            dict | None: Diccionario con `NOMBRE_COMPLETO` y `ROL`, o None si no está autorizado.
+        """
+        if not self.vigente():
+            self.cargar()
+        return self._usuarios.get(int(user_id))
+
+    async def obtener_async(self, user_id):
+        """
+        Igual que `obtener`, pero la recarga del directorio se ejecuta en el pool de hilos de base de datos.
+
+        Args:
+            user_id (int): ID de Telegram del usuario.
+
+        Returns:
+            dict | None: Diccionario con `NOMBRE_COMPLETO` y `ROL`, o None si no está autorizado.
+        """
+        if not self.vigente():
+            await ejecutar_en_hilo(self.cargar)
+        return self._usuarios.get(int(user_id))
+
+    def __contains__(self, user_id):
+        return self.obtener(user_id) is not None
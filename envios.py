@@ -0,0 +1,195 @@
+"""
+## Programador de envíos a Telegram
+
+Todos los mensajes de los reportes pasan por `ProgramadorEnvios`, que respeta los límites de Telegram
+en lugar de llamar a `send_message` directamente en el ciclo:
+
+- Cubeta de fichas global (`ENVIOS_POR_SEGUNDO`, por defecto 25, con ráfagas de hasta `ENVIOS_RAFAGA`,
+  por defecto 5): los envíos esperan su ficha en orden de llegada. En ningún segundo salen más de
+  `ENVIOS_POR_SEGUNDO + ENVIOS_RAFAGA` mensajes, por debajo de los ~30 por segundo de Telegram.
+- Separación por chat (`ENVIOS_INTERVALO_CHAT`, por defecto 1 segundo): los mensajes a un mismo chat
+  salen en orden y espaciados.
+- `RetryAfter`: se pausa todo envío durante los segundos que indica Telegram y se reintenta.
+- Errores de red o tiempo agotado: se reintenta con espera exponencial (1, 2, 4... hasta 30 segundos).
+- Hasta `ENVIOS_INTENTOS` intentos (por defecto 5) por mensaje.
+
+`enviar` termina cuando el mensaje fue entregado, así que la solicitud se marca como enviada solo
+después de la entrega. Si el envío falla se lanza `EnvioFallido`, que indica si el error es
+definitivo (el usuario bloqueó el bot, el mensaje es inválido) o si conviene reintentar más tarde.
+"""
+
+from datetime import timedelta
+import asyncio
+import logging
+import os
+import time
+
+from telegram.error import BadRequest, ChatMigrated, Forbidden, InvalidToken, NetworkError, RetryAfter
+
+
+class EnvioFallido(Exception):
+    """
+    Error de un mensaje que no se pudo entregar.
+
+    Args:
+        chat_id (int): Chat de destino.
+        error (Exception): Último error de Telegram.
+        definitivo (bool): True si reintentar no sirve (chat bloqueado, mensaje inválido).
+    """
+
+    def __init__(self, chat_id, error, definitivo):
+        super().__init__(f"No se pudo enviar el mensaje a {chat_id}: {error}")
+        self.chat_id = chat_id
+        self.error = error
+        self.definitivo = definitivo
+
+
+def _segundos(valor):
+    # RetryAfter.retry_after puede ser int o timedelta según la versión de python-telegram-bot
+    if isinstance(valor, timedelta):
+        return valor.total_seconds()
+    return float(valor)
+
+
+class ProgramadorEnvios:
+    """
+    ## Clase ProgramadorEnvios:
+    Envía mensajes respetando un límite global y una separación por chat, con reintentos.
+
+    Args:
+        por_segundo (float, opcional): Envíos por segundo en total; por defecto `ENVIOS_POR_SEGUNDO` o 25.
+        rafaga (int, opcional): Fichas máximas acumuladas; por defecto `ENVIOS_RAFAGA` o 5.
+        intervalo_chat (float, opcional): Segundos mínimos entre mensajes a un mismo chat; por
+            defecto `ENVIOS_INTERVALO_CHAT` o 1.
+        intentos (int, opcional): Intentos por mensaje; por defecto `ENVIOS_INTENTOS` o 5.
+    """
+
+    ESPERA_MAXIMA = 30
+
+    def __init__(self, por_segundo=None, rafaga=None, intervalo_chat=None, intentos=None):
+        self.por_segundo = por_segundo or float(os.getenv('ENVIOS_POR_SEGUNDO', 25))
+        self.rafaga = rafaga or max(1, int(os.getenv('ENVIOS_RAFAGA', 5)))
+        self.intervalo_chat = intervalo_chat if intervalo_chat is not None else float(os.getenv('ENVIOS_INTERVALO_CHAT', 1))
+        self.intentos = intentos or int(os.getenv('ENVIOS_INTENTOS', 5))
+
+        self._fichas = float(self.rafaga)
+        self._recarga = time.monotonic()
+        self._pausa_hasta = 0.0
+        self._lock_fichas = asyncio.Lock()
+        # Por chat: candado y mensajes en espera (orden de los mensajes), y momento del último envío
+        self._candados = {}
+        self._ultimo_envio = {}
+
+        # Contadores
+        self.enviados = 0
+        self.reintentos = 0
+        self.limites = 0
+        self.fallidos = 0
+        self.en_cola = 0
+
+    async def _tomar_ficha(self):
+        # El candado hace que los envíos tomen fichas en orden de llegada
+        async with self._lock_fichas:
+            while True:
+                ahora = time.monotonic()
+                if ahora < self._pausa_hasta:
+                    await asyncio.sleep(self._pausa_hasta - ahora)
+                    continue
+                self._fichas = min(self.rafaga, self._fichas + (ahora - self._recarga) * self.por_segundo)
+                self._recarga = ahora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                await asyncio.sleep((1 - self._fichas) / self.por_segundo)
+
+    def _candado(self, chat_id):
+        candado = self._candados.get(chat_id)
+        if candado is None:
+            candado = self._candados[chat_id] = [asyncio.Lock(), 0]
+        return candado
+
+    def _olvidar_chats(self):
+        # Descarta los últimos envíos que ya no limitan a su chat
+        limite = time.monotonic() - self.intervalo_chat
+        for chat_id in [chat_id for chat_id, momento in self._ultimo_envio.items() if momento < limite]:
+            del self._ultimo_envio[chat_id]
+
+    async def enviar(self, bot, chat_id, text, **kwargs):
+        """
+        Envía un mensaje cuando lo permiten los límites y espera a que se entregue.
+
+        Args:
+            bot (telegram.Bot): Bot que envía el mensaje.
+            chat_id (int): Chat de destino.
+            text (str): Texto del mensaje.
+            **kwargs: Argumentos adicionales de `send_message` (por ejemplo `reply_markup`).
+
+        Returns:
+            telegram.Message: Mensaje entregado.
+
+        Raises:
+            EnvioFallido: Si no se pudo entregar tras los intentos, o el error es definitivo.
+        """
+        candado = self._candado(chat_id)
+        candado[1] += 1
+        self.en_cola += 1
+        try:
+            async with candado[0]:
+                espera = 1
+                for intento in range(1, self.intentos + 1):
+                    # Separación entre mensajes al mismo chat
+                    restante = self._ultimo_envio.get(chat_id, 0.0) + self.intervalo_chat - time.monotonic()
+                    if restante > 0:
+                        await asyncio.sleep(restante)
+                    await self._tomar_ficha()
+                    self._ultimo_envio[chat_id] = time.monotonic()
+
+                    try:
+                        mensaje = await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                    except RetryAfter as e:
+                        segundos = _segundos(e.retry_after)
+                        self.limites += 1
+                        self._pausa_hasta = max(self._pausa_hasta, time.monotonic() + segundos)
+                        logging.warning(f"Límite de Telegram al enviar a {chat_id}, se reintenta en {segundos} s")
+                        error = e
+                    except (BadRequest, Forbidden, ChatMigrated, InvalidToken) as e:
+                        self.fallidos += 1
+                        raise EnvioFallido(chat_id, e, definitivo=True)
+                    except NetworkError as e:
+                        # Incluye TimedOut: el mensaje pudo no llegar, se reintenta con espera creciente
+                        logging.warning(f"Error de red al enviar a {chat_id} (intento {intento}): {e}")
+                        error = e
+                        if intento < self.intentos:
+                            await asyncio.sleep(espera)
+                            espera = min(espera * 2, self.ESPERA_MAXIMA)
+                    else:
+                        self.enviados += 1
+                        return mensaje
+
+                    if intento < self.intentos:
+                        self.reintentos += 1
+
+                self.fallidos += 1
+                raise EnvioFallido(chat_id, error, definitivo=False)
+        finally:
+            self.en_cola -= 1
+            candado[1] -= 1
+            if candado[1] == 0:
+                del self._candados[chat_id]
+            if len(self._ultimo_envio) > 1000:
+                self._olvidar_chats()
+
+    def estadisticas(self):
+        """
+        Devuelve los contadores del programador.
+
+        Returns:
+            dict: Mensajes enviados, reintentos, límites de Telegram recibidos, fallidos y en cola.
+        """
+        return {
+            'enviados': self.enviados,
+            'reintentos': self.reintentos,
+            'limites': self.limites,
+            'fallidos': self.fallidos,
+            'en_cola': self.en_cola,
+        }
@@ -0,0 +1,156 @@
+"""
+## Escritor diferido de estados de solicitudes
+
+Agrupa las confirmaciones de las solicitudes atendidas (`ENVIADO = 1`, o el arriendo liberado cuando
+no hubo nada que enviar) y las escribe en una sola transacción con sentencias `UPDATE ... WHERE id IN
+(...)`, en lugar de abrir una transacción por solicitud.
+
+Las confirmaciones se escriben al terminar cada ciclo de procesamiento o, si el ciclo se alarga,
+cuando pasan `ventana` segundos desde la primera confirmación pendiente.
+
+Si se le pasan las trazas (`trazas.py`), al hacer commit registra el tramo `confirmacion` y termina
+la traza de cada solicitud escrita. Las trazas de las confirmaciones que no se pudieron escribir
+siguen abiertas y terminan cuando una escritura posterior las confirma.
+
+### Garantías de durabilidad:
+- Una confirmación solo se da por escrita cuando su transacción hace commit.
+- Si la escritura falla, las confirmaciones vuelven al búfer y se reintentan en la siguiente escritura.
+- Si el proceso se cae con confirmaciones en el búfer, esas filas conservan `ENVIADO = 0` y se vuelven
+  a reclamar cuando vence su arriendo, por lo que el mensaje puede enviarse dos veces (entrega
+  al menos una vez). La ventana de pérdida es como máximo `ventana` segundos.
+"""
+
+from sqlalchemy import bindparam, text
+import asyncio
+import logging
+import os
+import time
+
+from acceso_datos import ejecutar_en_hilo
+
+
+class EscritorEstados:
+    """
+    ## Clase EscritorEstados:
+    Acumula confirmaciones de solicitudes y las escribe por lotes.
+
+    Args:
+        engine (Engine): Motor de SQLAlchemy.
+        tabla (str): Tabla de solicitudes.
+        columna_id (str): Columna que identifica la fila (`ITEM` o `id`).
+        ventana (float, opcional): Segundos máximos que una confirmación espera en el búfer;
+            por defecto `ESTADOS_VENTANA` o 2.
+        trazas (Trazas, opcional): Trazas en las que se registra la confirmación; None no las registra.
+    """
+
+    def __init__(self, engine, tabla, columna_id, ventana=None, trazas=None):
+        self.engine = engine
+        self.tabla = tabla
+        self.ventana = ventana or float(os.getenv('ESTADOS_VENTANA', 2))
+        self.trazas = trazas
+        self._sentencias = {
+            'enviado': text(f"UPDATE {tabla} SET ENVIADO = '1' WHERE {columna_id} IN :ids").bindparams(bindparam('ids', expanding=True)),
+            'liberado': text(f"UPDATE {tabla} SET LEASE_HASTA = NULL WHERE {columna_id} IN :ids").bindparams(bindparam('ids', expanding=True)),
+        }
+        # Por estado: (id de la fila, id de la traza)
+        self._pendientes = {estado: [] for estado in self._sentencias}
+        self._temporizador = None
+        # El ciclo de eventos solo guarda referencias débiles a las tareas
+        self._tareas = set()
+        self._lock = asyncio.Lock()
+
+        # Contadores de escrituras
+        self.confirmaciones = 0
+        self.commits = 0
+
+    def _programar(self):
+        if self._temporizador is None:
+            self._temporizador = asyncio.get_running_loop().call_later(self.ventana, self._vaciar_en_tarea)
+
+    def _vaciar_en_tarea(self):
+        tarea = asyncio.get_running_loop().create_task(self.vaciar())
+        self._tareas.add(tarea)
+        tarea.add_done_callback(self._tareas.discard)
+
+    def _agregar(self, estado, solicitud_id, traza_id):
+        self._pendientes[estado].append((solicitud_id, traza_id))
+        self._programar()
+
+    def marcar_enviado(self, solicitud_id, traza_id=None):
+        """
+        Registra que el mensaje de la solicitud fue entregado.
+
+        Args:
+            solicitud_id (int): Identificador de la fila.
+            traza_id (str, opcional): Traza de la solicitud, que termina cuando se escribe el estado.
+        """
+        self._agregar('enviado', solicitud_id, traza_id)
+
+    def marcar_liberado(self, solicitud_id, traza_id=None):
+        """
+        Registra que la solicitud se atendió sin mensaje que enviar y no debe volver a reclamarse.
+
+        Args:
+            solicitud_id (int): Identificador de la fila.
+            traza_id (str, opcional): Traza de la solicitud, que termina cuando se escribe el estado.
+        """
+        self._agregar('liberado', solicitud_id, traza_id)
+
+    def _escribir(self, lotes):
+        with self.engine.begin() as con:
+            for estado, marcas in lotes.items():
+                con.execute(self._sentencias[estado], {'ids': [solicitud_id for solicitud_id, _ in marcas]})
+
+    async def vaciar(self):
+        """
+        Escribe todas las confirmaciones pendientes en una sola transacción.
+
+        Returns:
+            int: Cantidad de confirmaciones escritas.
+        """
+        async with self._lock:
+            if self._temporizador is not None:
+                self._temporizador.cancel()
+                self._temporizador = None
+
+            lotes = {estado: ids for estado, ids in self._pendientes.items() if ids}
+            if not lotes:
+                return 0
+            self._pendientes = {estado: [] for estado in self._sentencias}
+
+            inicio = time.time()
+            medida = time.perf_counter()
+            try:
+                await ejecutar_en_hilo(self._escribir, lotes)
+            except Exception as e:
+                logging.error(f"Error al escribir estados en {self.tabla}, se reintentará: {e}")
+                for estado, marcas in lotes.items():
+                    self._pendientes[estado][:0] = marcas
+                self._programar()
+                return 0
+
+            if self.trazas is not None:
+                # Solo las trazas cuyo estado quedó escrito
+                trazas_ids = [traza_id for marcas in lotes.values() for _, traza_id in marcas if traza_id is not None]
+                self.trazas.registrar_lote(trazas_ids, 'confirmacion', inicio, time.perf_counter() - medida)
+                self.trazas.terminar(trazas_ids)
+
+            cantidad = sum(len(marcas) for marcas in lotes.values())
+            self.confirmaciones += cantidad
+            self.commits += 1
+            logging.info(f"Estados escritos en {self.tabla}: {cantidad} confirmaciones en un commit")
+            return cantidad
+
+    def estadisticas(self):
+        """
+        Devuelve los contadores del escritor.
+
+        Returns:
+            dict: Confirmaciones escritas, commits realizados, commits ahorrados y confirmaciones pendientes.
+        """
+        return {
+            'confirmaciones': self.confirmaciones,
+            'commits': self.commits,
+            'commits_ahorrados': self.confirmaciones - self.commits,
+            'pendientes': sum(len(marcas) for marcas in self._pendientes.values()),
+        }
@@ -0,0 +1,59 @@
+-- Cambios de esquema requeridos por los bots.
+-- Ejecutar una sola vez sobre la base de datos `pnrp`, en orden.
+
+-- Reclamo atómico de solicitudes con arriendo (cola_solicitudes.py)
+ALTER TABLE proceso_bot
+    ADD COLUMN WORKER_ID VARCHAR(80) NULL,
+    ADD COLUMN LEASE_HASTA DATETIME NULL,
+    ADD COLUMN INTENTOS INT NOT NULL DEFAULT 0,
+    ADD INDEX idx_proceso_bot_pendientes (ENVIADO, PROCESO, LEASE_HASTA),
+    ADD INDEX idx_proceso_bot_worker (WORKER_ID);
+
+ALTER TABLE bot_solicitudes_me
+    ADD COLUMN WORKER_ID VARCHAR(80) NULL,
+    ADD COLUMN LEASE_HASTA DATETIME NULL,
+    ADD COLUMN INTENTOS INT NOT NULL DEFAULT 0,
+    ADD INDEX idx_solicitudes_me_pendientes (ENVIADO, PROCESO, LEASE_HASTA),
+    ADD INDEX idx_solicitudes_me_worker (WORKER_ID);
+
+-- Resumen diario de comunicación por clave (comunicacion.py)
+CREATE TABLE IF NOT EXISTS bot_comunicacion_diaria (
+    MARCA VARCHAR(20) NOT NULL,
+    CLAVE VARCHAR(40) NOT NULL,
+    FECHA DATE NOT NULL,
+    SIN_LECTURA INT NOT NULL,
+    SIN_LECTURA_MEDIANOCHE INT NOT NULL,
+    PRIMARY KEY (MARCA, CLAVE, FECHA),
+    INDEX idx_comunicacion_diaria_fecha (MARCA, FECHA)
+);
+
+CREATE TABLE IF NOT EXISTS bot_comunicacion_control (
+    MARCA VARCHAR(20) NOT NULL PRIMARY KEY,
+    FECHA_ORIGEN DATETIME NOT NULL,
+    CONSTRUIDO DATETIME NOT NULL
+);
+
+-- Identificador de la traza de cada solicitud, creado al insertarla (trazas.py)
+ALTER TABLE proceso_bot
+    ADD COLUMN TRAZA_ID CHAR(32) NULL;
+
+ALTER TABLE bot_solicitudes_me
+    ADD COLUMN TRAZA_ID CHAR(32) NULL;
+
+-- Paginación por clave de los reportes de órdenes y bitácora (consultas.py): índice por clave, fecha
+-- y desempate único, en el mismo orden que el ORDER BY. Airflow recrea las tablas de órdenes, así que
+-- sus índices deben ir también en la definición que usa la carga. Si bitacora_ac ya tiene una llave
+-- numérica única, usarla como desempate en PAGINADAS en lugar de agregar ID_BITACORA.
+ALTER TABLE airflow_elster_os
+    ADD INDEX idx_elster_os_pagina (clave, FECHA_EJECUCION, OS);
+
+ALTER TABLE airflow_hexing_os
+    ADD INDEX idx_hexing_os_pagina (clave, FECHA_EJECUCION, OS);
+
+ALTER TABLE airflow_union_os
+    ADD INDEX idx_union_os_pagina (clave, FECHA_EJECUCION, OS);
+
+ALTER TABLE bitacora_ac
+    ADD COLUMN ID_BITACORA BIGINT NOT NULL AUTO_INCREMENT,
+    ADD UNIQUE INDEX idx_bitacora_id (ID_BITACORA),
+    ADD INDEX idx_bitacora_pagina (clave, fecha_asignacion, ID_BITACORA);
@@ -0,0 +1,516 @@
+"""
+## Métricas del procesamiento de solicitudes
+
+Histogramas y contadores por etapa, servidos en formato de texto de Prometheus en
+`http://METRICAS_HOST:METRICAS_PUERTO/metricas` (por defecto `127.0.0.1:9464`; `METRICAS_PUERTO=0` lo
+desactiva). No requiere dependencias: el servidor es el de `servidor_http.py`.
+
+Métricas principales (etiquetas `bot`, `marca` y `comando` donde aplica):
+
+- `bot_solicitud_edad_segundos`: tiempo en cola, desde `FECHA` de la solicitud hasta que empieza a
+  atenderse.
+- `bot_etapa_segundos`: duración de cada etapa de una solicitud: `reporte` (clave y consultas, o
+  caché), `render`, `envio` (incluye la espera del límite de Telegram) y `total`.
+- `bot_ciclo_segundos`: duración de las etapas de cada ciclo: `reclamo`, `claves`, `confirmacion`
+  y `ciclo`.
+- `bot_solicitudes_total`: solicitudes atendidas por resultado (`enviado`, `fallido`,
+  `fallido_definitivo`, `sin_mensaje`, `error`).
+- `bot_consulta_segundos` y `bot_consulta_errores_total`: tiempo de cada sentencia SQL, con el nombre
+  del catálogo de `consultas.py` o `verbo_tabla` para las demás.
+- `bot_manejador_segundos` y `bot_manejador_errores_total`: duración de cada manejador de Telegram.
+- Estadísticas que ya llevan los componentes, leídas al consultar el endpoint: cola pendiente
+  (`bot_cola_pendientes`), caché de reportes, pool de conexiones, envíos y escritor de estados.
+
+Las métricas son globales al proceso; con `bots.py` los dos bots se distinguen por la etiqueta `bot`.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime
+import asyncio
+import bisect
+import functools
+import logging
+import math
+import os
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+from sqlalchemy import event
+
+from acceso_datos import ejecutar_en_hilo
+from consultas import nombre_consulta
+from servidor_http import ServidorHTTP
+from trazas import TRAZAS
+
+
+# Límites (en segundos) de los histogramas de latencia y de edad en cola
+LIMITES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LIMITES_EDAD = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 21600)
+
+
+def _valor(numero):
+    if numero == math.inf:
+        return '+Inf'
+    return repr(float(numero)) if isinstance(numero, float) else str(numero)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(nombres, valores, extra=()):
+    pares = list(zip(nombres, valores)) + list(extra)
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{nombre}="{_escapar(valor)}"' for nombre, valor in pares) + '}'
+
+
+class _Metrica:
+    # Base de las métricas: valores por combinación de etiquetas, protegidos por un candado porque
+    # se actualizan desde el bucle de eventos y desde los hilos de base de datos
+
+    tipo = None
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+        self._valores = {}
+
+    def _clave(self, etiquetas):
+        return tuple(str(etiquetas.get(nombre, '')) for nombre in self.etiquetas)
+
+
+class Contador(_Metrica):
+    """
+    ## Clase Contador:
+    Contador que solo aumenta, por combinación de etiquetas.
+
+    Args:
+        nombre (str): Nombre de la métrica.
+        ayuda (str): Descripción de la métrica.
+        etiquetas (tuple): Nombres de las etiquetas.
+    """
+
+    tipo = 'counter'
+
+    def inc(self, valor=1, **etiquetas):
+        """
+        Suma `valor` al contador de las etiquetas indicadas.
+        """
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+    def valor(self, **etiquetas):
+        """
+        Devuelve el valor actual para las etiquetas indicadas.
+        """
+        with self._lock:
+            return self._valores.get(self._clave(etiquetas), 0)
+
+    def lineas(self):
+        with self._lock:
+            valores = list(self._valores.items())
+        return [f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {_valor(valor)}" for clave, valor in valores]
+
+
+class Histograma(_Metrica):
+    """
+    ## Clase Histograma:
+    Distribución de valores (por ejemplo, segundos) en cubetas acumuladas, por combinación de etiquetas.
+
+    Args:
+        nombre (str): Nombre de la métrica.
+        ayuda (str): Descripción de la métrica.
+        etiquetas (tuple): Nombres de las etiquetas.
+        limites (tuple, opcional): Límites superiores de las cubetas; por defecto `LIMITES_LATENCIA`.
+    """
+
+    tipo = 'histogram'
+
+    def __init__(self, nombre, ayuda, etiquetas=(), limites=LIMITES_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.limites = tuple(sorted(limites))
+
+    def observar(self, valor, **etiquetas):
+        """
+        Registra una observación para las etiquetas indicadas.
+        """
+        clave = self._clave(etiquetas)
+        with self._lock:
+            serie = self._valores.get(clave)
+            if serie is None:
+                # Conteo por cubeta (la última es +Inf), suma y cantidad
+                serie = self._valores[clave] = [[0] * (len(self.limites) + 1), 0.0, 0]
+            serie[0][bisect.bisect_left(self.limites, valor)] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    @contextmanager
+    def medir(self, **etiquetas):
+        """
+        Mide la duración del bloque `with` y la registra, también si el bloque lanza una excepción.
+
+        Yields:
+            SimpleNamespace: Medida con `inicio` (`time.time()`) y `duracion`, disponible al salir del bloque.
+        """
+        medida = SimpleNamespace(inicio=time.time(), duracion=None)
+        inicio = time.perf_counter()
+        try:
+            yield medida
+        finally:
+            medida.duracion = time.perf_counter() - inicio
+            self.observar(medida.duracion, **etiquetas)
+
+    def cantidad(self, **etiquetas):
+        """
+        Devuelve la cantidad de observaciones para las etiquetas indicadas.
+        """
+        with self._lock:
+            serie = self._valores.get(self._clave(etiquetas))
+            return serie[2] if serie else 0
+
+    def cantidades(self):
+        """
+        Devuelve la cantidad de observaciones de cada combinación de etiquetas.
+
+        Returns:
+            dict: Valores de las etiquetas (tupla) -> cantidad de observaciones.
+        """
+        with self._lock:
+            return {clave: serie[2] for clave, serie in self._valores.items()}
+
+    def lineas(self):
+        with self._lock:
+            series = [(clave, list(serie[0]), serie[1], serie[2]) for clave, serie in self._valores.items()]
+        lineas = []
+        for clave, cubetas, suma, cantidad in series:
+            acumulado = 0
+            for limite, conteo in zip(self.limites + (math.inf,), cubetas):
+                acumulado += conteo
+                le = _etiquetas(self.etiquetas, clave, [('le', _valor(limite))])
+                lineas.append(f"{self.nombre}_bucket{le} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {_valor(suma)}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {cantidad}")
+        return lineas
+
+
+class RegistroMetricas:
+    """
+    ## Clase RegistroMetricas:
+    Conjunto de métricas del proceso y de las estadísticas que se leen al exponerlas.
+    """
+
+    def __init__(self):
+        self._metricas = []
+        self._estadisticas = []
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        """
+        Crea y registra un `Contador`.
+        """
+        metrica = Contador(nombre, ayuda, etiquetas)
+        self._metricas.append(metrica)
+        return metrica
+
+    def histograma(self, nombre, ayuda, etiquetas=(), limites=LIMITES_LATENCIA):
+        """
+        Crea y registra un `Histograma`.
+        """
+        metrica = Histograma(nombre, ayuda, etiquetas, limites)
+        self._metricas.append(metrica)
+        return metrica
+
+    def estadisticas(self, prefijo, funcion, **etiquetas):
+        """
+        Registra una función que devuelve un diccionario de valores numéricos (como los `estadisticas()`
+        de la caché, el pool o los envíos). Cada valor se expone como `prefijo_clave` al consultar el
+        endpoint.
+
+        Args:
+            prefijo (str): Prefijo de los nombres de las métricas.
+            funcion (callable): Función sin argumentos que devuelve el diccionario.
+            **etiquetas: Etiquetas fijas de las métricas (por ejemplo `bot`).
+        """
+        self._estadisticas.append((prefijo, funcion, etiquetas))
+
+    def exponer(self):
+        """
+        Genera el texto de todas las métricas en formato de Prometheus. Puede consultar la base de datos
+        (cola pendiente), así que conviene ejecutarlo fuera del bucle de eventos.
+
+        Returns:
+            str: Métricas en formato de texto.
+        """
+        lineas = []
+        for metrica in self._metricas:
+            lineas.append(f"# HELP {metrica.nombre} {metrica.ayuda}")
+            lineas.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+            lineas.extend(metrica.lineas())
+
+        por_nombre = {}
+        for prefijo, funcion, etiquetas in self._estadisticas:
+            try:
+                valores = funcion()
+            except Exception as e:
+                logging.error(f"Error al leer las estadísticas {prefijo}: {e}")
+                continue
+            for clave, valor in valores.items():
+                if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+                    por_nombre.setdefault(f"{prefijo}_{clave}", []).append((etiquetas, valor))
+        for nombre, muestras in por_nombre.items():
+            lineas.append(f"# TYPE {nombre} gauge")
+            for etiquetas, valor in muestras:
+                lineas.append(f"{nombre}{_etiquetas(etiquetas, etiquetas.values())} {_valor(valor)}")
+        return '\n'.join(lineas) + '\n'
+
+
+# Registro del proceso y métricas del procesamiento de solicitudes
+REGISTRO_METRICAS = RegistroMetricas()
+
+EDAD_SOLICITUD = REGISTRO_METRICAS.histograma(
+    'bot_solicitud_edad_segundos', 'Segundos desde que se insertó la solicitud hasta que empezó a atenderse.',
+    ('bot', 'marca', 'comando'), LIMITES_EDAD
+)
+ETAPA = REGISTRO_METRICAS.histograma(
+    'bot_etapa_segundos', 'Duración de cada etapa de una solicitud.', ('bot', 'marca', 'comando', 'etapa')
+)
+CICLO = REGISTRO_METRICAS.histograma(
+    'bot_ciclo_segundos', 'Duración de cada etapa de un ciclo de procesamiento.', ('bot', 'etapa')
+)
+RECLAMADAS = REGISTRO_METRICAS.histograma(
+    'bot_ciclo_reclamadas', 'Solicitudes reclamadas por ciclo.', ('bot',), (0, 1, 5, 10, 25, 50, 100, 250)
+)
+SOLICITUDES = REGISTRO_METRICAS.contador(
+    'bot_solicitudes_total', 'Solicitudes atendidas por resultado.', ('bot', 'marca', 'comando', 'resultado')
+)
+CONSULTA = REGISTRO_METRICAS.histograma(
+    'bot_consulta_segundos', 'Duración de cada sentencia SQL.', ('consulta',)
+)
+CONSULTA_ERRORES = REGISTRO_METRICAS.contador(
+    'bot_consulta_errores_total', 'Sentencias SQL que fallaron.', ('consulta',)
+)
+MANEJADOR = REGISTRO_METRICAS.histograma(
+    'bot_manejador_segundos', 'Duración de cada manejador de Telegram.', ('bot', 'manejador')
+)
+MANEJADOR_ERRORES = REGISTRO_METRICAS.contador(
+    'bot_manejador_errores_total', 'Manejadores de Telegram que lanzaron una excepción.', ('bot', 'manejador')
+)
+
+
+class MedicionSolicitud:
+    """
+    ## Clase MedicionSolicitud:
+    Mediciones de una solicitud en curso, creada por `medir_solicitud`.
+
+    Attributes:
+        resultado (str): Resultado que se registra al terminar; `error` si no se cambia.
+    """
+
+    def __init__(self, **etiquetas):
+        self.etiquetas = etiquetas
+        self.resultado = 'error'
+
+    @contextmanager
+    def etapa(self, nombre):
+        """
+        Mide la duración de una etapa (`reporte`, `render`, `envio`) en un bloque `with`, también como
+        tramo de la traza de la solicitud.
+        """
+        with ETAPA.medir(etapa=nombre, **self.etiquetas), TRAZAS.tramo(nombre):
+            yield
+
+
+@contextmanager
+def medir_solicitud(bot, marca, comando, fecha=None, traza_id=None, medidor=None):
+    """
+    Mide una solicitud completa: registra su edad en cola al empezar, y su duración total y su
+    resultado al terminar. Si se indica `traza_id`, activa la traza de la solicitud (ver `trazas.py`).
+
+    Args:
+        bot (str): Nombre del bot.
+        marca (str): Marca del medidor.
+        comando (str): Comando solicitado.
+        fecha (datetime, opcional): `FECHA` en que se insertó la solicitud.
+        traza_id (str, opcional): Traza de la solicitud.
+        medidor (str, opcional): Medidor, como atributo de la traza.
+
+    Yields:
+        MedicionSolicitud: Medición en curso; se le asigna el `resultado`.
+    """
+    medicion = MedicionSolicitud(bot=bot, marca=marca, comando=comando)
+    try:
+        edad = (datetime.now() - fecha).total_seconds() if fecha is not None else None
+    except (TypeError, ValueError):
+        edad = None
+
+    with TRAZAS.activar(traza_id, medidor=medidor, **medicion.etiquetas):
+        # NaT y NaN no son iguales a sí mismos
+        if edad is not None and edad == edad:
+            edad = max(0.0, edad)
+            EDAD_SOLICITUD.observar(edad, **medicion.etiquetas)
+            TRAZAS.registrar_actual('espera', time.time() - edad, edad)
+
+        inicio = time.perf_counter()
+        try:
+            yield medicion
+        except Exception:
+            medicion.resultado = 'error'
+            raise
+        finally:
+            ETAPA.observar(time.perf_counter() - inicio, etapa='total', **medicion.etiquetas)
+            SOLICITUDES.inc(resultado=medicion.resultado, **medicion.etiquetas)
+            if traza_id is not None:
+                TRAZAS.anotar(traza_id, resultado=medicion.resultado)
+
+
+_VERBO_TABLA = re.compile(r'^\s*(\w+)(?:.*?\b(?:FROM|INTO)\s+`?(\w+))?', re.IGNORECASE | re.DOTALL)
+_ETIQUETAS_SQL = {}
+
+
+def etiqueta_sql(sentencia, sql):
+    """
+    Devuelve la etiqueta de una sentencia para `bot_consulta_segundos`.
+
+    Args:
+        sentencia (ClauseElement | None): Sentencia de SQLAlchemy, si la hay.
+        sql (str): Texto SQL ejecutado.
+
+    Returns:
+        str: Nombre en el catálogo de `consultas.py`, o `verbo_tabla` (`update_proceso_bot`).
+    """
+    nombre = nombre_consulta(sentencia)
+    if nombre is not None:
+        return nombre
+    etiqueta = _ETIQUETAS_SQL.get(sql)
+    if etiqueta is None:
+        coincidencia = _VERBO_TABLA.match(sql)
+        verbo = coincidencia.group(1).lower() if coincidencia else 'sql'
+        tabla = coincidencia.group(2) if coincidencia else None
+        if verbo == 'update':
+            tabla = sql.split()[1].strip('`')
+        etiqueta = f"{verbo}_{tabla}".lower() if tabla else verbo
+        # Las listas `IN` expandidas producen textos distintos: el diccionario se acota
+        if len(_ETIQUETAS_SQL) < 1000:
+            _ETIQUETAS_SQL[sql] = etiqueta
+    return etiqueta
+
+
+def instrumentar_engine(engine):
+    """
+    Mide la duración y los errores de cada sentencia que ejecuta el motor.
+
+    Args:
+        engine (Engine): Motor de SQLAlchemy.
+    """
+    @event.listens_for(engine, 'before_cursor_execute')
+    def antes(conexion, cursor, sql, parametros, contexto, varias):
+        conexion.info.setdefault('inicio_sentencias', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def despues(conexion, cursor, sql, parametros, contexto, varias):
+        duracion = time.perf_counter() - conexion.info['inicio_sentencias'].pop()
+        sentencia = contexto.compiled.statement if contexto is not None and contexto.compiled is not None else None
+        etiqueta = etiqueta_sql(sentencia, sql)
+        CONSULTA.observar(duracion, consulta=etiqueta)
+        # Tramo de la traza activa, si la sentencia se ejecuta para una solicitud (ver trazas.py)
+        TRAZAS.registrar_actual('sql', time.time() - duracion, duracion, consulta=etiqueta)
+
+    @event.listens_for(engine, 'handle_error')
+    def al_fallar(contexto):
+        inicios = contexto.connection.info.get('inicio_sentencias') if contexto.connection is not None else None
+        if inicios:
+            inicios.pop()
+        sentencia = contexto.execution_context.compiled.statement if (
+            contexto.execution_context is not None and contexto.execution_context.compiled is not None
+        ) else None
+        CONSULTA_ERRORES.inc(consulta=etiqueta_sql(sentencia, contexto.statement or ''))
+
+
+def instrumentar_manejadores(application, bot):
+    """
+    Envuelve los callbacks de los manejadores de la aplicación (incluidos los estados de los
+    `ConversationHandler`) para medir su duración y sus errores.
+
+    Args:
+        application (Application): Aplicación con los manejadores ya agregados.
+        bot (str): Nombre del bot para la etiqueta `bot`.
+    """
+    def envolver(manejador):
+        # ConversationHandler: sus manejadores internos
+        internos = []
+        for atributo in ('entry_points', 'fallbacks'):
+            internos.extend(getattr(manejador, atributo, None) or [])
+        for lista in (getattr(manejador, 'states', None) or {}).values():
+            internos.extend(lista)
+        for interno in internos:
+            envolver(interno)
+
+        callback = getattr(manejador, 'callback', None)
+        if callback is None or getattr(callback, '_medido', False) or not asyncio.iscoroutinefunction(callback):
+            return
+        nombre = getattr(callback, '__name__', type(manejador).__name__)
+
+        @functools.wraps(callback)
+        async def medido(update, context):
+            inicio = time.perf_counter()
+            try:
+                return await callback(update, context)
+            except Exception:
+                MANEJADOR_ERRORES.inc(bot=bot, manejador=nombre)
+                raise
+            finally:
+                MANEJADOR.observar(time.perf_counter() - inicio, bot=bot, manejador=nombre)
+
+        medido._medido = True
+        manejador.callback = medido
+
+    for grupo in application.handlers.values():
+        for manejador in grupo:
+            envolver(manejador)
+
+
+_servidor = None
+
+
+async def iniciar_servidor():
+    """
+    Inicia el endpoint `/metricas` en `METRICAS_HOST`:`METRICAS_PUERTO`. Solo se inicia una vez por
+    proceso aunque lo llamen varios bots; si el puerto está ocupado se registra el error y el bot
+    sigue funcionando.
+
+    Returns:
+        ServidorHTTP | None: Servidor iniciado, o None si está desactivado o no se pudo iniciar.
+    """
+    global _servidor
+    puerto = int(os.getenv('METRICAS_PUERTO', 9464))
+    if _servidor is not None or puerto == 0:
+        return _servidor
+
+    servidor = ServidorHTTP(os.getenv('METRICAS_HOST', '127.0.0.1'), puerto)
+
+    async def metricas(solicitud):
+        return 200, await ejecutar_en_hilo(REGISTRO_METRICAS.exponer)
+
+    servidor.ruta('GET', '/metricas', metricas)
+    try:
+        await servidor.iniciar()
+    except OSError as e:
+        logging.error(f"No se pudo iniciar el endpoint de métricas en el puerto {puerto}: {e}")
+        return None
+    _servidor = servidor
+    return _servidor
+
+
+async def detener_servidor():
+    """
+    Detiene el endpoint de métricas si está iniciado.
+    """
+    global _servidor
+    if _servidor is not None:
+        servidor, _servidor = _servidor, None
+        await servidor.detener()
@@ -0,0 +1,194 @@
+"""
+## Navegación de los reportes paginados
+
+Los reportes de órdenes de servicio y bitácora se envían de a una página (`TAMANO_PAGINA` filas, ver
+`consultas.py`). Si hay más filas, el mensaje lleva botones "Anterior" / "Siguiente" y cada botón
+consulta solo su página con la consulta por clave (keyset), partiendo del cursor (fecha nula o no,
+fecha y desempate de la última fila) de la página anterior.
+
+El estado de cada reporte paginado (la solicitud y los cursores de las páginas vistas) se guarda en
+memoria, acotado por `PAGINAS_TAMANO` (por defecto 1000, descarta el menos usado) y `PAGINAS_TTL`
+(por defecto 86400 segundos). Los botones de un reporte vencido piden volver a solicitarlo.
+
+El texto de una página se acota al máximo de Telegram (4096 caracteres).
+"""
+
+from collections import OrderedDict
+import logging
+import os
+import secrets
+import time
+
+import pandas as pd
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from consultas import TAMANO_PAGINA
+
+
+# Máximo de caracteres de un mensaje de Telegram
+MAXIMO_MENSAJE = 4096
+
+# Comandos con reporte paginado (órdenes de servicio y bitácora)
+COMANDOS_PAGINADOS = ('4', '5')
+
+
+def _nativo(valor):
+    # Los valores de pandas (Timestamp, escalares de numpy, NaT) se pasan a tipos de Python
+    if valor is None or pd.isna(valor):
+        return None
+    if isinstance(valor, pd.Timestamp):
+        return valor.to_pydatetime()
+    if hasattr(valor, 'item'):
+        return valor.item()
+    return valor
+
+
+def cursor_fila(fila):
+    """
+    Devuelve el cursor de una fila de un reporte paginado.
+
+    Args:
+        fila (dict | pd.Series): Fila con las columnas `ORDEN_FECHA` y `ORDEN_DESEMPATE`.
+
+    Returns:
+        dict: `fecha_nula` (si la fila no tiene fecha), `fecha` y `desempate`, con tipos de Python,
+            para `consultas.consulta_pagina`.
+    """
+    fecha = _nativo(fila['ORDEN_FECHA'])
+    return {'fecha_nula': fecha is None, 'fecha': fecha, 'desempate': _nativo(fila['ORDEN_DESEMPATE'])}
+
+
+def acotar(texto, maximo=MAXIMO_MENSAJE):
+    """
+    Recorta un mensaje al máximo de caracteres de Telegram.
+
+    Args:
+        texto (str): Mensaje.
+        maximo (int): Máximo de caracteres.
+
+    Returns:
+        str: El mensaje, recortado con "…" si lo excede.
+    """
+    if len(texto) <= maximo:
+        return texto
+    return texto[:maximo - 1] + "…"
+
+
+class PaginasReporte:
+    """
+    ## Clase PaginasReporte:
+    Guarda el estado de los reportes paginados y atiende sus botones de navegación.
+
+    Las solicitudes son tuplas `(marca, comando, clave, medidor, nombre)`.
+
+    Args:
+        consultar (callable): Corrutina `(solicitud, cursor)` que devuelve la página que sigue al
+            cursor (un DataFrame de hasta `tamano_pagina + 1` filas).
+        renderizar (callable): Función `(solicitud, tabla)` que arma el mensaje de una página.
+        tamano_pagina (int, opcional): Filas por página; por defecto `TAMANO_PAGINA`.
+        tamano (int, opcional): Máximo de reportes guardados; por defecto `PAGINAS_TAMANO` o 1000.
+        ttl (int, opcional): Segundos que se guarda un reporte; por defecto `PAGINAS_TTL` o 86400.
+    """
+
+    def __init__(self, consultar, renderizar, tamano_pagina=None, tamano=None, ttl=None):
+        self.consultar = consultar
+        self.renderizar = renderizar
+        self.tamano_pagina = tamano_pagina or TAMANO_PAGINA
+        self.tamano = tamano or int(os.getenv('PAGINAS_TAMANO', 1000))
+        self.ttl = ttl or int(os.getenv('PAGINAS_TTL', 86400))
+        self._reportes = OrderedDict()
+
+    def pagina(self, tabla):
+        """
+        Separa las filas de una página de la fila adicional que indica si hay otra.
+
+        Args:
+            tabla (pd.DataFrame): Resultado de la consulta de una página.
+
+        Returns:
+            tuple: Filas de la página y si hay una página siguiente.
+        """
+        return tabla.head(self.tamano_pagina), len(tabla) > self.tamano_pagina
+
+    def _teclado(self, reporte_id, numero, hay_siguiente):
+        botones = []
+        if numero > 1:
+            botones.append(InlineKeyboardButton("◀ Anterior", callback_data=f"pag:{reporte_id}:{numero - 1}"))
+        if hay_siguiente:
+            botones.append(InlineKeyboardButton("Siguiente ▶", callback_data=f"pag:{reporte_id}:{numero + 1}"))
+        return InlineKeyboardMarkup([botones]) if botones else None
+
+    def _texto(self, mensaje, numero, hay_siguiente):
+        if numero > 1 or hay_siguiente:
+            mensaje = f"{mensaje}\n\nPágina {numero}" + (" (hay más resultados)" if hay_siguiente else "")
+        return acotar(mensaje)
+
+    def abrir(self, solicitud, mensaje, tabla):
+        """
+        Prepara la primera página de un reporte ya construido.
+
+        Args:
+            solicitud (tuple): `(marca, comando, clave, medidor, nombre)`.
+            mensaje (str): Mensaje de la primera página.
+            tabla (pd.DataFrame | None): Resultado de la consulta de la primera página.
+
+        Returns:
+            tuple: Mensaje a enviar y teclado de navegación (o None si hay una sola página).
+        """
+        if tabla is None or tabla.empty:
+            return acotar(mensaje), None
+        filas, hay_siguiente = self.pagina(tabla)
+        if not hay_siguiente:
+            return acotar(mensaje), None
+
+        # Identificador aleatorio: los botones de antes de un reinicio no apuntan a otro reporte
+        reporte_id = secrets.token_urlsafe(6)
+        # Cursores con los que empieza cada página: la primera no tiene cursor
+        self._reportes[reporte_id] = (time.monotonic(), solicitud, [None, cursor_fila(filas.iloc[-1])])
+        while len(self._reportes) > self.tamano:
+            self._reportes.popitem(last=False)
+        return self._texto(mensaje, 1, True), self._teclado(reporte_id, 1, True)
+
+    async def manejar(self, update, context):
+        """
+        Atiende un botón de navegación: consulta la página pedida y edita el mensaje.
+
+        Args:
+            update (Update): Actualización con el `callback_query` del botón.
+            context (CallbackContext): Contexto del bot.
+
+        Returns:
+            None
+        """
+        query = update.callback_query
+        _, reporte_id, numero = query.data.split(':')
+        numero = int(numero)
+
+        entrada = self._reportes.get(reporte_id)
+        if entrada is None or time.monotonic() - entrada[0] > self.ttl:
+            self._reportes.pop(reporte_id, None)
+            await query.answer("El reporte venció, solicítelo de nuevo.", show_alert=True)
+            return
+        self._reportes.move_to_end(reporte_id)
+        _, solicitud, cursores = entrada
+        if numero > len(cursores):
+            await query.answer()
+            return
+
+        try:
+            tabla = await self.consultar(solicitud, cursores[numero - 1])
+        except Exception as e:
+            logging.error(f"Error al consultar la página {numero} del reporte {solicitud}: {e}")
+            await query.answer("No se pudo obtener la página, intente de nuevo.", show_alert=True)
+            return
+
+        filas, hay_siguiente = self.pagina(tabla)
+        if hay_siguiente and numero == len(cursores):
+            cursores.append(cursor_fila(filas.iloc[-1]))
+
+        mensaje = self.renderizar(solicitud, filas)
+        await query.answer()
+        await query.edit_message_text(
+            self._texto(mensaje, numero, hay_siguiente),
+            reply_markup=self._teclado(reporte_id, numero, hay_siguiente)
+        )
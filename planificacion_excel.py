@@ -0,0 +1,353 @@
+"""
+## Carga de planificaciones desde Excel por partes
+
+Lee el archivo de `/planificacion` fila por fila y lo inserta por lotes de tamaño fijo, para que un
+archivo de decenas de miles de filas no congele al bot ni cargue todo en memoria:
+
+- El archivo se descarga a un archivo temporal en disco, no a memoria.
+- La lectura y validación corre en un pool de procesos acotado (`PLANIFICACION_PROCESOS`, por
+  defecto 2), fuera del bucle de eventos y sin competir por el GIL con los demás manejadores. El
+  pool se crea con la primera carga y sus procesos se inician con `spawn`, no con `fork`, para no
+  copiar los hilos, conexiones y sockets del bot.
+- Los `.xlsx` se recorren con `openpyxl` en modo de solo lectura, que no arma el libro completo.
+- Cada fila se valida y convierte al leerla; las filas inválidas se descartan y se cuentan. Las
+  válidas vuelven al manejador en lotes de `PLANIFICACION_LOTE` (por defecto 1000) tuplas por una
+  cola de a lo sumo `PLANIFICACION_LOTES_EN_COLA` lotes (por defecto 2): la memoria del manejador
+  queda acotada por el lote y no por el tamaño del archivo, y el proceso lector espera si la base va
+  más lenta que la lectura.
+- Cada lote se inserta apenas llega, en su propia transacción, y el usuario ve el avance en un
+  mensaje que se va editando. Si la lectura falla a mitad del archivo (por ejemplo al pasar de
+  `PLANIFICACION_MAX_FILAS`), los lotes ya insertados quedan y el error lo indica.
+
+Límites por archivo:
+- `PLANIFICACION_MAX_MB` (por defecto 20): tamaño máximo del documento, revisado antes de descargarlo.
+- `PLANIFICACION_MAX_FILAS` (por defecto 100000): filas máximas de la hoja.
+- `PLANIFICACION_TIMEOUT` (por defecto 120): segundos máximos para leer y validar el archivo.
+
+Los `.xls` antiguos no se pueden leer por partes con `openpyxl`; se leen con `pandas` completos.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+import time
+
+import openpyxl
+import pandas as pd
+
+
+# Pool de procesos para leer los archivos y administrador de las colas hacia el manejador; se crean
+# con la primera carga
+_pool = None
+_administrador = None
+_lock = threading.Lock()
+
+
+def _pool_procesos():
+    global _pool, _administrador
+    with _lock:
+        if _pool is None:
+            contexto = multiprocessing.get_context('spawn')
+            _administrador = contexto.Manager()
+            _pool = ProcessPoolExecutor(max_workers=int(os.getenv('PLANIFICACION_PROCESOS', 2)), mp_context=contexto)
+        return _pool, _administrador
+
+
+class ArchivoPlanificacionError(Exception):
+    """
+    Error de un archivo de planificación que excede los límites o no tiene el formato esperado.
+    El mensaje se puede mostrar al usuario.
+    """
+
+
+def _texto(valor):
+    if valor is None or (isinstance(valor, float) and pd.isna(valor)):
+        return ''
+    return str(valor).strip()
+
+
+def _valor(valor):
+    # Los NaN de pandas se tratan como celdas vacías
+    if isinstance(valor, float) and pd.isna(valor):
+        return None
+    return valor
+
+
+def formatear_fecha(valor):
+    """
+    Convierte el valor de una celda de fecha al formato `AAAA-MM-DD`.
+
+    Args:
+        valor (Any): Fecha, fecha y hora o texto con una fecha.
+
+    Returns:
+        str | None: Fecha formateada, o None si el valor no es una fecha válida.
+    """
+    if isinstance(valor, (datetime, date)):
+        return valor.strftime('%Y-%m-%d')
+    texto = _texto(valor)
+    if not texto:
+        return None
+    fecha = pd.to_datetime(texto, errors='coerce')
+    if pd.isna(fecha):
+        return None
+    return fecha.strftime('%Y-%m-%d')
+
+
+def clave_valida(valor):
+    """
+    Indica si la celda `Clave` tiene contenido (no es nula ni vacía).
+
+    Args:
+        valor (Any): Valor de la celda.
+
+    Returns:
+        bool: True si la fila se debe cargar.
+    """
+    return _texto(valor) != ''
+
+
+def leer_filas(ruta, columnas):
+    """
+    Recorre las filas de la primera hoja del archivo y entrega solo las columnas pedidas.
+
+    Args:
+        ruta (str): Ruta del archivo `.xlsx` o `.xls`.
+        columnas (list[str]): Encabezados de las columnas a leer.
+
+    Yields:
+        tuple: Valores de las columnas pedidas, en el mismo orden.
+
+    Raises:
+        ArchivoPlanificacionError: Si falta alguna de las columnas en el encabezado.
+    """
+    if ruta.endswith('.xls'):
+        datos = pd.read_excel(ruta, usecols=columnas)
+        for fila in datos[columnas].itertuples(index=False, name=None):
+            yield tuple(_valor(valor) for valor in fila)
+        return
+
+    libro = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        filas = libro.worksheets[0].iter_rows(values_only=True)
+        encabezado = [_texto(valor) for valor in next(filas, ())]
+        faltantes = [columna for columna in columnas if columna not in encabezado]
+        if faltantes:
+            raise ArchivoPlanificacionError(f"Faltan las columnas {faltantes} en el archivo")
+        indices = [encabezado.index(columna) for columna in columnas]
+
+        for fila in filas:
+            yield tuple(fila[indice] if indice < len(fila) else None for indice in indices)
+    finally:
+        libro.close()
+
+
+def validar_filas(ruta, columnas, columna_clave, columna_fecha, max_filas, vence):
+    """
+    Recorre y valida las filas del archivo sin acumularlas.
+
+    Args:
+        ruta (str): Ruta del archivo `.xlsx` o `.xls`.
+        columnas (list[str]): Encabezados de las columnas a leer.
+        columna_clave (str): Columna que debe tener contenido para cargar la fila.
+        columna_fecha (str): Columna con la fecha, que se convierte a `AAAA-MM-DD`.
+        max_filas (int): Filas máximas permitidas.
+        vence (float): Momento (`time.time()`) en que se abandona la lectura.
+
+    Yields:
+        tuple | None: Tupla válida (en el orden de `columnas`), o None por cada fila descartada.
+
+    Raises:
+        ArchivoPlanificacionError: Si el archivo excede los límites o le faltan columnas.
+    """
+    indice_clave = columnas.index(columna_clave)
+    indice_fecha = columnas.index(columna_fecha)
+    for numero, valores in enumerate(leer_filas(ruta, columnas), start=1):
+        if numero > max_filas:
+            raise ArchivoPlanificacionError(f"El archivo tiene más de {max_filas} filas")
+        if numero % 1000 == 0 and time.time() > vence:
+            raise ArchivoPlanificacionError("El archivo tardó demasiado en procesarse")
+
+        fecha = formatear_fecha(valores[indice_fecha])
+        if not clave_valida(valores[indice_clave]) or fecha is None:
+            yield None
+            continue
+        valores = list(valores)
+        valores[indice_fecha] = fecha
+        yield tuple(valores)
+
+
+def _entregar(cola, mensaje, cancelada, vence):
+    # Espera lugar en la cola sin quedar bloqueado si el manejador abandonó la carga
+    while True:
+        try:
+            cola.put(mensaje, timeout=1)
+            return
+        except queue.Full:
+            if cancelada.is_set():
+                raise ArchivoPlanificacionError("La carga se canceló")
+            if time.time() > vence:
+                raise ArchivoPlanificacionError("El archivo tardó demasiado en procesarse")
+
+
+def leer_lotes(ruta, columnas, columna_clave, columna_fecha, max_filas, vence, lote, cola, cancelada):
+    """
+    Lee y valida el archivo y entrega las filas válidas por `cola` en lotes. Se ejecuta en el pool
+    de procesos.
+
+    Por `cola` pasan `('lote', filas)` con hasta `lote` tuplas y, al terminar, `('fin', descartadas)`.
+    Los errores se lanzan y llegan al manejador por el resultado de la tarea del pool.
+
+    Args:
+        ruta (str): Ruta del archivo `.xlsx` o `.xls`.
+        columnas (list[str]): Encabezados de las columnas a leer.
+        columna_clave (str): Columna que debe tener contenido para cargar la fila.
+        columna_fecha (str): Columna con la fecha, que se convierte a `AAAA-MM-DD`.
+        max_filas (int): Filas máximas permitidas.
+        vence (float): Momento (`time.time()`) en que se abandona la lectura.
+        lote (int): Filas por lote.
+        cola (Queue): Cola del administrador hacia el manejador.
+        cancelada (Event): Evento que el manejador activa si abandona la carga.
+
+    Returns:
+        int: Cantidad de filas descartadas.
+
+    Raises:
+        ArchivoPlanificacionError: Si el archivo excede los límites o le faltan columnas.
+    """
+    registros = []
+    descartadas = 0
+    for valores in validar_filas(ruta, columnas, columna_clave, columna_fecha, max_filas, vence):
+        if valores is None:
+            descartadas += 1
+            continue
+        registros.append(valores)
+        if len(registros) >= lote:
+            _entregar(cola, ('lote', registros), cancelada, vence)
+            registros = []
+    if registros:
+        _entregar(cola, ('lote', registros), cancelada, vence)
+    _entregar(cola, ('fin', descartadas), cancelada, vence)
+    return descartadas
+
+
+def _ignorar_resultado(futuro):
+    # El resultado de una lectura abandonada no se espera; se lee para que no quede sin recuperar
+    if not futuro.cancelled():
+        futuro.exception()
+
+
+class CargaPlanificacion:
+    """
+    ## Clase CargaPlanificacion:
+    Descarga, valida e inserta por lotes un archivo de planificación.
+
+    Args:
+        columnas (list[str]): Encabezados que se leen del archivo.
+        columna_clave (str): Columna que debe tener contenido para cargar la fila.
+        columna_fecha (str): Columna con la fecha de la planificación.
+        construir_registro (callable): Recibe la tupla de valores validados y devuelve el dict de
+            parámetros de la inserción.
+        insertar (callable): Corrutina que recibe una lista de registros y los inserta.
+        lote (int, opcional): Filas por inserción; por defecto `PLANIFICACION_LOTE` o 1000.
+    """
+
+    def __init__(self, columnas, columna_clave, columna_fecha, construir_registro, insertar, lote=None):
+        self.columnas = columnas
+        self.columna_clave = columna_clave
+        self.columna_fecha = columna_fecha
+        self.construir_registro = construir_registro
+        self.insertar = insertar
+        self.lote = lote or int(os.getenv('PLANIFICACION_LOTE', 1000))
+        self.max_bytes = int(os.getenv('PLANIFICACION_MAX_MB', 20)) * 1024 * 1024
+        self.max_filas = int(os.getenv('PLANIFICACION_MAX_FILAS', 100000))
+        self.timeout = int(os.getenv('PLANIFICACION_TIMEOUT', 120))
+
+    async def cargar(self, documento, archivo, update):
+        """
+        Descarga el archivo de Telegram y carga sus filas, informando el avance al usuario.
+
+        Args:
+            documento (telegram.Document): Documento enviado, para conocer su nombre y tamaño.
+            archivo (telegram.File): Archivo obtenido con `context.bot.get_file`.
+            update (Update): Mensaje del usuario, usado para responder el avance.
+
+        Returns:
+            tuple: Cantidad de filas insertadas y de filas descartadas.
+
+        Raises:
+            ArchivoPlanificacionError: Si el archivo excede los límites o no tiene el formato esperado.
+        """
+        if documento.file_size and documento.file_size > self.max_bytes:
+            raise ArchivoPlanificacionError(f"El archivo supera el máximo de {self.max_bytes // (1024 * 1024)} MB")
+
+        sufijo = '.xls' if documento.file_name.endswith('.xls') else '.xlsx'
+        descriptor, ruta = tempfile.mkstemp(suffix=sufijo)
+        os.close(descriptor)
+        try:
+            await archivo.download_to_drive(ruta)
+            return await self.cargar_archivo(ruta, update)
+        finally:
+            os.remove(ruta)
+
+    async def cargar_archivo(self, ruta, update=None):
+        """
+        Carga las filas de un archivo local, insertando cada lote apenas el proceso lector lo entrega.
+
+        Args:
+            ruta (str): Ruta del archivo `.xlsx` o `.xls`.
+            update (Update, opcional): Mensaje del usuario, usado para responder el avance.
+
+        Returns:
+            tuple: Cantidad de filas insertadas y de filas descartadas.
+
+        Raises:
+            ArchivoPlanificacionError: Si el archivo excede los límites o no tiene el formato esperado.
+        """
+        aviso = await update.message.reply_text('Procesando el archivo...') if update is not None else None
+        loop = asyncio.get_running_loop()
+        pool, administrador = await loop.run_in_executor(None, _pool_procesos)
+        cola = administrador.Queue(maxsize=max(1, int(os.getenv('PLANIFICACION_LOTES_EN_COLA', 2))))
+        cancelada = administrador.Event()
+        vence = time.time() + self.timeout
+        lectura = loop.run_in_executor(
+            pool, leer_lotes, ruta, self.columnas, self.columna_clave, self.columna_fecha,
+            self.max_filas, vence, self.lote, cola, cancelada
+        )
+
+        insertadas = 0
+        try:
+            while True:
+                try:
+                    tipo, valor = await loop.run_in_executor(None, cola.get, True, 1)
+                except queue.Empty:
+                    if lectura.done():
+                        # El proceso lector terminó sin avisar: se propaga su error
+                        lectura.result()
+                        raise ArchivoPlanificacionError("La lectura del archivo terminó sin resultado")
+                    # El proceso abandona la lectura al vencer el plazo; la espera tiene un margen para eso
+                    if time.time() > vence + 10:
+                        raise ArchivoPlanificacionError("El archivo tardó demasiado en procesarse")
+                    continue
+
+                if tipo == 'fin':
+                    return insertadas, valor
+                registros = [self.construir_registro(valores) for valores in valor]
+                await self.insertar(registros)
+                insertadas += len(registros)
+                logging.info(f"Planificación: {insertadas} filas insertadas")
+                if aviso is not None:
+                    await aviso.edit_text(f'Procesando el archivo... {insertadas} medidores registrados.')
+        except ArchivoPlanificacionError as e:
+            if insertadas:
+                raise ArchivoPlanificacionError(f"{e} (se registraron {insertadas} medidores antes del error)")
+            raise
+        finally:
+            cancelada.set()
+            lectura.add_done_callback(_ignorar_resultado)
@@ -0,0 +1,423 @@
+"""
+## Plantillas de los reportes
+
+Los textos de los cinco reportes de ambos bots, definidos una sola vez por `(marca, comando)`.
+
+Cada plantilla es texto con campos `{NOMBRE}` (columnas de la consulta) y `{nombre}`, `{medidor}`,
+`{clave}` (datos de la solicitud), con el mismo formato que una f-string (`{valor:.2f}`). Se compilan
+al importar el módulo, así que un error de sintaxis en una plantilla falla al arrancar el bot.
+
+Los reportes con una fila por registro (alarmas, órdenes de servicio, bitácora) se arman desde las
+tuplas de `DataFrame.itertuples`, sin construir una `Series` por fila como `iterrows`: la plantilla
+de la fila se traduce una vez por juego de columnas a un formato posicional (`{3}`) que toma los
+valores directamente de la tupla.
+"""
+
+from itertools import starmap
+from string import Formatter
+
+
+def _partes(texto):
+    # Valida el texto y devuelve sus partes (literal, campo, formato, conversión)
+    return list(Formatter().parse(texto))
+
+
+def _escapar(literal):
+    return literal.replace('{', '{{').replace('}', '}}')
+
+
+def primera_fila(tabla):
+    """
+    Devuelve la primera fila de un DataFrame como diccionario.
+
+    Args:
+        tabla (DataFrame): Resultado de una consulta.
+
+    Returns:
+        dict: Columna -> valor de la primera fila, o vacío si no hay filas.
+    """
+    for fila in tabla.itertuples(index=False, name=None):
+        return dict(zip(tabla.columns, fila))
+    return {}
+
+
+class Plantilla:
+    """
+    ## Clase Plantilla:
+    Texto de un reporte compilado para renderizarse muchas veces.
+
+    Sin `fila`, el texto se llena con la primera fila de las tablas y los datos de la solicitud. Con
+    `fila`, el texto es el encabezado y le siguen todas las filas de la tabla unidas por `separador`,
+    y al final el `pie`.
+
+    Args:
+        texto (str): Texto del reporte, o su encabezado si hay `fila`.
+        fila (str, opcional): Texto de cada fila de la tabla.
+        separador (str): Texto entre filas.
+        pie (str): Texto después de las filas.
+    """
+
+    def __init__(self, texto, fila=None, separador='', pie=''):
+        self.texto = texto
+        self.fila = fila
+        self.separador = separador
+        self.pie = pie
+
+        _partes(texto)
+        _partes(pie)
+        self._partes_fila = _partes(fila) if fila is not None else None
+        # Formato posicional de la fila por juego de columnas
+        self._formatos = {}
+
+    def formato_fila(self, columnas):
+        """
+        Traduce la plantilla de la fila a un formato posicional para las columnas dadas.
+
+        Args:
+            columnas (iterable): Columnas de la tabla, en orden.
+
+        Returns:
+            str: Formato con los campos reemplazados por la posición de su columna.
+
+        Raises:
+            KeyError: Si la plantilla usa una columna que la tabla no tiene.
+        """
+        columnas = tuple(columnas)
+        formato = self._formatos.get(columnas)
+        if formato is None:
+            indices = {columna: indice for indice, columna in reversed(list(enumerate(columnas)))}
+            piezas = []
+            for literal, campo, especificacion, conversion in self._partes_fila:
+                piezas.append(_escapar(literal))
+                if campo is None:
+                    continue
+                piezas.append('{' + str(indices[campo]))
+                if conversion:
+                    piezas.append('!' + conversion)
+                if especificacion:
+                    piezas.append(':' + especificacion)
+                piezas.append('}')
+            formato = self._formatos[columnas] = ''.join(piezas)
+        return formato
+
+    def filas(self, tabla):
+        """
+        Renderiza la plantilla de la fila para cada fila de la tabla.
+
+        Args:
+            tabla (DataFrame): Filas del reporte.
+
+        Returns:
+            Iterator[str]: Texto de cada fila.
+        """
+        formato = self.formato_fila(tabla.columns)
+        return starmap(formato.format, tabla.itertuples(index=False, name=None))
+
+    def renderizar(self, *tablas, **contexto):
+        """
+        Renderiza el reporte.
+
+        Args:
+            *tablas (DataFrame): Con `fila`, la tabla a listar; sin `fila`, tablas de las que se toma
+                la primera fila (si dos tienen la misma columna, gana la última).
+            **contexto: Datos de la solicitud (`nombre`, `medidor`, `clave`...).
+
+        Returns:
+            str: Mensaje del reporte.
+        """
+        if self.fila is None:
+            valores = {}
+            for tabla in tablas:
+                valores.update(primera_fila(tabla))
+            valores.update(contexto)
+            return self.texto.format_map(valores)
+
+        return (
+            self.texto.format_map(contexto)
+            + self.separador.join(self.filas(tablas[0]))
+            + self.pie.format_map(contexto)
+        )
+
+
+def mensaje_tabla(plantillas, tabla, clave, **contexto):
+    """
+    Elige y renderiza la plantilla de un reporte basado en una tabla.
+
+    Args:
+        plantillas (dict): Plantillas del `(marca, comando)`, de `PLANTILLAS`.
+        tabla (DataFrame): Resultado de la consulta del reporte.
+        clave (str): Clave del medidor, o "EMPTY" si no se encontró.
+        **contexto: Datos de la solicitud (`nombre`, `medidor`).
+
+    Returns:
+        str: `sin_clave` si no hay clave (y el reporte la requiere), `vacio` si la tabla no tiene
+        filas, o `reporte`.
+    """
+    contexto['clave'] = clave
+    if clave == "EMPTY" and 'sin_clave' in plantillas:
+        return plantillas['sin_clave'].renderizar(**contexto)
+    if tabla.empty:
+        return plantillas['vacio'].renderizar(**contexto)
+    return plantillas['reporte'].renderizar(tabla, **contexto)
+
+
+# Tabla de `datos` (resultado de `consultar_reporte`) de los reportes basados en una tabla
+TABLA_POR_COMANDO = {
+    '1': 'informacion_medidor',
+    '3': 'alarmas_medidor',
+    '4': 'ordenes',
+    '5': 'comentario_telegestion',
+}
+
+
+# Textos comunes
+
+SIN_CLAVE = "No se encontro informacion del medidor: {medidor}"
+
+UNIVERSO_ME = (
+    "Hola Ingeniero {nombre}\n\n"
+    "El siguiente reporte es para el medidor: {medidor}.\n\n"
+    "Clave: {CLAVE_INCMS}\n"
+    "Nombre Abonado: {NOMBRE_ABONADO_INCMS}\n"
+    "Medidor: {MEDIDOR_INCMS}\n"
+    "Multiplicador: {MULTIPLICADOR_INCMS}\n"
+    "Último Consumo: {ULTIMO_CONSUMO}\n"
+    "Lectura Actual: {LECTURA_ACTUAL}\n"
+    "Código de Lectura: {CODIGO_LECTURA}\n"
+    "Tarifa: {TARIFA}\n"
+    "Tipo de Medida: {TIPO_MEDIDA}\n"
+    "Zona: {ZONA}\n"
+    "Región PNRP: {REGION_PNRP}\n"
+    "Circuito: {CIRCUITO}\n"
+    "Subestación: {SUBESTACION}\n"
+    "Coord. (X,Y):  {COORD_U_Y}, {COORD_U_X}\n"
+    "Coord. UTM (X,Y): {COORD_Y}, {COORD_X}\n"
+    "Ubicacion de medidor: https://www.google.com/maps?q={COORD_U_Y},{COORD_U_X}"
+)
+
+ALARMA = "- {%s} \n(Ultima Fecha Detectada: {FECHA}, Cantidad: {CANTIDAD})\n\n"
+PIE_ALARMAS = "\nPor favor revise las alarmas mencionadas."
+
+ENCABEZADO_OS = (
+    "Hola ingeniero {nombre},\n\n"
+    "El siguiente reporte es para el medidor: {medidor}.\n\n"
+    "Alarmas del medidor:\n\n"
+)
+ORDEN = (
+    "Número de OS: {OS}\n"
+    "Estado de la OS: {ESTADO}\n"
+    "%s"
+    "Categoría de la anomalía: {CATEGORIA}\n"
+    "Descripción de OS: {DESCRIPCION}\n"
+    "Fecha Generada: {FECHA_GENERADA}\n"
+    "Fecha de Ejecución: {FECHA_EJECUCION}\n"
+)
+VACIO_OS_ME = "Hola ingeniero {nombre}, no se encontraron Ordenes de Servicio para el medidor: {medidor} con clave: {clave}"
+SIN_CLAVE_OS_ME = "No se encontró ordenes de servicio para el medidor {medidor} con clave {clave}."
+
+VACIO_BITACORA = "Hola ingeniero {nombre}, no se ha realizado analisis para el medidor: {medidor} con clave: {clave}"
+
+BITACORA_ME = Plantilla(
+    "Hola ingeniero {nombre}, \n\n"
+    "el siguiente reporte es para el medidor: {medidor}\n\n"
+    "El departamento de telegestion ha hecho una o mas revisiones al medidor.\n",
+    fila=(
+        "Fecha de analisis: {FECHA_ANALISIS}\n"
+        "Alarma encontrada: {ALARMA}\n"
+        "Fecha de la alarma encontrada: {FECHA_ALARMA}\n"
+        "Comentario del analista: {COMENTARIO_ANALISTA}\n"
+        "Criticidad de la alarma: {CRITICIDAD_ALARMA}\n"
+        "Estado de la revision: {ESTADO}\n"
+    ),
+    separador="\n\n",
+)
+
+ENCABEZADO_COMUNICACION_HEXING = (
+    "Hola Ingeniero {nombre}\n\n"
+    "El siguiente reporte es para el medidor: {medidor} con clave: {clave}.\n\n"
+)
+PROMEDIOS_HEXING = (
+    "Promedio de comunicaciones:\n"
+    "Promedio en los ultimos 7 dias: {PorcentajeComunicacion7Dias}.\n"
+    "Promedio en los ultimos 30 dias: {PorcentajeComunicacion30Dias}.\n"
+)
+
+ENCABEZADO_COMUNICACION_UNION = (
+    "Hola ingeniero {nombre}\n\n"
+    "El reporte de comunicación para el medidor: {medidor} es el siguiente:\n\n"
+)
+ULTIMA_COMUNICACION_UNION = (
+    "- Ultima fecha de comunicacion: {FECHA}\n"
+    "- Ultima lectura: {LECTURA}\n"
+)
+PORCENTAJES_UNION = (
+    "- Últimos 7 días: {PorcentajeComunicacion7Dias:.2f}%\n"
+    "- Último mes: {PorcentajeComunicacion1Mes:.2f}%\n"
+    "- Últimos 3 meses: {PorcentajeComunicacion3Meses:.2f}%\n"
+    "- Último año: {PorcentajeComunicacion1Ano:.2f}%\n\n"
+)
+PIE_COMUNICACION_UNION = "Por favor revise los porcentajes de comunicación mencionados."
+
+VACIO_COMUNICACION = "Hola ingeniero {nombre}, no se obtuvo la comunicacion del medidor: {medidor}"
+
+
+# Plantillas por (marca, comando). Los reportes de tabla usan `sin_clave`, `vacio` y `reporte`.
+PLANTILLAS = {
+    ('Elster', '1'): {
+        'reporte': Plantilla(
+            "Hola Ingeniero {nombre}\n\n"
+            "El siguiente reporte es para el medidor: {medidor}.\n\n"
+            "Clave: {CLAVE_INCMS}\n"
+            "Nombre Abonado: {NOMBRE_ABONADO_INCMS}\n"
+            "Medidor: {MEDIDOR_INCMS}\n"
+            "Multiplicador: {MULTIPLICADOR}\n"
+            "Último Consumo: {ULTIMO_CONSUMO}\n"
+            "Lectura Actual: {LECTURA_ACTUAL}\n"
+            "Código de Lectura: {CODIGO_LECTURA}\n"
+            "Tarifa: {TARIFA}\n"
+            "Tipo de Medida: {TIPO_MEDIDA}\n"
+            "Zona: {ZONA}\n"
+            "Región PNRP: {REGION_PNRP}\n"
+            "Circuito: {CIRCUITO}\n"
+            "Subestación: {SUBESTACION}\n"
+            "Coord. Geograficas(X,Y): {COORD_U_X}, {COORD_U_Y}\n"
+            "Coord. UTM(X,Y):{COORD_X}, {COORD_Y}\n"
+            "Ubicacion de medidor: https://www.google.com/maps?q={COORD_U_Y},{COORD_U_X}"
+        ),
+        'vacio': Plantilla("Hola ingeniero {nombre}, no hay informacion del medidor: {medidor}"),
+        'sin_clave': Plantilla(SIN_CLAVE),
+    },
+    ('Elster', '2'): {
+        # ultima_comunicacion, gatekeeper_info, estado_rele y comunica los calcula el bot
+        'reporte': Plantilla(
+            "Hola Ingeniero {nombre}\n\n"
+            "El siguiente reporte es para el medidor: {medidor} con clave: {clave}.\n\n"
+            "{ultima_comunicacion}\n"
+            "{gatekeeper_info}\n"
+            "Estado del rele: {estado_rele}\n\n"
+            "Comunicación: {comunica}"
+        ),
+        'vacio': Plantilla("Hola ingeniero {nombre}, no hay informacion del medidor: {medidor}"),
+        'sin_clave': Plantilla(SIN_CLAVE),
+    },
+    ('Elster', '3'): {
+        'reporte': Plantilla(
+            "Hola ingeniero {nombre}\n\n"
+            "El siguiente reporte es para el medidor: {medidor}.\n\n"
+            "Alarmas del medidor:\n\n",
+            fila=ALARMA % 'NOMBRE_EVENTO',
+            pie=PIE_ALARMAS,
+        ),
+        'vacio': Plantilla("Hola ingeniero {nombre}, no hay informacion del medidor: {medidor}"),
+        'sin_clave': Plantilla("No se encontro información de alarmas para el medidor {medidor}."),
+    },
+    ('Elster', '4'): {
+        'reporte': Plantilla(ENCABEZADO_OS, fila=ORDEN % '', separador="\n\n"),
+        'vacio': Plantilla("Hola ingeniero {nombre}, no hay informacion del medidor: {medidor}"),
+        'sin_clave': Plantilla("No se encontro ordenes de servicio para el medidor {medidor} con clave {clave}."),
+    },
+    ('Elster', '5'): {
+        'reporte': Plantilla(
+            "\nHola ingeniero {nombre}, \n\n"
+            "El siguiente reporte es para el medidor: {medidor}\n\n"
+            "El departamento de telegestion ha hecho una o mas revisiones al medidor.\n",
+            fila=(
+                "Fecha de analisis: {FECHA_ANALISIS}\n"
+                "Alarma encontrada: {ALARMA}\n"
+                "Comentario del analista: {COMENTARIO_ANALISTA}\n"
+            ),
+            separador="\n\n",
+        ),
+        'vacio': Plantilla(VACIO_BITACORA),
+    },
+
+    ('Hexing', '1'): {
+        'reporte': Plantilla(UNIVERSO_ME),
+        'vacio': Plantilla("Hola ingeniero {nombre}, no tenemos informacion del medidor: {medidor}"),
+        'sin_clave': Plantilla(SIN_CLAVE),
+    },
+    ('Hexing', '2'): {
+        # Tablas: última comunicación y promedios
+        'reporte': Plantilla(
+            ENCABEZADO_COMUNICACION_HEXING
+            + "Ultima Fecha de comunicacion: {FECHA}\n"
+            "Ultima Lectura: {LECTURA}\n\n"
+            + PROMEDIOS_HEXING
+        ),
+        'sin_ultima': Plantilla(
+            ENCABEZADO_COMUNICACION_HEXING
+            + "No se obtuvo la ultima comunicacion\n\n"
+            + PROMEDIOS_HEXING
+        ),
+        'sin_porcentajes': Plantilla(
+            ENCABEZADO_COMUNICACION_HEXING
+            + "Ultima Fecha de comunicacion: {FECHA}\n"
+            "Ultima Lectura: {LECTURA}\n\n"
+            "Promedio de comunicaciones:\n"
+            "No se Obtuvo el promedio de la comunicacion"
+        ),
+        'vacio': Plantilla(VACIO_COMUNICACION),
+        'sin_clave': Plantilla(SIN_CLAVE),
+    },
+    ('Hexing', '3'): {
+        'reporte': Plantilla(
+            "Hola ingeniero {nombre}\n\n"
+            "El siguiente reporte es para el medidor: {medidor}.\n\n"
+            "Alarmas del medidor:\n\n",
+            fila=ALARMA % 'ALARM_DESC',
+            pie=PIE_ALARMAS,
+        ),
+        'vacio': Plantilla("Hola ingeniero {nombre}, No se encontraron alarmas para el medidor: {medidor}"),
+        'sin_clave': Plantilla("No se encontró información de alarmas para el medidor {medidor}."),
+    },
+    ('Hexing', '4'): {
+        'reporte': Plantilla(ENCABEZADO_OS, fila=ORDEN % "Tipo de Gestion: {DESCRIPCION_OS}\n", separador="\n\n"),
+        'vacio': Plantilla(VACIO_OS_ME),
+        'sin_clave': Plantilla(SIN_CLAVE_OS_ME),
+    },
+    ('Hexing', '5'): {
+        'reporte': BITACORA_ME,
+        'vacio': Plantilla(VACIO_BITACORA),
+    },
+
+    ('Union', '1'): {
+        'reporte': Plantilla(UNIVERSO_ME),
+        'vacio': Plantilla("Hola ingeniero {nombre}, no tenemos informacion del medidor: {medidor}"),
+        'sin_clave': Plantilla(SIN_CLAVE),
+    },
+    ('Union', '2'): {
+        # Tablas: última comunicación y porcentajes
+        'reporte': Plantilla(
+            ENCABEZADO_COMUNICACION_UNION + ULTIMA_COMUNICACION_UNION + PORCENTAJES_UNION + PIE_COMUNICACION_UNION
+        ),
+        'sin_ultima': Plantilla(
+            ENCABEZADO_COMUNICACION_UNION + "Porcentaje de Comunicacion\n" + PORCENTAJES_UNION + PIE_COMUNICACION_UNION
+        ),
+        'sin_porcentajes': Plantilla(
+            ENCABEZADO_COMUNICACION_UNION + ULTIMA_COMUNICACION_UNION
+            + "- No se obtuvo el promedio de comunicacion\n" + PIE_COMUNICACION_UNION
+        ),
+        'vacio': Plantilla(VACIO_COMUNICACION),
+        'sin_clave': Plantilla("No se encontró información de comunicación para el medidor {medidor} con clave {clave}."),
+    },
+    ('Union', '3'): {
+        'reporte': Plantilla(
+            "hola ingeniero {nombre}\n\n"
+            "El siguiente reporte es para el medidor: {medidor}\n\n"
+            "Alarmas del medidor:\n\n",
+            fila=ALARMA % 'NOMBRE_EVENTO',
+            pie=PIE_ALARMAS,
+        ),
+        'vacio': Plantilla("Hola ingeniero {nombre}, No se encontraron alarmas para el medidor: {medidor}"),
+        'sin_clave': Plantilla("No se encontro informacion de la alarmas para el medidor {medidor}."),
+    },
+    ('Union', '4'): {
+        'reporte': Plantilla(ENCABEZADO_OS, fila=ORDEN % '', separador="\n\n"),
+        'vacio': Plantilla(VACIO_OS_ME),
+        'sin_clave': Plantilla(SIN_CLAVE_OS_ME),
+    },
+    ('Union', '5'): {
+        'reporte': BITACORA_ME,
+        'vacio': Plantilla(VACIO_BITACORA),
+    },
+}
@@ -0,0 +1,221 @@
+"""
+## Procesador concurrente de solicitudes
+
+Procesa las solicitudes pendientes de un ciclo con concurrencia acotada. Las solicitudes de un mismo
+usuario (`ID_TG`) se atienden en orden, una después de otra, mientras que las de usuarios distintos
+avanzan en paralelo hasta el límite configurado.
+
+Una solicitud que ya está siendo atendida no se vuelve a tomar aunque aparezca en otro ciclo, de modo
+que dos tareas nunca procesan la misma fila.
+
+Dentro de un lote, las solicitudes idénticas (mismo comando, medidor y marca) comparten una sola
+ejecución de las consultas mediante `UnSoloVuelo`; cada solicitante recibe su propio mensaje. Las
+claves de los medidores del lote se resuelven antes, en una consulta por marca (ver `claves.py`).
+
+`DespachadorSolicitudes` ejecuta un ciclo en cuanto un manejador inserta una solicitud; el sondeo
+periódico queda solo como respaldo para las filas insertadas por otros procesos.
+"""
+
+import asyncio
+import logging
+import os
+
+
+class UnSoloVuelo:
+    """
+    ## Clase UnSoloVuelo:
+    Agrupa las llamadas concurrentes con la misma clave para que la función se ejecute una sola vez y
+    todas reciban el mismo resultado (single-flight).
+    """
+
+    def __init__(self):
+        self._vuelos = {}
+        self.llamadas = 0
+        self.ejecuciones = 0
+
+    async def ejecutar(self, clave, funcion):
+        """
+        Ejecuta `funcion` una sola vez por clave y devuelve su resultado a todos los que lo pidan.
+
+        Args:
+            clave (hashable): Identifica el trabajo a compartir.
+            funcion (callable): Corrutina sin argumentos que realiza el trabajo.
+
+        Returns:
+            Any: Resultado de `funcion`.
+        """
+        self.llamadas += 1
+        tarea = self._vuelos.get(clave)
+        if tarea is None:
+            self.ejecuciones += 1
+            tarea = asyncio.ensure_future(funcion())
+            self._vuelos[clave] = tarea
+        return await asyncio.shield(tarea)
+
+
+class LoteSolicitudes:
+    """
+    ## Clase LoteSolicitudes:
+    Estado compartido por las solicitudes de un mismo lote.
+
+    Args:
+        claves (dict, opcional): `(marca, medidor normalizado)` -> clave, resueltas para todo el lote.
+    """
+
+    def __init__(self, claves=None):
+        self.vuelos = UnSoloVuelo()
+        self.claves = claves or {}
+
+
+class ProcesadorSolicitudes:
+    """
+    ## Clase ProcesadorSolicitudes:
+    Ejecuta una corrutina por solicitud con un máximo de `limite` solicitudes en curso.
+
+    Args:
+        procesar (callable): Corrutina `procesar(context, solicitud, lote)` que atiende una solicitud;
+            `lote` es el `LoteSolicitudes` con las claves resueltas y las consultas compartidas.
+        columna_id (str): Columna que identifica la fila de la solicitud (`ITEM` o `id`).
+        limite (int, opcional): Máximo de solicitudes en curso; por defecto `SOLICITUDES_CONCURRENCIA` o 8.
+        columna_usuario (str): Columna con el usuario, usada para conservar el orden por usuario.
+    """
+
+    def __init__(self, procesar, columna_id, limite=None, columna_usuario='ID_TG'):
+        self.procesar = procesar
+        self.columna_id = columna_id
+        self.limite = limite or int(os.getenv('SOLICITUDES_CONCURRENCIA', 8))
+        self.columna_usuario = columna_usuario
+        self._semaforo = asyncio.Semaphore(self.limite)
+        self._en_proceso = set()
+
+    async def _procesar_usuario(self, context, solicitudes, lote):
+        # Las solicitudes de un mismo usuario se atienden en el orden en que llegaron
+        for solicitud in solicitudes:
+            solicitud_id = solicitud[self.columna_id]
+            try:
+                async with self._semaforo:
+                    await self.procesar(context, solicitud, lote)
+            except Exception as e:
+                logging.error(f"Error al procesar la solicitud {solicitud_id}: {e}")
+            finally:
+                self._en_proceso.discard(solicitud_id)
+
+    async def procesar_lote(self, context, solicitudes, claves=None):
+        """
+        Procesa un lote de solicitudes y espera a que todas terminen.
+
+        Args:
+            context (CallbackContext | Application): Contexto con el bot para enviar mensajes.
+            solicitudes (iterable): Filas de solicitudes en el orden en que se deben atender.
+            claves (dict, opcional): Claves del lote resueltas con `ResolutorClaves.resolver_lote`.
+
+        Returns:
+            int: Cantidad de solicitudes tomadas en este lote.
+        """
+        por_usuario = {}
+        for solicitud in solicitudes:
+            solicitud_id = solicitud[self.columna_id]
+            if solicitud_id in self._en_proceso:
+                continue
+            self._en_proceso.add(solicitud_id)
+            por_usuario.setdefault(solicitud[self.columna_usuario], []).append(solicitud)
+
+        lote = LoteSolicitudes(claves)
+        vuelos = lote.vuelos
+        await asyncio.gather(*(self._procesar_usuario(context, filas, lote) for filas in por_usuario.values()))
+        if vuelos.llamadas:
+            logging.info(f"Lote de {vuelos.llamadas} solicitudes atendido con {vuelos.ejecuciones} reportes distintos")
+        return sum(len(filas) for filas in por_usuario.values())
+
+
+class DespachadorSolicitudes:
+    """
+    ## Clase DespachadorSolicitudes:
+    Ejecuta un ciclo de procesamiento apenas se notifica una nueva solicitud, sin esperar al siguiente
+    sondeo del JobQueue. Las notificaciones que llegan mientras un ciclo está en curso se agrupan en un
+    único ciclo adicional.
+
+    Cada ciclo reclama como máximo `lote` solicitudes; mientras un ciclo vuelve con el reclamo lleno se
+    ejecuta otro de inmediato, para que una ráfaga mayor que el lote no espere al sondeo de respaldo.
+
+    Args:
+        procesar_ciclo (callable): Corrutina `procesar_ciclo(context)` que atiende las solicitudes
+            pendientes y devuelve cuántas reclamó.
+        lote (int, opcional): Solicitudes por reclamo (`ColaSolicitudes.lote`). Sin lote se ejecuta un
+            solo ciclo por notificación.
+    """
+
+    def __init__(self, procesar_ciclo, lote=None):
+        self.procesar_ciclo = procesar_ciclo
+        self.lote = lote
+        self._evento = None
+        self._tarea = None
+        self._ocupado = False
+
+        # Contadores
+        self.ciclos = 0
+
+    def notificar(self):
+        """
+        Avisa que hay una solicitud nueva. No bloquea; si el despachador no está iniciado no hace nada.
+        """
+        if self._evento is not None:
+            self._evento.set()
+
+    @property
+    def inactivo(self):
+        """
+        True si el despachador está iniciado, sin ciclo en curso y sin notificaciones pendientes.
+        """
+        return self._evento is not None and not self._evento.is_set() and not self._ocupado
+
+    async def esperar_inactivo(self, intervalo=0.01):
+        """
+        Espera a que el despachador termine los ciclos en curso y los notificados.
+
+        Args:
+            intervalo (float, opcional): Segundos entre revisiones.
+        """
+        while not self.inactivo:
+            await asyncio.sleep(intervalo)
+
+    async def _ejecutar(self, context):
+        while True:
+            await self._evento.wait()
+            self._evento.clear()
+            self._ocupado = True
+            try:
+                while True:
+                    self.ciclos += 1
+                    reclamadas = await self.procesar_ciclo(context)
+                    # Un reclamo lleno indica que quedan solicitudes en la cola
+                    if not self.lote or reclamadas is None or reclamadas < self.lote:
+                        break
+            except Exception as e:
+                logging.error(f"Error en el ciclo despachado de solicitudes: {e}")
+            finally:
+                self._ocupado = False
+
+    def iniciar(self, context):
+        """
+        Inicia la tarea del despachador en el bucle de eventos actual.
+
+        Args:
+            context (Application): Aplicación con el bot para enviar mensajes.
+        """
+        self._evento = asyncio.Event()
+        self._tarea = asyncio.get_running_loop().create_task(self._ejecutar(context))
+
+    async def detener(self):
+        """
+        Cancela la tarea del despachador y espera a que termine.
+        """
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+            self._evento = None
+            self._ocupado = False
@@ -0,0 +1,200 @@
+"""
+## Servidor HTTP mínimo sobre asyncio
+
+Servidor HTTP/1.1 pequeño, solo con la biblioteca estándar, que corre en el mismo bucle de eventos
+que el bot. Lo usan el modo webhook (`webhook.py`) y los endpoints de salud.
+
+- Rutas exactas por método y ruta; cada manejador es una corrutina que recibe la `SolicitudHTTP` y
+  devuelve `(estado, cuerpo)`. Un cuerpo `dict`/`list` se responde como JSON y un `str` como texto.
+- Conexiones persistentes (keep-alive), con `SERVIDOR_ESPERA` segundos (por defecto 15) de espera
+  máxima por solicitud.
+- Cuerpos de hasta `SERVIDOR_MAX_CUERPO` bytes (por defecto 1 MB); los mayores responden 413.
+
+No implementa TLS: en producción se ubica detrás del proxy que termina HTTPS.
+"""
+
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+import asyncio
+import json
+import logging
+import os
+
+
+class SolicitudHTTP:
+    """
+    ## Clase SolicitudHTTP:
+    Solicitud recibida por el servidor.
+
+    Args:
+        metodo (str): Método HTTP (`GET`, `POST`...).
+        ruta (str): Ruta sin la consulta.
+        consulta (dict): Parámetros de la consulta (`?a=1`), con listas de valores.
+        cabeceras (dict): Cabeceras con el nombre en minúsculas.
+        cuerpo (bytes): Cuerpo de la solicitud.
+    """
+
+    def __init__(self, metodo, ruta, consulta, cabeceras, cuerpo):
+        self.metodo = metodo
+        self.ruta = ruta
+        self.consulta = consulta
+        self.cabeceras = cabeceras
+        self.cuerpo = cuerpo
+
+    def json(self):
+        """
+        Interpreta el cuerpo como JSON.
+
+        Returns:
+            Any: Contenido del cuerpo.
+        """
+        return json.loads(self.cuerpo)
+
+
+class ServidorHTTP:
+    """
+    ## Clase ServidorHTTP:
+    Servidor HTTP/1.1 con rutas registradas por método y ruta.
+
+    Args:
+        host (str): Dirección en la que escucha.
+        puerto (int): Puerto en el que escucha.
+        max_cuerpo (int, opcional): Bytes máximos del cuerpo; por defecto `SERVIDOR_MAX_CUERPO` o 1 MB.
+        espera (float, opcional): Segundos máximos para recibir una solicitud; por defecto
+            `SERVIDOR_ESPERA` o 15.
+    """
+
+    def __init__(self, host, puerto, max_cuerpo=None, espera=None):
+        self.host = host
+        self.puerto = puerto
+        self.max_cuerpo = max_cuerpo or int(os.getenv('SERVIDOR_MAX_CUERPO', 1024 * 1024))
+        self.espera = espera or float(os.getenv('SERVIDOR_ESPERA', 15))
+        self._rutas = {}
+        self._servidor = None
+
+        # Contadores
+        self.solicitudes = 0
+        self.errores = 0
+
+    def ruta(self, metodo, ruta, manejador):
+        """
+        Registra el manejador de una ruta.
+
+        Args:
+            metodo (str): Método HTTP.
+            ruta (str): Ruta exacta (`/salud`).
+            manejador (callable): Corrutina `manejador(solicitud)` que devuelve `(estado, cuerpo)`.
+        """
+        self._rutas[(metodo.upper(), ruta)] = manejador
+
+    async def iniciar(self):
+        """
+        Empieza a aceptar conexiones en el bucle de eventos actual.
+        """
+        self._servidor = await asyncio.start_server(self._atender, self.host, self.puerto)
+        direcciones = ', '.join(str(socket.getsockname()) for socket in self._servidor.sockets)
+        logging.info(f"Servidor HTTP escuchando en {direcciones}")
+
+    @property
+    def puerto_local(self):
+        """
+        Puerto en el que escucha el servidor (útil con `puerto=0`).
+        """
+        return self._servidor.sockets[0].getsockname()[1]
+
+    async def detener(self):
+        """
+        Deja de aceptar conexiones y cierra el servidor.
+        """
+        if self._servidor is not None:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+            self._servidor = None
+
+    async def _leer(self, reader):
+        linea = await reader.readline()
+        if not linea:
+            return None
+        metodo, destino, version = linea.decode('latin-1').rstrip('\r\n').split(' ', 2)
+
+        cabeceras = {}
+        while True:
+            linea = await reader.readline()
+            if linea in (b'\r\n', b'\n', b''):
+                break
+            nombre, _, valor = linea.decode('latin-1').partition(':')
+            cabeceras[nombre.strip().lower()] = valor.strip()
+
+        longitud = int(cabeceras.get('content-length', 0))
+        if longitud > self.max_cuerpo:
+            return version, cabeceras, None
+        cuerpo = await reader.readexactly(longitud) if longitud else b''
+
+        partes = urlsplit(destino)
+        return version, cabeceras, SolicitudHTTP(metodo.upper(), partes.path, parse_qs(partes.query), cabeceras, cuerpo)
+
+    async def _responder(self, solicitud):
+        manejador = self._rutas.get((solicitud.metodo, solicitud.ruta))
+        if manejador is None:
+            metodos = [metodo for metodo, ruta in self._rutas if ruta == solicitud.ruta]
+            if metodos:
+                return HTTPStatus.METHOD_NOT_ALLOWED, {'error': 'método no permitido'}
+            return HTTPStatus.NOT_FOUND, {'error': 'ruta no encontrada'}
+        try:
+            return await manejador(solicitud)
+        except Exception as e:
+            self.errores += 1
+            logging.error(f"Error al atender {solicitud.metodo} {solicitud.ruta}: {e}")
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': 'error interno'}
+
+    @staticmethod
+    def _serializar(estado, cuerpo, mantener):
+        if isinstance(cuerpo, (dict, list)):
+            datos, tipo = json.dumps(cuerpo, default=str).encode(), 'application/json'
+        elif isinstance(cuerpo, bytes):
+            datos, tipo = cuerpo, 'application/octet-stream'
+        else:
+            datos, tipo = str(cuerpo or '').encode(), 'text/plain; charset=utf-8'
+        estado = HTTPStatus(estado)
+        encabezado = (
+            f"HTTP/1.1 {estado.value} {estado.phrase}\r\n"
+            f"Content-Type: {tipo}\r\n"
+            f"Content-Length: {len(datos)}\r\n"
+            f"Connection: {'keep-alive' if mantener else 'close'}\r\n\r\n"
+        )
+        return encabezado.encode('latin-1') + datos
+
+    async def _atender(self, reader, writer):
+        try:
+            while True:
+                try:
+                    leido = await asyncio.wait_for(self._leer(reader), timeout=self.espera)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except ValueError:
+                    writer.write(self._serializar(HTTPStatus.BAD_REQUEST, {'error': 'solicitud inválida'}, False))
+                    break
+                if leido is None:
+                    break
+
+                version, cabeceras, solicitud = leido
+                self.solicitudes += 1
+                if solicitud is None:
+                    writer.write(self._serializar(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': 'cuerpo demasiado grande'}, False))
+                    break
+
+                conexion = cabeceras.get('connection', '').lower()
+                mantener = conexion != 'close' and (version == 'HTTP/1.1' or conexion == 'keep-alive')
+                estado, cuerpo = await self._responder(solicitud)
+                writer.write(self._serializar(estado, cuerpo, mantener))
+                await writer.drain()
+                if not mantener:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
@@ -0,0 +1,86 @@
+"""
+Proceso conjunto de `bots.py`: memoria y arranque de un proceso con ambos bots frente a un proceso por
+bot, y el sondeo compartido de las colas (este último requiere `TEST_DB_URL`).
+"""
+
+from datetime import datetime
+from types import SimpleNamespace
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import benchmark
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Importa los módulos indicados, como al arrancar, e informa el tiempo y la memoria residente máxima
+# del proceso. Se lee `VmHWM` y no `ru_maxrss`, que en Linux conserva el máximo del proceso padre
+# a través de `exec`.
+ARRANQUE = """
+import importlib, json, re, sys, time
+inicio = time.perf_counter()
+for nombre in sys.argv[1:]:
+    importlib.import_module(nombre)
+segundos = time.perf_counter() - inicio
+with open('/proc/self/status') as estado:
+    memoria_kb = int(re.search(r'VmHWM:\\s+(\\d+) kB', estado.read()).group(1))
+print(json.dumps({'segundos': segundos, 'memoria_kb': memoria_kb}))
+"""
+
+
+def arrancar(modulos, directorio):
+    # En un directorio temporal: los bots escriben su registro en el directorio actual
+    entorno = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [RAIZ, os.getenv('PYTHONPATH')]))}
+    salida = subprocess.run([sys.executable, '-c', ARRANQUE, *modulos], cwd=directorio, env=entorno,
+                            capture_output=True, text=True, timeout=120, check=True)
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/status'), reason="Requiere /proc (Linux)")
+def test_un_proceso_usa_menos_memoria_y_arranca_antes_que_dos(tmp_path):
+    separados = [arrancar([nombre], tmp_path) for nombre in ('bot_md', 'bot_me')]
+    conjunto = arrancar(['bots', 'bot_md', 'bot_me'], tmp_path)
+
+    # Las bibliotecas (pandas, SQLAlchemy, python-telegram-bot) se cargan una sola vez
+    memoria_separados = sum(medida['memoria_kb'] for medida in separados)
+    assert conjunto['memoria_kb'] < memoria_separados * 0.75
+    assert conjunto['segundos'] < sum(medida['segundos'] for medida in separados)
+
+
+class DespachadorRegistrado:
+    def __init__(self):
+        self.notificaciones = 0
+
+    def notificar(self):
+        self.notificaciones += 1
+
+
+def test_sondeo_notifica_solo_las_colas_con_pendientes(colas_vacias):
+    import bot_md
+    import bot_me
+    from bots import SondeoColas
+
+    bots = {
+        modulo.__name__: SimpleNamespace(engine=colas_vacias, cola_solicitudes=modulo.cola_solicitudes,
+                                         despachador_solicitudes=DespachadorRegistrado())
+        for modulo in (bot_md, bot_me)
+    }
+    sondeo = SondeoColas(bots, intervalo=1)
+    # Un motor compartido: una sola consulta para ambas colas
+    assert len(sondeo._consultas) == 1
+
+    assert sondeo.pendientes() == {'bot_md': False, 'bot_me': False}
+
+    usuario = benchmark.usuarios_sinteticos(benchmark.escala_desde_entorno())[0]
+    fila = benchmark.solicitud_sintetica(benchmark.BOTS['bot_me'], usuario, 1, 'Hexing',
+                                         benchmark.medidor_sintetico('Hexing', 1), datetime.now().replace(microsecond=0))
+    benchmark.insertar_filas(colas_vacias, 'bot_solicitudes_me', [fila])
+
+    assert asyncio.run(sondeo.revisar()) == ['bot_me']
+    assert bots['bot_me'].despachador_solicitudes.notificaciones == 1
+    assert bots['bot_md'].despachador_solicitudes.notificaciones == 0
+    assert (sondeo.revisiones, sondeo.notificaciones) == (1, 1)
@@ -0,0 +1,125 @@
+"""
+`CacheReportes` con un reloj controlado: aciertos dentro del TTL, entrega de entradas vencidas mientras
+se refrescan en segundo plano, refresco fallido y descarte de la entrada menos usada.
+"""
+
+from types import SimpleNamespace
+import asyncio
+
+import pytest
+
+import cache_reportes
+from cache_reportes import CacheReportes
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    # Solo el reloj de la caché; el ciclo de eventos sigue con el suyo
+    reloj = SimpleNamespace(ahora=1000.0)
+    monkeypatch.setattr(cache_reportes, 'time', SimpleNamespace(monotonic=lambda: reloj.ahora))
+    return reloj
+
+
+class Carga:
+    def __init__(self, *valores):
+        self.valores = list(valores)
+        self.llamadas = 0
+
+    async def __call__(self):
+        self.llamadas += 1
+        valor = self.valores.pop(0)
+        if isinstance(valor, Exception):
+            raise valor
+        return valor
+
+
+def test_acierto_dentro_del_ttl(reloj):
+    cache = CacheReportes(ttl_por_comando={'1': 60}, tamano=10, ventana_obsoleta=30)
+    carga = Carga('primero', 'segundo')
+
+    async def consultar():
+        valores = [await cache.obtener(('Hexing', '1', 'C1'), carga)]
+        reloj.ahora += 59
+        valores.append(await cache.obtener(('Hexing', '1', 'C1'), carga))
+        return valores
+
+    assert asyncio.run(consultar()) == ['primero', 'primero']
+    assert carga.llamadas == 1
+    assert cache.estadisticas() == {'aciertos': 1, 'aciertos_obsoletos': 0, 'fallos': 1, 'entradas': 1}
+
+
+def test_entrada_vencida_se_entrega_y_se_refresca(reloj):
+    cache = CacheReportes(ttl_por_comando={'3': 60}, tamano=10, ventana_obsoleta=30)
+    carga = Carga('viejo', 'nuevo')
+    clave = ('Union', '3', 'C1')
+
+    async def consultar():
+        await cache.obtener(clave, carga)
+        reloj.ahora += 70
+        # Dos pedidos vencidos seguidos: ambos reciben el valor viejo y hay un solo refresco
+        valores = [await cache.obtener(clave, carga), await cache.obtener(clave, carga)]
+        assert len(cache._tareas) == 1
+        await asyncio.gather(*cache._tareas)
+        valores.append(await cache.obtener(clave, carga))
+        return valores
+
+    assert asyncio.run(consultar()) == ['viejo', 'viejo', 'nuevo']
+    assert carga.llamadas == 2
+    assert not cache._tareas and not cache._refrescando
+    assert cache.estadisticas() == {'aciertos': 1, 'aciertos_obsoletos': 2, 'fallos': 1, 'entradas': 1}
+
+
+def test_refresco_fallido_conserva_la_entrada(reloj, caplog):
+    cache = CacheReportes(ttl_por_comando={'2': 60}, tamano=10, ventana_obsoleta=30)
+    carga = Carga('viejo', ConnectionError('sin base'), 'nuevo')
+    clave = ('Hexing', '2', 'C1')
+
+    async def consultar():
+        await cache.obtener(clave, carga)
+        reloj.ahora += 70
+        valores = [await cache.obtener(clave, carga)]
+        await asyncio.gather(*cache._tareas)
+        # El refresco fallido no deja la clave marcada: el siguiente pedido vencido lo reintenta
+        valores.append(await cache.obtener(clave, carga))
+        await asyncio.gather(*cache._tareas)
+        valores.append(await cache.obtener(clave, carga))
+        return valores
+
+    assert asyncio.run(consultar()) == ['viejo', 'viejo', 'nuevo']
+    assert carga.llamadas == 3
+    assert 'sin base' in caplog.text
+    assert not cache._tareas and not cache._refrescando
+
+
+def test_fuera_de_la_ventana_obsoleta_se_vuelve_a_cargar(reloj):
+    cache = CacheReportes(ttl_por_comando={'4': 60}, tamano=10, ventana_obsoleta=30)
+    carga = Carga('viejo', 'nuevo')
+
+    async def consultar():
+        await cache.obtener(('Elster', '4', 'C1'), carga)
+        reloj.ahora += 91
+        return await cache.obtener(('Elster', '4', 'C1'), carga)
+
+    assert asyncio.run(consultar()) == 'nuevo'
+    assert cache.estadisticas()['fallos'] == 2
+    assert not cache._tareas
+
+
+def test_descarta_la_entrada_menos_usada(reloj):
+    cache = CacheReportes(ttl_por_comando={'1': 60}, tamano=2, ventana_obsoleta=0)
+    cargas = {clave: Carga(clave, f"{clave}-otra") for clave in ('A', 'B', 'C')}
+
+    async def obtener(clave):
+        return await cache.obtener(('Elster', '1', clave), cargas[clave])
+
+    async def consultar():
+        await obtener('A')
+        await obtener('B')
+        # A pasa a ser la más reciente; al entrar C sale B
+        await obtener('A')
+        await obtener('C')
+        return [await obtener('A'), await obtener('C'), await obtener('B')]
+
+    assert asyncio.run(consultar()) == ['A', 'C', 'B-otra']
+    assert [carga.llamadas for carga in cargas.values()] == [1, 2, 1]
+    assert list(cache._entradas) == [('Elster', '1', 'C'), ('Elster', '1', 'B')]
@@ -0,0 +1,69 @@
+"""
+`ResolutorClaves.resolver_lote` sobre un universo en SQLite (ver `motor_sqlite`): un lote
+con varias marcas y medidores repetidos o sin normalizar se resuelve con una consulta por marca.
+"""
+
+import asyncio
+
+from sqlalchemy import event, text
+
+from claves import ResolutorClaves, TABLAS_UNIVERSO, normalizar_medidor
+
+UNIVERSO = {
+    'Elster': [('2015-001-000123', 'E-1'), ('2015-001-000456', 'E-2')],
+    'Hexing': [('HX00000001', 'H-1'), ('HX00000002', 'H-2')],
+    'Union': [('000000000123', 'U-1'), ('000000004567', 'U-2')],
+}
+
+
+def crear_universo(engine):
+    with engine.begin() as con:
+        for marca, filas in UNIVERSO.items():
+            con.execute(text(f"CREATE TABLE {TABLAS_UNIVERSO[marca]} (MEDIDOR_CATALOGO TEXT, CLAVE_CATALOGO TEXT)"))
+            con.execute(text(f"INSERT INTO {TABLAS_UNIVERSO[marca]} VALUES (:medidor, :clave)"),
+                        [{'medidor': medidor, 'clave': clave} for medidor, clave in filas])
+    return engine
+
+
+def test_una_consulta_por_marca_y_la_clave_de_cada_solicitud(motor_sqlite):
+    engine = crear_universo(motor_sqlite)
+    ejecutadas = []
+    event.listen(engine, 'before_cursor_execute', lambda con, cursor, sentencia, *_: ejecutadas.append(sentencia))
+
+    # (marca, medidor como lo escribió el usuario, clave esperada)
+    lote = [
+        ('Elster', '2015001000123', 'E-1'),     # sin guiones
+        ('Elster', '2015-001-000123', 'E-1'),   # el mismo, ya normalizado
+        ('Elster', '2015001000456', 'E-2'),
+        ('Elster', '2016002000999', 'EMPTY'),   # no está en el universo
+        ('Hexing', 'HX00000001', 'H-1'),
+        ('Hexing', 'hx00000001 ', 'H-1'),       # minúsculas y espacio final, como compara MySQL
+        ('Hexing', 'HX00000002', 'H-2'),
+        ('Union', '7123', 'U-1'),               # sin el 7 inicial y con ceros
+        ('Union', '123', 'U-1'),
+        ('Union', '000000000123', 'U-1'),
+        ('Union', '74567', 'U-2'),
+        ('Landis', 'L-1', None),                # marca sin universo: no se consulta
+    ]
+    solicitudes = [{'MARCA': marca, 'MEDIDOR': medidor} for marca, medidor, _ in lote]
+    resolutor = ResolutorClaves(engine)
+
+    claves = asyncio.run(resolutor.resolver_lote(solicitudes))
+
+    consultas = [sentencia for sentencia in ejecutadas if 'universo' in sentencia]
+    assert len(consultas) == resolutor.consultas == 3
+    assert sorted(sentencia.split(' FROM ')[1].split()[0] for sentencia in consultas) == sorted(TABLAS_UNIVERSO.values())
+    # Cada medidor normalizado distinto se consulta una sola vez
+    assert resolutor.medidores == 3 + 3 + 2
+
+    for marca, medidor, esperada in lote:
+        assert claves.get((marca, normalizar_medidor(marca, medidor))) == esperada, (marca, medidor)
+
+
+def test_marca_fija_para_todo_el_lote(motor_sqlite):
+    resolutor = ResolutorClaves(crear_universo(motor_sqlite))
+
+    claves = asyncio.run(resolutor.resolver_lote([{'MEDIDOR': '2015001000123'}, {'MEDIDOR': '2015001000456'}], marca='Elster'))
+
+    assert claves == {('Elster', '2015-001-000123'): 'E-1', ('Elster', '2015-001-000456'): 'E-2'}
+    assert resolutor.consultas == 1
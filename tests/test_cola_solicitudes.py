@@ -0,0 +1,120 @@
+"""
+Pruebas de `ColaSolicitudes` con dos trabajadores sobre la misma tabla (requieren `TEST_DB_URL`).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+import benchmark
+from cola_solicitudes import ColaSolicitudes
+
+
+TABLA = 'bot_solicitudes_me'
+
+
+def insertar_solicitudes(engine, cantidad):
+    configuracion = benchmark.BOTS['bot_me']
+    usuario = benchmark.usuarios_sinteticos(benchmark.escala_desde_entorno())[0]
+    ahora = datetime.now().replace(microsecond=0)
+    filas = [
+        benchmark.solicitud_sintetica(configuracion, usuario, 1, 'Hexing', benchmark.medidor_sintetico('Hexing', numero), ahora)
+        for numero in range(cantidad)
+    ]
+    benchmark.insertar_filas(engine, TABLA, filas)
+    with engine.connect() as con:
+        return set(con.execute(text(f"SELECT id FROM {TABLA}")).scalars())
+
+
+def vencer_arriendos(engine):
+    with engine.begin() as con:
+        con.execute(text(f"UPDATE {TABLA} SET LEASE_HASTA = DATE_SUB(NOW(), INTERVAL 1 SECOND) WHERE PROCESO = 1"))
+
+
+def fila(engine, solicitud_id):
+    with engine.connect() as con:
+        return con.execute(text(f"SELECT * FROM {TABLA} WHERE id = :id"), {'id': solicitud_id}).mappings().one()
+
+
+def reclamar_todo(cola):
+    lotes = []
+    while True:
+        solicitudes = cola.reclamar()
+        if solicitudes.empty:
+            return lotes
+        lotes.append(set(solicitudes['id']))
+
+
+def test_dos_trabajadores_no_reclaman_la_misma_fila(colas_vacias):
+    ids = insertar_solicitudes(colas_vacias, 300)
+    colas = [ColaSolicitudes(colas_vacias, TABLA, 'id', lote=7, worker_id=nombre) for nombre in ('a', 'b')]
+
+    with ThreadPoolExecutor(max_workers=2) as hilos:
+        lotes_a, lotes_b = hilos.map(reclamar_todo, colas)
+
+    reclamadas_a = set().union(*lotes_a)
+    reclamadas_b = set().union(*lotes_b)
+    assert lotes_a and lotes_b
+    assert not reclamadas_a & reclamadas_b
+    assert reclamadas_a | reclamadas_b == ids
+    assert sum(len(lote) for lote in lotes_a + lotes_b) == len(ids)
+    assert all(len(lote) <= 7 for lote in lotes_a + lotes_b)
+
+
+def test_arriendo_vencido_se_vuelve_a_reclamar(colas_vacias):
+    (solicitud_id,) = insertar_solicitudes(colas_vacias, 1)
+    a = ColaSolicitudes(colas_vacias, TABLA, 'id', worker_id='a', intentos_maximos=3)
+    b = ColaSolicitudes(colas_vacias, TABLA, 'id', worker_id='b', intentos_maximos=3)
+
+    assert list(a.reclamar()['id']) == [solicitud_id]
+    assert fila(colas_vacias, solicitud_id)['INTENTOS'] == 1
+    # Con el arriendo vigente nadie más la reclama
+    assert b.reclamar().empty
+    assert b.contar_pendientes() == 0
+
+    vencer_arriendos(colas_vacias)
+    assert b.contar_pendientes() == 1
+    assert list(b.reclamar()['id']) == [solicitud_id]
+    reclamada = fila(colas_vacias, solicitud_id)
+    assert reclamada['INTENTOS'] == 2
+    assert reclamada['WORKER_ID'].startswith('b:')
+
+    vencer_arriendos(colas_vacias)
+    assert list(a.reclamar()['id']) == [solicitud_id]
+    assert fila(colas_vacias, solicitud_id)['INTENTOS'] == 3
+
+    # Agotados los intentos la fila ya no se reclama aunque venza el arriendo
+    vencer_arriendos(colas_vacias)
+    assert a.reclamar().empty
+    assert b.reclamar().empty
+    assert fila(colas_vacias, solicitud_id)['INTENTOS'] == 3
+
+
+def test_fila_enviada_no_se_reclama(colas_vacias):
+    (solicitud_id,) = insertar_solicitudes(colas_vacias, 1)
+    a = ColaSolicitudes(colas_vacias, TABLA, 'id', worker_id='a')
+    assert list(a.reclamar()['id']) == [solicitud_id]
+    with colas_vacias.begin() as con:
+        con.execute(text(f"UPDATE {TABLA} SET ENVIADO = 1 WHERE id = :id"), {'id': solicitud_id})
+
+    vencer_arriendos(colas_vacias)
+    assert a.reclamar().empty
+
+
+def test_bot_md_solo_reclama_solicitudes_recientes(colas_vacias):
+    import bot_md
+
+    configuracion = benchmark.BOTS['bot_md']
+    usuario = benchmark.usuarios_sinteticos(benchmark.escala_desde_entorno())[0]
+    ahora = datetime.now().replace(microsecond=0)
+    filas = [
+        benchmark.solicitud_sintetica(configuracion, usuario, 1, 'Elster', benchmark.medidor_sintetico('Elster', numero), fecha)
+        for numero, fecha in enumerate([ahora, ahora - timedelta(days=1), ahora - timedelta(days=400)])
+    ]
+    benchmark.insertar_filas(colas_vacias, 'proceso_bot', filas)
+
+    cola = ColaSolicitudes(colas_vacias, 'proceso_bot', 'ITEM', filtro=bot_md.cola_solicitudes.filtro, worker_id='md')
+    # Las de hoy y ayer, sin importar el año; la histórica queda fuera
+    assert cola.contar_pendientes() == 2
+    assert sorted(cola.reclamar()['MEDIDOR']) == sorted(fila['MEDIDOR'] for fila in filas[:2])
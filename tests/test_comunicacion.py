@@ -0,0 +1,274 @@
+"""
+Regresión de los porcentajes de comunicación del reporte 2 contra la consulta anterior.
+
+Los valores esperados de las pruebas sin base siguen las reglas de MySQL de la consulta anterior:
+`DATE_SUB` con ajuste de fin de mes, `BETWEEN inicio AND CURDATE()` contra la medianoche de hoy y la
+división decimal con `div_precision_increment` = 4. Una prueba con MySQL (`TEST_DB_URL`) ejecuta la
+consulta anterior de `benchmark.SQL_COMUNICACION_ANTERIOR` sobre los mismos datos, y otra construye el
+resumen diario con el bloqueo `GET_LOCK` tomado por otra conexión y después de una carga nueva.
+"""
+
+from datetime import date, datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+import asyncio
+import random
+
+import pytest
+from sqlalchemy import text
+
+from comunicacion import MARCAS, MotorComunicacion, RollupComunicacion, calcular_porcentajes, calcular_porcentajes_diarios, restar_meses
+
+
+HOY = date(2024, 3, 31)
+
+
+def como_float(resultado):
+    return {columna: float(valor) for columna, valor in resultado.items()}
+
+
+@pytest.mark.parametrize('fecha, meses, esperado', [
+    (date(2024, 3, 31), 1, date(2024, 2, 29)),
+    (date(2023, 3, 31), 1, date(2023, 2, 28)),
+    (date(2024, 5, 31), 3, date(2024, 2, 29)),
+    (date(2024, 2, 29), 12, date(2023, 2, 28)),
+    (date(2024, 1, 15), 1, date(2023, 12, 15)),
+])
+def test_restar_meses_como_date_sub(fecha, meses, esperado):
+    assert restar_meses(fecha, meses) == esperado
+
+
+def test_union_bordes_de_las_ventanas():
+    fechas = [
+        datetime(2023, 3, 30),        # fuera del año
+        datetime(2023, 3, 31),        # inicio del año: DATE_SUB(2024-03-31, INTERVAL 1 YEAR)
+        datetime(2024, 2, 28),        # fuera del mes, dentro de 3 meses
+        datetime(2024, 2, 29),        # inicio del mes
+        datetime(2024, 3, 24),        # inicio de los 7 días
+        datetime(2024, 3, 31),        # medianoche de hoy: dentro
+        datetime(2024, 3, 31, 10),    # hoy después de la medianoche: fuera
+    ]
+    # 7 días: (7 - 2) / 7 = 0.7143; 1 mes: (32 - 3) / 32 = 0.9063;
+    # 3 meses: (92 - 4) / 92 = 0.9565; 1 año: (367 - 5) / 367 = 0.9864
+    assert como_float(calcular_porcentajes(fechas, HOY, 'Union')) == {
+        'PorcentajeComunicacion7Dias': 71.43,
+        'PorcentajeComunicacion1Mes': 90.63,
+        'PorcentajeComunicacion3Meses': 95.65,
+        'PorcentajeComunicacion1Ano': 98.64,
+    }
+
+
+def test_hexing_bordes_de_las_ventanas():
+    fechas = [
+        datetime(2024, 2, 29, 23, 45),  # fuera de los 30 días
+        datetime(2024, 3, 1),           # inicio de los 30 días
+        datetime(2024, 3, 23, 23, 45),  # fuera de los 7 días
+        datetime(2024, 3, 24),          # inicio de los 7 días
+        datetime(2024, 3, 25, 12),
+        datetime(2024, 3, 28, 6, 15),
+        datetime(2024, 3, 30, 23, 45),
+        datetime(2024, 3, 31),          # medianoche de hoy: dentro
+        datetime(2024, 3, 31, 0, 15),   # fuera
+    ]
+    # Totales con escala 4 (672.0000 y 2880.0000), cociente con escala 8:
+    # (672 - 5) / 672 = 0.99255952 y (2880 - 7) / 2880 = 0.99756944
+    assert como_float(calcular_porcentajes(fechas, HOY, 'Hexing')) == {
+        'PorcentajeComunicacion7Dias': 99.255952,
+        'PorcentajeComunicacion30Dias': 99.756944,
+    }
+
+
+def test_sin_fechas_es_cien_por_ciento():
+    assert set(como_float(calcular_porcentajes([], HOY, 'Union')).values()) == {100.0}
+    assert set(como_float(calcular_porcentajes([], HOY, 'Hexing')).values()) == {100.0}
+
+
+def date_sub_meses(fecha, meses):
+    # Implementación independiente de `restar_meses`: retrocede el día hasta que la fecha exista
+    anio, mes = fecha.year, fecha.month - meses
+    while mes < 1:
+        anio, mes = anio - 1, mes + 12
+    dia = fecha.day
+    while True:
+        try:
+            return date(anio, mes, dia)
+        except ValueError:
+            dia -= 1
+
+
+def porcentajes_lineales(fechas, hoy, marca):
+    # La consulta anterior, traducida literalmente: un recorrido y un COUNT(DISTINCT) por ventana
+    fin = datetime(hoy.year, hoy.month, hoy.day)
+    if marca == 'Union':
+        ventanas = [('PorcentajeComunicacion7Dias', hoy - timedelta(days=7), lambda inicio: Decimal(7))]
+        for columna, meses in (('1Mes', 1), ('3Meses', 3), ('1Ano', 12)):
+            ventanas.append((f'PorcentajeComunicacion{columna}', date_sub_meses(hoy, meses),
+                             lambda inicio: Decimal((hoy - inicio).days + 1)))
+        escala = Decimal('0.0001')
+    else:
+        total = lambda inicio: (Decimal((hoy - inicio).days * 24 * 60) / 15).quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)
+        ventanas = [('PorcentajeComunicacion7Dias', hoy - timedelta(days=7), total),
+                    ('PorcentajeComunicacion30Dias', hoy - timedelta(days=30), total)]
+        escala = Decimal('0.00000001')
+
+    resultado = {}
+    for columna, inicio, calcular_total in ventanas:
+        desde = datetime(inicio.year, inicio.month, inicio.day)
+        sin_lectura = len({fecha for fecha in fechas if desde <= fecha <= fin})
+        total_ventana = calcular_total(inicio)
+        cociente = ((total_ventana - sin_lectura) / total_ventana).quantize(escala, rounding=ROUND_HALF_UP)
+        resultado[columna] = float(cociente * 100)
+    return resultado
+
+
+def fechas_aleatorias(azar, hoy, marca):
+    inicio = datetime(hoy.year, hoy.month, hoy.day) - timedelta(days=400 if marca == 'Union' else 35)
+    paso = timedelta(days=1) if marca == 'Union' else timedelta(minutes=15)
+    pasos = int((timedelta(days=401 if marca == 'Union' else 36)) / paso)
+    fechas = {inicio + paso * numero for numero in azar.sample(range(pasos), azar.randrange(0, min(pasos, 400)))}
+    # Algunas fechas de hoy después de la medianoche
+    fechas.update(datetime(hoy.year, hoy.month, hoy.day, azar.randrange(24)) for _ in range(azar.randrange(3)))
+    return sorted(fechas)
+
+
+@pytest.mark.parametrize('marca', ['Union', 'Hexing'])
+def test_coincide_con_el_recorrido_lineal(marca):
+    azar = random.Random(marca)
+    for _ in range(300):
+        hoy = date(2023, 1, 1) + timedelta(days=azar.randrange(800))
+        fechas = fechas_aleatorias(azar, hoy, marca)
+        assert como_float(calcular_porcentajes(fechas, hoy, marca)) == porcentajes_lineales(fechas, hoy, marca), (hoy, fechas)
+
+
+def resumen_diario(fechas):
+    # Lo que inserta `RollupComunicacion`: por día, fechas distintas y cuántas son la medianoche
+    dias = {}
+    for fecha in fechas:
+        sin_lectura, medianoche = dias.get(fecha.date(), (0, 0))
+        dias[fecha.date()] = (sin_lectura + 1, medianoche + (fecha == datetime(fecha.year, fecha.month, fecha.day)))
+    return [(dia, *conteos) for dia, conteos in sorted(dias.items())]
+
+
+@pytest.mark.parametrize('marca', ['Union', 'Hexing'])
+def test_resumen_diario_coincide_con_la_tabla_de_origen(marca):
+    azar = random.Random(f"diario-{marca}")
+    for _ in range(300):
+        hoy = date(2023, 1, 1) + timedelta(days=azar.randrange(800))
+        fechas = fechas_aleatorias(azar, hoy, marca)
+        assert calcular_porcentajes_diarios(resumen_diario(fechas), hoy, marca) == calcular_porcentajes(fechas, hoy, marca)
+
+
+CLAVES_PRUEBA = {'Union': '99000001', 'Hexing': '99000002'}
+
+
+def test_mysql_consulta_anterior_y_motor_coinciden(engine, escala):
+    import benchmark
+
+    with engine.connect() as con:
+        hoy = con.execute(text("SELECT CURDATE()")).scalar()
+    medianoche = datetime(hoy.year, hoy.month, hoy.day)
+    filas = {'Alarmas_Union_Consumo': [], 'airflow_hexing_sinlectura': []}
+
+    # Union: los bordes de cada ventana, un día antes y hoy después de la medianoche
+    for inicio in (hoy - timedelta(days=7), restar_meses(hoy, 1), restar_meses(hoy, 3), restar_meses(hoy, 12)):
+        for fecha in (inicio - timedelta(days=1), inicio):
+            filas['Alarmas_Union_Consumo'].append(datetime(fecha.year, fecha.month, fecha.day))
+    filas['Alarmas_Union_Consumo'] += [medianoche, medianoche + timedelta(hours=3)]
+    # Hexing: intervalos en los bordes de 7 y 30 días
+    for dias in (7, 30):
+        inicio = medianoche - timedelta(days=dias)
+        filas['airflow_hexing_sinlectura'] += [inicio - timedelta(minutes=15), inicio, inicio + timedelta(minutes=15)]
+    filas['airflow_hexing_sinlectura'] += [medianoche, medianoche + timedelta(minutes=15)]
+
+    with engine.begin() as con:
+        for marca, (tabla, evento, clave) in {
+            'Union': ('Alarmas_Union_Consumo', 'Día sin lectura', CLAVES_PRUEBA['Union']),
+            'Hexing': ('airflow_hexing_sinlectura', 'Sin Lectura', CLAVES_PRUEBA['Hexing']),
+        }.items():
+            con.execute(text(f"DELETE FROM {tabla} WHERE clave = :clave"), {'clave': clave})
+            con.execute(text(f"INSERT INTO {tabla} (clave, NOMBRE_EVENTO, FECHA) VALUES (:clave, :evento, :fecha)"),
+                        [{'clave': clave, 'evento': evento, 'fecha': fecha} for fecha in set(filas[tabla])])
+
+    rollup = RollupComunicacion(engine)
+
+    async def calcular(marca, clave):
+        origen = await MotorComunicacion(engine).porcentajes(marca, clave)
+        await rollup.actualizar_todas()
+        assert rollup.vigente(marca)
+        resumen = await MotorComunicacion(engine, rollup).porcentajes(marca, clave)
+        return origen.iloc[0].to_dict(), resumen.iloc[0].to_dict()
+
+    for marca, clave in CLAVES_PRUEBA.items():
+        anterior = benchmark.porcentajes_anteriores(engine, marca, clave)
+        origen, resumen = asyncio.run(calcular(marca, clave))
+        assert origen == anterior
+        assert resumen == anterior
+
+    # Y sobre las claves sintéticas de la base de pruebas
+    for marca in CLAVES_PRUEBA:
+        for numero in range(0, escala.medidores, 7):
+            clave = benchmark.clave_sintetica(marca, numero)
+            origen, resumen = asyncio.run(calcular(marca, clave))
+            anterior = benchmark.porcentajes_anteriores(engine, marca, clave)
+            assert origen == anterior
+            assert resumen == anterior
+
+
+def test_mysql_rollup_bajo_get_lock_y_reconstruccion_incremental(engine):
+    tabla, evento, clave = MARCAS['Union']['tabla'], MARCAS['Union']['evento'], '99000003'
+    rollup = RollupComunicacion(engine)
+
+    def resumen_de_la_clave():
+        with engine.connect() as con:
+            return [tuple(fila) for fila in con.execute(text(
+                "SELECT FECHA, SIN_LECTURA, SIN_LECTURA_MEDIANOCHE FROM bot_comunicacion_diaria "
+                "WHERE MARCA = 'Union' AND CLAVE = :clave ORDER BY FECHA"), {'clave': clave})]
+
+    def insertar(fechas):
+        with engine.begin() as con:
+            con.execute(text(f"INSERT INTO {tabla} (clave, NOMBRE_EVENTO, FECHA) VALUES (:clave, :evento, :fecha)"),
+                        [{'clave': clave, 'evento': evento, 'fecha': fecha} for fecha in fechas])
+
+    def reiniciar():
+        with engine.begin() as con:
+            con.execute(text(f"DELETE FROM {tabla} WHERE clave = :clave"), {'clave': clave})
+            con.execute(text("DELETE FROM bot_comunicacion_diaria WHERE MARCA = 'Union'"))
+            con.execute(text("DELETE FROM bot_comunicacion_control WHERE MARCA = 'Union'"))
+
+    reiniciar()
+    try:
+        with engine.connect() as con:
+            hoy = con.execute(text("SELECT CURDATE()")).scalar()
+        ayer = datetime(hoy.year, hoy.month, hoy.day) - timedelta(days=1)
+        anteayer = ayer - timedelta(days=1)
+        fechas = [anteayer, anteayer + timedelta(hours=10), ayer]
+        insertar(fechas)
+
+        # Con el bloqueo tomado por otra instancia no se construye nada
+        with engine.connect() as otra:
+            assert otra.execute(text("SELECT GET_LOCK('bot_comunicacion_diaria', 0)")).scalar() == 1
+            assert rollup.actualizar('Union') is None
+            assert not rollup.vigente('Union')
+            assert resumen_de_la_clave() == []
+            otra.execute(text("SELECT RELEASE_LOCK('bot_comunicacion_diaria')"))
+
+        assert rollup.actualizar('Union') > 0
+        assert rollup.vigente('Union')
+        assert resumen_de_la_clave() == resumen_diario(fechas)
+        # Sin datos nuevos en el origen no se vuelve a construir
+        assert rollup.actualizar('Union') is None
+        assert rollup.vigente('Union')
+
+        # Una carga nueva después del último día: se borra y se recalcula ese día sin duplicar filas
+        with engine.connect() as con:
+            ultima = con.execute(text(f"SELECT MAX(FECHA) FROM {tabla} WHERE NOMBRE_EVENTO = :evento"), {'evento': evento}).scalar()
+        nuevas = [ayer + timedelta(hours=6), ultima + timedelta(minutes=1)]
+        insertar(nuevas)
+
+        assert rollup.actualizar('Union') > 0
+        assert resumen_de_la_clave() == resumen_diario(fechas + nuevas)
+        with engine.connect() as con:
+            assert con.execute(text("SELECT IS_FREE_LOCK('bot_comunicacion_diaria')")).scalar() == 1
+            assert con.execute(text("SELECT FECHA_ORIGEN FROM bot_comunicacion_control WHERE MARCA = 'Union'")).scalar() == nuevas[-1]
+    finally:
+        # Las demás pruebas construyen el resumen desde cero
+        reiniciar()
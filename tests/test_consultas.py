@@ -0,0 +1,153 @@
+"""
+Las consultas de los reportes no cambian con los datos del usuario: el medidor, la clave y el cursor
+de las páginas solo viajan como parámetros enlazados.
+"""
+
+import asyncio
+import re
+
+import pandas as pd
+import pytest
+from sqlalchemy.dialects import mysql
+
+import consultas
+from consultas import CONSULTAS, PAGINADAS, TAMANO_PAGINA
+
+
+HOSTILES = [
+    "1' OR '1'='1",
+    "x'; DROP TABLE proceso_bot; -- ",
+    '" OR ""="',
+    "\\'; SELECT SLEEP(10); #",
+    "%(clave)s",
+    ":medidor",
+    "' UNION SELECT * FROM bot_usuarios_autorizados -- ñ",
+]
+
+DIALECTO = mysql.dialect()
+
+
+def compilar(sentencia, valores):
+    return sentencia.bindparams(**valores).compile(dialect=DIALECTO, compile_kwargs={'render_postcompile': True})
+
+
+def nombres_parametros(sentencia):
+    return list(sentencia.compile(dialect=DIALECTO).params)
+
+
+@pytest.mark.parametrize('nombre', sorted(CONSULTAS))
+@pytest.mark.parametrize('hostil', HOSTILES)
+def test_catalogo_con_valores_hostiles(nombre, hostil):
+    sentencia = CONSULTAS[nombre]
+    nombres = nombres_parametros(sentencia)
+    assert nombres, f"{nombre} no tiene parámetros"
+
+    normal = compilar(sentencia, {parametro: 'ABC123' for parametro in nombres})
+    atacada = compilar(sentencia, {parametro: hostil for parametro in nombres})
+
+    # El texto SQL es el mismo y el valor solo aparece entre los parámetros
+    assert str(atacada) == str(normal)
+    assert hostil not in str(atacada)
+    assert atacada.params == {parametro: hostil for parametro in nombres}
+
+
+def test_paginadas_se_arman_solo_con_constantes():
+    # `_paginada` arma el SQL con f-strings: tabla, filtro y columnas deben ser identificadores fijos
+    assert isinstance(TAMANO_PAGINA, int)
+    for nombre, (tabla, filtro, fecha, desempate) in PAGINADAS.items():
+        assert re.fullmatch(r'[A-Za-z_][\w.]*', tabla), nombre
+        assert re.fullmatch(r'\w+', fecha), nombre
+        assert re.fullmatch(r'\w+', desempate), nombre
+        # El único dato variable del filtro es la clave enlazada
+        assert re.findall(r'(?<!:):(\w+)', filtro) == ['clave'], nombre
+        assert nombres_parametros(CONSULTAS[nombre]) == ['clave']
+
+
+def test_motor_comunicacion_y_claves_con_valores_hostiles():
+    from claves import ResolutorClaves
+    from comunicacion import MARCAS, MotorComunicacion
+
+    motor = MotorComunicacion(None)
+    sentencias = list(motor._queries.values()) + [motor._query_diaria]
+    for hostil in HOSTILES:
+        for sentencia in sentencias:
+            nombres = nombres_parametros(sentencia)
+            normal = compilar(sentencia, {parametro: 'ABC123' for parametro in nombres})
+            atacada = compilar(sentencia, {parametro: hostil for parametro in nombres})
+            assert str(atacada) == str(normal)
+            assert hostil not in str(atacada)
+
+        resolutor = ResolutorClaves(None)
+        for sentencia in resolutor._queries.values():
+            atacada = compilar(sentencia, {'medidores': [hostil, 'ABC123']})
+            assert hostil not in str(atacada)
+            assert hostil in atacada.params.values()
+
+
+class Registro:
+    """
+    Reemplaza `solicitud_query_async` de un bot y guarda cada sentencia con sus parámetros.
+    """
+
+    def __init__(self):
+        self.ejecutadas = []
+
+    async def __call__(self, sentencia, params=None):
+        self.ejecutadas.append((sentencia, params))
+        return pd.DataFrame()
+
+    def revisar(self, hostil):
+        assert self.ejecutadas
+        catalogo = {id(sentencia) for sentencia in CONSULTAS.values()}
+        for sentencia, params in self.ejecutadas:
+            # Solo sentencias del catálogo, sin texto armado en el momento
+            assert id(sentencia) in catalogo, sentencia
+            assert consultas.nombre_consulta(sentencia) is not None
+            assert hostil not in str(compilar(sentencia, params))
+            assert hostil in params.values()
+
+
+@pytest.mark.parametrize('hostil', HOSTILES)
+def test_bot_md_solo_ejecuta_el_catalogo(monkeypatch, hostil):
+    import bot_md
+
+    registro = Registro()
+    monkeypatch.setattr(bot_md, 'solicitud_query_async', registro)
+
+    async def ejecutar():
+        for comando in '12345':
+            await bot_md.consultar_reporte(comando, hostil, hostil)
+        solicitud = ('Elster', '4', hostil, hostil, 'Usuario')
+        await bot_md.consultar_pagina(solicitud, None)
+        await bot_md.consultar_pagina(solicitud, {'fecha_nula': False, 'fecha': hostil, 'desempate': hostil})
+        await bot_md.consultar_pagina(solicitud, {'fecha_nula': True, 'fecha': None, 'desempate': hostil})
+        await bot_md.consultar_pagina(('Elster', '5', hostil, hostil, 'Usuario'), {'fecha_nula': False, 'fecha': hostil, 'desempate': hostil})
+
+    asyncio.run(ejecutar())
+    registro.revisar(hostil)
+
+
+@pytest.mark.parametrize('hostil', HOSTILES)
+def test_bot_me_solo_ejecuta_el_catalogo(monkeypatch, hostil):
+    import bot_me
+
+    registro = Registro()
+    monkeypatch.setattr(bot_me, 'solicitud_query_async', registro)
+
+    async def porcentajes(marca, clave):
+        # Sus consultas se revisan en test_motor_comunicacion_y_claves_con_valores_hostiles
+        return pd.DataFrame()
+
+    monkeypatch.setattr(bot_me.motor_comunicacion, 'porcentajes', porcentajes)
+
+    async def ejecutar():
+        for marca in ('Hexing', 'Union'):
+            for comando in '12345':
+                await bot_me.consultar_reporte(marca, comando, hostil, hostil)
+            solicitud = (marca, '4', hostil, hostil, 'Usuario')
+            await bot_me.consultar_pagina(solicitud, None)
+            await bot_me.consultar_pagina(solicitud, {'fecha_nula': False, 'fecha': hostil, 'desempate': hostil})
+            await bot_me.consultar_pagina(solicitud, {'fecha_nula': True, 'fecha': None, 'desempate': hostil})
+
+    asyncio.run(ejecutar())
+    registro.revisar(hostil)
@@ -0,0 +1,138 @@
+"""
+Pruebas de `DespachadorSolicitudes`: ciclos encadenados mientras el reclamo vuelve lleno.
+"""
+
+from datetime import datetime
+from types import SimpleNamespace
+import asyncio
+
+from sqlalchemy import text
+
+from procesador import DespachadorSolicitudes
+
+
+class ColaSimulada:
+    """
+    Cola en memoria: cada ciclo reclama hasta `lote` solicitudes y devuelve cuántas reclamó.
+    """
+
+    def __init__(self, pendientes, lote):
+        self.pendientes = pendientes
+        self.lote = lote
+        self.reclamos = []
+
+    async def procesar_ciclo(self, context):
+        await asyncio.sleep(0)
+        reclamadas = min(self.pendientes, self.lote)
+        self.pendientes -= reclamadas
+        self.reclamos.append(reclamadas)
+        return reclamadas
+
+
+async def despachar(despachador, notificaciones=1):
+    despachador.iniciar(SimpleNamespace())
+    try:
+        for _ in range(notificaciones):
+            despachador.notificar()
+        await asyncio.wait_for(despachador.esperar_inactivo(), timeout=5)
+    finally:
+        await despachador.detener()
+
+
+def test_una_notificacion_vacia_una_rafaga_mayor_que_el_lote():
+    cola = ColaSimulada(pendientes=2 * 50 + 7, lote=50)
+    despachador = DespachadorSolicitudes(cola.procesar_ciclo, lote=cola.lote)
+    asyncio.run(despachar(despachador))
+
+    assert cola.pendientes == 0
+    assert cola.reclamos == [50, 50, 7]
+    assert despachador.ciclos == 3
+
+
+def test_multiplo_exacto_del_lote_termina_con_un_reclamo_vacio():
+    cola = ColaSimulada(pendientes=100, lote=50)
+    despachador = DespachadorSolicitudes(cola.procesar_ciclo, lote=cola.lote)
+    asyncio.run(despachar(despachador))
+
+    assert cola.reclamos == [50, 50, 0]
+
+
+def test_sin_lote_un_ciclo_por_notificacion():
+    cola = ColaSimulada(pendientes=120, lote=50)
+    despachador = DespachadorSolicitudes(cola.procesar_ciclo)
+    asyncio.run(despachar(despachador))
+
+    assert cola.reclamos == [50]
+
+
+def test_notificaciones_seguidas_se_agrupan():
+    cola = ColaSimulada(pendientes=10, lote=50)
+    despachador = DespachadorSolicitudes(cola.procesar_ciclo, lote=cola.lote)
+    asyncio.run(despachar(despachador, notificaciones=5))
+
+    assert cola.reclamos == [10]
+
+
+def test_error_en_un_ciclo_no_detiene_al_despachador():
+    llamadas = []
+
+    async def procesar_ciclo(context):
+        llamadas.append(len(llamadas))
+        if len(llamadas) == 1:
+            raise RuntimeError("falla simulada")
+        return 0
+
+    async def ejecutar():
+        despachador = DespachadorSolicitudes(procesar_ciclo, lote=50)
+        despachador.iniciar(SimpleNamespace())
+        try:
+            despachador.notificar()
+            await asyncio.wait_for(despachador.esperar_inactivo(), timeout=5)
+            despachador.notificar()
+            await asyncio.wait_for(despachador.esperar_inactivo(), timeout=5)
+        finally:
+            await despachador.detener()
+
+    asyncio.run(ejecutar())
+    assert llamadas == [0, 1]
+
+
+def test_bot_me_atiende_mas_de_dos_lotes_con_una_notificacion(colas_vacias, escala, monkeypatch):
+    import benchmark
+    import bot_me
+    from bot_simulado import BotSimulado
+
+    # Sin separación por chat para que los envíos no dominen la prueba
+    monkeypatch.setattr(bot_me.programador_envios, 'intervalo_chat', 0)
+    monkeypatch.setattr(bot_me.programador_envios, 'por_segundo', 10_000)
+
+    lote = bot_me.cola_solicitudes.lote
+    cantidad = 2 * lote + 7
+    configuracion = benchmark.BOTS['bot_me']
+    usuarios = benchmark.usuarios_sinteticos(escala)
+    ahora = datetime.now().replace(microsecond=0)
+    filas = [
+        benchmark.solicitud_sintetica(configuracion, usuarios[numero % len(usuarios)], 1, 'Hexing',
+                                      benchmark.medidor_sintetico('Hexing', numero % escala.medidores), ahora)
+        for numero in range(cantidad)
+    ]
+    benchmark.insertar_filas(colas_vacias, configuracion.cola, filas)
+
+    bot = BotSimulado(latencia=0)
+    despachador = bot_me.despachador_solicitudes
+    ciclos = despachador.ciclos
+
+    async def ejecutar():
+        despachador.iniciar(SimpleNamespace(bot=bot))
+        try:
+            despachador.notificar()
+            await asyncio.wait_for(despachador.esperar_inactivo(), timeout=120)
+        finally:
+            await despachador.detener()
+
+    asyncio.run(ejecutar())
+
+    assert bot_me.cola_solicitudes.contar_pendientes() == 0
+    assert despachador.ciclos - ciclos == 3
+    with colas_vacias.connect() as con:
+        assert con.execute(text(f"SELECT COUNT(*) FROM {configuracion.cola} WHERE ENVIADO = 1")).scalar() == cantidad
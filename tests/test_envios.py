@@ -0,0 +1,92 @@
+"""
+Límites de `ProgramadorEnvios` medidos contra `BotSimulado`: separación por chat, tasa global de la
+cubeta de fichas, pausa ante `RetryAfter` y `EnvioFallido` al agotar los intentos.
+"""
+
+from datetime import timedelta
+import asyncio
+
+import pytest
+from telegram.error import NetworkError
+
+from bot_simulado import BotSimulado
+from envios import EnvioFallido, ProgramadorEnvios
+
+# Holgura de los relojes y del ciclo de eventos
+HOLGURA = 0.01
+
+
+async def enviar_todos(programador, bot, mensajes):
+    return await asyncio.gather(*(programador.enviar(bot, chat_id, texto) for chat_id, texto in mensajes))
+
+
+def test_separacion_por_chat():
+    intervalo = 0.1
+    # El bot rechaza lo que llegue antes del intervalo, con algo de holgura
+    bot = BotSimulado(intervalo_chat=intervalo - HOLGURA)
+    programador = ProgramadorEnvios(por_segundo=1000, rafaga=100, intervalo_chat=intervalo)
+    mensajes = [(chat_id, f"{chat_id}-{numero}") for numero in range(4) for chat_id in (1, 2, 3)]
+
+    asyncio.run(enviar_todos(programador, bot, mensajes))
+
+    assert bot.limites == 0
+    assert programador.enviados == len(mensajes)
+    for chat_id in (1, 2, 3):
+        entregados = [(momento, texto) for momento, chat, texto, _ in bot.enviados if chat == chat_id]
+        # En orden de llegada y separados por el intervalo
+        assert [texto for _, texto in entregados] == [f"{chat_id}-{numero}" for numero in range(4)]
+        momentos = [momento for momento, _ in entregados]
+        assert all(despues - antes >= intervalo - HOLGURA for antes, despues in zip(momentos, momentos[1:]))
+
+
+def test_tasa_global():
+    por_segundo, rafaga = 50, 5
+    bot = BotSimulado()
+    programador = ProgramadorEnvios(por_segundo=por_segundo, rafaga=rafaga, intervalo_chat=0)
+    mensajes = [(chat_id, "hola") for chat_id in range(30)]
+
+    asyncio.run(enviar_todos(programador, bot, mensajes))
+
+    momentos = [momento for momento, *_ in bot.enviados]
+    assert len(momentos) == len(mensajes)
+    # En cualquier ventana salen a lo sumo las fichas recargadas más la ráfaga
+    for inicio in range(len(momentos)):
+        for fin in range(inicio, len(momentos)):
+            assert fin - inicio + 1 <= por_segundo * (momentos[fin] - momentos[inicio]) + rafaga + HOLGURA
+    # Y la cubeta no frena de más: los 25 envíos después de la ráfaga tardan unos 0.5 s
+    assert momentos[-1] - momentos[0] < (len(mensajes) - rafaga) / por_segundo + 0.2
+
+
+# `envios._segundos` acepta `retry_after` como número o timedelta; el aviso es de python-telegram-bot
+@pytest.mark.filterwarnings('ignore::telegram.warnings.PTBDeprecationWarning')
+def test_pausa_ante_retry_after():
+    pausa = 0.5
+    bot = BotSimulado(limite_global=3, retry_after=timedelta(seconds=pausa))
+    programador = ProgramadorEnvios(por_segundo=1000, rafaga=10, intervalo_chat=0)
+    mensajes = [(chat_id, "hola") for chat_id in range(6)]
+
+    asyncio.run(enviar_todos(programador, bot, mensajes))
+
+    assert len(bot.enviados) == len(mensajes)
+    assert bot.rechazados
+    assert programador.limites == len(bot.rechazados)
+    llamadas = sorted([momento for momento, *_ in bot.enviados] + [momento for momento, _ in bot.rechazados])
+    for rechazo, _ in bot.rechazados:
+        # Ningún envío, a ningún chat, durante la pausa que pidió Telegram
+        assert not [momento for momento in llamadas if rechazo < momento < rechazo + pausa - HOLGURA]
+
+
+def test_envio_fallido_al_agotar_los_intentos():
+    bot = BotSimulado(tasa_errores=1.0, semilla=1)
+    programador = ProgramadorEnvios(por_segundo=1000, rafaga=10, intervalo_chat=0, intentos=2)
+
+    with pytest.raises(EnvioFallido) as error:
+        # Un reintento, después de la primera espera de 1 segundo
+        asyncio.run(programador.enviar(bot, 7, "hola"))
+
+    assert error.value.chat_id == 7
+    assert not error.value.definitivo
+    assert isinstance(error.value.error, NetworkError)
+    assert bot.errores == 2
+    assert not bot.enviados
+    assert programador.estadisticas() == {'enviados': 0, 'reintentos': 1, 'limites': 0, 'fallidos': 1, 'en_cola': 0}
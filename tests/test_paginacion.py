@@ -0,0 +1,120 @@
+"""
+Paginación por clave de los reportes: el cursor de la última fila y la consulta de la página siguiente,
+y el recorrido completo de un reporte con fechas repetidas y nulas, en MySQL (`TEST_DB_URL`) y con
+las mismas sentencias en SQLite.
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from consultas import CONSULTAS, TAMANO_PAGINA, consulta_pagina
+from paginacion import cursor_fila
+
+
+def test_cursor_con_tipos_de_pandas():
+    fila = pd.Series({'ORDEN_FECHA': pd.Timestamp('2025-03-04 05:06:07'), 'ORDEN_DESEMPATE': np.int64(42)})
+
+    cursor = cursor_fila(fila)
+
+    assert cursor == {'fecha_nula': False, 'fecha': datetime(2025, 3, 4, 5, 6, 7), 'desempate': 42}
+    assert type(cursor['fecha']) is datetime
+    assert type(cursor['desempate']) is int
+
+
+def test_cursor_con_fecha_nula():
+    for nula in (None, pd.NaT, np.nan):
+        assert cursor_fila({'ORDEN_FECHA': nula, 'ORDEN_DESEMPATE': 7}) == {'fecha_nula': True, 'fecha': None, 'desempate': 7}
+
+
+def test_consulta_de_cada_pagina():
+    fecha = datetime(2025, 1, 1)
+
+    assert consulta_pagina('bitacora', 'C1') == (CONSULTAS['bitacora'], {'clave': 'C1'})
+    assert consulta_pagina('bitacora', 'C1', {'fecha_nula': False, 'fecha': fecha, 'desempate': 3}) == (
+        CONSULTAS['bitacora_siguiente'], {'clave': 'C1', 'fecha': fecha, 'desempate': 3}
+    )
+    assert consulta_pagina('bitacora', 'C1', {'fecha_nula': True, 'fecha': None, 'desempate': 3}) == (
+        CONSULTAS['bitacora_siguiente_nulas'], {'clave': 'C1', 'desempate': 3}
+    )
+
+
+def test_orden_sin_expresiones_sobre_la_fecha():
+    # El ORDER BY va sobre las columnas, para que lo sirva el índice (clave, fecha, desempate)
+    for nombre in ('union_ordenes', 'union_ordenes_siguiente', 'union_ordenes_siguiente_nulas'):
+        sql = str(CONSULTAS[nombre])
+        assert 'ORDER BY FECHA_EJECUCION DESC, OS DESC' in sql
+        assert 'COALESCE' not in sql
+
+
+def filas_con_fechas_repetidas_y_nulas(base, primer_id):
+    # Casi cuatro páginas: grupos de fechas repetidas que cruzan los bordes de página y fechas nulas
+    fechas = [base - timedelta(days=indice // 3) for indice in range(TAMANO_PAGINA * 2 + 3)]
+    fechas += [None] * (TAMANO_PAGINA + TAMANO_PAGINA // 2)
+    return [(primer_id + numero, fecha) for numero, fecha in enumerate(fechas)]
+
+
+def orden_esperado(filas):
+    # Fecha descendente con las nulas al final (como MySQL y SQLite) y desempate descendente
+    return [desempate for desempate, _ in sorted(filas, key=lambda fila: (fila[1] is not None, fila[1] or 0, fila[0]), reverse=True)]
+
+
+def recorrer(engine, nombre, clave):
+    """
+    Recorre un reporte paginado siguiendo el cursor de cada página y devuelve los desempates vistos.
+    """
+    vistas = []
+    cursor = None
+    while True:
+        sentencia, params = consulta_pagina(nombre, clave, cursor)
+        with engine.connect() as con:
+            pagina = pd.read_sql(sentencia, con, params=params)
+        vistas += pagina.head(TAMANO_PAGINA)['ORDEN_DESEMPATE'].tolist()
+        if len(pagina) <= TAMANO_PAGINA:
+            return vistas
+        cursor = cursor_fila(pagina.iloc[TAMANO_PAGINA - 1])
+
+
+def test_recorrido_con_fechas_repetidas_y_nulas(engine):
+    clave = 'PAGINACION'
+    filas = filas_con_fechas_repetidas_y_nulas(datetime(2025, 5, 1, 8, 0), 900_000_000)
+    with engine.begin() as con:
+        con.execute(text("DELETE FROM airflow_union_os WHERE clave = :clave"), {'clave': clave})
+        con.execute(text("INSERT INTO airflow_union_os (clave, OS, FECHA_EJECUCION) VALUES (:clave, :OS, :FECHA_EJECUCION)"),
+                    [{'clave': clave, 'OS': os_, 'FECHA_EJECUCION': fecha} for os_, fecha in filas])
+
+    try:
+        vistas = recorrer(engine, 'union_ordenes', clave)
+    finally:
+        with engine.begin() as con:
+            con.execute(text("DELETE FROM airflow_union_os WHERE clave = :clave"), {'clave': clave})
+
+    # Cada fila una sola vez, en el orden completo
+    assert vistas == orden_esperado(filas)
+
+
+def test_recorrido_en_sqlite(motor_sqlite):
+    # Las mismas sentencias del catálogo, sin MySQL: las fechas se guardan como texto ISO, que en
+    # SQLite se compara en el mismo orden que las fechas
+    clave = 'PAGINACION'
+    filas = [(desempate, fecha and fecha.isoformat(sep=' '))
+             for desempate, fecha in filas_con_fechas_repetidas_y_nulas(datetime(2025, 5, 1, 8, 0), 1)]
+    with motor_sqlite.begin() as con:
+        con.execute(text("CREATE TABLE pnrp.airflow_union_os (clave TEXT, OS INTEGER, FECHA_EJECUCION TEXT)"))
+        con.execute(text("CREATE TABLE bitacora_ac (ID_BITACORA INTEGER, clave TEXT, ESTADO TEXT, REQUIERE_OS BOOLEAN, fecha_asignacion TEXT)"))
+        con.execute(text("INSERT INTO pnrp.airflow_union_os VALUES (:clave, :OS, :FECHA)"),
+                    [{'clave': clave, 'OS': os_, 'FECHA': fecha} for os_, fecha in filas]
+                    + [{'clave': 'OTRA', 'OS': 10_000, 'FECHA': None}])
+        # En la bitácora, las anuladas y las que no requieren OS no se listan
+        con.execute(text("INSERT INTO bitacora_ac VALUES (:id, :clave, :estado, :requiere, :fecha)"), [
+            {'id': desempate, 'clave': clave, 'estado': 'ANULADO' if desempate % 7 == 0 else 'ABIERTO',
+             'requiere': desempate % 5 != 0, 'fecha': fecha}
+            for desempate, fecha in filas
+        ])
+
+    assert recorrer(motor_sqlite, 'union_ordenes', clave) == orden_esperado(filas)
+    assert recorrer(motor_sqlite, 'bitacora', clave) == orden_esperado(
+        [(desempate, fecha) for desempate, fecha in filas if desempate % 7 and desempate % 5]
+    )
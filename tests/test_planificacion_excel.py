@@ -0,0 +1,85 @@
+"""
+Pruebas de la carga de planificaciones por lotes (`planificacion_excel.py`), con el pool de procesos real.
+"""
+
+from datetime import datetime
+import asyncio
+
+import pytest
+
+from benchmark import excel_planificacion
+from planificacion_excel import ArchivoPlanificacionError, CargaPlanificacion, validar_filas
+
+
+COLUMNAS = ['Clave', 'Medidor', 'Fecha']
+
+
+def archivo(tmp_path, filas):
+    ruta = tmp_path / 'planificacion.xlsx'
+    ruta.write_bytes(excel_planificacion(COLUMNAS, filas))
+    return str(ruta)
+
+
+def filas_sinteticas(cantidad, invalidas=()):
+    return [
+        {'Clave': None if numero in invalidas else str(10_000 + numero), 'Medidor': f"M{numero}", 'Fecha': datetime(2024, 5, 1)}
+        for numero in range(cantidad)
+    ]
+
+
+def cargar(ruta, lote, insertar=None, max_filas=None):
+    lotes = []
+
+    async def insertar_lote(registros):
+        lotes.append(registros)
+        if insertar is not None:
+            await insertar(registros)
+
+    carga = CargaPlanificacion(COLUMNAS, 'Clave', 'Fecha', lambda valores: dict(zip(COLUMNAS, valores)), insertar_lote, lote=lote)
+    if max_filas is not None:
+        carga.max_filas = max_filas
+    return asyncio.run(carga.cargar_archivo(ruta)), lotes
+
+
+def test_validar_filas_descarta_sin_clave_o_sin_fecha(tmp_path):
+    filas = filas_sinteticas(5, invalidas={1})
+    filas[3]['Fecha'] = 'no es fecha'
+    validadas = list(validar_filas(archivo(tmp_path, filas), COLUMNAS, 'Clave', 'Fecha', 100, float('inf')))
+    assert validadas[1] is None and validadas[3] is None
+    assert validadas[0] == ('10000', 'M0', '2024-05-01')
+
+
+def test_inserta_por_lotes_a_medida_que_lee(tmp_path):
+    ruta = archivo(tmp_path, filas_sinteticas(1050, invalidas={7, 500, 1049}))
+    (insertadas, descartadas), lotes = cargar(ruta, lote=100)
+
+    assert (insertadas, descartadas) == (1047, 3)
+    assert [len(lote) for lote in lotes] == [100] * 10 + [47]
+    assert lotes[0][0] == {'Clave': '10000', 'Medidor': 'M0', 'Fecha': '2024-05-01'}
+    claves = [registro['Clave'] for lote in lotes for registro in lote]
+    assert claves == sorted(claves) and len(set(claves)) == 1047
+
+
+def test_limite_de_filas_informa_lo_ya_insertado(tmp_path):
+    ruta = archivo(tmp_path, filas_sinteticas(600))
+    with pytest.raises(ArchivoPlanificacionError) as error:
+        cargar(ruta, lote=100, max_filas=450)
+    assert 'más de 450 filas' in str(error.value)
+    assert 'se registraron 400 medidores' in str(error.value)
+
+
+def test_faltan_columnas(tmp_path):
+    ruta = tmp_path / 'planificacion.xlsx'
+    ruta.write_bytes(excel_planificacion(['Clave', 'Medidor'], [{'Clave': '1', 'Medidor': 'M'}]))
+    with pytest.raises(ArchivoPlanificacionError, match='Faltan las columnas'):
+        cargar(str(ruta), lote=100)
+
+
+def test_error_al_insertar_cancela_la_lectura(tmp_path):
+    ruta = archivo(tmp_path, filas_sinteticas(2000))
+
+    async def fallar(registros):
+        raise RuntimeError("base caída")
+
+    with pytest.raises(RuntimeError, match='base caída'):
+        cargar(ruta, lote=100, insertar=fallar)
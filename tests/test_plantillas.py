@@ -0,0 +1,366 @@
+"""
+Textos de los reportes de ambos bots, renderizados con `construir_mensaje` desde tablas fijas y
+comparados con el texto esperado: el mismo que armaba `construir_mensaje` antes de `plantillas.py`,
+salvo tres defectos corregidos (el encabezado del comando 5, el salto de línea después de "Tipo de
+Gestion" en las OS de Hexing y la respuesta sin clave de las alarmas de Union). También el escenario
+`render` de `benchmark.py`, que compara `Plantilla.filas` con la unión de `iterrows`.
+"""
+
+import asyncio
+import copy
+import random
+
+import pandas as pd
+import pytest
+
+import benchmark
+import bot_md
+import bot_me
+from plantillas import PLANTILLAS
+
+NOMBRE, MEDIDOR, CLAVE = 'Ana', 'HX00000001', 'C-100'
+
+UNIVERSO = pd.DataFrame([{
+    'CLAVE_INCMS': 'C-100', 'NOMBRE_ABONADO_INCMS': 'Juan Pérez', 'MEDIDOR_INCMS': 'HX00000001',
+    'MULTIPLICADOR': 1, 'MULTIPLICADOR_INCMS': 40, 'ULTIMO_CONSUMO': 321.5, 'LECTURA_ACTUAL': 10234,
+    'CODIGO_LECTURA': 'N', 'TARIFA': 'T1', 'TIPO_MEDIDA': 'Directa', 'ZONA': 'Norte', 'REGION_PNRP': 'R2',
+    'CIRCUITO': 'L-310', 'SUBESTACION': 'S/E Centro', 'COORD_U_X': -87.2, 'COORD_U_Y': 14.1,
+    'COORD_X': 478000.5, 'COORD_Y': 1558000.25,
+}])
+# Sin lectura por gatekeeper y registrado hace más de tres días: "No comunica" en cualquier fecha
+COMUNICACION_ELSTER = pd.DataFrame([{
+    'gatekeeper': 'GK-7', 'service_status': 'Connect', 'last_registered': pd.Timestamp('2024-01-02 03:04:05'),
+    'last_register_read': pd.NaT,
+}])
+ULTIMA = pd.DataFrame([{'FECHA': pd.Timestamp('2025-03-01 10:00:00'), 'LECTURA': 5120.75}])
+PROMEDIOS_HEXING = pd.DataFrame([{'PorcentajeComunicacion7Dias': 85.5, 'PorcentajeComunicacion30Dias': 91.25}])
+PORCENTAJES_UNION = pd.DataFrame([{
+    'PorcentajeComunicacion7Dias': 85.5, 'PorcentajeComunicacion1Mes': 90.125,
+    'PorcentajeComunicacion3Meses': 70.0, 'PorcentajeComunicacion1Ano': 66.666,
+}])
+ALARMAS = pd.DataFrame([
+    {'NOMBRE_EVENTO': 'Tapa abierta', 'ALARM_DESC': 'Cover open', 'FECHA': pd.Timestamp('2025-02-01 08:00:00'), 'CANTIDAD': 3},
+    {'NOMBRE_EVENTO': 'Corte de energía', 'ALARM_DESC': 'Power down', 'FECHA': pd.Timestamp('2025-02-03 09:30:00'), 'CANTIDAD': 1},
+])
+ORDENES = pd.DataFrame([
+    {'OS': 900001, 'ESTADO': 'EJECUTADA', 'DESCRIPCION_OS': 'Revisión', 'CATEGORIA': 'Fraude', 'DESCRIPCION': 'Puente en bornes',
+     'FECHA_GENERADA': pd.Timestamp('2025-01-10 07:00:00'), 'FECHA_EJECUCION': pd.Timestamp('2025-01-12 15:45:00')},
+    {'OS': 900002, 'ESTADO': 'PENDIENTE', 'DESCRIPCION_OS': 'Cambio', 'CATEGORIA': 'Falla', 'DESCRIPCION': 'Display apagado',
+     'FECHA_GENERADA': pd.Timestamp('2025-02-20 11:00:00'), 'FECHA_EJECUCION': pd.NaT},
+])
+BITACORA = pd.DataFrame([
+    {'FECHA_ANALISIS': pd.Timestamp('2025-03-02'), 'ALARMA': 'Tapa abierta', 'FECHA_ALARMA': pd.Timestamp('2025-02-01 08:00:00'),
+     'COMENTARIO_ANALISTA': 'Se envía cuadrilla', 'CRITICIDAD_ALARMA': 'Alta', 'ESTADO': 'Abierta'},
+    {'FECHA_ANALISIS': pd.Timestamp('2025-01-15'), 'ALARMA': 'Sin comunicación', 'FECHA_ALARMA': pd.Timestamp('2025-01-10'),
+     'COMENTARIO_ANALISTA': 'Normalizado', 'CRITICIDAD_ALARMA': 'Baja', 'ESTADO': 'Cerrada'},
+])
+
+# Tablas de `consultar_reporte` por marca; las de comunicación son (última, porcentajes)
+TABLAS = {
+    'Elster': {'comunicacion_elster': COMUNICACION_ELSTER},
+    'Hexing': {'comunicacion': ULTIMA, 'promedio_comunicacion': PROMEDIOS_HEXING},
+    'Union': {'comunicacion_union': ULTIMA, 'comunicacion': PORCENTAJES_UNION},
+}
+COMUNICACION = {'Hexing': ('comunicacion', 'promedio_comunicacion'), 'Union': ('comunicacion_union', 'comunicacion')}
+
+
+def datos_de(marca, variante):
+    datos = {
+        'informacion_medidor': UNIVERSO, 'alarmas_medidor': ALARMAS, 'ordenes': ORDENES,
+        'comentario_telegestion': BITACORA, **TABLAS[marca],
+    }
+    if variante in ('vacio', 'sin_clave'):
+        return {nombre: pd.DataFrame() for nombre in datos}
+    if variante == 'sin_ultima':
+        datos[COMUNICACION[marca][0]] = pd.DataFrame()
+    if variante == 'sin_porcentajes':
+        datos[COMUNICACION[marca][1]] = pd.DataFrame()
+    return datos
+
+
+def renderizar(marca, comando, variante):
+    clave = 'EMPTY' if variante == 'sin_clave' else CLAVE
+    datos = datos_de(marca, variante)
+    if marca == 'Elster':
+        return bot_md.construir_mensaje(comando, datos, MEDIDOR, clave, NOMBRE)
+    return bot_me.construir_mensaje(marca, comando, datos, MEDIDOR, clave, NOMBRE)
+
+
+UNIVERSO_ME = (
+    "Hola Ingeniero Ana\n\n"
+    "El siguiente reporte es para el medidor: HX00000001.\n\n"
+    "Clave: C-100\n"
+    "Nombre Abonado: Juan Pérez\n"
+    "Medidor: HX00000001\n"
+    "Multiplicador: 40\n"
+    "Último Consumo: 321.5\n"
+    "Lectura Actual: 10234\n"
+    "Código de Lectura: N\n"
+    "Tarifa: T1\n"
+    "Tipo de Medida: Directa\n"
+    "Zona: Norte\n"
+    "Región PNRP: R2\n"
+    "Circuito: L-310\n"
+    "Subestación: S/E Centro\n"
+    "Coord. (X,Y):  14.1, -87.2\n"
+    "Coord. UTM (X,Y): 1558000.25, 478000.5\n"
+    "Ubicacion de medidor: https://www.google.com/maps?q=14.1,-87.2"
+)
+ORDENES_ELSTER_UNION = (
+    "Hola ingeniero Ana,\n\n"
+    "El siguiente reporte es para el medidor: HX00000001.\n\n"
+    "Alarmas del medidor:\n\n"
+    "Número de OS: 900001\n"
+    "Estado de la OS: EJECUTADA\n"
+    "Categoría de la anomalía: Fraude\n"
+    "Descripción de OS: Puente en bornes\n"
+    "Fecha Generada: 2025-01-10 07:00:00\n"
+    "Fecha de Ejecución: 2025-01-12 15:45:00\n"
+    "\n\n"
+    "Número de OS: 900002\n"
+    "Estado de la OS: PENDIENTE\n"
+    "Categoría de la anomalía: Falla\n"
+    "Descripción de OS: Display apagado\n"
+    "Fecha Generada: 2025-02-20 11:00:00\n"
+    "Fecha de Ejecución: NaT\n"
+)
+# Corrección: antes el encabezado quedaba como separador entre las revisiones, después de la primera
+BITACORA_ME = (
+    "Hola ingeniero Ana, \n\n"
+    "el siguiente reporte es para el medidor: HX00000001\n\n"
+    "El departamento de telegestion ha hecho una o mas revisiones al medidor.\n"
+    "Fecha de analisis: 2025-03-02 00:00:00\n"
+    "Alarma encontrada: Tapa abierta\n"
+    "Fecha de la alarma encontrada: 2025-02-01 08:00:00\n"
+    "Comentario del analista: Se envía cuadrilla\n"
+    "Criticidad de la alarma: Alta\n"
+    "Estado de la revision: Abierta\n"
+    "\n\n"
+    "Fecha de analisis: 2025-01-15 00:00:00\n"
+    "Alarma encontrada: Sin comunicación\n"
+    "Fecha de la alarma encontrada: 2025-01-10 00:00:00\n"
+    "Comentario del analista: Normalizado\n"
+    "Criticidad de la alarma: Baja\n"
+    "Estado de la revision: Cerrada\n"
+)
+
+SIN_CLAVE = "No se encontro informacion del medidor: HX00000001"
+VACIO_ELSTER = "Hola ingeniero Ana, no hay informacion del medidor: HX00000001"
+VACIO_UNIVERSO_ME = "Hola ingeniero Ana, no tenemos informacion del medidor: HX00000001"
+VACIO_COMUNICACION = "Hola ingeniero Ana, no se obtuvo la comunicacion del medidor: HX00000001"
+VACIO_ALARMAS_ME = "Hola ingeniero Ana, No se encontraron alarmas para el medidor: HX00000001"
+VACIO_OS_ME = "Hola ingeniero Ana, no se encontraron Ordenes de Servicio para el medidor: HX00000001 con clave: C-100"
+SIN_CLAVE_OS_ME = "No se encontró ordenes de servicio para el medidor HX00000001 con clave EMPTY."
+# El comando 5 consulta la bitácora aun sin clave
+VACIO_BITACORA = "Hola ingeniero Ana, no se ha realizado analisis para el medidor: HX00000001 con clave: C-100"
+SIN_CLAVE_BITACORA = "Hola ingeniero Ana, no se ha realizado analisis para el medidor: HX00000001 con clave: EMPTY"
+
+ESPERADOS = {
+    ('Elster', '1', 'reporte'): (
+        "Hola Ingeniero Ana\n\n"
+        "El siguiente reporte es para el medidor: HX00000001.\n\n"
+        "Clave: C-100\n"
+        "Nombre Abonado: Juan Pérez\n"
+        "Medidor: HX00000001\n"
+        "Multiplicador: 1\n"
+        "Último Consumo: 321.5\n"
+        "Lectura Actual: 10234\n"
+        "Código de Lectura: N\n"
+        "Tarifa: T1\n"
+        "Tipo de Medida: Directa\n"
+        "Zona: Norte\n"
+        "Región PNRP: R2\n"
+        "Circuito: L-310\n"
+        "Subestación: S/E Centro\n"
+        "Coord. Geograficas(X,Y): -87.2, 14.1\n"
+        "Coord. UTM(X,Y):478000.5, 1558000.25\n"
+        "Ubicacion de medidor: https://www.google.com/maps?q=14.1,-87.2"
+    ),
+    ('Elster', '1', 'vacio'): VACIO_ELSTER,
+    ('Elster', '1', 'sin_clave'): SIN_CLAVE,
+    ('Elster', '2', 'reporte'): (
+        "Hola Ingeniero Ana\n\n"
+        "El siguiente reporte es para el medidor: HX00000001 con clave: C-100.\n\n"
+        "Última fecha de comunicacion directa del medidor: 2024-01-02 03:04:05\n"
+        "El medidor tiene un gatekeeper asociado, pero no ha comunicado a traves de el.\n"
+        "Estado del rele: Conectado\n\n"
+        "Comunicación: No comunica"
+    ),
+    ('Elster', '2', 'vacio'): VACIO_ELSTER,
+    ('Elster', '2', 'sin_clave'): SIN_CLAVE,
+    ('Elster', '3', 'reporte'): (
+        "Hola ingeniero Ana\n\n"
+        "El siguiente reporte es para el medidor: HX00000001.\n\n"
+        "Alarmas del medidor:\n\n"
+        "- Tapa abierta \n"
+        "(Ultima Fecha Detectada: 2025-02-01 08:00:00, Cantidad: 3)\n\n"
+        "- Corte de energía \n"
+        "(Ultima Fecha Detectada: 2025-02-03 09:30:00, Cantidad: 1)\n\n"
+        "\nPor favor revise las alarmas mencionadas."
+    ),
+    ('Elster', '3', 'vacio'): VACIO_ELSTER,
+    ('Elster', '3', 'sin_clave'): "No se encontro información de alarmas para el medidor HX00000001.",
+    ('Elster', '4', 'reporte'): ORDENES_ELSTER_UNION,
+    ('Elster', '4', 'vacio'): VACIO_ELSTER,
+    ('Elster', '4', 'sin_clave'): "No se encontro ordenes de servicio para el medidor HX00000001 con clave EMPTY.",
+    # Corrección: el encabezado va una vez, antes de las revisiones
+    ('Elster', '5', 'reporte'): (
+        "\nHola ingeniero Ana, \n\n"
+        "El siguiente reporte es para el medidor: HX00000001\n\n"
+        "El departamento de telegestion ha hecho una o mas revisiones al medidor.\n"
+        "Fecha de analisis: 2025-03-02 00:00:00\n"
+        "Alarma encontrada: Tapa abierta\n"
+        "Comentario del analista: Se envía cuadrilla\n"
+        "\n\n"
+        "Fecha de analisis: 2025-01-15 00:00:00\n"
+        "Alarma encontrada: Sin comunicación\n"
+        "Comentario del analista: Normalizado\n"
+    ),
+    ('Elster', '5', 'vacio'): VACIO_BITACORA,
+    ('Elster', '5', 'sin_clave'): SIN_CLAVE_BITACORA,
+
+    ('Hexing', '1', 'reporte'): UNIVERSO_ME,
+    ('Hexing', '1', 'vacio'): VACIO_UNIVERSO_ME,
+    ('Hexing', '1', 'sin_clave'): SIN_CLAVE,
+    ('Hexing', '2', 'reporte'): (
+        "Hola Ingeniero Ana\n\n"
+        "El siguiente reporte es para el medidor: HX00000001 con clave: C-100.\n\n"
+        "Ultima Fecha de comunicacion: 2025-03-01 10:00:00\n"
+        "Ultima Lectura: 5120.75\n\n"
+        "Promedio de comunicaciones:\n"
+        "Promedio en los ultimos 7 dias: 85.5.\n"
+        "Promedio en los ultimos 30 dias: 91.25.\n"
+    ),
+    ('Hexing', '2', 'sin_ultima'): (
+        "Hola Ingeniero Ana\n\n"
+        "El siguiente reporte es para el medidor: HX00000001 con clave: C-100.\n\n"
+        "No se obtuvo la ultima comunicacion\n\n"
+        "Promedio de comunicaciones:\n"
+        "Promedio en los ultimos 7 dias: 85.5.\n"
+        "Promedio en los ultimos 30 dias: 91.25.\n"
+    ),
+    ('Hexing', '2', 'sin_porcentajes'): (
+        "Hola Ingeniero Ana\n\n"
+        "El siguiente reporte es para el medidor: HX00000001 con clave: C-100.\n\n"
+        "Ultima Fecha de comunicacion: 2025-03-01 10:00:00\n"
+        "Ultima Lectura: 5120.75\n\n"
+        "Promedio de comunicaciones:\n"
+        "No se Obtuvo el promedio de la comunicacion"
+    ),
+    ('Hexing', '2', 'vacio'): VACIO_COMUNICACION,
+    ('Hexing', '2', 'sin_clave'): SIN_CLAVE,
+    ('Hexing', '3', 'reporte'): (
+        "Hola ingeniero Ana\n\n"
+        "El siguiente reporte es para el medidor: HX00000001.\n\n"
+        "Alarmas del medidor:\n\n"
+        "- Cover open \n"
+        "(Ultima Fecha Detectada: 2025-02-01 08:00:00, Cantidad: 3)\n\n"
+        "- Power down \n"
+        "(Ultima Fecha Detectada: 2025-02-03 09:30:00, Cantidad: 1)\n\n"
+        "\nPor favor revise las alarmas mencionadas."
+    ),
+    ('Hexing', '3', 'vacio'): VACIO_ALARMAS_ME,
+    ('Hexing', '3', 'sin_clave'): "No se encontró información de alarmas para el medidor HX00000001.",
+    # Corrección: faltaba el salto de línea después de "Tipo de Gestion"
+    ('Hexing', '4', 'reporte'): (
+        "Hola ingeniero Ana,\n\n"
+        "El siguiente reporte es para el medidor: HX00000001.\n\n"
+        "Alarmas del medidor:\n\n"
+        "Número de OS: 900001\n"
+        "Estado de la OS: EJECUTADA\n"
+        "Tipo de Gestion: Revisión\n"
+        "Categoría de la anomalía: Fraude\n"
+        "Descripción de OS: Puente en bornes\n"
+        "Fecha Generada: 2025-01-10 07:00:00\n"
+        "Fecha de Ejecución: 2025-01-12 15:45:00\n"
+        "\n\n"
+        "Número de OS: 900002\n"
+        "Estado de la OS: PENDIENTE\n"
+        "Tipo de Gestion: Cambio\n"
+        "Categoría de la anomalía: Falla\n"
+        "Descripción de OS: Display apagado\n"
+        "Fecha Generada: 2025-02-20 11:00:00\n"
+        "Fecha de Ejecución: NaT\n"
+    ),
+    ('Hexing', '4', 'vacio'): VACIO_OS_ME,
+    ('Hexing', '4', 'sin_clave'): SIN_CLAVE_OS_ME,
+    ('Hexing', '5', 'reporte'): BITACORA_ME,
+    ('Hexing', '5', 'vacio'): VACIO_BITACORA,
+    ('Hexing', '5', 'sin_clave'): SIN_CLAVE_BITACORA,
+
+    ('Union', '1', 'reporte'): UNIVERSO_ME,
+    ('Union', '1', 'vacio'): VACIO_UNIVERSO_ME,
+    ('Union', '1', 'sin_clave'): SIN_CLAVE,
+    ('Union', '2', 'reporte'): (
+        "Hola ingeniero Ana\n\n"
+        "El reporte de comunicación para el medidor: HX00000001 es el siguiente:\n\n"
+        "- Ultima fecha de comunicacion: 2025-03-01 10:00:00\n"
+        "- Ultima lectura: 5120.75\n"
+        "- Últimos 7 días: 85.50%\n"
+        "- Último mes: 90.12%\n"
+        "- Últimos 3 meses: 70.00%\n"
+        "- Último año: 66.67%\n\n"
+        "Por favor revise los porcentajes de comunicación mencionados."
+    ),
+    ('Union', '2', 'sin_ultima'): (
+        "Hola ingeniero Ana\n\n"
+        "El reporte de comunicación para el medidor: HX00000001 es el siguiente:\n\n"
+        "Porcentaje de Comunicacion\n"
+        "- Últimos 7 días: 85.50%\n"
+        "- Último mes: 90.12%\n"
+        "- Últimos 3 meses: 70.00%\n"
+        "- Último año: 66.67%\n\n"
+        "Por favor revise los porcentajes de comunicación mencionados."
+    ),
+    ('Union', '2', 'sin_porcentajes'): (
+        "Hola ingeniero Ana\n\n"
+        "El reporte de comunicación para el medidor: HX00000001 es el siguiente:\n\n"
+        "- Ultima fecha de comunicacion: 2025-03-01 10:00:00\n"
+        "- Ultima lectura: 5120.75\n"
+        "- No se obtuvo el promedio de comunicacion\n"
+        "Por favor revise los porcentajes de comunicación mencionados."
+    ),
+    ('Union', '2', 'vacio'): VACIO_COMUNICACION,
+    ('Union', '2', 'sin_clave'): "No se encontró información de comunicación para el medidor HX00000001 con clave EMPTY.",
+    ('Union', '3', 'reporte'): (
+        "hola ingeniero Ana\n\n"
+        "El siguiente reporte es para el medidor: HX00000001\n\n"
+        "Alarmas del medidor:\n\n"
+        "- Tapa abierta \n"
+        "(Ultima Fecha Detectada: 2025-02-01 08:00:00, Cantidad: 3)\n\n"
+        "- Corte de energía \n"
+        "(Ultima Fecha Detectada: 2025-02-03 09:30:00, Cantidad: 1)\n\n"
+        "\nPor favor revise las alarmas mencionadas."
+    ),
+    ('Union', '3', 'vacio'): VACIO_ALARMAS_ME,
+    # Corrección: antes el mensaje quedaba en `mensjae` y no se respondía nada
+    ('Union', '3', 'sin_clave'): "No se encontro informacion de la alarmas para el medidor HX00000001.",
+    ('Union', '4', 'reporte'): ORDENES_ELSTER_UNION,
+    ('Union', '4', 'vacio'): VACIO_OS_ME,
+    ('Union', '4', 'sin_clave'): SIN_CLAVE_OS_ME,
+    ('Union', '5', 'reporte'): BITACORA_ME,
+    ('Union', '5', 'vacio'): VACIO_BITACORA,
+    ('Union', '5', 'sin_clave'): SIN_CLAVE_BITACORA,
+}
+
+
+@pytest.mark.parametrize('marca, comando, variante', list(ESPERADOS), ids='-'.join)
+def test_texto_de_cada_reporte(marca, comando, variante):
+    assert renderizar(marca, comando, variante) == ESPERADOS[(marca, comando, variante)]
+
+
+def test_todas_las_plantillas_tienen_texto_esperado():
+    cubiertas = {(marca, comando, variante) for marca, comando, variante in ESPERADOS}
+    assert {(marca, comando, variante) for (marca, comando), plantillas in PLANTILLAS.items() for variante in plantillas} <= cubiertas
+
+
+@pytest.mark.parametrize('nombre', ['bot_md', 'bot_me'])
+def test_escenario_render(escala, nombre):
+    escala = copy.copy(escala)
+    escala.render_repeticiones = 5
+    medicion = asyncio.run(benchmark.escenario_render(None, benchmark.BOTS[nombre], None, escala, random.Random(1), []))
+
+    # Mismo texto que la unión de `iterrows`, en menos tiempo
+    assert medicion['distintos'] == 0
+    assert (medicion['cantidad'], medicion['filas']) == (5, 500)
+    assert medicion['p50_ms'] < medicion['p50_base_ms']
@@ -0,0 +1,169 @@
+"""
+Pruebas de `ProcesadorSolicitudes` (límite de solicitudes en curso, orden por usuario y solicitudes
+que ya se están atendiendo en otro ciclo) y de `UnSoloVuelo` (una ejecución por clave, con el mismo
+resultado o el mismo error para todos).
+"""
+
+import asyncio
+
+import pytest
+
+from procesador import ProcesadorSolicitudes, UnSoloVuelo
+
+
+def solicitudes(*pares):
+    return [{'ITEM': item, 'ID_TG': usuario} for item, usuario in pares]
+
+
+class Registro:
+    """
+    Corrutina `procesar` que anota el inicio y el fin de cada solicitud y la cantidad en curso.
+    """
+
+    def __init__(self, demora=0.01, fallar=()):
+        self.demora = demora
+        self.fallar = set(fallar)
+        self.eventos = []
+        self.en_curso = 0
+        self.maximo = 0
+        self.lotes = []
+
+    async def __call__(self, context, solicitud, lote):
+        self.lotes.append(lote)
+        self.en_curso += 1
+        self.maximo = max(self.maximo, self.en_curso)
+        self.eventos.append(('inicio', solicitud['ITEM']))
+        try:
+            await asyncio.sleep(self.demora)
+            if solicitud['ITEM'] in self.fallar:
+                raise RuntimeError(f"falla {solicitud['ITEM']}")
+        finally:
+            self.en_curso -= 1
+            self.eventos.append(('fin', solicitud['ITEM']))
+
+
+def test_limite_de_solicitudes_en_curso():
+    registro = Registro()
+    procesador = ProcesadorSolicitudes(registro, 'ITEM', limite=3)
+
+    tomadas = asyncio.run(procesador.procesar_lote(None, solicitudes(*((item, item) for item in range(10)))))
+
+    assert tomadas == 10
+    assert registro.maximo == 3
+    assert not procesador._en_proceso
+
+
+def test_orden_por_usuario_y_usuarios_en_paralelo():
+    registro = Registro()
+    procesador = ProcesadorSolicitudes(registro, 'ITEM', limite=8)
+    claves = {('Hexing', 'HX1'): 'C1'}
+
+    asyncio.run(procesador.procesar_lote(None, solicitudes((1, 'ana'), (2, 'luis'), (3, 'ana'), (4, 'ana'), (5, 'luis')), claves))
+
+    # Las de cada usuario en orden y sin solaparse
+    for items in ([1, 3, 4], [2, 5]):
+        propios = [evento for evento in registro.eventos if evento[1] in items]
+        assert propios == [(momento, item) for item in items for momento in ('inicio', 'fin')]
+    # Las de usuarios distintos sí se solapan
+    assert registro.maximo == 2
+    # Todo el lote comparte el mismo `LoteSolicitudes`, con las claves resueltas
+    assert len({id(lote) for lote in registro.lotes}) == 1
+    assert registro.lotes[0].claves == claves
+
+
+def test_no_toma_las_solicitudes_en_proceso():
+    liberar = None
+    atendidas = []
+
+    async def procesar(context, solicitud, lote):
+        atendidas.append(solicitud['ITEM'])
+        if solicitud['ITEM'] == 1:
+            await liberar.wait()
+
+    procesador = ProcesadorSolicitudes(procesar, 'ITEM', limite=8)
+
+    async def ciclos():
+        nonlocal liberar
+        liberar = asyncio.Event()
+        primero = asyncio.create_task(procesador.procesar_lote(None, solicitudes((1, 'ana'))))
+        await asyncio.sleep(0)
+        # La 1 sigue en curso: el siguiente ciclo, que la vuelve a ver, solo toma la 2
+        segundo = await procesador.procesar_lote(None, solicitudes((1, 'ana'), (2, 'luis')))
+        liberar.set()
+        tomadas = [await primero, segundo]
+        # Terminada, la 1 se puede volver a tomar
+        tomadas.append(await procesador.procesar_lote(None, solicitudes((1, 'ana'))))
+        return tomadas
+
+    assert asyncio.run(ciclos()) == [1, 1, 1]
+    assert atendidas == [1, 2, 1]
+    assert not procesador._en_proceso
+
+
+def test_un_error_no_detiene_las_siguientes_del_usuario(caplog):
+    registro = Registro(fallar={1})
+    procesador = ProcesadorSolicitudes(registro, 'ITEM', limite=2)
+
+    assert asyncio.run(procesador.procesar_lote(None, solicitudes((1, 'ana'), (2, 'ana')))) == 2
+
+    assert registro.eventos == [('inicio', 1), ('fin', 1), ('inicio', 2), ('fin', 2)]
+    assert 'Error al procesar la solicitud 1: falla 1' in caplog.text
+    assert not procesador._en_proceso
+
+
+class Consulta:
+    """
+    Corrutina sin argumentos que cuenta sus ejecuciones y devuelve (o lanza) `resultado`.
+    """
+
+    def __init__(self, resultado):
+        self.resultado = resultado
+        self.ejecuciones = 0
+
+    async def __call__(self):
+        self.ejecuciones += 1
+        await asyncio.sleep(0.01)
+        if isinstance(self.resultado, Exception):
+            raise self.resultado
+        return self.resultado
+
+
+def test_una_ejecucion_por_clave():
+    vuelos = UnSoloVuelo()
+    consultas = {'a': Consulta('reporte a'), 'b': Consulta('reporte b')}
+
+    async def pedir():
+        return await asyncio.gather(*(vuelos.ejecutar(clave, consultas[clave]) for clave in 'abaab'))
+
+    assert asyncio.run(pedir()) == ['reporte a', 'reporte b', 'reporte a', 'reporte a', 'reporte b']
+    assert [consulta.ejecuciones for consulta in consultas.values()] == [1, 1]
+    assert (vuelos.llamadas, vuelos.ejecuciones) == (5, 2)
+
+
+def test_el_error_llega_a_todos_los_que_esperan():
+    vuelos = UnSoloVuelo()
+    error = ConnectionError('sin base')
+    consulta = Consulta(error)
+
+    async def pedir():
+        return await asyncio.gather(*(vuelos.ejecutar('a', consulta) for _ in range(3)), return_exceptions=True)
+
+    assert asyncio.run(pedir()) == [error, error, error]
+    assert consulta.ejecuciones == 1
+
+
+def test_cancelar_a_uno_no_cancela_a_los_demas():
+    vuelos = UnSoloVuelo()
+    consulta = Consulta('reporte')
+
+    async def pedir():
+        cancelado = asyncio.create_task(vuelos.ejecutar('a', consulta))
+        otro = asyncio.create_task(vuelos.ejecutar('a', consulta))
+        await asyncio.sleep(0)
+        cancelado.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelado
+        return await otro
+
+    assert asyncio.run(pedir()) == 'reporte'
+    assert consulta.ejecuciones == 1
@@ -0,0 +1,136 @@
+"""
+Funciones de `replay.py` que no usan la base: lectura de la exportación, sustitución de medidores,
+lectura de las trazas exportadas, distribución de latencias e informe.
+"""
+
+from datetime import datetime
+import csv
+import json
+
+import pytest
+
+from benchmark import medidor_sintetico
+from replay import distribucion, informe, leer_exportacion, leer_trazas, sustituir_medidores
+from trazas import Trazas
+
+FILAS = [
+    {'ID_TG': '20', 'COMANDO': '2', 'MEDIDOR': ' HX123 ', 'MARCA': 'Hexing', 'FECHA': '2025-03-03 08:00:05', 'NOMBRE': 'Ana'},
+    {'ID_TG': '10', 'COMANDO': '1', 'MEDIDOR': '2015-001-000001', 'MARCA': '', 'FECHA': '2025-03-03 08:00:00', 'NOMBRE': ''},
+    {'ID_TG': '30', 'COMANDO': '3', 'MEDIDOR': '000000000042', 'MARCA': 'Union', 'FECHA': '2025-03-03 09:30:00', 'NOMBRE': 'Luis'},
+    # Incompleta: sin fecha válida
+    {'ID_TG': '40', 'COMANDO': '1', 'MEDIDOR': 'HX1', 'MARCA': 'Hexing', 'FECHA': 'ayer', 'NOMBRE': ''},
+]
+
+
+def escribir(ruta, formato):
+    if formato == 'jsonl':
+        ruta.write_text(''.join(json.dumps(fila) + '\n\n' for fila in FILAS), encoding='utf-8')
+    elif formato == 'json':
+        ruta.write_text(json.dumps(FILAS, indent=2), encoding='utf-8')
+    else:
+        with open(ruta, 'w', encoding='utf-8', newline='') as archivo:
+            escritor = csv.DictWriter(archivo, fieldnames=list(FILAS[0]), delimiter=';')
+            escritor.writeheader()
+            escritor.writerows(FILAS)
+
+
+@pytest.mark.parametrize('formato', ['jsonl', 'json', 'csv'])
+def test_lee_cada_formato_de_exportacion(tmp_path, formato):
+    ruta = tmp_path / f"solicitudes.{formato}"
+    escribir(ruta, formato)
+
+    solicitudes, descartadas = leer_exportacion(str(ruta))
+
+    assert descartadas == 1
+    # Ordenadas por fecha; sin marca es Elster (`proceso_bot`) y va a `bot_md`
+    assert [(solicitud['bot'], solicitud['ID_TG'], solicitud['MARCA']) for solicitud in solicitudes] == [
+        ('bot_md', 10, 'Elster'), ('bot_me', 20, 'Hexing'), ('bot_me', 30, 'Union'),
+    ]
+    assert solicitudes[0]['NOMBRE'] == 'Usuario 10'
+    assert solicitudes[1]['MEDIDOR'] == 'HX123'
+    assert solicitudes[1]['FECHA'] == datetime(2025, 3, 3, 8, 0, 5)
+
+
+def test_lista_json_con_elementos_que_no_son_filas(tmp_path):
+    ruta = tmp_path / 'solicitudes.json'
+    ruta.write_text('\n  ' + json.dumps([FILAS[0], 'basura', 7]), encoding='utf-8')
+
+    solicitudes, descartadas = leer_exportacion(str(ruta))
+
+    assert [solicitud['ID_TG'] for solicitud in solicitudes] == [20]
+    assert descartadas == 2
+
+
+def test_filtro_de_fechas(tmp_path):
+    ruta = tmp_path / 'solicitudes.jsonl'
+    escribir(ruta, 'jsonl')
+
+    solicitudes, _ = leer_exportacion(str(ruta), desde=datetime(2025, 3, 3, 8, 0, 1), hasta=datetime(2025, 3, 3, 9, 0))
+
+    assert [solicitud['ID_TG'] for solicitud in solicitudes] == [20]
+
+
+def test_sustituir_medidores_conserva_las_repeticiones():
+    solicitudes = [
+        {'MARCA': marca, 'MEDIDOR': medidor}
+        for marca, medidor in [('Hexing', 'A'), ('Union', 'A'), ('Hexing', 'B'), ('Hexing', 'A'), ('Elster', 'A')]
+    ]
+
+    distintos = sustituir_medidores(solicitudes)
+
+    assert distintos == {'Hexing': 2, 'Union': 1, 'Elster': 1}
+    # El mismo medidor de otra marca es otro medidor
+    assert [solicitud['MEDIDOR'] for solicitud in solicitudes] == [
+        medidor_sintetico('Hexing', 0), medidor_sintetico('Union', 0), medidor_sintetico('Hexing', 1),
+        medidor_sintetico('Hexing', 0), medidor_sintetico('Elster', 0),
+    ]
+
+
+def test_leer_trazas_exportadas(tmp_path):
+    ruta = tmp_path / 'trazas.jsonl'
+    assert leer_trazas(str(ruta)) == {}
+
+    trazas = Trazas(archivo=str(ruta), ventana=60, memoria=100)
+    for traza_id, inicio, resultado in [('a', 100.0, 'enviado'), ('b', 200.0, 'sin_datos'), ('a', 300.0, 'enviado')]:
+        # La traza `a` se reintentó: se abre y se termina dos veces
+        with trazas.activar(traza_id, bot='bot_md'):
+            trazas.registrar_actual('insercion', inicio, 0.5)
+            trazas.registrar_actual('envio', inicio + 1, 2.0)
+        trazas.anotar(traza_id, resultado=resultado)
+        trazas.terminar([traza_id])
+
+    assert leer_trazas(str(ruta)) == {'a': (303.0, 'enviado'), 'b': (203.0, 'sin_datos')}
+
+
+def test_distribucion():
+    assert distribucion([]) == {'cantidad': 0}
+
+    assert distribucion([2, 0.5, 7, 2, 1000]) == {
+        'cantidad': 5, 'p50': 2, 'p90': 1000, 'p99': 1000, 'max': 1000,
+        'rangos': {'<=1s': 1, '<=5s': 2, '<=10s': 1, '>900s': 1},
+    }
+
+
+def test_informe():
+    solicitudes = [{}] * 4
+    ejecucion = {
+        'insertadas': {'a': ('bot_md', 10.0), 'b': ('bot_me', 10.0), 'c': ('bot_me', 20.0), 'd': ('bot_me', 20.0)},
+        'retrasos': [0.2, 1.5], 'duracion': 12.34567, 'vaciadas': False, 'enviados': 3, 'sondeos': 5,
+    }
+    # `d` no terminó; el reloj de `c` quedó antes de su inserción
+    terminadas = {'a': (12.0, 'enviado'), 'b': (14.0, 'enviado'), 'c': (19.5, None)}
+    consultas = {'solicitudes_pendientes': 6, 'bitacora': 2}
+
+    resultado = informe(solicitudes, ejecucion, terminadas, consultas, {'bot_me': {'pico': 3}}, {'velocidad': 10})
+
+    assert resultado['resultados'] == {'enviado': 2, 'sin_resultado': 1, 'sin_terminar': 1}
+    assert resultado['latencia']['bot_md']['max'] == 2.0
+    assert resultado['latencia']['bot_me']['cantidad'] == 2
+    assert resultado['latencia']['bot_me']['max'] == 4.0
+    assert resultado['latencia']['total']['cantidad'] == 3
+    assert resultado['retraso_insercion'] == {'cantidad': 2, 'max': 1.5}
+    assert resultado['consultas']['total'] == 8
+    assert resultado['consultas']['por_solicitud'] == 2.0
+    assert list(resultado['consultas']['por_consulta']) == ['solicitudes_pendientes', 'bitacora']
+    assert (resultado['duracion'], resultado['colas_vaciadas'], resultado['mensajes_enviados']) == (12.346, False, 3)
+    assert resultado['parametros'] == {'velocidad': 10}
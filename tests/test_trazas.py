@@ -0,0 +1,118 @@
+"""
+Trazas de las solicitudes: terminan solo cuando su estado queda escrito, y el archivo de exportación
+se rota al llegar a su tamaño máximo.
+"""
+
+import asyncio
+import json
+import time
+
+from sqlalchemy import create_engine, text
+
+from escritor_estados import EscritorEstados
+from trazas import Trazas
+
+
+def abrir(trazas, *trazas_ids):
+    for traza_id in trazas_ids:
+        with trazas.activar(traza_id, bot='bot_md'):
+            trazas.registrar_actual('envio', time.time(), 0.1)
+
+
+def test_solo_terminan_las_trazas_con_el_estado_escrito(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'estados.db'}")
+    trazas = Trazas(archivo='', ventana=60, memoria=100)
+    escritor = EscritorEstados(engine, 'proceso_bot', 'ITEM', ventana=60, trazas=trazas)
+    abrir(trazas, 'a', 'b', 'c')
+
+    async def primera():
+        escritor.marcar_enviado(1, 'a')
+        escritor.marcar_liberado(2, 'b')
+        # La tabla no existe: la escritura falla y las confirmaciones vuelven al búfer
+        return await escritor.vaciar()
+
+    assert asyncio.run(primera()) == 0
+    assert trazas.mas_lentas() == ([], 0)
+
+    with engine.begin() as con:
+        con.execute(text("CREATE TABLE proceso_bot (ITEM INTEGER PRIMARY KEY, ENVIADO TEXT, LEASE_HASTA TEXT)"))
+        con.execute(text("INSERT INTO proceso_bot VALUES (1, '0', 'x'), (2, '0', 'x'), (3, '0', 'x')"))
+
+    async def segunda():
+        # La traza `c` no se marca (envío fallido temporal): sigue abierta
+        return await escritor.vaciar()
+
+    assert asyncio.run(segunda()) == 2
+    terminadas = {traza['traza']: traza for traza in trazas.mas_lentas()[0]}
+    assert set(terminadas) == {'a', 'b'}
+    assert all('confirmacion' in [tramo['span'] for tramo in traza['tramos']] for traza in terminadas.values())
+    with engine.connect() as con:
+        assert con.execute(text("SELECT ITEM, ENVIADO, LEASE_HASTA FROM proceso_bot ORDER BY ITEM")).all() == [
+            (1, '1', 'x'), (2, '0', None), (3, '0', 'x')
+        ]
+
+
+
+def test_la_ventana_escribe_sin_esperar_el_fin_del_ciclo(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'estados.db'}")
+    with engine.begin() as con:
+        con.execute(text("CREATE TABLE proceso_bot (ITEM INTEGER PRIMARY KEY, ENVIADO TEXT, LEASE_HASTA TEXT)"))
+        con.execute(text("INSERT INTO proceso_bot VALUES (1, '0', 'x')"))
+    trazas = Trazas(archivo='', ventana=60, memoria=100)
+    escritor = EscritorEstados(engine, 'proceso_bot', 'ITEM', ventana=0.05, trazas=trazas)
+    abrir(trazas, 'a')
+
+    # Al vencer la ventana, la tarea de escritura ya está guardada en el escritor
+    retenidas = []
+    vaciar_en_tarea = escritor._vaciar_en_tarea
+
+    def registrar_tarea():
+        vaciar_en_tarea()
+        retenidas.append(set(escritor._tareas))
+
+    escritor._vaciar_en_tarea = registrar_tarea
+
+    async def ciclo():
+        escritor.marcar_enviado(1, 'a')
+        # Nadie espera la tarea: la escritura termina sola
+        while escritor.commits == 0:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(asyncio.wait_for(ciclo(), timeout=5))
+
+    assert [len(tareas) for tareas in retenidas] == [1]
+    assert not escritor._tareas
+    assert (escritor.confirmaciones, escritor.commits) == (1, 1)
+    assert [traza['traza'] for traza in trazas.mas_lentas()[0]] == ['a']
+    with engine.connect() as con:
+        assert con.execute(text("SELECT ENVIADO FROM proceso_bot")).scalar() == '1'
+
+
+def test_rotacion_del_archivo(tmp_path):
+    archivo = tmp_path / 'trazas.jsonl'
+    trazas = Trazas(archivo=str(archivo), ventana=60, memoria=100, maximo_mb=1 / 1024)
+
+    for numero in range(40):
+        abrir(trazas, f"traza-{numero}")
+        trazas.terminar([f"traza-{numero}"])
+
+    rotado = tmp_path / 'trazas.jsonl.1'
+    assert rotado.exists()
+    # Cada archivo se rota al superar el límite en a lo sumo una exportación
+    assert archivo.stat().st_size < 1024 + 1024
+    assert not (tmp_path / 'trazas.jsonl.2').exists()
+    for ruta in (archivo, rotado):
+        lineas = [json.loads(linea) for linea in ruta.read_text(encoding='utf-8').splitlines()]
+        assert lineas and all('traza' in linea for linea in lineas)
+
+
+def test_sin_limite_no_rota(tmp_path):
+    archivo = tmp_path / 'trazas.jsonl'
+    trazas = Trazas(archivo=str(archivo), ventana=60, memoria=100, maximo_mb=0)
+
+    for numero in range(40):
+        abrir(trazas, f"traza-{numero}")
+        trazas.terminar([f"traza-{numero}"])
+
+    assert not (tmp_path / 'trazas.jsonl.1').exists()
+    assert len(archivo.read_text(encoding='utf-8').splitlines()) == 80
@@ -0,0 +1,86 @@
+"""
+Ciclo de vida de `webhook.ejecutar_aplicaciones` y carga por polling y por webhook sobre `APISimulada`.
+"""
+
+import asyncio
+
+import pytest
+from telegram.ext import Application, MessageHandler, filters
+
+import benchmark
+import webhook
+from bot_simulado import APISimulada
+from servidor_http import ServidorHTTP
+
+
+USUARIOS = [
+    {'ID_TELEGRAM': 1000 + numero, 'NOMBRE_TELEGRAM': f"Usuario {numero}", 'USUARIO_TELEGRAM': f"usuario{numero}"}
+    for numero in range(20)
+]
+
+
+def aplicacion(api):
+    return Application.builder().token('0:simulado').request(api).get_updates_request(api).build()
+
+
+def test_modo_desconocido(monkeypatch):
+    monkeypatch.setenv('BOT_MODO', 'webhok')
+    with pytest.raises(ValueError, match='BOT_MODO'):
+        webhook.modo_configurado()
+    with pytest.raises(ValueError, match='BOT_MODO'):
+        asyncio.run(webhook.ejecutar_aplicaciones({'bot': aplicacion(APISimulada())}))
+
+
+def test_registrar_sin_url(monkeypatch):
+    monkeypatch.delenv('WEBHOOK_URL', raising=False)
+    api = APISimulada()
+    with pytest.raises(ValueError, match='WEBHOOK_URL'):
+        asyncio.run(webhook.ejecutar_aplicaciones({'bot': aplicacion(api)}, 'webhook', ServidorHTTP('127.0.0.1', 0), registrar=True))
+    # Falla antes de contactar a Telegram
+    assert api.llamadas == []
+
+
+def test_servidor_escucha_antes_de_registrar_el_webhook(monkeypatch):
+    monkeypatch.setenv('WEBHOOK_URL', 'https://bots.ejemplo.com/telegram')
+    api = APISimulada()
+    application = aplicacion(api)
+    servidor = ServidorHTTP('127.0.0.1', 0)
+    iniciar = servidor.iniciar
+
+    async def iniciar_registrado():
+        await iniciar()
+        api.llamadas.append('iniciar servidor')
+
+    monkeypatch.setattr(servidor, 'iniciar', iniciar_registrado)
+
+    async def ejecutar():
+        parada = asyncio.Event()
+        tarea = asyncio.create_task(webhook.ejecutar_aplicaciones(
+            {'bot': application}, 'webhook', servidor, registrar=True, parada=parada
+        ))
+        while not application.running:
+            await asyncio.sleep(0.01)
+        parada.set()
+        await tarea
+
+    asyncio.run(ejecutar())
+
+    assert api.llamadas.index('iniciar servidor') < api.llamadas.index('setWebhook')
+    assert api.llamadas[0] == 'iniciar servidor'
+    assert api.webhook == 'https://bots.ejemplo.com/telegram'
+
+
+@pytest.mark.parametrize('modo', webhook.MODOS)
+def test_carga_por_polling_y_por_webhook(modo):
+    async def responder(update, context):
+        await update.message.reply_text('ok')
+
+    actualizaciones = [benchmark.datos_actualizacion(usuario, 'hola') for usuario in USUARIOS * 5]
+    medida = asyncio.run(benchmark.medir_recepcion(
+        modo, MessageHandler(filters.TEXT, responder), actualizaciones, conexiones=4, espera=10
+    ))
+
+    # Cada actualización atendida una sola vez, con su respuesta
+    assert medida['cantidad'] == len(actualizaciones)
+    assert medida['enviados'] == len(actualizaciones)
+    assert medida['p99_ms'] is not None
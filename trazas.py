@@ -0,0 +1,313 @@
+"""
+## Trazas de las solicitudes
+
+Une en una traza todo lo que pasa con una solicitud, desde que `ingresar_medidor` la inserta hasta
+que se confirma su envío:
+
+- El identificador de la traza (`TRAZA_ID`, ver `esquema.sql`) se crea al insertar la solicitud y se
+  guarda con la fila. Las filas insertadas por otros procesos sin `TRAZA_ID` usan `<bot>-<id>`.
+- Cada traza tiene tramos (spans): `insercion`, `espera` (en cola), `reclamo`, `claves`, `reporte`,
+  `sql` (uno por sentencia, con el nombre de la consulta), `render`, `envio` y `confirmacion`.
+- La traza termina cuando `escritor_estados.py` escribe el estado de su solicitud (enviada o
+  liberada). Si el envío falla y la fila se vuelve a reclamar, la traza sigue abierta y continúa.
+- La traza activa viaja en una variable de contexto, así que las sentencias ejecutadas en los hilos de
+  `acceso_datos.py` quedan en la traza que las pidió.
+
+Los tramos se exportan como líneas JSON a `TRAZAS_ARCHIVO` (por defecto `trazas.jsonl`; vacío lo
+desactiva), una por tramo y una por traza terminada (`"span": "traza"`), listas para un colector que
+lea archivos. Cuando el archivo llega a `TRAZAS_MAX_MB` megabytes (por defecto 100; 0 sin límite) se
+renombra a `<archivo>.1`, reemplazando el anterior, y se empieza uno nuevo. Las trazas terminadas de la última `TRAZAS_VENTANA` segundos (por defecto 3600, hasta
+`TRAZAS_MEMORIA` trazas) quedan en memoria para el comando `/trazas`, que muestra las más lentas a los
+administradores.
+"""
+
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from paginacion import acotar
+
+
+# Traza activa en el contexto actual
+_traza_actual = ContextVar('traza_actual', default=None)
+
+# Tramos máximos que se guardan en memoria por traza
+MAXIMO_TRAMOS = 200
+
+
+class Trazas:
+    """
+    ## Clase Trazas:
+    Registra los tramos de las trazas abiertas, exporta los tramos y guarda las trazas terminadas.
+
+    Args:
+        archivo (str, opcional): Archivo JSONL de exportación; por defecto `TRAZAS_ARCHIVO` o `trazas.jsonl`.
+        ventana (int, opcional): Segundos que se guardan las trazas terminadas; por defecto `TRAZAS_VENTANA` o 3600.
+        memoria (int, opcional): Máximo de trazas terminadas en memoria; por defecto `TRAZAS_MEMORIA` o 5000.
+        maximo_mb (float, opcional): Tamaño en MB a partir del cual se rota el archivo; por defecto
+            `TRAZAS_MAX_MB` o 100. Con 0 no se rota.
+    """
+
+    def __init__(self, archivo=None, ventana=None, memoria=None, maximo_mb=None):
+        self.archivo = archivo if archivo is not None else os.getenv('TRAZAS_ARCHIVO', 'trazas.jsonl')
+        self.ventana = ventana or int(os.getenv('TRAZAS_VENTANA', 3600))
+        self.memoria = memoria or int(os.getenv('TRAZAS_MEMORIA', 5000))
+        maximo_mb = maximo_mb if maximo_mb is not None else float(os.getenv('TRAZAS_MAX_MB', 100))
+        self.maximo_bytes = int(maximo_mb * 1024 * 1024)
+        # Los tramos de SQL llegan desde los hilos de base de datos
+        self._lock = threading.Lock()
+        self._abiertas = OrderedDict()
+        self._terminadas = deque(maxlen=self.memoria)
+        self._pendientes = []
+
+    @staticmethod
+    def nuevo_id():
+        """
+        Crea un identificador de traza.
+
+        Returns:
+            str: 32 caracteres hexadecimales.
+        """
+        return uuid.uuid4().hex
+
+    def _abrir(self, traza_id, atributos):
+        traza = self._abiertas.get(traza_id)
+        if traza is None:
+            traza = self._abiertas[traza_id] = {'traza': traza_id, 'abierta': time.monotonic(), 'tramos': [], **atributos}
+            # Las trazas que terminan en otra instancia no se cierran aquí: se descartan al vencer
+            while self._abiertas:
+                primera = next(iter(self._abiertas.values()))
+                if time.monotonic() - primera['abierta'] <= self.ventana and len(self._abiertas) <= self.memoria:
+                    break
+                self._abiertas.popitem(last=False)
+        else:
+            traza.update(atributos)
+        return traza
+
+    @contextmanager
+    def activar(self, traza_id, **atributos):
+        """
+        Activa una traza en el contexto actual: los tramos del bloque `with` quedan en ella.
+
+        Args:
+            traza_id (str | None): Identificador de la traza; con None no se traza nada.
+            **atributos: Atributos de la traza (`bot`, `marca`, `comando`, `medidor`...).
+        """
+        if traza_id is None:
+            yield
+            return
+        with self._lock:
+            self._abrir(traza_id, atributos)
+        token = _traza_actual.set(traza_id)
+        try:
+            yield
+        finally:
+            _traza_actual.reset(token)
+
+    def registrar(self, traza_id, nombre, inicio, duracion, **atributos):
+        """
+        Registra un tramo terminado de una traza abierta.
+
+        Args:
+            traza_id (str): Identificador de la traza.
+            nombre (str): Nombre del tramo.
+            inicio (float): Inicio del tramo (segundos desde la época, `time.time()`).
+            duracion (float): Duración en segundos.
+            **atributos: Atributos del tramo (por ejemplo `consulta`).
+        """
+        tramo = {'traza': traza_id, 'span': nombre, 'inicio': round(inicio, 6), 'duracion': round(duracion, 6), **atributos}
+        with self._lock:
+            traza = self._abiertas.get(traza_id)
+            if traza is None:
+                # Traza ya terminada (por ejemplo, el refresco en segundo plano de la caché)
+                return
+            if len(traza['tramos']) < MAXIMO_TRAMOS:
+                traza['tramos'].append(tramo)
+            self._pendientes.append(tramo)
+
+    def registrar_actual(self, nombre, inicio, duracion, **atributos):
+        """
+        Registra un tramo en la traza activa del contexto, si la hay.
+        """
+        traza_id = _traza_actual.get()
+        if traza_id is not None:
+            self.registrar(traza_id, nombre, inicio, duracion, **atributos)
+
+    def registrar_lote(self, trazas_ids, nombre, inicio, duracion, **atributos):
+        """
+        Registra el mismo tramo (por ejemplo, el reclamo del ciclo) en varias trazas, abriendo las que
+        no estén abiertas (solicitudes insertadas por otro proceso o antes de un reinicio).
+        """
+        with self._lock:
+            for traza_id in trazas_ids:
+                self._abrir(traza_id, {})
+        for traza_id in trazas_ids:
+            self.registrar(traza_id, nombre, inicio, duracion, **atributos)
+
+    @contextmanager
+    def tramo(self, nombre, **atributos):
+        """
+        Mide el bloque `with` como un tramo de la traza activa.
+        """
+        if _traza_actual.get() is None:
+            yield
+            return
+        inicio = time.time()
+        medida = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar_actual(nombre, inicio, time.perf_counter() - medida, **atributos)
+
+    def anotar(self, traza_id, **atributos):
+        """
+        Agrega atributos (por ejemplo el `resultado`) a una traza abierta.
+        """
+        with self._lock:
+            traza = self._abiertas.get(traza_id)
+            if traza is not None:
+                traza.update(atributos)
+
+    def terminar(self, trazas_ids):
+        """
+        Cierra las trazas indicadas, las guarda para `/trazas` y exporta sus tramos.
+
+        Args:
+            trazas_ids (iterable): Identificadores de las trazas a cerrar.
+        """
+        ahora = time.time()
+        with self._lock:
+            for traza_id in trazas_ids:
+                traza = self._abiertas.pop(traza_id, None)
+                if traza is None or not traza['tramos']:
+                    continue
+                del traza['abierta']
+                inicio = min(tramo['inicio'] for tramo in traza['tramos'])
+                fin = max(tramo['inicio'] + tramo['duracion'] for tramo in traza['tramos'])
+                traza.update(inicio=round(inicio, 6), duracion=round(fin - inicio, 6), terminada=ahora)
+                self._terminadas.append(traza)
+                self._pendientes.append({key: valor for key, valor in traza.items() if key != 'tramos'} | {'span': 'traza'})
+        self.exportar()
+
+    def _rotar(self):
+        # El archivo lleno pasa a `.1` (reemplazando el anterior) y se empieza uno vacío
+        if self.maximo_bytes and os.path.exists(self.archivo) and os.path.getsize(self.archivo) >= self.maximo_bytes:
+            os.replace(self.archivo, self.archivo + '.1')
+            logging.info(f"Archivo de trazas {self.archivo} rotado a {self.archivo}.1")
+
+    def exportar(self):
+        """
+        Escribe en `archivo` los tramos registrados desde la última exportación, rotándolo si llegó
+        a `maximo_bytes`.
+        """
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, []
+        if not pendientes or not self.archivo:
+            return
+        try:
+            self._rotar()
+            with open(self.archivo, 'a', encoding='utf-8') as archivo:
+                archivo.writelines(json.dumps(tramo, default=str, ensure_ascii=False) + '\n' for tramo in pendientes)
+        except OSError as e:
+            logging.error(f"No se pudieron exportar las trazas a {self.archivo}: {e}")
+
+    def mas_lentas(self, cantidad=10, bot=None):
+        """
+        Devuelve las trazas terminadas más lentas de la ventana.
+
+        Args:
+            cantidad (int): Trazas a devolver.
+            bot (str, opcional): Solo las trazas de este bot.
+
+        Returns:
+            tuple: Trazas ordenadas de mayor a menor duración y cantidad de trazas en la ventana.
+        """
+        limite = time.time() - self.ventana
+        with self._lock:
+            recientes = [traza for traza in self._terminadas
+                         if traza['terminada'] >= limite and (bot is None or traza.get('bot') == bot)]
+        recientes.sort(key=lambda traza: traza['duracion'], reverse=True)
+        return recientes[:cantidad], len(recientes)
+
+
+def resumen_traza(traza):
+    """
+    Resume una traza en texto: duración total y tiempo por tramo.
+
+    Args:
+        traza (dict): Traza terminada.
+
+    Returns:
+        str: Resumen de la traza.
+    """
+    por_tramo = {}
+    for tramo in sorted(traza['tramos'], key=lambda tramo: tramo['inicio']):
+        total, cantidad = por_tramo.get(tramo['span'], (0.0, 0))
+        por_tramo[tramo['span']] = (total + tramo['duracion'], cantidad + 1)
+    tramos = ', '.join(
+        f"{nombre} {total:.2f} s" + (f" ({cantidad})" if cantidad > 1 else '')
+        for nombre, (total, cantidad) in por_tramo.items()
+    )
+    return (
+        f"{traza['duracion']:.2f} s · {traza.get('marca', '')} {traza.get('comando', '')} · "
+        f"medidor {traza.get('medidor', '')} · {traza.get('resultado', '')}\n"
+        f"   {tramos}\n"
+        f"   traza {traza['traza']}"
+    )
+
+
+def comando_trazas(directorio_usuarios, bot, cantidad=None):
+    """
+    Crea el manejador del comando `/trazas`, que muestra a los administradores las trazas más lentas
+    de la última ventana.
+
+    Args:
+        directorio_usuarios (DirectorioUsuarios): Directorio para verificar el rol.
+        bot (str): Nombre del bot cuyas trazas se muestran.
+        cantidad (int, opcional): Trazas a mostrar; por defecto `TRAZAS_TOP` o 10.
+
+    Returns:
+        callable: Corrutina `trazas(update, context)`.
+    """
+    cantidad = cantidad or int(os.getenv('TRAZAS_TOP', 10))
+
+    async def trazas(update, context):
+        usuario = await directorio_usuarios.obtener_async(update.message.from_user.id)
+        if usuario is None or usuario['ROL'] != 'ADMINISTRADOR':
+            await update.message.reply_text('No estás autorizado para consultar las trazas.')
+            return
+
+        lentas, total = TRAZAS.mas_lentas(cantidad, bot=bot)
+        if not lentas:
+            await update.message.reply_text('No hay solicitudes terminadas en la última hora.')
+            return
+        lineas = [f"Solicitudes más lentas de la última hora ({len(lentas)} de {total}):"]
+        lineas += [f"{numero}. {resumen_traza(traza)}" for numero, traza in enumerate(lentas, 1)]
+        await update.message.reply_text(acotar('\n'.join(lineas)))
+
+    return trazas
+
+
+def traza_de(solicitud, respaldo):
+    """
+    Devuelve el identificador de traza de una solicitud.
+
+    Args:
+        solicitud (pd.Series): Fila de la solicitud.
+        respaldo (str): Identificador a usar si la fila no tiene `TRAZA_ID` (`<bot>-<id>`).
+
+    Returns:
+        str: Identificador de la traza.
+    """
+    traza_id = solicitud.get('TRAZA_ID')
+    return traza_id if isinstance(traza_id, str) and traza_id else respaldo
+
+
+# Trazas del proceso, compartidas por los bots que corren en él
+TRAZAS = Trazas()
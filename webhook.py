@@ -0,0 +1,284 @@
+"""
+## Modo webhook
+
+Alternativa a `run_polling`: Telegram envía cada actualización por HTTP a `servidor_http.py`, que la
+pone en la cola de la `Application` de python-telegram-bot. Los manejadores, el JobQueue y
+`post_init`/`post_stop` funcionan igual que con polling.
+
+`ejecutar_aplicaciones` ejecuta una o varias aplicaciones en el mismo bucle de eventos, en polling o
+en webhook (ver `bots.py`). Con varias aplicaciones en webhook comparten el servidor HTTP y cada una
+recibe en `WEBHOOK_RUTA/<nombre>` (y se registra en `WEBHOOK_URL/<nombre>`).
+
+Variables de entorno:
+- `BOT_MODO`: `polling` (por defecto) o `webhook`; cualquier otro valor es un error.
+- `WEBHOOK_URL`: URL pública (HTTPS) que se registra en Telegram, incluida la ruta. Obligatoria si
+  se registra el webhook.
+- `WEBHOOK_RUTA` (por defecto `/telegram`): ruta local que recibe las actualizaciones.
+- `WEBHOOK_HOST` (por defecto `0.0.0.0`) y `WEBHOOK_PUERTO` (por defecto 8080).
+- `WEBHOOK_SECRETO`: token secreto que Telegram envía en `X-Telegram-Bot-Api-Secret-Token`. Las
+  solicitudes sin el token correcto responden 403. Si no se define se genera uno al arrancar.
+- `WEBHOOK_REGISTRAR` (por defecto 1): registra el webhook en Telegram al arrancar. Con 0 no se
+  contacta a Telegram y se pueden enviar actualizaciones grabadas a mano, por ejemplo:
+  `curl -H "X-Telegram-Bot-Api-Secret-Token: $WEBHOOK_SECRETO" -d @update.json localhost:8080/telegram`
+
+El servidor HTTP empieza a escuchar antes de registrar el webhook y de iniciar las aplicaciones: las
+actualizaciones que Telegram envíe apenas se registra quedan en la cola de la aplicación en lugar de
+rechazarse, y `/listo` responde 503 hasta que todas estén iniciadas.
+
+Endpoints de salud:
+- `GET /salud`: 200 mientras el proceso responde.
+- `GET /listo`: 200 cuando todas las aplicaciones están iniciadas y recibiendo actualizaciones, 503 si no.
+"""
+
+from http import HTTPStatus
+import asyncio
+import hmac
+import logging
+import os
+import secrets
+import signal
+
+from telegram import Update
+
+from servidor_http import ServidorHTTP
+
+
+MODOS = ('polling', 'webhook')
+
+
+class ReceptorWebhook:
+    """
+    ## Clase ReceptorWebhook:
+    Registra en el servidor HTTP la ruta del webhook de una aplicación.
+
+    Args:
+        application (Application): Aplicación de python-telegram-bot.
+        servidor (ServidorHTTP): Servidor en el que se registran las rutas.
+        ruta (str): Ruta que recibe las actualizaciones.
+        secreto (str): Token secreto esperado en `X-Telegram-Bot-Api-Secret-Token`.
+    """
+
+    def __init__(self, application, servidor, ruta, secreto):
+        self.application = application
+        self.secreto = secreto
+        self.recibidas = 0
+        self.rechazadas = 0
+
+        servidor.ruta('POST', ruta, self.recibir)
+
+    async def recibir(self, solicitud):
+        """
+        Valida el token secreto y encola la actualización recibida.
+
+        Args:
+            solicitud (SolicitudHTTP): Solicitud de Telegram con la actualización en JSON.
+
+        Returns:
+            tuple: Estado HTTP y cuerpo de la respuesta.
+        """
+        token = solicitud.cabeceras.get('x-telegram-bot-api-secret-token', '')
+        if not hmac.compare_digest(token.encode(), self.secreto.encode()):
+            self.rechazadas += 1
+            return HTTPStatus.FORBIDDEN, {'error': 'token secreto inválido'}
+
+        try:
+            update = Update.de_json(solicitud.json(), self.application.bot)
+        except (ValueError, TypeError, KeyError):
+            self.rechazadas += 1
+            return HTTPStatus.BAD_REQUEST, {'error': 'actualización inválida'}
+
+        await self.application.update_queue.put(update)
+        self.recibidas += 1
+        return HTTPStatus.OK, ''
+
+    def estado(self):
+        """
+        Devuelve el estado de la aplicación y los contadores del receptor.
+
+        Returns:
+            dict: Si está lista, actualizaciones recibidas, rechazadas y en cola.
+        """
+        return {
+            'listo': self.application.running,
+            'recibidas': self.recibidas,
+            'rechazadas': self.rechazadas,
+            'en_cola': self.application.update_queue.qsize(),
+        }
+
+
+def modo_configurado(modo=None):
+    """
+    Devuelve el modo de ejecución indicado o el de `BOT_MODO`.
+
+    Args:
+        modo (str, opcional): `polling` o `webhook`; por defecto `BOT_MODO` o `polling`.
+
+    Returns:
+        str: Modo validado.
+
+    Raises:
+        ValueError: Si el modo no es uno de `MODOS`.
+    """
+    modo = modo or os.getenv('BOT_MODO', 'polling')
+    if modo not in MODOS:
+        raise ValueError(f"BOT_MODO inválido: {modo!r}; debe ser {' o '.join(MODOS)}")
+    return modo
+
+
+def registrar_salud(servidor, receptores):
+    """
+    Registra los endpoints `/salud` y `/listo` de las aplicaciones del proceso.
+
+    Args:
+        servidor (ServidorHTTP): Servidor en el que se registran las rutas.
+        receptores (dict): `ReceptorWebhook` de cada aplicación, por nombre.
+    """
+    async def salud(solicitud):
+        return HTTPStatus.OK, {'estado': 'ok'}
+
+    async def listo(solicitud):
+        estados = {nombre: receptor.estado() for nombre, receptor in receptores.items()}
+        todas = all(estado['listo'] for estado in estados.values())
+        if len(estados) == 1:
+            cuerpo = next(iter(estados.values()))
+        else:
+            cuerpo = {'listo': todas, 'bots': estados}
+        return (HTTPStatus.OK if todas else HTTPStatus.SERVICE_UNAVAILABLE), cuerpo
+
+    servidor.ruta('GET', '/salud', salud)
+    servidor.ruta('GET', '/listo', listo)
+
+
+async def _detener(application):
+    # Mismo orden que `run_polling` al terminar
+    try:
+        if application.updater is not None and application.updater.running:
+            await application.updater.stop()
+        if application.running:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+    finally:
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+async def ejecutar_aplicaciones(aplicaciones, modo=None, servidor=None, registrar=None, tareas=(), parada=None,
+                                secreto=None):
+    """
+    Ejecuta una o varias aplicaciones en el bucle de eventos actual hasta recibir SIGINT o SIGTERM.
+
+    Cada aplicación sigue el mismo ciclo de vida que con `run_polling`: `initialize`, `post_init`,
+    `start`, y al terminar `stop`, `post_stop`, `shutdown` y `post_shutdown`.
+
+    Args:
+        aplicaciones (dict): Aplicaciones de python-telegram-bot por nombre.
+        modo (str, opcional): `polling` o `webhook`; por defecto `BOT_MODO` o `polling`.
+        servidor (ServidorHTTP, opcional): Servidor del webhook; por defecto uno en `WEBHOOK_HOST`:`WEBHOOK_PUERTO`.
+        registrar (bool, opcional): Registrar el webhook en Telegram; por defecto `WEBHOOK_REGISTRAR`.
+        tareas (iterable, opcional): Corrutinas sin argumentos que corren mientras las aplicaciones
+            están iniciadas (por ejemplo el sondeo compartido de `bots.py`); se cancelan al terminar.
+        parada (asyncio.Event, opcional): Evento que también detiene las aplicaciones (pruebas y
+            banco de pruebas).
+        secreto (str, opcional): Token secreto del webhook; por defecto `WEBHOOK_SECRETO` o uno generado.
+
+    Returns:
+        None
+
+    Raises:
+        ValueError: Si el modo no es válido, o si se registra el webhook sin `WEBHOOK_URL`.
+    """
+    modo = modo_configurado(modo)
+    varias = len(aplicaciones) > 1
+    url = os.getenv('WEBHOOK_URL')
+    ruta = os.getenv('WEBHOOK_RUTA', '/telegram')
+    secreto = secreto or os.getenv('WEBHOOK_SECRETO') or secrets.token_urlsafe(32)
+
+    if modo == 'webhook':
+        if registrar is None:
+            registrar = os.getenv('WEBHOOK_REGISTRAR', '1') == '1'
+        if registrar and not url:
+            raise ValueError("Falta WEBHOOK_URL para registrar el webhook (o WEBHOOK_REGISTRAR=0)")
+        if servidor is None:
+            servidor = ServidorHTTP(os.getenv('WEBHOOK_HOST', '0.0.0.0'), int(os.getenv('WEBHOOK_PUERTO', 8080)))
+        receptores = {
+            nombre: ReceptorWebhook(application, servidor, f"{ruta}/{nombre}" if varias else ruta, secreto)
+            for nombre, application in aplicaciones.items()
+        }
+        registrar_salud(servidor, receptores)
+    else:
+        servidor = None
+
+    parada = parada or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for senal in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(senal, parada.set)
+        except NotImplementedError:
+            pass
+
+    iniciadas = []
+    activas = []
+    try:
+        # Escuchando antes de que Telegram conozca la URL
+        if servidor is not None:
+            await servidor.iniciar()
+        for nombre, application in aplicaciones.items():
+            await application.initialize()
+            iniciadas.append(application)
+            if application.post_init:
+                await application.post_init(application)
+            if modo != 'webhook':
+                await application.updater.start_polling()
+            elif registrar:
+                url_bot = f"{url}/{nombre}" if varias else url
+                await application.bot.set_webhook(url=url_bot, secret_token=secreto, allowed_updates=Update.ALL_TYPES)
+                logging.info(f"Webhook registrado en {url_bot}")
+            await application.start()
+
+        activas = [asyncio.create_task(tarea()) for tarea in tareas]
+        logging.info(f"Aplicaciones iniciadas en modo {modo}: {', '.join(aplicaciones)}")
+        await parada.wait()
+    finally:
+        for tarea in activas:
+            tarea.cancel()
+        await asyncio.gather(*activas, return_exceptions=True)
+        if servidor is not None:
+            await servidor.detener()
+        for application in reversed(iniciadas):
+            await _detener(application)
+
+
+async def ejecutar_webhook(application, servidor=None, registrar=None):
+    """
+    Ejecuta una aplicación en modo webhook hasta recibir SIGINT o SIGTERM.
+
+    Args:
+        application (Application): Aplicación de python-telegram-bot.
+        servidor (ServidorHTTP, opcional): Servidor a usar; por defecto uno en `WEBHOOK_HOST`:`WEBHOOK_PUERTO`.
+        registrar (bool, opcional): Registrar el webhook en Telegram; por defecto `WEBHOOK_REGISTRAR`.
+
+    Returns:
+        None
+    """
+    await ejecutar_aplicaciones({'bot': application}, 'webhook', servidor, registrar)
+
+
+def ejecutar_aplicacion(application):
+    """
+    Ejecuta la aplicación en el modo configurado en `BOT_MODO` (polling por defecto).
+
+    Args:
+        application (Application): Aplicación de python-telegram-bot.
+
+    Returns:
+        None
+
+    Raises:
+        ValueError: Si `BOT_MODO` no es válido.
+    """
+    if modo_configurado() == 'webhook':
+        asyncio.run(ejecutar_webhook(application))
+    else:
+        application.run_polling()